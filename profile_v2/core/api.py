@@ -1,5 +1,7 @@
 from abc import ABC, abstractmethod
-from typing import List
+from contextvars import ContextVar
+from threading import Lock
+from typing import Callable, List, Optional
 
 from profile_v2.core.model import (DataSource,
                                    ProfileNonFunctionalRequirements,
@@ -17,6 +19,73 @@ class ProfileEngineValueError(ProfileEngineException, ValueError):
     pass
 
 
+class ProfileEngineTimeoutError(ProfileEngineException, TimeoutError):
+    pass
+
+
+class ProfileEngineOverloadedError(ProfileEngineException):
+    pass
+
+
+class ProfileEngineCancelledError(ProfileEngineException):
+    pass
+
+
+class CancellationToken:
+    """
+    Thread-safe cancellation signal of a profile call.
+
+    Engines get the token of the current call from `current_cancellation_token`, check it between units of work
+    with `raise_if_cancelled`, and register callbacks to abort the work in flight (eg: the running statement).
+    Callbacks run on the thread calling `cancel`, or right away if registered once cancelled.
+    """
+
+    def __init__(self):
+        self._cancelled = False
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def cancel(self) -> None:
+        with self._lock:
+            if self._cancelled:
+                return
+            self._cancelled = True
+            callbacks = list(self._callbacks)
+            self._callbacks.clear()
+        for callback in callbacks:
+            callback()
+
+    def add_callback(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """Registers the callback, returning a function that unregisters it."""
+        with self._lock:
+            if not self._cancelled:
+                self._callbacks.append(callback)
+                return lambda: self._remove_callback(callback)
+        callback()
+        return lambda: None
+
+    def _remove_callback(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+
+# token of the profile call being run; threads started by the engines must run in a copy of the caller context
+current_cancellation_token: ContextVar[Optional[CancellationToken]] = ContextVar(
+    "current_cancellation_token", default=None
+)
+
+
+def raise_if_cancelled() -> None:
+    token = current_cancellation_token.get()
+    if token is not None and token.cancelled:
+        raise ProfileEngineCancelledError("Profile call cancelled")
+
+
 class ProfileEngine(ABC):
 
     def __init__(self, report: ProfileCoreReport = ProfileCoreReport()):
@@ -29,6 +98,7 @@ class ProfileEngine(ABC):
         non_functional_requirements: ProfileNonFunctionalRequirements = ProfileNonFunctionalRequirements(),
     ) -> ProfileResponse:
         self._requests_validations(requests)
+        raise_if_cancelled()
         return self._do_profile(datasource, requests, non_functional_requirements)
 
     @abstractmethod
@@ -1,17 +1,43 @@
 import asyncio
 import concurrent.futures
+import heapq
+import itertools
 import logging
-from copy import deepcopy
-from dataclasses import dataclass
-from typing import Callable, List, Optional
+import math
+import random
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, field, replace
+from enum import Enum
+from threading import Condition, Lock
+from typing import Callable, Deque, Dict, List, Optional, Set, Tuple
 
-from profile_v2.core.api import ProfileEngine
+from profile_v2.core.api import (CancellationToken, ProfileEngine,
+                                 ProfileEngineCancelledError,
+                                 ProfileEngineOverloadedError,
+                                 ProfileEngineTimeoutError,
+                                 ProfileEngineValueError,
+                                 current_cancellation_token,
+                                 raise_if_cancelled)
+from profile_v2.core.cache import (CachedStatisticResult,
+                                   InMemoryStatisticResultCache,
+                                   SqliteStatisticResultCache,
+                                   StatisticResultCache,
+                                   TieredStatisticResultCache)
+from profile_v2.core.concurrency import (DEFAULT_SHARED_EXECUTOR,
+                                         AdaptiveConcurrencyLimiter,
+                                         CircuitBreaker, CircuitBreakerState,
+                                         SharedExecutor, percentile)
 from profile_v2.core.model import (DataSource,
                                    ProfileNonFunctionalRequirements,
                                    ProfileRequest, ProfileResponse,
-                                   SuccessStatisticResult,
-                                   UnsuccessfulStatisticResult)
-from profile_v2.core.model_utils import ModelCollections
+                                   StatisticResult, StatisticSpec,
+                                   SuccessStatisticResult, TypedStatistic,
+                                   UnsuccessfulStatisticResult,
+                                   UnsuccessfulStatisticResultType)
+from profile_v2.core.model_utils import (DataSourceKey, ModelCollections,
+                                         ModelKeys)
+from profile_v2.core.report import ProfileCoreReport
 
 logger = logging.getLogger(__name__)
 
@@ -22,10 +48,77 @@ class SequentialFallbackProfileEngine(ProfileEngine):
 
     Requests are processed by the first engine and only the failed/unsupported ones will be tried with the next one.
     And so on, until no more pending requests or no more engines.
+
+    Requests are not copied: pending requests share the batch and statistic objects of the given ones, and are
+    rebuilt from an index of the statistics by fq_name, so the cost of every fallback step is proportional to the
+    number of unsuccessful statistics rather than to the number of requested ones.
+
+    Hedging (opt-in with `hedge_percentile`): if an engine has not returned within the given percentile of its
+    latencies per statistic, times the number of statistics of the call (`hedge_initial_delay_seconds` until
+    `hedge_min_samples` latencies are known), its pending statistics are sent to the next engine too. Cancelled
+    calls (eg: the slower engine of a hedge) are sampled at their elapsed time. For every statistic, the first
+    successful result wins, and the call returns as soon as all the statistics have succeeded; the slower engine
+    call is cancelled through its own CancellationToken, so its statement in flight is cancelled too, not left
+    running in the warehouse. Statistics unsuccessful in both continue with the engine after the hedge. Engine
+    calls run in `executor` (the process-wide DEFAULT_SHARED_EXECUTOR by default), keyed by datasource. Hedges and
+    hedge wins (the hedge engine succeeding first) are in the report, by hedge engine.
+
+    Pipelining (opt-in with `pipelined`): requests are sent to the engines in chunks of `pipeline_chunk_size`
+    requests, every engine working on a chunk at a time in `executor`, and the unsuccessful statistics of a chunk
+    are forwarded to the next engine as soon as the chunk is done, while the previous engine keeps working on the
+    next chunks. So the elapsed time gets close to the one of the slowest engine, rather than to the sum of all of
+    them; at the cost of smaller calls to every engine. Chunks are batch-sized by default, so every engine call
+    keeps the optimizations of bulk calls (eg: statistic fusion, UNION ALL packing, catalog queries per schema) and
+    a single connection checkout; smaller chunks overlap the engines more. Pipelining and hedging are exclusive.
+
+    Circuit breakers (opt-in with `circuit_breaker_failure_threshold`): there is a CircuitBreaker per engine and
+    datasource, opening after the given number of consecutive failed calls (calls raising an exception, or with
+    FAILURE results and no successful one). While open, the engine is skipped, its statistics being FAILURE results
+    that go straight to the next engine. After `circuit_breaker_reset_timeout_seconds`, the next call is let through
+    as a probe, closing the breaker if it succeeds. With breakers, exceptions of an engine fall back to the next
+    engine too, instead of being raised. Breaker states are in the report, by engine and datasource.
+
+    Cancellation: once the call is cancelled (see CancellationToken), statistics don't fall back to the next engine,
+    and ProfileEngineCancelledError is raised, whatever the circuit breakers.
     """
 
-    def __init__(self, engines: List[ProfileEngine]):
+    _MAX_LATENCY_SAMPLES = 100
+    _DEFAULT_PIPELINE_CHUNK_SIZE = 100
+
+    def __init__(
+        self,
+        engines: List[ProfileEngine],
+        report: ProfileCoreReport = ProfileCoreReport(),
+        hedge_percentile: Optional[float] = None,
+        hedge_initial_delay_seconds: Optional[float] = None,
+        hedge_min_samples: int = 20,
+        pipelined: bool = False,
+        pipeline_chunk_size: int = _DEFAULT_PIPELINE_CHUNK_SIZE,
+        circuit_breaker_failure_threshold: Optional[int] = None,
+        circuit_breaker_reset_timeout_seconds: float = 60,
+        executor: Optional[SharedExecutor] = None,
+    ):
+        super().__init__(report)
+        if pipelined and hedge_percentile is not None:
+            raise ProfileEngineValueError("Pipelining and hedging are exclusive")
         self.engines = engines
+        self.executor = executor or DEFAULT_SHARED_EXECUTOR
+        self.pipelined = pipelined
+        self.pipeline_chunk_size = pipeline_chunk_size
+        self.hedge_percentile = hedge_percentile
+        self.hedge_initial_delay_seconds = hedge_initial_delay_seconds
+        self.hedge_min_samples = hedge_min_samples
+        self._latencies_seconds: List[Deque[float]] = [
+            deque(maxlen=SequentialFallbackProfileEngine._MAX_LATENCY_SAMPLES)
+            for _ in engines
+        ]
+        self._latencies_lock = Lock()
+        self.circuit_breaker_failure_threshold = circuit_breaker_failure_threshold
+        self.circuit_breaker_reset_timeout_seconds = (
+            circuit_breaker_reset_timeout_seconds
+        )
+        self._circuit_breakers: Dict[Tuple[int, DataSourceKey], CircuitBreaker] = {}
+        self._circuit_breakers_lock = Lock()
 
     def _do_profile(
         self,
@@ -33,61 +126,392 @@ class SequentialFallbackProfileEngine(ProfileEngine):
         requests: List[ProfileRequest],
         non_functional_requirements: ProfileNonFunctionalRequirements = ProfileNonFunctionalRequirements(),
     ) -> ProfileResponse:
+        if self.pipelined and len(self.engines) > 1:
+            return self._profile_pipelined(
+                datasource, requests, non_functional_requirements
+            )
+
         response = ProfileResponse()
 
-        pending = deepcopy(requests)
-        for engine in self.engines:
-            engine_response = engine._do_profile(datasource, pending)
+        index = SequentialFallbackProfileEngine._index(requests)
+        pending = requests
+        position = 0
+        while position < len(self.engines):
+            # cancelled statistics don't fall back to the next engine
+            raise_if_cancelled()
+            engine = self.engines[position]
+            if self.hedge_percentile is not None and position + 1 < len(self.engines):
+                engine_response, num_engines = self._profile_hedged(
+                    position, datasource, pending, non_functional_requirements
+                )
+            else:
+                engine_response = self._profile_with_engine(
+                    position, datasource, pending, non_functional_requirements
+                )
+                num_engines = 1
+            position += num_engines
+            # failed results are set in the response too, next engine will overwrite if so
+            response.update(engine_response)
 
-            engine_responses_by_type = ModelCollections.split_response_by_type(
-                engine_response
-            )
-            success_response: Optional[ProfileResponse] = engine_responses_by_type.get(
-                SuccessStatisticResult
-            )
-            unsuccessful_response: Optional[ProfileResponse] = (
-                engine_responses_by_type.get(UnsuccessfulStatisticResult)
+            unsuccessful_positions = [
+                index[fq_name]
+                for fq_name, result in engine_response.data.items()
+                if isinstance(result, UnsuccessfulStatisticResult) and fq_name in index
+            ]
+            logger.info(
+                f"{engine.__class__.__name__} processed {len(engine_response.data)} statistics, "
+                f"{len(unsuccessful_positions)} unsuccessful"
             )
+            if not unsuccessful_positions:
+                break
 
-            if success_response:
-                logger.info(
-                    f"{engine.__class__.__name__} successfully processed: {success_response}"
-                )
-                response.update(success_response)
+            # only keep in pending the statistics that failed, in the order they were requested
+            pending = SequentialFallbackProfileEngine._pending_requests(
+                requests, sorted(unsuccessful_positions)
+            )
 
-            if unsuccessful_response:
-                # set the failed results in the response
-                # next engine will overwrite if so
-                response.update(unsuccessful_response)
+        return response
 
-                # only keep in pending the requests that failed
-                aux: List[ProfileRequest] = []
-                for request in pending:
-                    aux_stats = []
-                    for statistic in request.statistics:
-                        fq_name = statistic.fq_name
-                        if fq_name not in unsuccessful_response.data:
-                            aux_stats.append(statistic)
-                    if aux_stats:
-                        aux.append(
-                            ProfileRequest(batch=request.batch, statistics=aux_stats)
+    def _profile_pipelined(
+        self,
+        datasource: DataSource,
+        requests: List[ProfileRequest],
+        non_functional_requirements: ProfileNonFunctionalRequirements,
+    ) -> ProfileResponse:
+        response = ProfileResponse()
+        datasource_key = ModelKeys.datasource_key(datasource)
+        # chunks waiting for every engine; the first engine gets all of them, the next ones the unsuccessful statistics
+        waiting_chunks: List[Deque[List[ProfileRequest]]] = [
+            deque() for _ in self.engines
+        ]
+        waiting_chunks[0].extend(
+            requests[start : start + self.pipeline_chunk_size]
+            for start in range(0, len(requests), self.pipeline_chunk_size)
+        )
+        # a single call in flight per engine, so every engine works on its chunks in order
+        in_flight: Dict[concurrent.futures.Future, Tuple[int, List[ProfileRequest]]]
+        in_flight = {}
+        try:
+            while True:
+                # once the call is cancelled, the remaining chunks are dropped
+                raise_if_cancelled()
+                busy_positions = {position for position, _ in in_flight.values()}
+                for position, chunks in enumerate(waiting_chunks):
+                    if chunks and position not in busy_positions:
+                        chunk = chunks.popleft()
+                        future = self.executor.submit(
+                            datasource_key,
+                            self._profile_with_engine,
+                            position,
+                            datasource,
+                            chunk,
+                            non_functional_requirements,
+                        )
+                        in_flight[future] = (position, chunk)
+                if not in_flight:
+                    break
+                for future in self.executor.wait_any(set(in_flight)):
+                    position, chunk = in_flight.pop(future)
+                    engine_response = future.result()
+                    # failed results are set in the response too, next engine will overwrite if so
+                    response.update(engine_response)
+                    index = SequentialFallbackProfileEngine._index(chunk)
+                    unsuccessful_positions = [
+                        index[fq_name]
+                        for fq_name, result in engine_response.data.items()
+                        if isinstance(result, UnsuccessfulStatisticResult)
+                        and fq_name in index
+                    ]
+                    if position + 1 < len(self.engines) and unsuccessful_positions:
+                        waiting_chunks[position + 1].append(
+                            SequentialFallbackProfileEngine._pending_requests(
+                                chunk, sorted(unsuccessful_positions)
+                            )
                         )
+        except Exception:
+            # once an engine failed, the remaining chunks are dropped, and the calls in flight are waited for
+            for future in in_flight:
+                future.cancel()
+            pending = {future for future in in_flight if not future.done()}
+            while pending:
+                pending -= self.executor.wait_any(pending)
+            raise
+        return response
+
+    @staticmethod
+    def _index(requests: List[ProfileRequest]) -> Dict[str, Tuple[int, int]]:
+        """fq_name -> (request position, statistic position)"""
+        return {
+            statistic.fq_name: (request_position, statistic_position)
+            for request_position, request in enumerate(requests)
+            for statistic_position, statistic in enumerate(request.statistics)
+        }
 
-                pending = aux
-                logger.info(f"Pending requests: {pending}")
+    def _profile_with_engine(
+        self,
+        position: int,
+        datasource: DataSource,
+        requests: List[ProfileRequest],
+        non_functional_requirements: ProfileNonFunctionalRequirements,
+    ) -> ProfileResponse:
+        """Profiles with the engine at the given position, through its circuit breaker if any, timing the call."""
+        engine = self.engines[position]
+        circuit_breaker = self._circuit_breaker(position, datasource)
+        if circuit_breaker is not None and not circuit_breaker.allow_request():
+            logger.info(f"Circuit breaker open, skipping {engine.__class__.__name__}")
+            return SequentialFallbackProfileEngine._failed_response(
+                requests, f"Circuit breaker open for {engine.__class__.__name__}"
+            )
+
+        start = time.perf_counter()
+        try:
+            engine_response = engine._do_profile(
+                datasource, requests, non_functional_requirements
+            )
+        except ProfileEngineCancelledError:
+            # eg: losing a hedge; its latency is at least the elapsed time, which keeps the slow calls in the samples
+            self._record_latency(position, time.perf_counter() - start, requests)
+            if circuit_breaker is not None:
+                circuit_breaker.record_cancellation()
+            raise
+        except Exception as e:
+            if circuit_breaker is None:
+                raise
+            logger.warning(f"{engine.__class__.__name__} failed: {e}")
+            circuit_breaker.record_failure()
+            return SequentialFallbackProfileEngine._failed_response(requests, str(e), e)
+        self._record_latency(position, time.perf_counter() - start, requests)
+
+        if circuit_breaker is not None:
+            if SequentialFallbackProfileEngine._is_failed_response(engine_response):
+                circuit_breaker.record_failure()
             else:
-                break
+                circuit_breaker.record_success()
+        return engine_response
+
+    def _circuit_breaker(
+        self, position: int, datasource: DataSource
+    ) -> Optional[CircuitBreaker]:
+        if self.circuit_breaker_failure_threshold is None:
+            return None
+        key = (position, ModelKeys.datasource_key(datasource))
+        with self._circuit_breakers_lock:
+            if key not in self._circuit_breakers:
+                engine_name = self.engines[position].__class__.__name__
+                datasource_label = ModelKeys.datasource_label(datasource)
+                self._circuit_breakers[key] = CircuitBreaker(
+                    failure_threshold=self.circuit_breaker_failure_threshold,
+                    reset_timeout_seconds=self.circuit_breaker_reset_timeout_seconds,
+                    on_change=lambda previous_state, state: self.report.circuit_breaker_state(
+                        engine_name, datasource_label, state, previous_state
+                    ),
+                )
+                self.report.circuit_breaker_state(
+                    engine_name, datasource_label, CircuitBreakerState.CLOSED
+                )
+            return self._circuit_breakers[key]
 
+    @staticmethod
+    def _is_failed_response(response: ProfileResponse) -> bool:
+        """Failed if some FAILURE result and no successful one; UNSUPPORTED and SKIPPED are not failures."""
+        has_failure = False
+        for result in response.data.values():
+            if isinstance(result, SuccessStatisticResult):
+                return False
+            if (
+                isinstance(result, UnsuccessfulStatisticResult)
+                and result.type == UnsuccessfulStatisticResultType.FAILURE
+            ):
+                has_failure = True
+        return has_failure
+
+    @staticmethod
+    def _failed_response(
+        requests: List[ProfileRequest],
+        message: str,
+        exception: Optional[Exception] = None,
+    ) -> ProfileResponse:
+        response = ProfileResponse()
+        for request in requests:
+            response.update(
+                ModelCollections.failed_response_for_request(
+                    request,
+                    UnsuccessfulStatisticResultType.FAILURE,
+                    message,
+                    exception,
+                )
+            )
         return response
 
+    def _record_latency(
+        self, position: int, latency_seconds: float, requests: List[ProfileRequest]
+    ) -> None:
+        # per statistic, as calls differ in size
+        num_statistics = sum(len(request.statistics) for request in requests)
+        with self._latencies_lock:
+            self._latencies_seconds[position].append(
+                latency_seconds / max(num_statistics, 1)
+            )
+
+    def _hedge_delay_seconds(
+        self, position: int, requests: List[ProfileRequest]
+    ) -> Optional[float]:
+        with self._latencies_lock:
+            latencies_seconds = list(self._latencies_seconds[position])
+        if len(latencies_seconds) < self.hedge_min_samples or not latencies_seconds:
+            return self.hedge_initial_delay_seconds
+        assert self.hedge_percentile is not None
+        num_statistics = sum(len(request.statistics) for request in requests)
+        return percentile(latencies_seconds, self.hedge_percentile) * max(
+            num_statistics, 1
+        )
+
+    def _profile_with_token(
+        self,
+        token: CancellationToken,
+        position: int,
+        datasource: DataSource,
+        requests: List[ProfileRequest],
+        non_functional_requirements: ProfileNonFunctionalRequirements,
+    ) -> ProfileResponse:
+        # run in a copy of the caller context, so the token is set for this engine call only
+        current_cancellation_token.set(token)
+        return self._profile_with_engine(
+            position, datasource, requests, non_functional_requirements
+        )
+
+    def _profile_hedged(
+        self,
+        position: int,
+        datasource: DataSource,
+        requests: List[ProfileRequest],
+        non_functional_requirements: ProfileNonFunctionalRequirements,
+    ) -> Tuple[ProfileResponse, int]:
+        """
+        Profiles with the engine at the given position, hedged with the next one if slow.
+        Returns the response, and the number of engines used (2 if hedged).
+        """
+        delay_seconds = self._hedge_delay_seconds(position, requests)
+        datasource_key = ModelKeys.datasource_key(datasource)
+        # every engine call has its own token, cancelled with the call or when the other engine wins
+        tokens = [CancellationToken(), CancellationToken()]
+        parent_token = current_cancellation_token.get()
+        remove_callbacks = (
+            [parent_token.add_callback(token.cancel) for token in tokens]
+            if parent_token is not None
+            else []
+        )
+        try:
+            primary_future = self.executor.submit(
+                datasource_key,
+                self._profile_with_token,
+                tokens[0],
+                position,
+                datasource,
+                requests,
+                non_functional_requirements,
+            )
+            # with no delay, waits for the primary until done
+            if self.executor.wait_any({primary_future}, timeout_seconds=delay_seconds):
+                return primary_future.result(), 1
+
+            hedge_engine_name = self.engines[position + 1].__class__.__name__
+            logger.info(
+                f"{self.engines[position].__class__.__name__} slower than {delay_seconds:.3f}s, "
+                f"hedging with {hedge_engine_name}"
+            )
+            self.report.hedge(hedge_engine_name)
+            hedge_future = self.executor.submit(
+                datasource_key,
+                self._profile_with_token,
+                tokens[1],
+                position + 1,
+                datasource,
+                requests,
+                non_functional_requirements,
+            )
+            token_by_future = {primary_future: tokens[0], hedge_future: tokens[1]}
+
+            num_statistics = sum(len(request.statistics) for request in requests)
+            response = ProfileResponse()
+            num_successful = 0
+            first_successful_future: Optional[concurrent.futures.Future] = None
+            first_exception: Optional[Exception] = None
+            not_done = {primary_future, hedge_future}
+            while not_done and num_successful < num_statistics:
+                done = self.executor.wait_any(not_done)
+                not_done -= done
+                for future in done:
+                    try:
+                        engine_response = future.result()
+                    except Exception as e:
+                        logger.warning(f"Engine failed while hedging: {e}")
+                        first_exception = first_exception or e
+                        continue
+                    for fq_name, result in engine_response.data.items():
+                        if isinstance(
+                            response.data.get(fq_name), SuccessStatisticResult
+                        ):
+                            continue
+                        response.data[fq_name] = result
+                        if isinstance(result, SuccessStatisticResult):
+                            num_successful += 1
+                            first_successful_future = first_successful_future or future
+
+            # the slower engine call is not started, or its statement in flight is cancelled
+            for future in not_done:
+                future.cancel()
+                token_by_future[future].cancel()
+            raise_if_cancelled()
+            if first_successful_future is hedge_future:
+                self.report.hedge_win(hedge_engine_name)
+            if not response.data and first_exception:
+                raise first_exception
+            return response, 2
+        finally:
+            for remove_callback in remove_callbacks:
+                remove_callback()
+
+    @staticmethod
+    def _pending_requests(
+        requests: List[ProfileRequest], positions: List[Tuple[int, int]]
+    ) -> List[ProfileRequest]:
+        pending: List[ProfileRequest] = []
+        last_request_position = None
+        for request_position, statistic_position in positions:
+            request = requests[request_position]
+            if request_position != last_request_position:
+                pending.append(ProfileRequest(statistics=[], batch=request.batch))
+                last_request_position = request_position
+            pending[-1].statistics.append(request.statistics[statistic_position])
+        return pending
+
 
 class ParallelProfileEngine(ProfileEngine):
     """
     Executes requests in parallel with a given engine.
 
     The requests are grouped in batches using the given predicate.
+
+    With `adaptive_concurrency`, the number of batches in flight is adjusted at runtime with an
+    AdaptiveConcurrencyLimiter per datasource, between `min_workers` and `max_workers`: it grows while batches
+    succeed with stable latency per statistic, and backs off when they fail (eg: throttling) or slow down. Limiters
+    are kept across calls, so the learned limit carries over. The current limit of every datasource and the
+    adjustments are in the report.
+
+    Batches run in a SharedExecutor (`executor`, the process-wide DEFAULT_SHARED_EXECUTOR by default), so nested
+    and concurrent parallel engines share a bounded set of threads, and the executor limit per datasource applies
+    across all of them. So `max_workers` is not a number of threads, which is bounded by the executor, but the max
+    number of batches in flight of a single call (and the max adaptive limit). The calling thread runs batches too
+    while waiting for them or for an adaptive limiter slot (work-stealing), so nesting can't starve the executor.
+
+    Batches run with their own CancellationToken, cancelled with the call, so pending batches are not run once the
+    call is cancelled. If a batch raises, the pending batches are not run either, the running ones are cancelled,
+    and the exception is raised once they are done.
     """
 
+    _DEFAULT_INITIAL_WORKERS = 4
+
     def __init__(
         self,
         engine: ProfileEngine,
@@ -95,10 +519,24 @@ class ParallelProfileEngine(ProfileEngine):
         batch_requests_predicate: Optional[
             Callable[[List[ProfileRequest]], List[List[ProfileRequest]]]
         ] = None,
+        adaptive_concurrency: bool = False,
+        min_workers: int = 1,
+        report: Optional[ProfileCoreReport] = None,
+        executor: Optional[SharedExecutor] = None,
     ):
+        super().__init__(
+            report
+            if report is not None
+            else getattr(engine, "report", ProfileCoreReport())
+        )
         self.engine = engine
+        self.executor = executor or DEFAULT_SHARED_EXECUTOR
         self.max_workers = max_workers
         self.group_requests_predicate = batch_requests_predicate
+        self.adaptive_concurrency = adaptive_concurrency
+        self.min_workers = min_workers
+        self._limiters: Dict[DataSourceKey, AdaptiveConcurrencyLimiter] = {}
+        self._limiters_lock = Lock()
 
     def _do_profile(
         self,
@@ -116,69 +554,1136 @@ class ParallelProfileEngine(ProfileEngine):
         logger.info(f"Requests batched in {len(batch_requests)} batches")
         logger.debug(batch_requests)
 
-        with concurrent.futures.ThreadPoolExecutor(
-            max_workers=self.max_workers
-        ) as executor:
-            batch_response_futures = {
-                executor.submit(self.engine._do_profile, datasource, batch): batch
-                for batch in batch_requests
+        limiter = self._limiter(datasource) if self.adaptive_concurrency else None
+        datasource_key = ModelKeys.datasource_key(datasource)
+        # cancelled with the call, or when a batch fails
+        token = CancellationToken()
+        parent_token = current_cancellation_token.get()
+        remove_callback = (
+            parent_token.add_callback(token.cancel)
+            if parent_token is not None
+            else None
+        )
+        pending_batches = deque(batch_requests)
+        in_flight: Set[concurrent.futures.Future] = set()
+        try:
+            while pending_batches or in_flight:
+                # sliding window of batches in flight, bounded by max_workers and by the adaptive limit
+                while pending_batches and len(in_flight) < self.max_workers:
+                    if limiter and not limiter.try_acquire():
+                        if in_flight:
+                            break
+                        # slots held by other calls, released as their batches complete; waiting through the
+                        # executor, as this call may run in a batch of an outer call, which must not block a worker
+                        self.executor.wait_until(limiter.try_acquire)
+                    in_flight.add(
+                        self.executor.submit(
+                            datasource_key,
+                            self._profile_batch,
+                            token,
+                            limiter,
+                            datasource,
+                            pending_batches.popleft(),
+                            non_functional_requirements,
+                        )
+                    )
+                for batch_response_future in self.executor.wait_any(in_flight):
+                    in_flight.remove(batch_response_future)
+                    response.update(batch_response_future.result())
+        except Exception:
+            # queued batches are not run, and running ones are cancelled, then waited for so none is left behind
+            for batch_response_future in in_flight:
+                if batch_response_future.cancel() and limiter:
+                    limiter.cancel()
+            token.cancel()
+            in_flight = {future for future in in_flight if not future.done()}
+            while in_flight:
+                in_flight -= self.executor.wait_any(in_flight)
+            raise
+        finally:
+            if remove_callback is not None:
+                remove_callback()
+
+        return response
+
+    def _profile_batch(
+        self,
+        token: CancellationToken,
+        limiter: Optional[AdaptiveConcurrencyLimiter],
+        datasource: DataSource,
+        batch: List[ProfileRequest],
+        non_functional_requirements: ProfileNonFunctionalRequirements,
+    ) -> ProfileResponse:
+        # run in a copy of the caller context, so the token is set for this batch only
+        current_cancellation_token.set(token)
+        start = time.perf_counter()
+        failed = True
+        try:
+            # pending batches are not run once the call is cancelled
+            raise_if_cancelled()
+            batch_response = self.engine._do_profile(
+                datasource, batch, non_functional_requirements
+            )
+            failed = any(
+                isinstance(result, UnsuccessfulStatisticResult)
+                and result.type == UnsuccessfulStatisticResultType.FAILURE
+                for result in batch_response.data.values()
+            )
+            return batch_response
+        except ProfileEngineCancelledError:
+            # not a sign of overload
+            failed = False
+            raise
+        finally:
+            if limiter:
+                # per statistic, as batches differ in size
+                limiter.release(
+                    time.perf_counter() - start,
+                    failed=failed,
+                    size=sum(len(request.statistics) for request in batch),
+                )
+
+    def _limiter(self, datasource: DataSource) -> AdaptiveConcurrencyLimiter:
+        key = ModelKeys.datasource_key(datasource)
+        with self._limiters_lock:
+            if key not in self._limiters:
+                engine_name = self.__class__.__name__
+                datasource_label = ModelKeys.datasource_label(datasource)
+                limiter = AdaptiveConcurrencyLimiter(
+                    min_limit=self.min_workers,
+                    max_limit=self.max_workers,
+                    initial_limit=ParallelProfileEngine._DEFAULT_INITIAL_WORKERS,
+                    on_change=lambda previous_limit, limit: self.report.concurrency_limit(
+                        engine_name, datasource_label, limit, previous_limit
+                    ),
+                )
+                self.report.concurrency_limit(
+                    engine_name, datasource_label, limiter.limit
+                )
+                self._limiters[key] = limiter
+            return self._limiters[key]
+
+
+class RoutingProfileEngine(ProfileEngine):
+    """
+    Routes every statistic straight to the engine with the lowest expected cost, instead of trying the engines in
+    a fixed order like SequentialFallbackProfileEngine.
+
+    Outcomes of the routed statistics are kept by engine position, statistic type and datasource, and the expected
+    cost of an engine is its latency percentile (`latency_percentile`) divided by its success rate, ie the expected
+    time to get a successful result. Latencies are sampled once per engine call, per statistic, as calls differ in
+    size. Engines with fewer than `min_samples` outcomes have no cost, so they are tried first, in the given order.
+    A fraction `exploration_rate` of the statistics are routed to a random engine, so the outcomes of every engine
+    stay current. Outcomes are reported too, with engines named by class and their position as a suffix (eg:
+    SqlAlchemyProfileEngine[1]) if several engines are of the same class.
+
+    Statistics unsuccessful in an engine are routed again to the remaining engines, until they succeed or all the
+    engines have been tried. Engine exceptions are FAILURE results of its statistics.
+    """
+
+    _MAX_LATENCY_SAMPLES = 100
+
+    def __init__(
+        self,
+        engines: List[ProfileEngine],
+        report: ProfileCoreReport = ProfileCoreReport(),
+        exploration_rate: float = 0.05,
+        latency_percentile: float = 50,
+        min_samples: int = 5,
+        seed: Optional[int] = None,
+    ):
+        super().__init__(report)
+        self.engines = engines
+        self.exploration_rate = exploration_rate
+        self.latency_percentile = latency_percentile
+        self.min_samples = min_samples
+        self._random = random.Random(seed)
+        # by (engine position, statistic type, datasource label)
+        self._num_routed: Dict[Tuple[int, str, str], int] = defaultdict(int)
+        self._num_succeeded: Dict[Tuple[int, str, str], int] = defaultdict(int)
+        self._latencies_seconds: Dict[Tuple[int, str, str], Deque[float]] = {}
+        self._outcomes_lock = Lock()
+        class_names = [engine.__class__.__name__ for engine in engines]
+        self._engine_names = [
+            (
+                class_name
+                if class_names.count(class_name) == 1
+                else f"{class_name}[{position}]"
+            )
+            for position, class_name in enumerate(class_names)
+        ]
+
+    def _do_profile(
+        self,
+        datasource: DataSource,
+        requests: List[ProfileRequest],
+        non_functional_requirements: ProfileNonFunctionalRequirements = ProfileNonFunctionalRequirements(),
+    ) -> ProfileResponse:
+        response = ProfileResponse()
+        datasource_label = ModelKeys.datasource_label(datasource)
+
+        # (request position, statistic) of the statistics to be routed
+        pending: List[Tuple[int, StatisticSpec]] = [
+            (request_position, statistic)
+            for request_position, request in enumerate(requests)
+            for statistic in request.statistics
+        ]
+        tried_positions: Dict[str, List[int]] = defaultdict(list)
+        while pending:
+            routed: Dict[int, List[Tuple[int, StatisticSpec]]] = defaultdict(list)
+            for request_position, statistic in pending:
+                candidates = [
+                    position
+                    for position in range(len(self.engines))
+                    if position not in tried_positions[statistic.fq_name]
+                ]
+                if candidates:
+                    position = self._choose_engine(
+                        candidates,
+                        RoutingProfileEngine._statistic_type(statistic),
+                        datasource_label,
+                    )
+                    routed[position].append((request_position, statistic))
+
+            pending = []
+            for position in sorted(routed):
+                engine_response, elapsed_seconds = self._profile_with_engine(
+                    position,
+                    datasource,
+                    requests,
+                    routed[position],
+                    non_functional_requirements,
+                )
+                outcomes: List[Tuple[str, bool]] = []
+                for request_position, statistic in routed[position]:
+                    tried_positions[statistic.fq_name].append(position)
+                    result = engine_response.data.get(statistic.fq_name)
+                    succeeded = isinstance(result, SuccessStatisticResult)
+                    outcomes.append(
+                        (RoutingProfileEngine._statistic_type(statistic), succeeded)
+                    )
+                    if result is not None:
+                        response.data[statistic.fq_name] = result
+                    if not succeeded:
+                        pending.append((request_position, statistic))
+                self._record_outcomes(
+                    position, datasource_label, outcomes, elapsed_seconds
+                )
+
+        return response
+
+    def _choose_engine(
+        self, candidates: List[int], statistic_type: str, datasource_label: str
+    ) -> int:
+        if len(candidates) > 1 and self._random.random() < self.exploration_rate:
+            return self._random.choice(candidates)
+        return min(
+            candidates,
+            key=lambda position: (
+                self._expected_cost(position, statistic_type, datasource_label),
+                position,
+            ),
+        )
+
+    def _record_outcomes(
+        self,
+        position: int,
+        datasource_label: str,
+        outcomes: List[Tuple[str, bool]],
+        elapsed_seconds: float,
+    ) -> None:
+        # one latency sample per call and statistic type, per statistic
+        latency_seconds = elapsed_seconds / max(len(outcomes), 1)
+        with self._outcomes_lock:
+            for statistic_type, succeeded in outcomes:
+                key = (position, statistic_type, datasource_label)
+                self._num_routed[key] += 1
+                if succeeded:
+                    self._num_succeeded[key] += 1
+            for statistic_type in {statistic_type for statistic_type, _ in outcomes}:
+                self._latencies_seconds.setdefault(
+                    (position, statistic_type, datasource_label),
+                    deque(maxlen=RoutingProfileEngine._MAX_LATENCY_SAMPLES),
+                ).append(latency_seconds)
+        for statistic_type, succeeded in outcomes:
+            self.report.routed_statistic(
+                self._engine_names[position],
+                statistic_type,
+                datasource_label,
+                succeeded,
+            )
+
+    def _expected_cost(
+        self, position: int, statistic_type: str, datasource_label: str
+    ) -> float:
+        key = (position, statistic_type, datasource_label)
+        with self._outcomes_lock:
+            num_routed = self._num_routed.get(key, 0)
+            num_succeeded = self._num_succeeded.get(key, 0)
+            latencies_seconds = list(self._latencies_seconds.get(key, []))
+        if num_routed < self.min_samples:
+            return 0
+        if not num_succeeded or not latencies_seconds:
+            return math.inf
+        return percentile(latencies_seconds, self.latency_percentile) / (
+            num_succeeded / num_routed
+        )
+
+    def _profile_with_engine(
+        self,
+        position: int,
+        datasource: DataSource,
+        requests: List[ProfileRequest],
+        routed: List[Tuple[int, StatisticSpec]],
+        non_functional_requirements: ProfileNonFunctionalRequirements,
+    ) -> Tuple[ProfileResponse, float]:
+        engine_requests: List[ProfileRequest] = []
+        last_request_position = None
+        for request_position, statistic in routed:
+            if request_position != last_request_position:
+                engine_requests.append(
+                    ProfileRequest(
+                        statistics=[], batch=requests[request_position].batch
+                    )
+                )
+                last_request_position = request_position
+            engine_requests[-1].statistics.append(statistic)
+
+        engine = self.engines[position]
+        start = time.perf_counter()
+        try:
+            engine_response = engine._do_profile(
+                datasource, engine_requests, non_functional_requirements
+            )
+        except ProfileEngineCancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"{engine.__class__.__name__} failed: {e}")
+            engine_response = ProfileResponse()
+            for engine_request in engine_requests:
+                engine_response.update(
+                    ModelCollections.failed_response_for_request(
+                        engine_request,
+                        UnsuccessfulStatisticResultType.FAILURE,
+                        str(e),
+                        e,
+                    )
+                )
+        return engine_response, time.perf_counter() - start
+
+    @staticmethod
+    def _statistic_type(statistic: StatisticSpec) -> str:
+        if isinstance(statistic, TypedStatistic):
+            return statistic.type.value
+        return statistic.__class__.__name__
+
+
+class CachingProfileEngine(ProfileEngine):
+    """
+    Serves statistics from a cache of previous results, and profiles only the missing ones with the given engine.
+
+    Results are keyed by datasource, batch and statistic definition, so the same statistic requested with another
+    fq_name is a hit too. Only successful results are cached. Approximate results of exact statistics (eg:
+    downgraded by `approximate_distinct_row_count_threshold`) are neither cached nor served, so they never reach
+    later calls with other non-functional requirements.
+
+    The cache has an in-memory LRU tier of `max_entries`, and an optional SQLite tier at `persistent_cache_path`
+    that can be shared by several processes. Results older than `ttl_seconds` are never served; requests can be
+    stricter with `max_staleness_seconds` in the non-functional requirements (0 to bypass the cache).
+    """
+
+    def __init__(
+        self,
+        engine: ProfileEngine,
+        report: ProfileCoreReport = ProfileCoreReport(),
+        max_entries: int = 10_000,
+        persistent_cache_path: Optional[str] = None,
+        ttl_seconds: Optional[float] = None,
+        cache: Optional[StatisticResultCache] = None,
+    ):
+        super().__init__(report)
+        self.engine = engine
+        self.ttl_seconds = ttl_seconds
+        self.cache = cache or TieredStatisticResultCache(
+            memory=InMemoryStatisticResultCache(max_entries=max_entries),
+            persistent=(
+                SqliteStatisticResultCache(persistent_cache_path)
+                if persistent_cache_path
+                else None
+            ),
+        )
+
+    def _do_profile(
+        self,
+        datasource: DataSource,
+        requests: List[ProfileRequest],
+        non_functional_requirements: ProfileNonFunctionalRequirements = ProfileNonFunctionalRequirements(),
+    ) -> ProfileResponse:
+        response = ProfileResponse()
+
+        statistics: Dict[str, StatisticSpec] = {
+            statistic.fq_name: statistic
+            for request in requests
+            for statistic in request.statistics
+        }
+        keys: Dict[str, str] = {
+            statistic.fq_name: ModelKeys.statistic_result_key(
+                datasource, request.batch, statistic
+            )
+            for request in requests
+            for statistic in request.statistics
+        }
+        max_age_seconds = self._max_age_seconds(non_functional_requirements)
+        cached = (
+            self.cache.get_many(list(set(keys.values())))
+            if max_age_seconds is None or max_age_seconds > 0
+            else {}
+        )
+
+        now = time.time()
+        missing_requests: List[ProfileRequest] = []
+        for request in requests:
+            missing_statistics = []
+            for statistic in request.statistics:
+                entry = cached.get(keys[statistic.fq_name])
+                if (
+                    entry is not None
+                    and (
+                        max_age_seconds is None
+                        or entry.age_seconds(now) <= max_age_seconds
+                    )
+                    and CachingProfileEngine._is_cacheable(statistic, entry.result)
+                ):
+                    response.data[statistic.fq_name] = entry.result
+                else:
+                    missing_statistics.append(statistic)
+            if missing_statistics:
+                missing_requests.append(
+                    ProfileRequest(statistics=missing_statistics, batch=request.batch)
+                )
+
+        num_misses = sum(len(request.statistics) for request in missing_requests)
+        self.report.cache_lookup(
+            self.__class__.__name__,
+            hits=len(response.data),
+            misses=num_misses,
+        )
+        logger.info(f"Cache hits: {len(response.data)}, misses: {num_misses}")
+        if not missing_requests:
+            return response
+
+        engine_response = self.engine._do_profile(
+            datasource, missing_requests, non_functional_requirements
+        )
+        response.update(engine_response)
+
+        computed_at = time.time()
+        self.cache.put_many(
+            {
+                keys[fq_name]: CachedStatisticResult(
+                    result=result, computed_at=computed_at
+                )
+                for fq_name, result in engine_response.data.items()
+                if fq_name in keys
+                and CachingProfileEngine._is_cacheable(statistics[fq_name], result)
             }
-            for batch_response_future in concurrent.futures.as_completed(
-                batch_response_futures
-            ):
-                batch_response = batch_response_future.result()
-                response.update(batch_response)
+        )
+
+        return response
+
+    @staticmethod
+    def _is_cacheable(statistic: StatisticSpec, result: StatisticResult) -> bool:
+        if not isinstance(result, SuccessStatisticResult):
+            return False
+        # approximate results only for statistics requested approximately
+        return result.error_bound is None or (
+            isinstance(statistic, TypedStatistic) and statistic.approximate
+        )
+
+    def _max_age_seconds(
+        self, non_functional_requirements: ProfileNonFunctionalRequirements
+    ) -> Optional[float]:
+        limits = [
+            limit
+            for limit in [
+                self.ttl_seconds,
+                non_functional_requirements.max_staleness_seconds,
+            ]
+            if limit is not None
+        ]
+        return min(limits) if limits else None
+
+
+class SingleFlightProfileEngine(ProfileEngine):
+    """
+    Deduplicates identical statistics in flight: when a statistic (same datasource, batch, statistic definition and
+    non-functional requirements) is already being profiled by another call, the later call joins the ongoing
+    computation instead of profiling it again. Results are returned under the fq_name of every caller.
+
+    Every call profiles first the statistics it leads, then waits for the ones it joined, so calls waiting on each
+    other never deadlock. If the leading call fails, the statistics joined by other calls are FAILURE results. If
+    the leading call is cancelled, the calls that joined it profile the statistics again, so the cancellation of a
+    caller is never passed to another one.
+    The number of joined statistics is in the report.
+    """
+
+    def __init__(
+        self,
+        engine: ProfileEngine,
+        report: ProfileCoreReport = ProfileCoreReport(),
+    ):
+        super().__init__(report)
+        self.engine = engine
+        self._in_flight: Dict[Tuple[str, str], concurrent.futures.Future] = {}
+        self._lock = Lock()
 
+    def _do_profile(
+        self,
+        datasource: DataSource,
+        requests: List[ProfileRequest],
+        non_functional_requirements: ProfileNonFunctionalRequirements = ProfileNonFunctionalRequirements(),
+    ) -> ProfileResponse:
+        response = ProfileResponse()
+        pending = requests
+        while pending:
+            retried = self._profile_single_flight(
+                datasource, pending, non_functional_requirements, response
+            )
+            # statistics joined to a cancelled call: profiled again, leading or joining another call
+            pending = ModelCollections.group_request_by_statistics_predicate(
+                pending, lambda statistic: statistic.fq_name in retried
+            ).get(True, [])
         return response
 
+    def _profile_single_flight(
+        self,
+        datasource: DataSource,
+        requests: List[ProfileRequest],
+        non_functional_requirements: ProfileNonFunctionalRequirements,
+        response: ProfileResponse,
+    ) -> Set[str]:
+        """Profiles the statistics in the response, returning the fq_names joined to a call that was cancelled."""
+        non_functional_requirements_key = ModelKeys.non_functional_requirements_key(
+            non_functional_requirements
+        )
+        led: Dict[str, Tuple[Tuple[str, str], concurrent.futures.Future]] = {}
+        joined: Dict[str, concurrent.futures.Future] = {}
+        led_requests: List[ProfileRequest] = []
+        with self._lock:
+            for request in requests:
+                led_statistics = []
+                for statistic in request.statistics:
+                    key = (
+                        ModelKeys.statistic_result_key(
+                            datasource, request.batch, statistic
+                        ),
+                        non_functional_requirements_key,
+                    )
+                    future = self._in_flight.get(key)
+                    if future is None:
+                        future = concurrent.futures.Future()
+                        self._in_flight[key] = future
+                        led[statistic.fq_name] = (key, future)
+                        led_statistics.append(statistic)
+                    else:
+                        # also statistics repeated in the same call, with another fq_name
+                        joined[statistic.fq_name] = future
+                if led_statistics:
+                    led_requests.append(
+                        ProfileRequest(statistics=led_statistics, batch=request.batch)
+                    )
+
+        if joined:
+            self.report.single_flight_join(self.__class__.__name__, len(joined))
+            logger.info(f"Joined {len(joined)} statistics in flight")
+
+        if led_requests:
+            try:
+                response.update(
+                    self.engine._do_profile(
+                        datasource, led_requests, non_functional_requirements
+                    )
+                )
+            except Exception as e:
+                for _, future in led.values():
+                    future.set_exception(e)
+                raise
+            else:
+                for fq_name, (_, future) in led.items():
+                    future.set_result(response.data.get(fq_name))
+            finally:
+                with self._lock:
+                    for key, _ in led.values():
+                        self._in_flight.pop(key, None)
+
+        retried: Set[str] = set()
+        for fq_name, future in joined.items():
+            try:
+                result = future.result()
+            except ProfileEngineCancelledError:
+                # the cancellation of the leading call is not passed to this one
+                raise_if_cancelled()
+                retried.add(fq_name)
+            except Exception as e:
+                response.data[fq_name] = UnsuccessfulStatisticResult(
+                    type=UnsuccessfulStatisticResultType.FAILURE,
+                    message=str(e),
+                    exception=e,
+                )
+            else:
+                if result is not None:
+                    response.data[fq_name] = result
+
+        return retried
+
+
+class QueueOverloadPolicy(Enum):
+    REJECT = "reject"  # the call fails with ProfileEngineOverloadedError
+    BLOCK = "block"  # the caller blocks until the queue drains below the limits
+    SKIP = "skip"  # the call resolves with SKIPPED results
+
 
 class AsyncProfileEngine:
+    """
+    Asynchronous facade of a profile engine: `profile` returns a future, and the calls are queued and run by a pool
+    of `num_consumers` consumer tasks, each in a worker thread.
+
+    Calls are queued by priority (lower `priority` first, eg: 0 for an interactive call and 1 for a bulk crawl),
+    then by deadline (earliest first), then in submission order. Calls whose deadline passed while queued fail with
+    ProfileEngineTimeoutError instead of being run. Queue depth, wait and service times are in the report.
+
+    Bounded queue: with `max_queued_calls` and/or `max_queued_statistics`, calls arriving when the queue is at the
+    limit are handled as per `overload_policy`: rejected, blocking the caller, or skipped. Queued statistics are
+    a proxy of the memory held by the queue, as every statistic is kept until its call is dequeued; a single call
+    is always admitted on an empty queue, whatever its statistics. The BLOCK policy is meant for callers on other
+    threads, as blocking the event loop would stop the consumers.
+
+    Cancellation: cancelling the future of a queued call drops it, and cancelling the futures of a running call
+    (all of them, if coalesced) cancels its CancellationToken, so the engines stop their pending batches and cancel
+    the statements in flight. `shutdown` drains or cancels the outstanding calls.
 
-    @dataclass
+    Request coalescing: a consumer takes up to `max_coalesced_payloads` queued calls at once, waiting up to
+    `coalescing_window_seconds` for more calls to arrive. Calls on the same datasource, with the same priority and
+    the same non-functional requirements are merged in a single call to the engine, with the statistics of the same
+    batch in the same request, so concurrent callers profiling the same tables share queries. Identical statistics
+    of the same batch are computed once. The combined response is split back to the future of every call, with its
+    own fq_names. Other queued calls are left to the other consumers, and cut the coalescing window short.
+    """
+
+    @dataclass(order=True)
     class _QueuePayload:
-        datasource: DataSource
-        requests: List[ProfileRequest]
-        non_functional_requirements: ProfileNonFunctionalRequirements
-        future: asyncio.Future
+        priority: int
+        deadline: float
+        sequence: int
+        enqueued_at: float = field(compare=False)
+        datasource: DataSource = field(compare=False)
+        requests: List[ProfileRequest] = field(compare=False)
+        non_functional_requirements: ProfileNonFunctionalRequirements = field(
+            compare=False
+        )
+        future: asyncio.Future = field(compare=False)
+        # taken by a consumer, either from the heap or from the coalescing index
+        dequeued: bool = field(default=False, compare=False)
 
     def __init__(
-        self, engine: ProfileEngine, loop: Optional[asyncio.AbstractEventLoop] = None
+        self,
+        engine: ProfileEngine,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        max_coalesced_payloads: int = 100,
+        coalescing_window_seconds: float = 0,
+        num_consumers: int = 1,
+        report: Optional[ProfileCoreReport] = None,
+        max_queued_calls: Optional[int] = None,
+        max_queued_statistics: Optional[int] = None,
+        overload_policy: QueueOverloadPolicy = QueueOverloadPolicy.REJECT,
     ):
+        if num_consumers < 1:
+            raise ProfileEngineValueError(
+                f"Invalid number of consumers: {num_consumers}"
+            )
         self.engine = engine
-        self.queue: asyncio.Queue = asyncio.Queue()
+        self.max_coalesced_payloads = max_coalesced_payloads
+        self.coalescing_window_seconds = coalescing_window_seconds
+        self.num_consumers = num_consumers
+        self.max_queued_calls = max_queued_calls
+        self.max_queued_statistics = max_queued_statistics
+        self.overload_policy = overload_policy
+        self.report = (
+            report
+            if report is not None
+            else getattr(engine, "report", ProfileCoreReport())
+        )
+        # payloads by priority, and by coalescing key in submission order; a payload dequeued from one of them is
+        # left in the other, and skipped once it comes first
+        self._queue_heap: List[AsyncProfileEngine._QueuePayload] = []
+        self._queued_payloads_by_key: Dict[
+            Tuple[DataSourceKey, int, str],
+            Deque[AsyncProfileEngine._QueuePayload],
+        ] = defaultdict(deque)
+        self._queue_waiters: Set[asyncio.Future] = set()
+        # calls admitted and not yet run, as per `shutdown`, guarded by the condition; the drain event is only
+        # updated on the event loop thread
+        self._num_unfinished_payloads = 0
+        self._queue_drained = asyncio.Event()
+        self._queue_drained.set()
         self.loop = loop or asyncio.get_event_loop()
-        self.loop.create_task(self._consume_queue())
+        self._sequence = itertools.count()
+        # calls and statistics submitted and not yet dequeued, guarded by the condition
+        self._num_queued_calls = 0
+        self._num_queued_statistics = 0
+        self._queue_condition = Condition()
+        self._running_tokens: Set[CancellationToken] = set()
+        self._shut_down = False
+        self._cancel_calls = False
+        self._consumers = [
+            self.loop.create_task(self._consume_queue()) for _ in range(num_consumers)
+        ]
 
     def profile(
         self,
         datasource: DataSource,
         requests: List[ProfileRequest],
         non_functional_requirements: ProfileNonFunctionalRequirements = ProfileNonFunctionalRequirements(),
+        priority: int = 0,
+        deadline_seconds: Optional[float] = None,
     ) -> asyncio.Future:
+        """
+        Queues the call; lower `priority` runs first. If `deadline_seconds` is given, the call fails if not started
+        within that time. If the queue is at its limits, the overload policy applies.
+        """
         future = self.loop.create_future()
+        if not self._admit(sum(len(request.statistics) for request in requests)):
+            if self._shut_down:
+                self.loop.call_soon_threadsafe(
+                    AsyncProfileEngine._set_exception,
+                    future,
+                    ProfileEngineCancelledError(
+                        f"{self.__class__.__name__} is shut down"
+                    ),
+                )
+            elif self.overload_policy == QueueOverloadPolicy.SKIP:
+                response = ProfileResponse()
+                for request in requests:
+                    response.update(
+                        ModelCollections.failed_response_for_request(
+                            request,
+                            UnsuccessfulStatisticResultType.SKIPPED,
+                            "Profile queue overloaded",
+                        )
+                    )
+                self.loop.call_soon_threadsafe(
+                    AsyncProfileEngine._set_result, future, response
+                )
+            else:
+                self.loop.call_soon_threadsafe(
+                    AsyncProfileEngine._set_exception,
+                    future,
+                    ProfileEngineOverloadedError("Profile queue overloaded"),
+                )
+            return future
+
+        now = self.loop.time()
         self.loop.call_soon_threadsafe(
-            self.queue.put_nowait,
+            self._enqueue,
             AsyncProfileEngine._QueuePayload(
-                datasource, requests, non_functional_requirements, future
+                priority=priority,
+                deadline=(
+                    now + deadline_seconds if deadline_seconds is not None else math.inf
+                ),
+                sequence=next(self._sequence),
+                enqueued_at=now,
+                datasource=datasource,
+                requests=requests,
+                non_functional_requirements=non_functional_requirements,
+                future=future,
             ),
         )
         return future
 
+    def _admit(self, num_statistics: int) -> bool:
+        """
+        Reserves room in the queue for a call with the given statistics; False if it can't be admitted, as per the
+        overload policy, or because the engine is shut down.
+        """
+        with self._queue_condition:
+            if self._shut_down:
+                return False
+            if self._is_queue_full(num_statistics):
+                self.report.overloaded_call(self.__class__.__name__)
+                if self.overload_policy != QueueOverloadPolicy.BLOCK:
+                    return False
+                if self._is_event_loop_thread():
+                    raise ProfileEngineValueError(
+                        "Blocking on an overloaded queue from the event loop thread"
+                    )
+                while self._is_queue_full(num_statistics) and not self._shut_down:
+                    self._queue_condition.wait()
+                if self._shut_down:
+                    return False
+            self._num_queued_calls += 1
+            self._num_queued_statistics += num_statistics
+            # counted from admission, as the call is enqueued later on the event loop
+            self._num_unfinished_payloads += 1
+            return True
+
+    def _is_queue_full(self, num_statistics: int) -> bool:
+        return (
+            self.max_queued_calls is not None
+            and self._num_queued_calls >= self.max_queued_calls
+        ) or (
+            self.max_queued_statistics is not None
+            and self._num_queued_calls > 0
+            and self._num_queued_statistics + num_statistics
+            > self.max_queued_statistics
+        )
+
+    def _is_event_loop_thread(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    def _enqueue(self, queue_payload: "AsyncProfileEngine._QueuePayload") -> None:
+        if self._cancel_calls:
+            # admitted before the shutdown, arriving once the queue is cancelled
+            queue_payload.future.cancel()
+            self._dequeued([queue_payload])
+            self._payloads_done(1)
+            return
+        heapq.heappush(self._queue_heap, queue_payload)
+        self._queued_payloads_by_key[
+            AsyncProfileEngine._coalescing_key(queue_payload)
+        ].append(queue_payload)
+        for waiter in self._queue_waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+        self._report_queue_size()
+
+    def _has_queued_payload(self) -> bool:
+        while self._queue_heap and self._queue_heap[0].dequeued:
+            heapq.heappop(self._queue_heap)
+        return bool(self._queue_heap)
+
+    def _pop_queued_payload(self) -> Optional["AsyncProfileEngine._QueuePayload"]:
+        if not self._has_queued_payload():
+            return None
+        queue_payload = heapq.heappop(self._queue_heap)
+        queue_payload.dequeued = True
+        return queue_payload
+
+    def _pop_coalescable_payloads(
+        self, coalescing_key: Tuple[DataSourceKey, int, str], max_payloads: int
+    ) -> List["AsyncProfileEngine._QueuePayload"]:
+        """Takes up to `max_payloads` queued payloads with the coalescing key, in submission order."""
+        queued_payloads = self._queued_payloads_by_key[coalescing_key]
+        queue_payloads: List[AsyncProfileEngine._QueuePayload] = []
+        while queued_payloads and (
+            queued_payloads[0].dequeued or len(queue_payloads) < max_payloads
+        ):
+            queue_payload = queued_payloads.popleft()
+            if not queue_payload.dequeued:
+                queue_payload.dequeued = True
+                queue_payloads.append(queue_payload)
+        if not queued_payloads:
+            del self._queued_payloads_by_key[coalescing_key]
+        return queue_payloads
+
+    async def _wait_for_queued_payload(
+        self, timeout_seconds: Optional[float] = None
+    ) -> bool:
+        """Waits for a payload in the queue; False if none was queued within the timeout."""
+        while not self._has_queued_payload():
+            waiter = self.loop.create_future()
+            self._queue_waiters.add(waiter)
+            try:
+                await asyncio.wait_for(waiter, timeout_seconds)
+            except asyncio.TimeoutError:
+                return False
+            finally:
+                self._queue_waiters.discard(waiter)
+        return True
+
+    def _payloads_done(self, num_payloads: int) -> None:
+        with self._queue_condition:
+            self._num_unfinished_payloads -= num_payloads
+            drained = self._num_unfinished_payloads == 0
+        if drained:
+            self._queue_drained.set()
+
+    def _dequeued(
+        self, queue_payloads: List["AsyncProfileEngine._QueuePayload"]
+    ) -> None:
+        with self._queue_condition:
+            self._num_queued_calls -= len(queue_payloads)
+            self._num_queued_statistics -= sum(
+                len(request.statistics)
+                for queue_payload in queue_payloads
+                for request in queue_payload.requests
+            )
+            self._queue_condition.notify_all()
+        self._report_queue_size()
+
+    def _report_queue_size(self) -> None:
+        with self._queue_condition:
+            num_queued_calls = self._num_queued_calls
+            num_queued_statistics = self._num_queued_statistics
+        self.report.queue_depth(
+            self.__class__.__name__, num_queued_calls, num_queued_statistics
+        )
+
     async def _consume_queue(self):
+        engine_name = self.__class__.__name__
         while True:
-            queue_payload: AsyncProfileEngine._QueuePayload = (
-                # TODO: we could fetch multiple items from the queue
-                await self.queue.get()
-            )
+            queue_payloads = await self._get_queue_payloads()
+            try:
+                self._dequeued(queue_payloads)
+                now = self.loop.time()
+                runnable_payloads: List[AsyncProfileEngine._QueuePayload] = []
+                for queue_payload in queue_payloads:
+                    if self._cancel_calls:
+                        queue_payload.future.cancel()
+                    if queue_payload.future.done():
+                        # cancelled by the caller, or by the shutdown
+                        continue
+                    if queue_payload.deadline < now:
+                        self.report.expired_call(engine_name)
+                        AsyncProfileEngine._set_exception(
+                            queue_payload.future,
+                            ProfileEngineTimeoutError(
+                                f"Deadline exceeded after {now - queue_payload.enqueued_at:.3f}s queued"
+                            ),
+                        )
+                    else:
+                        runnable_payloads.append(queue_payload)
+                if not runnable_payloads:
+                    continue
+
+                token = self._cancellation_token(runnable_payloads)
+                start = time.perf_counter()
+                try:
+                    if len(runnable_payloads) == 1:
+                        await self._profile_payload(runnable_payloads[0], token)
+                    else:
+                        await self._profile_coalesced_payloads(runnable_payloads, token)
+                finally:
+                    self._running_tokens.discard(token)
+                service_seconds = time.perf_counter() - start
+                for queue_payload in runnable_payloads:
+                    self.report.queued_call(
+                        engine_name, now - queue_payload.enqueued_at, service_seconds
+                    )
+            finally:
+                self._payloads_done(len(queue_payloads))
+
+    def _cancellation_token(
+        self, queue_payloads: List["AsyncProfileEngine._QueuePayload"]
+    ) -> CancellationToken:
+        """Token of a call to the engine, cancelled once the futures of all its payloads are cancelled."""
+        token = CancellationToken()
+        self._running_tokens.add(token)
+
+        def on_done(_: asyncio.Future) -> None:
+            if all(
+                queue_payload.future.cancelled() for queue_payload in queue_payloads
+            ):
+                token.cancel()
+
+        for queue_payload in queue_payloads:
+            queue_payload.future.add_done_callback(on_done)
+        return token
+
+    async def shutdown(
+        self, cancel: bool = False, timeout_seconds: Optional[float] = None
+    ) -> None:
+        """
+        Stops accepting calls, which fail with ProfileEngineCancelledError, and waits for the outstanding ones.
+        Queued calls are run, unless `cancel` or the drain takes longer than `timeout_seconds`: then queued calls
+        are cancelled, and so are the running ones, down to their statements. The consumers are stopped on return.
+        """
+        with self._queue_condition:
+            self._shut_down = True
+            # callers blocked on an overloaded queue
+            self._queue_condition.notify_all()
+            # no call is admitted from now on; the admitted ones may not be enqueued yet
+            if self._num_unfinished_payloads > 0:
+                self._queue_drained.clear()
+
+        if not cancel:
             try:
-                response = await asyncio.to_thread(
-                    self.engine.profile,
-                    queue_payload.datasource,
-                    queue_payload.requests,
-                    queue_payload.non_functional_requirements,
+                await asyncio.wait_for(self._queue_drained.wait(), timeout_seconds)
+            except asyncio.TimeoutError:
+                logger.warning(
+                    f"Queue not drained in {timeout_seconds}s, cancelling outstanding calls"
+                )
+                cancel = True
+        if cancel:
+            self._cancel_calls = True
+            cancelled_payloads: List[AsyncProfileEngine._QueuePayload] = []
+            while (queue_payload := self._pop_queued_payload()) is not None:
+                queue_payload.future.cancel()
+                cancelled_payloads.append(queue_payload)
+            self._queued_payloads_by_key.clear()
+            self._dequeued(cancelled_payloads)
+            self._payloads_done(len(cancelled_payloads))
+            for token in list(self._running_tokens):
+                token.cancel()
+            await self._queue_drained.wait()
+
+        for consumer in self._consumers:
+            consumer.cancel()
+        await asyncio.gather(*self._consumers, return_exceptions=True)
+
+    async def _get_queue_payloads(self) -> List["AsyncProfileEngine._QueuePayload"]:
+        """
+        Waits for a payload, then takes the queued ones that can be coalesced with it, and the ones arriving within
+        the coalescing window, up to the max number of coalesced payloads. The window is cut short by a payload
+        that can't be coalesced, which is left in the queue for the other consumers.
+
+        Coalescable payloads are looked up by coalescing key, so other queued payloads are not scanned.
+        """
+        await self._wait_for_queued_payload()
+        queue_payloads = [self._pop_queued_payload()]
+        coalescing_key = AsyncProfileEngine._coalescing_key(queue_payloads[0])
+        queue_payloads.extend(
+            self._pop_coalescable_payloads(
+                coalescing_key, self.max_coalesced_payloads - 1
+            )
+        )
+
+        deadline = self.loop.time() + self.coalescing_window_seconds
+        while (
+            len(queue_payloads) < self.max_coalesced_payloads
+            and not self._has_queued_payload()
+        ):
+            remaining_seconds = deadline - self.loop.time()
+            if remaining_seconds <= 0 or not await self._wait_for_queued_payload(
+                remaining_seconds
+            ):
+                break
+            queue_payloads.extend(
+                self._pop_coalescable_payloads(
+                    coalescing_key, self.max_coalesced_payloads - len(queue_payloads)
                 )
-                queue_payload.future.set_result(response)
+            )
+        return queue_payloads
+
+    @staticmethod
+    def _coalescing_key(
+        queue_payload: "AsyncProfileEngine._QueuePayload",
+    ) -> Tuple[DataSourceKey, int, str]:
+        return (
+            ModelKeys.datasource_key(queue_payload.datasource),
+            queue_payload.priority,
+            ModelKeys.non_functional_requirements_key(
+                queue_payload.non_functional_requirements
+            ),
+        )
+
+    async def _profile_payload(
+        self,
+        queue_payload: "AsyncProfileEngine._QueuePayload",
+        token: CancellationToken,
+    ) -> None:
+        try:
+            response = await asyncio.to_thread(
+                AsyncProfileEngine._run_cancellable,
+                token,
+                self.engine.profile,
+                queue_payload.datasource,
+                queue_payload.requests,
+                queue_payload.non_functional_requirements,
+            )
+            AsyncProfileEngine._set_result(queue_payload.future, response)
+        except Exception as e:
+            AsyncProfileEngine._set_exception(queue_payload.future, e)
+
+    async def _profile_coalesced_payloads(
+        self,
+        queue_payloads: List["AsyncProfileEngine._QueuePayload"],
+        token: CancellationToken,
+    ) -> None:
+        """
+        Profiles the payloads, all on the same datasource and non-functional requirements, in a single call.
+
+        Statistics are renamed to unique internal fq_names, so statistics of different callers sharing the fq_name
+        don't collide, and identical statistics of the same batch share the internal fq_name.
+        """
+        requests_by_batch: Dict[str, ProfileRequest] = {}
+        internal_fq_names: Dict[Tuple[str, str], str] = {}
+        # per payload, internal fq_name of every caller fq_name
+        fq_name_mappings: List[Dict[str, str]] = []
+        valid_payloads: List[AsyncProfileEngine._QueuePayload] = []
+        for queue_payload in queue_payloads:
+            try:
+                self.engine._requests_validations(queue_payload.requests)
             except Exception as e:
-                queue_payload.future.set_exception(e)
-            finally:
-                self.queue.task_done()
+                AsyncProfileEngine._set_exception(queue_payload.future, e)
+                continue
+            fq_name_mapping: Dict[str, str] = {}
+            for request in queue_payload.requests:
+                batch_key = ModelKeys.batch_key(request.batch)
+                combined_request = requests_by_batch.setdefault(
+                    batch_key, ProfileRequest(statistics=[], batch=request.batch)
+                )
+                for statistic in request.statistics:
+                    key = (batch_key, ModelKeys.statistic_key(statistic))
+                    if key not in internal_fq_names:
+                        internal_fq_names[key] = f"coalesced_{len(internal_fq_names)}"
+                        combined_request.statistics.append(
+                            replace(statistic, fq_name=internal_fq_names[key])
+                        )
+                    fq_name_mapping[statistic.fq_name] = internal_fq_names[key]
+            fq_name_mappings.append(fq_name_mapping)
+            valid_payloads.append(queue_payload)
+        if not valid_payloads:
+            return
+
+        num_statistics = sum(len(mapping) for mapping in fq_name_mappings)
+        logger.info(
+            f"Coalesced {len(valid_payloads)} calls with {num_statistics} statistics into "
+            f"{len(requests_by_batch)} batches with {len(internal_fq_names)} statistics"
+        )
+        try:
+            response = await asyncio.to_thread(
+                AsyncProfileEngine._run_cancellable,
+                token,
+                self.engine.profile,
+                valid_payloads[0].datasource,
+                list(requests_by_batch.values()),
+                valid_payloads[0].non_functional_requirements,
+            )
+        except Exception as e:
+            for queue_payload in valid_payloads:
+                AsyncProfileEngine._set_exception(queue_payload.future, e)
+            return
+
+        for queue_payload, fq_name_mapping in zip(valid_payloads, fq_name_mappings):
+            AsyncProfileEngine._set_result(
+                queue_payload.future,
+                ProfileResponse(
+                    data={
+                        fq_name: response.data[internal_fq_name]
+                        for fq_name, internal_fq_name in fq_name_mapping.items()
+                        if internal_fq_name in response.data
+                    }
+                ),
+            )
+
+    @staticmethod
+    def _run_cancellable(
+        token: CancellationToken, function: Callable[..., ProfileResponse], *args
+    ) -> ProfileResponse:
+        # run by asyncio.to_thread in a copy of the context, so the token is only set for this call
+        current_cancellation_token.set(token)
+        return function(*args)
+
+    @staticmethod
+    def _set_result(future: asyncio.Future, response: ProfileResponse) -> None:
+        # the caller may have cancelled the future meanwhile
+        if not future.done():
+            future.set_result(response)
+
+    @staticmethod
+    def _set_exception(future: asyncio.Future, e: Exception) -> None:
+        if not future.done():
+            future.set_exception(e)
@@ -1,10 +1,14 @@
 import logging
-from typing import Dict, List, Tuple
+import time
+from collections import defaultdict
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Tuple
 
-from sqlalchemy import text
+from sqlalchemy import bindparam, text
 
 from profile_v2.core.api import ProfileEngine
 from profile_v2.core.api_utils import ModelCollections, ParallelProfileEngine
+from profile_v2.core.concurrency import SharedExecutor
 from profile_v2.core.model import (BatchSpec, DataSource,
                                    ProfileNonFunctionalRequirements,
                                    ProfileRequest, ProfileResponse,
@@ -12,8 +16,12 @@ from profile_v2.core.model import (BatchSpec, DataSource,
                                    SuccessStatisticResult, TypedStatistic,
                                    UnsuccessfulStatisticResult,
                                    UnsuccessfulStatisticResultType)
+from profile_v2.core.model_utils import DataSourceKey, ModelKeys
 from profile_v2.core.report import ProfileCoreReport
-from profile_v2.core.sqlalchemy.sqlalchemy import SqlAlchemyProfileEngine
+from profile_v2.core.sqlalchemy.registry import SqlAlchemyEngineRegistry
+from profile_v2.core.sqlalchemy.session import SqlAlchemyExecutionSession
+from profile_v2.core.sqlalchemy.sqlalchemy import (DEFAULT_ENGINE_REGISTRY,
+                                                   SqlAlchemyProfileEngine)
 
 logger = logging.getLogger(__name__)
 
@@ -28,6 +36,60 @@ class BigQueryUtils:
         return batch.fq_dataset_name.split(".")[2]
 
 
+class BigQueryTablesMetadataCache:
+    """
+    Thread-safe TTL cache of the __TABLES__ row counts, by datasource and dataset.
+
+    Entries are per table, so a call only needs to fetch the tables that are not cached yet (or expired).
+    """
+
+    def __init__(self, ttl_seconds: float = 300):
+        self.ttl_seconds = ttl_seconds
+        self._row_counts: Dict[
+            Tuple[DataSourceKey, str], Dict[str, Tuple[int, float]]
+        ] = defaultdict(dict)
+        self._lock = Lock()
+
+    def get(
+        self, datasource_key: DataSourceKey, dataset: str, table_ids: Iterable[str]
+    ) -> Tuple[Dict[str, int], List[str]]:
+        """
+        Returns the cached row counts by table and the (sorted) table ids not in the cache.
+        """
+        now = time.monotonic()
+        cached: Dict[str, int] = {}
+        missing: List[str] = []
+        with self._lock:
+            dataset_row_counts = self._row_counts.get((datasource_key, dataset), {})
+            for table_id in sorted(set(table_ids)):
+                entry = dataset_row_counts.get(table_id)
+                if entry and entry[1] > now:
+                    cached[table_id] = entry[0]
+                else:
+                    missing.append(table_id)
+        return cached, missing
+
+    def put(
+        self,
+        datasource_key: DataSourceKey,
+        dataset: str,
+        row_counts_by_table: Dict[str, int],
+    ) -> None:
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            dataset_row_counts = self._row_counts[(datasource_key, dataset)]
+            for table_id, row_count in row_counts_by_table.items():
+                dataset_row_counts[table_id] = (row_count, expires_at)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._row_counts.clear()
+
+
+DEFAULT_TABLES_METADATA_CACHE = BigQueryTablesMetadataCache()
+"""Process-wide cache used by default by BigQueryInformationSchemaProfileEngine."""
+
+
 class BigQueryInformationSchemaProfileEngine(ProfileEngine):
     """
     Profile engine for BigQuery using INFORMATION_SCHEMA.
@@ -38,10 +100,21 @@ class BigQueryInformationSchemaProfileEngine(ProfileEngine):
     Everything else is unsupported.
 
     While requests can span for multiple bigquery tables and datasets, requests are internally processed in batches by dataset.
+    Only the requested tables are fetched from __TABLES__, and fetched row counts are kept in a process-wide TTL
+    cache, so repeated calls and parallel batches do not rescan __TABLES__.
     """
 
-    def __init__(self, report: ProfileCoreReport = ProfileCoreReport()):
+    def __init__(
+        self,
+        report: ProfileCoreReport = ProfileCoreReport(),
+        engine_registry: Optional[SqlAlchemyEngineRegistry] = None,
+        tables_metadata_cache: Optional[BigQueryTablesMetadataCache] = None,
+    ):
         super().__init__(report)
+        self.engine_registry = engine_registry or DEFAULT_ENGINE_REGISTRY
+        self.tables_metadata_cache = (
+            tables_metadata_cache or DEFAULT_TABLES_METADATA_CACHE
+        )
 
     def _do_profile(
         self,
@@ -54,8 +127,15 @@ class BigQueryInformationSchemaProfileEngine(ProfileEngine):
         split = ModelCollections.group_request_by_statistics_predicate(
             requests, BigQueryInformationSchemaProfileEngine._is_statistic_supported
         )
-        supported_requests = split[True]
-        unsupported_requests = split[False]
+        supported_requests: List[ProfileRequest] = []
+        unsupported_requests: List[ProfileRequest] = split[False]
+        for request in split[True]:
+            if BigQueryInformationSchemaProfileEngine._is_batch_supported(
+                request.batch
+            ):
+                supported_requests.append(request)
+            else:
+                unsupported_requests.append(request)
 
         for unsupported_request in unsupported_requests:
             for statistic in unsupported_request.statistics:
@@ -71,18 +151,29 @@ class BigQueryInformationSchemaProfileEngine(ProfileEngine):
             )
         )
 
-        engine = SqlAlchemyProfileEngine.create_engine(datasource)
-
-        for dataset, requests in supported_requests_by_dataset.items():
-            select_query = f"select table_id, row_count from {dataset}.__TABLES__"
-            # TODO: add where clause with table_ids from [extract-table-id(request.batch) for request in requests]
-            logger.info(text(select_query))
-            with engine.connect() as conn:
+        engine = self.engine_registry.get_engine(datasource)
+        datasource_key = ModelKeys.datasource_key(datasource)
+
+        with SqlAlchemyExecutionSession(
+            engine, report=self.report, engine_name=self.__class__.__name__
+        ) as session:
+            for dataset, requests in supported_requests_by_dataset.items():
+                table_ids = {
+                    BigQueryUtils.bigquerytable_from_batch_spec(request.batch)
+                    for request in requests
+                }
+                row_counts_by_table, missing_table_ids = self.tables_metadata_cache.get(
+                    datasource_key, dataset, table_ids
+                )
                 try:
-                    self.report_issue_query()
-
-                    result = conn.execute(text(select_query))
-                    row_counts_by_table = {row[0]: row[1] for row in result}
+                    if missing_table_ids:
+                        fetched_row_counts_by_table = self._fetch_row_counts(
+                            session, dataset, missing_table_ids
+                        )
+                        self.tables_metadata_cache.put(
+                            datasource_key, dataset, fetched_row_counts_by_table
+                        )
+                        row_counts_by_table.update(fetched_row_counts_by_table)
                     logger.info(row_counts_by_table)
 
                     for request in requests:
@@ -94,9 +185,19 @@ class BigQueryInformationSchemaProfileEngine(ProfileEngine):
                             table_name = BigQueryUtils.bigquerytable_from_batch_spec(
                                 request.batch
                             )
-                            response.data[statistic_fq_name] = SuccessStatisticResult(
-                                value=row_counts_by_table[table_name]
-                            )
+                            if table_name in row_counts_by_table:
+                                response.data[statistic_fq_name] = (
+                                    SuccessStatisticResult(
+                                        value=row_counts_by_table[table_name]
+                                    )
+                                )
+                            else:
+                                response.data[statistic_fq_name] = (
+                                    UnsuccessfulStatisticResult(
+                                        type=UnsuccessfulStatisticResultType.FAILURE,
+                                        message=f"Table {table_name} not found in {dataset}.__TABLES__",
+                                    )
+                                )
                 except Exception as e:
                     self.report_unsuccessful_query(
                         UnsuccessfulStatisticResultType.FAILURE
@@ -112,10 +213,30 @@ class BigQueryInformationSchemaProfileEngine(ProfileEngine):
                         )
                         response.update(failed_response_for_request)
                 else:
-                    self.report_successful_query()
+                    if missing_table_ids:
+                        self.report_successful_query()
 
         return response
 
+    def _fetch_row_counts(
+        self,
+        session: SqlAlchemyExecutionSession,
+        dataset: str,
+        table_ids: List[str],
+    ) -> Dict[str, int]:
+        select_query = text(
+            f"select table_id, row_count from {dataset}.__TABLES__ where table_id in :table_ids"
+        ).bindparams(bindparam("table_ids", expanding=True))
+        logger.info(f"{select_query} with table_ids={table_ids}")
+        self.report_issue_query()
+        result = session.execute(select_query, {"table_ids": table_ids})
+        return {row[0]: row[1] for row in result}
+
+    @staticmethod
+    def _is_batch_supported(batch: BatchSpec) -> bool:
+        # __TABLES__ metadata is for the whole table
+        return not batch.sample and not batch.partitions
+
     @staticmethod
     def _is_statistic_supported(statistic_spec: StatisticSpec) -> bool:
         return (
@@ -134,7 +255,8 @@ class BigQueryProfileEngine(ProfileEngine):
 
     Table level statistics are solved with the BigQueryInformationSchemaProfileEngine.
     While all other statistics are solved with the SqlAlchemyProfileEngine, and running requests in parallel with
-    ParallelProfileEngine.
+    ParallelProfileEngine, on the given SharedExecutor (process-wide one by default), so nesting this engine under
+    other parallel engines doesn't multiply threads.
     """
 
     @staticmethod
@@ -148,6 +270,8 @@ class BigQueryProfileEngine(ProfileEngine):
             for statistic in request.statistics:
                 if BigQueryInformationSchemaProfileEngine._is_statistic_supported(
                     statistic
+                ) and BigQueryInformationSchemaProfileEngine._is_batch_supported(
+                    request.batch
                 ):
                     information_schema_requests.append(
                         ProfileRequest(batch=request.batch, statistics=[statistic])
@@ -176,17 +300,29 @@ class BigQueryProfileEngine(ProfileEngine):
         return [requests for requests in requests_by_dataset.values()]
 
     def __init__(
-        self, report: ProfileCoreReport = ProfileCoreReport(), max_workers: int = 4
+        self,
+        report: ProfileCoreReport = ProfileCoreReport(),
+        max_workers: int = 4,
+        engine_registry: Optional[SqlAlchemyEngineRegistry] = None,
+        executor: Optional[SharedExecutor] = None,
     ):
         super().__init__(report)
 
         self.bq_information_schema_profile_engine = (
-            BigQueryInformationSchemaProfileEngine(report=self.report)
+            BigQueryInformationSchemaProfileEngine(
+                report=self.report, engine_registry=engine_registry
+            )
         )
+        # pool as big as the number of workers, so parallel batches reuse connections
         self.parallel_sqlalchemy_profile_engine = ParallelProfileEngine(
-            engine=SqlAlchemyProfileEngine(report=self.report),
+            engine=SqlAlchemyProfileEngine(
+                report=self.report,
+                engine_registry=engine_registry,
+                pool_size=max_workers,
+            ),
             max_workers=max_workers,
             batch_requests_predicate=BigQueryProfileEngine._group_requests_by_bigquerydataset,
+            executor=executor,
         )
 
     def _do_profile(
@@ -202,11 +338,11 @@ class BigQueryProfileEngine(ProfileEngine):
         )
         information_schema_response = (
             self.bq_information_schema_profile_engine._do_profile(
-                datasource, information_schema_requests
+                datasource, information_schema_requests, non_functional_requirements
             )
         )
         other_requests_response = self.parallel_sqlalchemy_profile_engine._do_profile(
-            datasource, other_requests
+            datasource, other_requests, non_functional_requirements
         )
 
         response.update(information_schema_response)
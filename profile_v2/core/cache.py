@@ -0,0 +1,207 @@
+import json
+import logging
+import sqlite3
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import Lock
+from typing import Dict, List, Optional
+
+from profile_v2.core.model import SketchStatisticResult, SuccessStatisticResult
+from profile_v2.core.sketches import Sketch
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CachedStatisticResult:
+    result: SuccessStatisticResult
+    computed_at: float  # epoch seconds
+
+    def age_seconds(self, now: float) -> float:
+        return now - self.computed_at
+
+
+class StatisticResultCache(ABC):
+    """Cache tier of successful statistic results, keyed by ModelKeys.statistic_result_key."""
+
+    @abstractmethod
+    def get_many(self, keys: List[str]) -> Dict[str, CachedStatisticResult]:
+        pass
+
+    @abstractmethod
+    def put_many(self, entries: Dict[str, CachedStatisticResult]) -> None:
+        pass
+
+    @abstractmethod
+    def invalidate(self, keys: List[str]) -> None:
+        pass
+
+
+class InMemoryStatisticResultCache(StatisticResultCache):
+    """Thread-safe LRU cache, evicting the least recently used entries beyond `max_entries`."""
+
+    def __init__(self, max_entries: int = 10_000):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, CachedStatisticResult] = OrderedDict()
+        self._lock = Lock()
+
+    def get_many(self, keys: List[str]) -> Dict[str, CachedStatisticResult]:
+        found: Dict[str, CachedStatisticResult] = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    found[key] = entry
+        return found
+
+    def put_many(self, entries: Dict[str, CachedStatisticResult]) -> None:
+        with self._lock:
+            for key, entry in entries.items():
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, keys: List[str]) -> None:
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SqliteStatisticResultCache(StatisticResultCache):
+    """
+    On-disk cache in a SQLite database file, so it survives restarts and can be shared by several processes.
+
+    Values are stored as JSON, so results whose value is not JSON-serializable are not persisted.
+    Sketches of SketchStatisticResult are stored serialized next to the value.
+    A connection is opened per operation, so the cache can be used from any thread.
+    """
+
+    _TABLE = "statistic_results"
+
+    def __init__(self, path: str, timeout_seconds: float = 30):
+        self.path = path
+        self.timeout_seconds = timeout_seconds
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {self._TABLE} "
+                f"(key TEXT PRIMARY KEY, value TEXT, error_bound REAL, sketch BLOB, computed_at REAL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=self.timeout_seconds)
+
+    def get_many(self, keys: List[str]) -> Dict[str, CachedStatisticResult]:
+        if not keys:
+            return {}
+        found: Dict[str, CachedStatisticResult] = {}
+        connection = self._connect()
+        try:
+            # chunked to keep under SQLite's limit of host parameters
+            for i in range(0, len(keys), 500):
+                chunk = keys[i : i + 500]
+                rows = connection.execute(
+                    f"SELECT key, value, error_bound, sketch, computed_at FROM {self._TABLE} "
+                    f"WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                for key, value, error_bound, sketch, computed_at in rows:
+                    found[key] = CachedStatisticResult(
+                        result=(
+                            SketchStatisticResult(
+                                value=json.loads(value),
+                                error_bound=error_bound,
+                                sketch=Sketch.from_bytes(sketch),
+                            )
+                            if sketch is not None
+                            else SuccessStatisticResult(
+                                value=json.loads(value), error_bound=error_bound
+                            )
+                        ),
+                        computed_at=computed_at,
+                    )
+        finally:
+            connection.close()
+        return found
+
+    def put_many(self, entries: Dict[str, CachedStatisticResult]) -> None:
+        rows = []
+        for key, entry in entries.items():
+            try:
+                value = json.dumps(entry.result.value)
+            except (TypeError, ValueError):
+                logger.debug(f"Not persisting non JSON-serializable result: {key}")
+                continue
+            sketch = (
+                entry.result.sketch.to_bytes()
+                if isinstance(entry.result, SketchStatisticResult)
+                and entry.result.sketch
+                else None
+            )
+            rows.append(
+                (key, value, entry.result.error_bound, sketch, entry.computed_at)
+            )
+        if not rows:
+            return
+        connection = self._connect()
+        try:
+            with connection:
+                connection.executemany(
+                    f"INSERT OR REPLACE INTO {self._TABLE} VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+        finally:
+            connection.close()
+
+    def invalidate(self, keys: List[str]) -> None:
+        connection = self._connect()
+        try:
+            with connection:
+                connection.executemany(
+                    f"DELETE FROM {self._TABLE} WHERE key = ?", [(key,) for key in keys]
+                )
+        finally:
+            connection.close()
+
+
+class TieredStatisticResultCache(StatisticResultCache):
+    """
+    In-memory tier in front of an optional persistent tier.
+
+    Lookups missing in memory are looked up in the persistent tier, and promoted to memory if found.
+    Writes go to both tiers.
+    """
+
+    def __init__(
+        self,
+        memory: InMemoryStatisticResultCache,
+        persistent: Optional[StatisticResultCache] = None,
+    ):
+        self.memory = memory
+        self.persistent = persistent
+
+    def get_many(self, keys: List[str]) -> Dict[str, CachedStatisticResult]:
+        found = self.memory.get_many(keys)
+        if self.persistent is not None and len(found) < len(keys):
+            persisted = self.persistent.get_many(
+                [key for key in keys if key not in found]
+            )
+            self.memory.put_many(persisted)
+            found.update(persisted)
+        return found
+
+    def put_many(self, entries: Dict[str, CachedStatisticResult]) -> None:
+        self.memory.put_many(entries)
+        if self.persistent is not None:
+            self.persistent.put_many(entries)
+
+    def invalidate(self, keys: List[str]) -> None:
+        self.memory.invalidate(keys)
+        if self.persistent is not None:
+            self.persistent.invalidate(keys)
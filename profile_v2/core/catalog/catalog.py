@@ -0,0 +1,343 @@
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, text
+
+from profile_v2.core.api import ProfileEngine, ProfileEngineValueError
+from profile_v2.core.model import (BatchSpec, DataSource, DataSourceType,
+                                   ExpensivenessRequirements,
+                                   ProfileNonFunctionalRequirements,
+                                   ProfileRequest, ProfileResponse,
+                                   ProfileStatisticType, StatisticSpec,
+                                   SuccessStatisticResult, TypedStatistic,
+                                   UnsuccessfulStatisticResult,
+                                   UnsuccessfulStatisticResultType)
+from profile_v2.core.model_utils import ModelCollections
+from profile_v2.core.report import ProfileCoreReport
+from profile_v2.core.sqlalchemy.registry import (DEFAULT_ENGINE_REGISTRY,
+                                                 SqlAlchemyEngineRegistry)
+from profile_v2.core.sqlalchemy.session import SqlAlchemyExecutionSession
+
+logger = logging.getLogger(__name__)
+
+_SQLITE_SCHEMA_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+@dataclass
+class CatalogStatistics:
+    """Statistics of the tables of a schema, as found in the catalog."""
+
+    row_counts: Dict[str, int] = field(default_factory=dict)
+    distinct_counts: Dict[Tuple[str, str], int] = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class CatalogSchema:
+    database: Optional[str]
+    schema: str
+
+    @staticmethod
+    def from_batch_spec(batch: BatchSpec) -> "CatalogSchema":
+        parts = batch.fq_dataset_name.split(".")
+        return CatalogSchema(
+            database=parts[-3] if len(parts) >= 3 else None,
+            schema=parts[-2] if len(parts) >= 2 else "",
+        )
+
+
+class CatalogStatisticsProfileEngine(ProfileEngine):
+    """
+    Profile engine answering statistics from the warehouse metadata, without scanning any data.
+
+    Supported statistics are:
+    - TABLE_ROW_COUNT: Snowflake INFORMATION_SCHEMA.TABLES.ROW_COUNT, exact. Postgres pg_class.reltuples and SQLite
+      sqlite_stat1 are planner estimates as of the last ANALYZE, so they are returned with `row_count_error_bound` as
+      error bound, and only for approximate statistics or CHEAP expensiveness requirements: otherwise UNSUPPORTED.
+    - COLUMN_DISTINCT_COUNT (single column, approximate): Postgres pg_stats.n_distinct, SQLite sqlite_stat1 for
+      columns leading an index. These are estimates from a sample of the table, so they are returned with
+      `distinct_count_error_bound` as error bound, and exact distinct counts are UNSUPPORTED.
+
+    Batches with sample or partitions, and statistics not found in the catalog (eg: table never analyzed), are
+    UNSUPPORTED, so this engine is meant to be the first one in a SequentialFallbackProfileEngine.
+
+    Requests are processed with one bulk query per schema.
+    """
+
+    # sources whose catalog row counts are kept up to date, rather than estimated
+    _EXACT_ROW_COUNT_SOURCES = [DataSourceType.SNOWFLAKE]
+
+    def __init__(
+        self,
+        report: ProfileCoreReport = ProfileCoreReport(),
+        engine_registry: Optional[SqlAlchemyEngineRegistry] = None,
+        distinct_count_error_bound: float = 0.1,
+        row_count_error_bound: float = 0.1,
+    ):
+        super().__init__(report)
+        self.engine_registry = engine_registry or DEFAULT_ENGINE_REGISTRY
+        self.distinct_count_error_bound = distinct_count_error_bound
+        self.row_count_error_bound = row_count_error_bound
+
+    def _do_profile(
+        self,
+        datasource: DataSource,
+        requests: List[ProfileRequest],
+        non_functional_requirements: ProfileNonFunctionalRequirements = ProfileNonFunctionalRequirements(),
+    ) -> ProfileResponse:
+        response = ProfileResponse()
+
+        fetch_statistics = self._catalog_fetchers().get(datasource.source)
+        split = ModelCollections.group_request_by_statistics_predicate(
+            requests,
+            lambda statistic: fetch_statistics is not None
+            and CatalogStatisticsProfileEngine._is_statistic_supported(
+                datasource.source, statistic, non_functional_requirements
+            ),
+        )
+        supported_requests: List[ProfileRequest] = []
+        unsupported_requests: List[ProfileRequest] = split[False]
+        for request in split[True]:
+            if request.batch.sample or request.batch.partitions:
+                unsupported_requests.append(request)
+            else:
+                supported_requests.append(request)
+
+        for unsupported_request in unsupported_requests:
+            response.update(
+                ModelCollections.failed_response_for_request(
+                    unsupported_request,
+                    UnsuccessfulStatisticResultType.UNSUPPORTED,
+                    f"Unsupported by catalog statistics for {datasource.source.value}",
+                )
+            )
+
+        if not supported_requests:
+            return response
+        assert fetch_statistics is not None
+
+        supported_requests_by_schema = (
+            ModelCollections.group_requests_by_batch_predicate(
+                supported_requests, predicate=CatalogSchema.from_batch_spec
+            )
+        )
+
+        engine = self.engine_registry.get_engine(datasource)
+        with SqlAlchemyExecutionSession(
+            engine, report=self.report, engine_name=self.__class__.__name__
+        ) as session:
+            for schema, schema_requests in supported_requests_by_schema.items():
+                tables = sorted(
+                    {
+                        CatalogStatisticsProfileEngine._table_from_batch_spec(
+                            request.batch
+                        )
+                        for request in schema_requests
+                    }
+                )
+                self.report_issue_query()
+                try:
+                    catalog_statistics = fetch_statistics(session, schema, tables)
+                    logger.info(
+                        f"Catalog statistics for {schema}: {catalog_statistics}"
+                    )
+                except Exception as e:
+                    self.report_unsuccessful_query(
+                        UnsuccessfulStatisticResultType.FAILURE
+                    )
+                    logger.error(f"Error fetching catalog statistics for {schema}")
+                    logger.exception(e)
+                    for request in schema_requests:
+                        response.update(
+                            ModelCollections.failed_response_for_request(
+                                request,
+                                unsuccessful_result_type=UnsuccessfulStatisticResultType.FAILURE,
+                                message=str(e),
+                                exception=e,
+                            )
+                        )
+                else:
+                    self.report_successful_query()
+                    for request in schema_requests:
+                        for statistic in request.statistics:
+                            response.data[statistic.fq_name] = self._statistic_result(
+                                datasource.source,
+                                request.batch,
+                                statistic,
+                                catalog_statistics,
+                            )
+
+        return response
+
+    def _catalog_fetchers(
+        self,
+    ) -> Dict[
+        DataSourceType,
+        Callable[
+            [SqlAlchemyExecutionSession, CatalogSchema, List[str]], CatalogStatistics
+        ],
+    ]:
+        return {
+            DataSourceType.SNOWFLAKE: self._fetch_snowflake_statistics,
+            DataSourceType.POSTGRES: self._fetch_postgres_statistics,
+            DataSourceType.SQLITE: self._fetch_sqlite_statistics,
+        }
+
+    @staticmethod
+    def _is_statistic_supported(
+        source: DataSourceType,
+        statistic_spec: StatisticSpec,
+        non_functional_requirements: ProfileNonFunctionalRequirements,
+    ) -> bool:
+        if not isinstance(statistic_spec, TypedStatistic):
+            return False
+        if statistic_spec.type == ProfileStatisticType.TABLE_ROW_COUNT:
+            return (
+                source in CatalogStatisticsProfileEngine._EXACT_ROW_COUNT_SOURCES
+                or statistic_spec.approximate
+                or non_functional_requirements.expensiveness
+                == ExpensivenessRequirements.CHEAP
+            )
+        if statistic_spec.type == ProfileStatisticType.COLUMN_DISTINCT_COUNT:
+            return (
+                source in [DataSourceType.POSTGRES, DataSourceType.SQLITE]
+                and statistic_spec.approximate
+                and len(statistic_spec.columns) == 1
+            )
+        return False
+
+    def _statistic_result(
+        self,
+        source: DataSourceType,
+        batch: BatchSpec,
+        statistic: StatisticSpec,
+        catalog_statistics: CatalogStatistics,
+    ):
+        assert isinstance(statistic, TypedStatistic)
+        table = CatalogStatisticsProfileEngine._table_from_batch_spec(batch)
+        value: Optional[int] = None
+        error_bound: Optional[float] = None
+        if statistic.type == ProfileStatisticType.TABLE_ROW_COUNT:
+            value = catalog_statistics.row_counts.get(table)
+            if source not in CatalogStatisticsProfileEngine._EXACT_ROW_COUNT_SOURCES:
+                error_bound = self.row_count_error_bound
+        elif statistic.type == ProfileStatisticType.COLUMN_DISTINCT_COUNT:
+            value = catalog_statistics.distinct_counts.get(
+                (table, statistic.columns[0])
+            )
+            error_bound = self.distinct_count_error_bound
+        if value is None:
+            return UnsuccessfulStatisticResult(
+                type=UnsuccessfulStatisticResultType.UNSUPPORTED,
+                message=f"No catalog statistics for {batch.fq_dataset_name}: {statistic}",
+            )
+        return SuccessStatisticResult(value=value, error_bound=error_bound)
+
+    def _fetch_snowflake_statistics(
+        self,
+        session: SqlAlchemyExecutionSession,
+        schema: CatalogSchema,
+        tables: List[str],
+    ) -> CatalogStatistics:
+        information_schema = (
+            f"{schema.database}.INFORMATION_SCHEMA"
+            if schema.database
+            else "INFORMATION_SCHEMA"
+        )
+        # unquoted identifiers are stored uppercase, so names are compared case-insensitively
+        select_query = text(
+            f"SELECT TABLE_NAME, ROW_COUNT FROM {information_schema}.TABLES "
+            f"WHERE UPPER(TABLE_SCHEMA) = :schema AND UPPER(TABLE_NAME) IN :tables"
+        ).bindparams(bindparam("tables", expanding=True))
+        tables_by_upper_name = {table.upper(): table for table in tables}
+        rows = session.execute(
+            select_query,
+            {
+                "schema": schema.schema.upper(),
+                "tables": list(tables_by_upper_name.keys()),
+            },
+        )
+        return CatalogStatistics(
+            row_counts={
+                tables_by_upper_name[row[0].upper()]: row[1]
+                for row in rows
+                if row[1] is not None and row[0].upper() in tables_by_upper_name
+            }
+        )
+
+    def _fetch_postgres_statistics(
+        self,
+        session: SqlAlchemyExecutionSession,
+        schema: CatalogSchema,
+        tables: List[str],
+    ) -> CatalogStatistics:
+        select_query = text(
+            "SELECT c.relname, c.reltuples, s.attname, s.n_distinct "
+            "FROM pg_class c "
+            "JOIN pg_namespace n ON n.oid = c.relnamespace "
+            "LEFT JOIN pg_stats s ON s.schemaname = n.nspname AND s.tablename = c.relname "
+            "WHERE n.nspname = :schema AND c.relname IN :tables"
+        ).bindparams(bindparam("tables", expanding=True))
+        rows = session.execute(
+            select_query, {"schema": schema.schema, "tables": tables}
+        )
+
+        catalog_statistics = CatalogStatistics()
+        for table, reltuples, column, n_distinct in rows:
+            # reltuples is -1 if the table was never vacuumed/analyzed
+            if reltuples is None or reltuples < 0:
+                continue
+            catalog_statistics.row_counts[table] = round(reltuples)
+            if column is not None and n_distinct is not None:
+                catalog_statistics.distinct_counts[(table, column)] = (
+                    CatalogStatisticsProfileEngine._postgres_distinct_count(
+                        n_distinct, reltuples
+                    )
+                )
+        return catalog_statistics
+
+    @staticmethod
+    def _postgres_distinct_count(n_distinct: float, reltuples: float) -> int:
+        """
+        pg_stats.n_distinct is the number of distinct values if positive,
+        or the negative of the ratio of distinct values to rows otherwise.
+        """
+        if n_distinct >= 0:
+            return round(n_distinct)
+        return round(-n_distinct * reltuples)
+
+    def _fetch_sqlite_statistics(
+        self,
+        session: SqlAlchemyExecutionSession,
+        schema: CatalogSchema,
+        tables: List[str],
+    ) -> CatalogStatistics:
+        # the schema qualifies the table, so it can't be bound
+        schema_name = schema.schema or "main"
+        if not _SQLITE_SCHEMA_NAME.match(schema_name):
+            raise ProfileEngineValueError(f"Invalid SQLite schema name: {schema_name}")
+        # sqlite_stat1 is populated by ANALYZE; stat is "<rows> <avg rows per distinct prefix of the index>..."
+        select_query = text(
+            f"SELECT s.tbl, s.stat, ii.name "
+            f"FROM {schema_name}.sqlite_stat1 s "
+            f"LEFT JOIN pragma_index_info(s.idx, :schema) ii ON ii.seqno = 0 "
+            f"WHERE s.tbl IN :tables"
+        ).bindparams(bindparam("tables", expanding=True))
+        rows = session.execute(select_query, {"schema": schema_name, "tables": tables})
+
+        catalog_statistics = CatalogStatistics()
+        for table, stat, leading_column in rows:
+            stats = [int(value) for value in stat.split(" ") if value.isdigit()]
+            if not stats:
+                continue
+            catalog_statistics.row_counts[table] = stats[0]
+            if leading_column is not None and len(stats) > 1 and stats[1] > 0:
+                catalog_statistics.distinct_counts[(table, leading_column)] = round(
+                    stats[0] / stats[1]
+                )
+        return catalog_statistics
+
+    @staticmethod
+    def _table_from_batch_spec(batch: BatchSpec) -> str:
+        return batch.fq_dataset_name.split(".")[-1]
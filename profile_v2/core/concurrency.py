@@ -0,0 +1,436 @@
+import concurrent.futures
+import contextvars
+import logging
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from enum import Enum
+from threading import Condition, Lock
+from typing import (Any, Callable, Deque, Dict, Hashable, List, Optional,
+                    Sequence, Set)
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(values: Sequence[float], percent: float) -> float:
+    """Nearest-rank percentile (0-100) of the given values, which must not be empty."""
+    sorted_values = sorted(values)
+    rank = math.ceil(percent / 100 * len(sorted_values))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Thread-safe concurrency limit adjusted with AIMD (additive increase, multiplicative decrease).
+
+    The limit grows by one after `limit` consecutive successful tasks (so about once per round of parallel tasks),
+    and is multiplied by `backoff_ratio` when a task fails (eg: throttling) or its latency exceeds
+    `latency_tolerance` times the baseline latency. Latencies are per unit of work (eg: per statistic, see `release`),
+    so bigger tasks don't look degraded. The baseline is the lowest latency observed, slowly drifting towards recent
+    ones, so it adapts if the workload changes. The limit stays within `min_limit` and `max_limit`.
+
+    `on_change(previous_limit, limit)` is called on every adjustment.
+    """
+
+    def __init__(
+        self,
+        min_limit: int = 1,
+        max_limit: int = 32,
+        initial_limit: Optional[int] = None,
+        backoff_ratio: float = 0.5,
+        latency_tolerance: float = 2.0,
+        on_change: Optional[Callable[[int, int], None]] = None,
+    ):
+        if not 1 <= min_limit <= max_limit:
+            raise ValueError(
+                f"Invalid concurrency limits: min {min_limit}, max {max_limit}"
+            )
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = max(min_limit, min(initial_limit or min_limit, max_limit))
+        self.backoff_ratio = backoff_ratio
+        self.latency_tolerance = latency_tolerance
+        self.on_change = on_change
+        self.in_flight = 0
+        self._baseline_latency_seconds: Optional[float] = None
+        self._successes_since_increase = 0
+        self._condition = Condition()
+
+    def acquire(self) -> None:
+        """Blocks until the number of tasks in flight is below the limit."""
+        with self._condition:
+            while self.in_flight >= self.limit:
+                self._condition.wait()
+            self.in_flight += 1
+
+    def try_acquire(self) -> bool:
+        """Takes a slot if the number of tasks in flight is below the limit, without blocking."""
+        with self._condition:
+            if self.in_flight >= self.limit:
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(
+        self, latency_seconds: float, failed: bool = False, size: int = 1
+    ) -> None:
+        """
+        Releases a slot, adjusting the limit with the outcome of the task; `size` is its units of work (eg: number of
+        statistics), its latency being compared per unit.
+        """
+        with self._condition:
+            self.in_flight -= 1
+            previous_limit = self.limit
+
+            if failed or self._is_latency_degraded(latency_seconds / max(size, 1)):
+                self.limit = max(self.min_limit, int(self.limit * self.backoff_ratio))
+                self._successes_since_increase = 0
+            else:
+                self._successes_since_increase += 1
+                if self._successes_since_increase >= self.limit:
+                    self.limit = min(self.max_limit, self.limit + 1)
+                    self._successes_since_increase = 0
+
+            self._condition.notify_all()
+
+        if self.limit != previous_limit:
+            logger.info(
+                f"Concurrency limit {previous_limit} -> {self.limit} "
+                f"(latency {latency_seconds:.3f}s, failed {failed})"
+            )
+            if self.on_change:
+                self.on_change(previous_limit, self.limit)
+
+    def cancel(self) -> None:
+        """Releases the slot of a task that didn't run, without adjusting the limit."""
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def _is_latency_degraded(self, latency_seconds: float) -> bool:
+        if self._baseline_latency_seconds is None:
+            self._baseline_latency_seconds = latency_seconds
+            return False
+        degraded = (
+            latency_seconds > self._baseline_latency_seconds * self.latency_tolerance
+        )
+        # lowest latency, drifting slowly towards the recent ones
+        self._baseline_latency_seconds = min(
+            latency_seconds,
+            self._baseline_latency_seconds
+            + (latency_seconds - self._baseline_latency_seconds) * 0.01,
+        )
+        return degraded
+
+
+class CircuitBreakerState(Enum):
+    CLOSED = "closed"  # calls go through
+    OPEN = "open"  # calls are rejected
+    HALF_OPEN = "half_open"  # a probe call goes through, deciding whether to close or open again
+
+
+class CircuitBreaker:
+    """
+    Thread-safe circuit breaker: opens after `failure_threshold` consecutive failures, so calls are rejected
+    without waiting for them to fail. After `reset_timeout_seconds`, it half-opens and lets a single probe call
+    through: the breaker closes if it succeeds, and opens again if it fails.
+
+    `on_change(previous_state, state)` is called on every transition.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout_seconds: float = 60,
+        on_change: Optional[
+            Callable[[CircuitBreakerState, CircuitBreakerState], None]
+        ] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_seconds = reset_timeout_seconds
+        self.on_change = on_change
+        self.clock = clock
+        self.state = CircuitBreakerState.CLOSED
+        self.consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = Lock()
+
+    def allow_request(self) -> bool:
+        """Whether a call can go through; if so, its outcome must be recorded."""
+        with self._lock:
+            previous_state = self.state
+            if self.state == CircuitBreakerState.OPEN:
+                if self.clock() - self._opened_at < self.reset_timeout_seconds:
+                    return False
+                self.state = CircuitBreakerState.HALF_OPEN
+            if self.state == CircuitBreakerState.HALF_OPEN:
+                if self._probe_in_flight:
+                    return False
+                self._probe_in_flight = True
+        self._notify(previous_state)
+        return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            previous_state = self.state
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+            self.state = CircuitBreakerState.CLOSED
+        self._notify(previous_state)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            previous_state = self.state
+            self.consecutive_failures += 1
+            self._probe_in_flight = False
+            if (
+                self.state == CircuitBreakerState.HALF_OPEN
+                or self.consecutive_failures >= self.failure_threshold
+            ):
+                self.state = CircuitBreakerState.OPEN
+                self._opened_at = self.clock()
+        self._notify(previous_state)
+
+    def record_cancellation(self) -> None:
+        """The call was cancelled: neither a success nor a failure, but a new probe can go through."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def _notify(self, previous_state: CircuitBreakerState) -> None:
+        if self.state != previous_state:
+            logger.info(f"Circuit breaker {previous_state.value} -> {self.state.value}")
+            if self.on_change:
+                self.on_change(previous_state, self.state)
+
+
+@dataclass
+class _ExecutorTask:
+    key: Hashable
+    function: Callable[..., Any]
+    args: Sequence[Any]
+    context: contextvars.Context
+    future: concurrent.futures.Future
+
+
+class SharedExecutor:
+    """
+    Long-lived thread pool, meant to be shared by all the parallel engines of the process (see ParallelProfileEngine),
+    so nested or concurrent parallel calls share a bounded set of threads instead of creating a pool each.
+
+    - threads: up to `max_workers`, started on demand and kept for the next tasks.
+    - per-key limit: tasks are submitted with a key (eg: the datasource), and at most `max_concurrency_per_key` tasks
+      of the same key run at once, across all the callers. Tasks over the limit stay queued, holding no thread.
+    - work-stealing: when all the workers are busy, a thread waiting in `wait_any` or `wait_until` runs queued tasks
+      itself (its own first) instead of blocking, so a parallel call nested in a task makes progress. While waiting,
+      a task doesn't count against the limit of its key, so nested tasks of the same key can run.
+
+    Tasks run in a copy of the context of the submitter (eg: the cancellation token of the call).
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 32,
+        max_concurrency_per_key: Optional[int] = None,
+        thread_name_prefix: str = "profile-executor",
+    ):
+        if max_workers < 1:
+            raise ValueError(f"Invalid number of workers: {max_workers}")
+        self.max_workers = max_workers
+        self.max_concurrency_per_key = max_concurrency_per_key
+        self.thread_name_prefix = thread_name_prefix
+        self._tasks: Deque[_ExecutorTask] = deque()
+        self._running_by_key: Dict[Hashable, int] = defaultdict(int)
+        self._threads: List[threading.Thread] = []
+        self._num_idle_threads = 0
+        self._shut_down = False
+        self._condition = Condition()
+        # tasks being run by the current thread, innermost last
+        self._local = threading.local()
+
+    @property
+    def num_threads(self) -> int:
+        return len(self._threads)
+
+    def submit(
+        self, key: Hashable, function: Callable[..., Any], *args: Any
+    ) -> concurrent.futures.Future:
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        with self._condition:
+            if self._shut_down:
+                raise RuntimeError("Executor is shut down")
+            self._tasks.append(
+                _ExecutorTask(key, function, args, contextvars.copy_context(), future)
+            )
+            # idle threads may be already woken up for previous tasks, not taken yet
+            if (
+                len(self._tasks) > self._num_idle_threads
+                and len(self._threads) < self.max_workers
+            ):
+                thread = threading.Thread(
+                    target=self._work,
+                    name=f"{self.thread_name_prefix}-{len(self._threads)}",
+                    daemon=True,
+                )
+                self._threads.append(thread)
+                thread.start()
+            self._condition.notify_all()
+        return future
+
+    def wait_any(
+        self,
+        futures: Set[concurrent.futures.Future],
+        timeout_seconds: Optional[float] = None,
+    ) -> Set[concurrent.futures.Future]:
+        """
+        Waits until some of the futures, submitted to this executor, are done, and returns them; empty if none is done
+        within the timeout. Meanwhile, the calling thread runs queued tasks if all the workers are busy, unless there
+        is a timeout, as running a task could exceed it.
+        """
+        done = self._wait(
+            lambda: {future for future in futures if future.done()},
+            futures,
+            timeout_seconds,
+        )
+        return done or set()
+
+    def wait_until(self, predicate: Callable[[], bool]) -> None:
+        """
+        Waits until the predicate holds, checked whenever a task of this executor completes (eg: a limiter slot
+        released by the tasks), running queued tasks meanwhile as `wait_any`, so a task waiting never holds a
+        worker. The predicate is called with the executor lock held, so it must not block.
+        """
+        self._wait(predicate, None, None)
+
+    def _wait(
+        self,
+        poll: Callable[[], Any],
+        preferred_futures: Optional[Set[concurrent.futures.Future]],
+        timeout_seconds: Optional[float],
+    ) -> Any:
+        """Returns the first truthy result of `poll`, or None on timeout; see `wait_any`."""
+        deadline = (
+            time.monotonic() + timeout_seconds if timeout_seconds is not None else None
+        )
+        current_task = self._current_task()
+        if current_task is not None:
+            with self._condition:
+                self._running_by_key[current_task.key] -= 1
+                self._condition.notify_all()
+        try:
+            while True:
+                with self._condition:
+                    while True:
+                        result = poll()
+                        if result:
+                            return result
+                        # otherwise, idle or new workers take the queued tasks
+                        task = (
+                            self._take_runnable_task(preferred_futures)
+                            if deadline is None and self._is_saturated()
+                            else None
+                        )
+                        if task is not None:
+                            break
+                        if deadline is None:
+                            self._condition.wait()
+                            continue
+                        remaining_seconds = deadline - time.monotonic()
+                        if remaining_seconds <= 0:
+                            return None
+                        self._condition.wait(remaining_seconds)
+                self._run(task)
+        finally:
+            if current_task is not None:
+                with self._condition:
+                    self._running_by_key[current_task.key] += 1
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stops accepting tasks; the queued ones are still run."""
+        with self._condition:
+            self._shut_down = True
+            self._condition.notify_all()
+            threads = list(self._threads)
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def _work(self) -> None:
+        while True:
+            with self._condition:
+                while (task := self._take_runnable_task()) is None:
+                    if self._shut_down and not self._tasks:
+                        return
+                    self._num_idle_threads += 1
+                    self._condition.wait()
+                    self._num_idle_threads -= 1
+            self._run(task)
+
+    def _is_saturated(self) -> bool:
+        return self._num_idle_threads == 0 and len(self._threads) >= self.max_workers
+
+    def _take_runnable_task(
+        self, preferred_futures: Optional[Set[concurrent.futures.Future]] = None
+    ) -> Optional[_ExecutorTask]:
+        """
+        Takes the first queued task under the limit of its key, the ones of the preferred futures first, taking a
+        slot of its key. Cancelled tasks are dropped. Must be called with the condition held.
+        """
+        candidates: List[_ExecutorTask] = []
+        for task in list(self._tasks):
+            if task.future.cancelled():
+                self._tasks.remove(task)
+                continue
+            if (
+                self.max_concurrency_per_key is not None
+                and self._running_by_key[task.key] >= self.max_concurrency_per_key
+            ):
+                continue
+            if preferred_futures is None or task.future in preferred_futures:
+                candidates = [task]
+                break
+            if not candidates:
+                candidates.append(task)
+        if not candidates:
+            return None
+        task = candidates[0]
+        self._tasks.remove(task)
+        self._running_by_key[task.key] += 1
+        return task
+
+    def _run(self, task: _ExecutorTask) -> None:
+        try:
+            if not task.future.set_running_or_notify_cancel():
+                return
+            stack = self._task_stack()
+            stack.append(task)
+            try:
+                result = task.context.run(task.function, *task.args)
+            except BaseException as e:
+                task.future.set_exception(e)
+            else:
+                task.future.set_result(result)
+            finally:
+                stack.pop()
+        finally:
+            with self._condition:
+                self._running_by_key[task.key] -= 1
+                if not self._running_by_key[task.key]:
+                    del self._running_by_key[task.key]
+                self._condition.notify_all()
+
+    def _task_stack(self) -> List[_ExecutorTask]:
+        if not hasattr(self._local, "tasks"):
+            self._local.tasks = []
+        return self._local.tasks
+
+    def _current_task(self) -> Optional[_ExecutorTask]:
+        stack = self._task_stack()
+        return stack[-1] if stack else None
+
+
+DEFAULT_SHARED_EXECUTOR = SharedExecutor()
+"""Process-wide executor used by default by ParallelProfileEngine."""
@@ -0,0 +1,359 @@
+import logging
+import math
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from profile_v2.core.api import ProfileEngine
+from profile_v2.core.cache import (CachedStatisticResult,
+                                   InMemoryStatisticResultCache,
+                                   SqliteStatisticResultCache,
+                                   StatisticResultCache,
+                                   TieredStatisticResultCache)
+from profile_v2.core.model import (BatchSpec, DataSource, PartitionSpec,
+                                   PartitionsSpec, PartitionValue,
+                                   ProfileNonFunctionalRequirements,
+                                   ProfileRequest, ProfileResponse,
+                                   ProfileStatisticType, StatisticResult,
+                                   StatisticSpec, SuccessStatisticResult,
+                                   TypedStatistic, UnsuccessfulStatisticResult,
+                                   UnsuccessfulStatisticResultType)
+from profile_v2.core.model_utils import ModelCollections, ModelKeys
+from profile_v2.core.report import ProfileCoreReport
+
+logger = logging.getLogger(__name__)
+
+PartitionVersions = Callable[[DataSource, BatchSpec], Dict[PartitionValue, str]]
+"""Version of each partition of the batch (eg: last modified time), so changed partitions are profiled again"""
+
+PartialValues = Dict[ProfileStatisticType, Any]
+
+
+class IncrementalProfileEngine(ProfileEngine):
+    """
+    Profiles partitioned batches partition by partition, reusing the partial results of previous runs.
+
+    Statistics on a batch with a single partition column are split into one partial statistic per partition value.
+    Only the partitions not profiled before, or whose version changed as per `partition_versions`, are profiled with
+    the given engine; partial results are then combined into the batch-level result. With no `partition_versions`,
+    partitions are assumed immutable once profiled (eg: date-partitioned append-only tables).
+
+    Combinable statistics are row, null and non-null counts, min, max, mean and stddev (the last two need the
+    non-null count and mean of each partition too). With `merge_sketches`, approximate distinct counts are combined
+    too, by merging the sketches of the partial results, so the engine must return SketchStatisticResult for them
+    (eg: SqlAlchemySketchProfileEngine). Any other statistic or batch is profiled as is with the engine.
+
+    Partial results are kept in memory, and optionally in a SQLite file at `persistent_cache_path` so they
+    survive between runs.
+    """
+
+    _COMBINABLE_STATISTIC_TYPES = {
+        ProfileStatisticType.TABLE_ROW_COUNT,
+        ProfileStatisticType.COLUMN_NULL_COUNT,
+        ProfileStatisticType.COLUMN_NON_NULL_COUNT,
+        ProfileStatisticType.COLUMN_MIN,
+        ProfileStatisticType.COLUMN_MAX,
+        ProfileStatisticType.COLUMN_MEAN,
+        ProfileStatisticType.COLUMN_STDDEV,
+    }
+
+    _PARTIAL_STATISTIC_TYPES: Dict[ProfileStatisticType, List[ProfileStatisticType]] = {
+        ProfileStatisticType.COLUMN_MEAN: [
+            ProfileStatisticType.COLUMN_MEAN,
+            ProfileStatisticType.COLUMN_NON_NULL_COUNT,
+        ],
+        ProfileStatisticType.COLUMN_STDDEV: [
+            ProfileStatisticType.COLUMN_STDDEV,
+            ProfileStatisticType.COLUMN_MEAN,
+            ProfileStatisticType.COLUMN_NON_NULL_COUNT,
+        ],
+    }
+
+    def __init__(
+        self,
+        engine: ProfileEngine,
+        report: ProfileCoreReport = ProfileCoreReport(),
+        partition_versions: Optional[PartitionVersions] = None,
+        persistent_cache_path: Optional[str] = None,
+        partial_results: Optional[StatisticResultCache] = None,
+        merge_sketches: bool = False,
+    ):
+        super().__init__(report)
+        self.engine = engine
+        self.partition_versions = partition_versions
+        self.merge_sketches = merge_sketches
+        self.partial_results = partial_results or TieredStatisticResultCache(
+            memory=InMemoryStatisticResultCache(max_entries=100_000),
+            persistent=(
+                SqliteStatisticResultCache(persistent_cache_path)
+                if persistent_cache_path
+                else None
+            ),
+        )
+
+    def _do_profile(
+        self,
+        datasource: DataSource,
+        requests: List[ProfileRequest],
+        non_functional_requirements: ProfileNonFunctionalRequirements = ProfileNonFunctionalRequirements(),
+    ) -> ProfileResponse:
+        response = ProfileResponse()
+
+        split = ModelCollections.group_request_by_statistics_predicate(
+            requests, self._is_statistic_combinable
+        )
+        incremental_requests: List[ProfileRequest] = []
+        other_requests: List[ProfileRequest] = split[False]
+        for request in split[True]:
+            if IncrementalProfileEngine._is_batch_incremental(request.batch):
+                incremental_requests.append(request)
+            else:
+                other_requests.append(request)
+
+        if other_requests:
+            response.update(
+                self.engine._do_profile(
+                    datasource, other_requests, non_functional_requirements
+                )
+            )
+        if incremental_requests:
+            response.update(
+                self._profile_incrementally(
+                    datasource, incremental_requests, non_functional_requirements
+                )
+            )
+
+        return response
+
+    def _profile_incrementally(
+        self,
+        datasource: DataSource,
+        requests: List[ProfileRequest],
+        non_functional_requirements: ProfileNonFunctionalRequirements,
+    ) -> ProfileResponse:
+        response = ProfileResponse()
+
+        # key of every partial statistic needed, per (fq_name, partition value)
+        partial_keys: Dict[
+            Tuple[str, PartitionValue], Dict[ProfileStatisticType, str]
+        ] = {}
+        partial_specs: Dict[str, ProfileRequest] = {}
+        for request in requests:
+            partition = request.batch.partitions.columns[0]
+            versions = (
+                self.partition_versions(datasource, request.batch)
+                if self.partition_versions
+                else {}
+            )
+            for value in partition.values:
+                partition_batch = IncrementalProfileEngine._partition_batch(
+                    request.batch, partition, value
+                )
+                for statistic in request.statistics:
+                    assert isinstance(statistic, TypedStatistic)
+                    keys: Dict[ProfileStatisticType, str] = {}
+                    for partial_type in self._PARTIAL_STATISTIC_TYPES.get(
+                        statistic.type, [statistic.type]
+                    ):
+                        partial_statistic = TypedStatistic(
+                            fq_name="",
+                            type=partial_type,
+                            columns=statistic.columns,
+                            approximate=statistic.approximate,
+                        )
+                        key = f"{ModelKeys.statistic_result_key(datasource, partition_batch, partial_statistic)}:{versions.get(value, '')}"
+                        keys[partial_type] = key
+                        if key not in partial_specs:
+                            # sql-friendly fq_name, as keys are not
+                            partial_statistic.fq_name = f"partial_{len(partial_specs)}"
+                            partial_specs[key] = ProfileRequest(
+                                statistics=[partial_statistic], batch=partition_batch
+                            )
+                    partial_keys[(statistic.fq_name, value)] = keys
+
+        partial_results: Dict[str, StatisticResult] = {
+            key: entry.result
+            for key, entry in self.partial_results.get_many(
+                list(partial_specs.keys())
+            ).items()
+        }
+        missing_requests = ModelCollections.join_statistics_by_batch(
+            [
+                ProfileRequest(
+                    statistics=list(partial_request.statistics),
+                    batch=partial_request.batch,
+                )
+                for key, partial_request in partial_specs.items()
+                if key not in partial_results
+            ]
+        )
+        num_misses = len(partial_specs) - len(partial_results)
+        self.report.cache_lookup(
+            self.__class__.__name__, hits=len(partial_results), misses=num_misses
+        )
+        logger.info(
+            f"Partial results reused: {len(partial_results)}, to profile: {num_misses}"
+        )
+
+        if missing_requests:
+            engine_response = self.engine._do_profile(
+                datasource, missing_requests, non_functional_requirements
+            )
+            keys_by_fq_name = {
+                partial_request.statistics[0].fq_name: key
+                for key, partial_request in partial_specs.items()
+            }
+            engine_results = {
+                keys_by_fq_name[fq_name]: result
+                for fq_name, result in engine_response.data.items()
+            }
+            computed_at = time.time()
+            self.partial_results.put_many(
+                {
+                    key: CachedStatisticResult(result=result, computed_at=computed_at)
+                    for key, result in engine_results.items()
+                    if isinstance(result, SuccessStatisticResult)
+                }
+            )
+            partial_results.update(engine_results)
+
+        for request in requests:
+            partition = request.batch.partitions.columns[0]
+            for statistic in request.statistics:
+                assert isinstance(statistic, TypedStatistic)
+                response.data[statistic.fq_name] = (
+                    IncrementalProfileEngine._combine_partial_results(
+                        statistic.type,
+                        [
+                            {
+                                partial_type: partial_results.get(key)
+                                for partial_type, key in partial_keys[
+                                    (statistic.fq_name, value)
+                                ].items()
+                            }
+                            for value in partition.values
+                        ],
+                    )
+                )
+
+        return response
+
+    @staticmethod
+    def _combine_partial_results(
+        statistic_type: ProfileStatisticType,
+        partial_results: List[Dict[ProfileStatisticType, Optional[StatisticResult]]],
+    ) -> StatisticResult:
+        if statistic_type == ProfileStatisticType.COLUMN_DISTINCT_COUNT:
+            return ModelCollections.merge_sketch_results(
+                [
+                    partition_results.get(statistic_type)
+                    or UnsuccessfulStatisticResult(
+                        type=UnsuccessfulStatisticResultType.FAILURE,
+                        message="Missing partial result for some partition",
+                    )
+                    for partition_results in partial_results
+                ]
+            )
+
+        partial_values: List[PartialValues] = []
+        for partition_results in partial_results:
+            for result in partition_results.values():
+                if isinstance(result, UnsuccessfulStatisticResult):
+                    return result
+                if not isinstance(result, SuccessStatisticResult):
+                    return UnsuccessfulStatisticResult(
+                        type=UnsuccessfulStatisticResultType.FAILURE,
+                        message="Missing partial result for some partition",
+                    )
+            partial_values.append(
+                {
+                    partial_type: result.value
+                    for partial_type, result in partition_results.items()
+                    if isinstance(result, SuccessStatisticResult)
+                }
+            )
+
+        try:
+            return SuccessStatisticResult(
+                value=IncrementalProfileEngine._combine_partial_values(
+                    statistic_type, partial_values
+                )
+            )
+        except Exception as e:
+            logger.exception(e)
+            return UnsuccessfulStatisticResult(
+                type=UnsuccessfulStatisticResultType.FAILURE,
+                message=f"Error combining partial results: {e}",
+                exception=e,
+            )
+
+    @staticmethod
+    def _combine_partial_values(
+        statistic_type: ProfileStatisticType, partial_values: List[PartialValues]
+    ) -> Any:
+        values = [partial[statistic_type] for partial in partial_values]
+        if statistic_type in [
+            ProfileStatisticType.TABLE_ROW_COUNT,
+            ProfileStatisticType.COLUMN_NULL_COUNT,
+            ProfileStatisticType.COLUMN_NON_NULL_COUNT,
+        ]:
+            return sum(value or 0 for value in values)
+        non_null_values = [value for value in values if value is not None]
+        if statistic_type == ProfileStatisticType.COLUMN_MIN:
+            return min(non_null_values, default=None)
+        if statistic_type == ProfileStatisticType.COLUMN_MAX:
+            return max(non_null_values, default=None)
+
+        counts = [
+            partial[ProfileStatisticType.COLUMN_NON_NULL_COUNT] or 0
+            for partial in partial_values
+        ]
+        means = [
+            partial[ProfileStatisticType.COLUMN_MEAN] for partial in partial_values
+        ]
+        count = sum(counts)
+        if count == 0:
+            return None
+        mean = sum(n * m for n, m in zip(counts, means) if m is not None) / count
+        if statistic_type == ProfileStatisticType.COLUMN_MEAN:
+            return mean
+        if statistic_type == ProfileStatisticType.COLUMN_STDDEV:
+            if count < 2:
+                return None
+            # sum of squared deviations, from the sample variance and mean of each partition
+            m2 = sum(
+                (n - 1) * (stddev or 0) ** 2 + n * ((m or 0) - mean) ** 2
+                for n, m, stddev in zip(counts, means, values)
+                if n > 0
+            )
+            return math.sqrt(m2 / (count - 1))
+        raise ValueError(f"Non combinable statistic type: {statistic_type}")
+
+    def _is_statistic_combinable(self, statistic: StatisticSpec) -> bool:
+        if not isinstance(statistic, TypedStatistic):
+            return False
+        if statistic.type == ProfileStatisticType.COLUMN_DISTINCT_COUNT:
+            return (
+                self.merge_sketches
+                and statistic.approximate
+                and len(statistic.columns) == 1
+            )
+        return statistic.type in IncrementalProfileEngine._COMBINABLE_STATISTIC_TYPES
+
+    @staticmethod
+    def _is_batch_incremental(batch: BatchSpec) -> bool:
+        return (
+            batch.partitions is not None
+            and len(batch.partitions.columns) == 1
+            and not batch.sample
+        )
+
+    @staticmethod
+    def _partition_batch(
+        batch: BatchSpec, partition: PartitionSpec, value: PartitionValue
+    ) -> BatchSpec:
+        return BatchSpec(
+            fq_dataset_name=batch.fq_dataset_name,
+            partitions=PartitionsSpec(
+                columns=[PartitionSpec(column=partition.column, values=[value])]
+            ),
+        )
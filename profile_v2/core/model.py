@@ -1,12 +1,21 @@
 from abc import abstractmethod
 from dataclasses import dataclass, field
+from datetime import date, datetime
 from enum import Enum
-from typing import Any, Dict, List, Optional, TypeAlias
+from typing import Any, Dict, List, Optional, TypeAlias, Union
+
+from profile_v2.core.sketches import Sketch
 
 
 class ProfileStatisticType(Enum):
     COLUMN_DISTINCT_COUNT = "column_distinct_count"
     TABLE_ROW_COUNT = "table_row_count"
+    COLUMN_MIN = "column_min"
+    COLUMN_MAX = "column_max"
+    COLUMN_MEAN = "column_mean"
+    COLUMN_STDDEV = "column_stddev"
+    COLUMN_NULL_COUNT = "column_null_count"
+    COLUMN_NON_NULL_COUNT = "column_non_null_count"
 
     def is_table_level(self) -> bool:
         return self.value in [v.value for v in [ProfileStatisticType.TABLE_ROW_COUNT]]
@@ -74,10 +83,13 @@ class SampleSpec:
     size: int
 
 
+PartitionValue: TypeAlias = Union[str, int, float, bool, date, datetime]
+
+
 @dataclass
 class PartitionSpec:
     column: str
-    values: List[str]
+    values: List[PartitionValue]  # Typed as the partition column, eg: int or date
 
 
 @dataclass
@@ -88,6 +100,8 @@ class PartitionsSpec:
 class DataSourceType(Enum):
     SNOWFLAKE = "snowflake"
     BIGQUERY = "bigquery"
+    POSTGRES = "postgres"
+    SQLITE = "sqlite"  # mostly for local testing
 
 
 @dataclass
@@ -125,6 +139,16 @@ class StatisticResult:
 @dataclass
 class SuccessStatisticResult(StatisticResult):
     value: Any
+    error_bound: Optional[float] = (
+        None  # Relative standard error, if the value was calculated approximately
+    )
+
+
+@dataclass
+class SketchStatisticResult(SuccessStatisticResult):
+    sketch: Optional[Sketch] = (
+        None  # Sketch the value was estimated from, so it can be merged with others
+    )
 
 
 class UnsuccessfulStatisticResultType(Enum):
@@ -156,3 +180,25 @@ class ExpensivenessRequirements(Enum):
 @dataclass
 class ProfileNonFunctionalRequirements:
     expensiveness: ExpensivenessRequirements = ExpensivenessRequirements.UNLIMITED
+    approximate_distinct_row_count_threshold: Optional[int] = (
+        None  # Distinct counts on tables with more rows are calculated approximately
+    )
+    max_staleness_seconds: Optional[float] = (
+        None  # Max age of cached results to be served, None for any age
+    )
+    max_estimated_bytes: Optional[int] = (
+        None  # Statements estimated to scan more bytes are skipped
+    )
+    max_estimated_rows: Optional[int] = (
+        None  # Statements estimated to scan more rows are skipped
+    )
+    max_estimated_seconds: Optional[float] = (
+        None  # Statements estimated to take longer are skipped
+    )
+
+    def has_cost_budgets(self) -> bool:
+        return (
+            self.max_estimated_bytes is not None
+            or self.max_estimated_rows is not None
+            or self.max_estimated_seconds is not None
+        )
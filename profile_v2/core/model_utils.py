@@ -1,17 +1,132 @@
+import hashlib
+import json
 import logging
 from collections import defaultdict
-from typing import Callable, Dict, List, Optional, Type, TypeVar
+from dataclasses import asdict
+from typing import (Any, Callable, Dict, List, Optional, Tuple, Type,
+                    TypeAlias, TypeVar)
 
-from profile_v2.core.model import (BatchSpec, ProfileRequest, ProfileResponse,
-                                   StatisticResult, StatisticSpec,
-                                   SuccessStatisticResult,
+from profile_v2.core.model import (BatchSpec, DataSource,
+                                   ProfileNonFunctionalRequirements,
+                                   ProfileRequest, ProfileResponse,
+                                   SketchStatisticResult, StatisticResult,
+                                   StatisticSpec, SuccessStatisticResult,
                                    UnsuccessfulStatisticResult,
                                    UnsuccessfulStatisticResultType)
+from profile_v2.core.sketches import HyperLogLogSketch
 
 logger = logging.getLogger(__name__)
 
 PredicateResponse = TypeVar("PredicateResponse")
 
+DataSourceKey: TypeAlias = Tuple[str, str, str]
+
+
+class ModelKeys:
+
+    @staticmethod
+    def datasource_key(datasource: DataSource) -> DataSourceKey:
+        """
+        Hashable key identifying a datasource: source type, connection string and extra config.
+        :param datasource:
+        :return:
+        """
+        return (
+            datasource.source.value,
+            datasource.connection_string,
+            json.dumps(datasource.extra_config or {}, sort_keys=True, default=str),
+        )
+
+    @staticmethod
+    def datasource_fingerprint(datasource: DataSource) -> str:
+        """
+        Hash of the datasource key, so it can be persisted or logged without leaking the connection credentials.
+        :param datasource:
+        :return:
+        """
+        return hashlib.sha256(
+            json.dumps(ModelKeys.datasource_key(datasource)).encode()
+        ).hexdigest()
+
+    @staticmethod
+    def datasource_label(datasource: DataSource) -> str:
+        """
+        Short readable label of the datasource for reports: source type and prefix of its fingerprint.
+        :param datasource:
+        :return:
+        """
+        return f"{datasource.source.value}:{ModelKeys.datasource_fingerprint(datasource)[:8]}"
+
+    @staticmethod
+    def batch_key(batch: BatchSpec) -> str:
+        """
+        Canonical key of the batch spec: dataset, partitions and sample.
+        :param batch:
+        :return:
+        """
+        return json.dumps(
+            asdict(batch), sort_keys=True, default=ModelKeys._tagged_with_type
+        )
+
+    @staticmethod
+    def statistic_key(statistic: StatisticSpec) -> str:
+        """
+        Canonical key of the statistic definition, regardless of its fq_name.
+        :param statistic:
+        :return:
+        """
+        definition = {k: v for k, v in asdict(statistic).items() if k != "fq_name"}
+        return json.dumps(
+            [statistic.__class__.__name__, definition],
+            sort_keys=True,
+            default=ModelKeys._tagged_with_type,
+        )
+
+    @staticmethod
+    def non_functional_requirements_key(
+        non_functional_requirements: ProfileNonFunctionalRequirements,
+    ) -> str:
+        """
+        Canonical key of the non-functional requirements.
+        :param non_functional_requirements:
+        :return:
+        """
+        return json.dumps(
+            asdict(non_functional_requirements), sort_keys=True, default=str
+        )
+
+    @staticmethod
+    def statistic_result_key(
+        datasource: DataSource, batch: BatchSpec, statistic: StatisticSpec
+    ) -> str:
+        """
+        Key identifying the result of a statistic: same datasource, batch and statistic definition give the same key,
+        whatever the fq_name the statistic was requested with.
+        :param datasource:
+        :param batch:
+        :param statistic:
+        :return:
+        """
+        return hashlib.sha256(
+            json.dumps(
+                [
+                    ModelKeys.datasource_fingerprint(datasource),
+                    ModelKeys.batch_key(batch),
+                    ModelKeys.statistic_key(statistic),
+                ]
+            ).encode()
+        ).hexdigest()
+
+    @staticmethod
+    def _tagged_with_type(value: Any) -> Dict[str, str]:
+        """
+        JSON serialization of values not natively serializable (eg: dates), tagged with their type so they never get
+        the key of a string with the same representation.
+        :param value:
+        :return:
+        """
+        return {"type": type(value).__qualname__, "value": str(value)}
+
 
 class ModelCollections:
 
@@ -73,17 +188,16 @@ class ModelCollections:
         :param requests:
         :return:
         """
-        grouped_requests: List[ProfileRequest] = []
+        # in order of first appearance of every batch
+        grouped_requests: Dict[str, ProfileRequest] = {}
         for request in requests:
-            found = False
-            for grouped_request in grouped_requests:
-                if request.batch == grouped_request.batch:
-                    grouped_request.statistics.extend(request.statistics)
-                    found = True
-                    break
-            if not found:
-                grouped_requests.append(request)
-        return grouped_requests
+            batch_key = ModelKeys.batch_key(request.batch)
+            grouped_request = grouped_requests.get(batch_key)
+            if grouped_request is None:
+                grouped_requests[batch_key] = request
+            else:
+                grouped_request.statistics.extend(request.statistics)
+        return list(grouped_requests.values())
 
     @staticmethod
     def group_requests_by_batch_predicate(
@@ -110,6 +224,7 @@ class ModelCollections:
     ) -> Dict[Type[StatisticResult], ProfileResponse]:
         """
         Splits the response by the type of the statistic result.
+        Subtypes of SuccessStatisticResult (eg: SketchStatisticResult) are successful results too.
         :param response:
         :return:
         """
@@ -117,7 +232,12 @@ class ModelCollections:
             ProfileResponse
         )
         for fq_statistic_name, result in response.data.items():
-            responses_by_type[type(result)].data[fq_statistic_name] = result
+            result_type = (
+                SuccessStatisticResult
+                if isinstance(result, SuccessStatisticResult)
+                else type(result)
+            )
+            responses_by_type[result_type].data[fq_statistic_name] = result
 
         assert set(responses_by_type.keys()) <= {
             SuccessStatisticResult,
@@ -126,6 +246,65 @@ class ModelCollections:
 
         return responses_by_type
 
+    @staticmethod
+    def merge_sketch_results(results: List[StatisticResult]) -> StatisticResult:
+        """
+        Merges the sketches of partial results (eg: of partitions or shards) into a single result, whose value is
+        the estimate of the merged sketch.
+        If some result is unsuccessful, it is returned instead; if some result has no sketch, a FAILURE is returned.
+        :param results:
+        :return:
+        """
+        if not results:
+            return UnsuccessfulStatisticResult(
+                type=UnsuccessfulStatisticResultType.FAILURE,
+                message="No results to merge",
+            )
+        for result in results:
+            if isinstance(result, UnsuccessfulStatisticResult):
+                return result
+            if not isinstance(result, SketchStatisticResult) or result.sketch is None:
+                return UnsuccessfulStatisticResult(
+                    type=UnsuccessfulStatisticResultType.FAILURE,
+                    message=f"Result without sketch cannot be merged: {result}",
+                )
+
+        try:
+            sketch = results[0].sketch  # type: ignore[attr-defined]
+            for result in results[1:]:
+                sketch = sketch.merge(result.sketch)  # type: ignore[attr-defined]
+        except ValueError as e:
+            return UnsuccessfulStatisticResult(
+                type=UnsuccessfulStatisticResultType.FAILURE,
+                message=str(e),
+                exception=e,
+            )
+        return SketchStatisticResult(
+            value=sketch.estimate(),
+            error_bound=(
+                sketch.relative_error if isinstance(sketch, HyperLogLogSketch) else None
+            ),
+            sketch=sketch,
+        )
+
+    @staticmethod
+    def merge_sketch_responses(responses: List[ProfileResponse]) -> ProfileResponse:
+        """
+        Merges responses of the same statistics calculated on separate partitions or shards, by fq_name.
+        :param responses:
+        :return:
+        """
+        results_by_fq_name: Dict[str, List[StatisticResult]] = defaultdict(list)
+        for response in responses:
+            for fq_name, result in response.data.items():
+                results_by_fq_name[fq_name].append(result)
+        return ProfileResponse(
+            data={
+                fq_name: ModelCollections.merge_sketch_results(results)
+                for fq_name, results in results_by_fq_name.items()
+            }
+        )
+
     @staticmethod
     def failed_response_for_request(
         request: ProfileRequest,
@@ -1,11 +1,15 @@
 from collections import defaultdict
 from dataclasses import dataclass, field
 from threading import Lock
-from typing import Dict, Tuple, TypeAlias
+from typing import Dict, Optional, Tuple, TypeAlias
 
+from profile_v2.core.concurrency import CircuitBreakerState
 from profile_v2.core.model import UnsuccessfulStatisticResultType
 
 EngineName: TypeAlias = str
+RoutingKey: TypeAlias = Tuple[
+    EngineName, str, str
+]  # engine, statistic type, datasource
 
 
 @dataclass
@@ -21,6 +25,71 @@ class ProfileCoreReport:
     num_unsuccessful_queries_by_engine_and_status: Dict[
         Tuple[EngineName, UnsuccessfulStatisticResultType], int
     ] = field(default_factory=lambda: defaultdict(int))
+    num_connection_checkouts_by_engine: Dict[EngineName, int] = field(
+        default_factory=lambda: defaultdict(int)
+    )
+    connection_checkout_seconds_by_engine: Dict[EngineName, float] = field(
+        default_factory=lambda: defaultdict(float)
+    )
+    num_cache_hits_by_engine: Dict[EngineName, int] = field(
+        default_factory=lambda: defaultdict(int)
+    )
+    num_cache_misses_by_engine: Dict[EngineName, int] = field(
+        default_factory=lambda: defaultdict(int)
+    )
+    concurrency_limit_by_engine_and_datasource: Dict[Tuple[EngineName, str], int] = (
+        field(default_factory=dict)
+    )
+    num_concurrency_increases_by_engine: Dict[EngineName, int] = field(
+        default_factory=lambda: defaultdict(int)
+    )
+    num_concurrency_decreases_by_engine: Dict[EngineName, int] = field(
+        default_factory=lambda: defaultdict(int)
+    )
+    num_single_flight_joins_by_engine: Dict[EngineName, int] = field(
+        default_factory=lambda: defaultdict(int)
+    )
+    num_hedges_by_engine: Dict[EngineName, int] = field(
+        default_factory=lambda: defaultdict(int)
+    )
+    num_hedge_wins_by_engine: Dict[EngineName, int] = field(
+        default_factory=lambda: defaultdict(int)
+    )
+    circuit_breaker_state_by_engine_and_datasource: Dict[
+        Tuple[EngineName, str], CircuitBreakerState
+    ] = field(default_factory=dict)
+    num_circuit_breaker_opens_by_engine: Dict[EngineName, int] = field(
+        default_factory=lambda: defaultdict(int)
+    )
+    num_routed_statistics_by_routing_key: Dict[RoutingKey, int] = field(
+        default_factory=lambda: defaultdict(int)
+    )
+    num_routed_successes_by_routing_key: Dict[RoutingKey, int] = field(
+        default_factory=lambda: defaultdict(int)
+    )
+    queue_depth_by_engine: Dict[EngineName, int] = field(default_factory=dict)
+    max_queue_depth_by_engine: Dict[EngineName, int] = field(
+        default_factory=lambda: defaultdict(int)
+    )
+    queued_statistics_by_engine: Dict[EngineName, int] = field(default_factory=dict)
+    max_queued_statistics_by_engine: Dict[EngineName, int] = field(
+        default_factory=lambda: defaultdict(int)
+    )
+    num_queued_calls_by_engine: Dict[EngineName, int] = field(
+        default_factory=lambda: defaultdict(int)
+    )
+    queue_wait_seconds_by_engine: Dict[EngineName, float] = field(
+        default_factory=lambda: defaultdict(float)
+    )
+    service_seconds_by_engine: Dict[EngineName, float] = field(
+        default_factory=lambda: defaultdict(float)
+    )
+    num_expired_calls_by_engine: Dict[EngineName, int] = field(
+        default_factory=lambda: defaultdict(int)
+    )
+    num_overloaded_calls_by_engine: Dict[EngineName, int] = field(
+        default_factory=lambda: defaultdict(int)
+    )
 
     _lock: Lock = Lock()
 
@@ -38,10 +107,165 @@ class ProfileCoreReport:
         with self._lock:
             self.num_unsuccessful_queries_by_engine_and_status[(engine, status)] += 1
 
+    def connection_checkout(self, engine: EngineName, elapsed_seconds: float) -> None:
+        with self._lock:
+            self.num_connection_checkouts_by_engine[engine] += 1
+            self.connection_checkout_seconds_by_engine[engine] += elapsed_seconds
+
+    def cache_lookup(self, engine: EngineName, hits: int, misses: int) -> None:
+        with self._lock:
+            self.num_cache_hits_by_engine[engine] += hits
+            self.num_cache_misses_by_engine[engine] += misses
+
+    def concurrency_limit(
+        self,
+        engine: EngineName,
+        datasource: str,
+        limit: int,
+        previous_limit: Optional[int] = None,
+    ) -> None:
+        with self._lock:
+            self.concurrency_limit_by_engine_and_datasource[(engine, datasource)] = (
+                limit
+            )
+            if previous_limit is not None and limit > previous_limit:
+                self.num_concurrency_increases_by_engine[engine] += 1
+            elif previous_limit is not None and limit < previous_limit:
+                self.num_concurrency_decreases_by_engine[engine] += 1
+
+    def single_flight_join(self, engine: EngineName, num_statistics: int) -> None:
+        with self._lock:
+            self.num_single_flight_joins_by_engine[engine] += num_statistics
+
+    def hedge(self, engine: EngineName) -> None:
+        with self._lock:
+            self.num_hedges_by_engine[engine] += 1
+
+    def hedge_win(self, engine: EngineName) -> None:
+        with self._lock:
+            self.num_hedge_wins_by_engine[engine] += 1
+
+    def hedge_win_rate(self, engine: EngineName) -> Optional[float]:
+        """Fraction of the hedges where the hedge engine succeeded first, None if never hedged."""
+        with self._lock:
+            num_hedges = self.num_hedges_by_engine.get(engine, 0)
+            if not num_hedges:
+                return None
+            return self.num_hedge_wins_by_engine.get(engine, 0) / num_hedges
+
+    def circuit_breaker_state(
+        self,
+        engine: EngineName,
+        datasource: str,
+        state: CircuitBreakerState,
+        previous_state: Optional[CircuitBreakerState] = None,
+    ) -> None:
+        with self._lock:
+            self.circuit_breaker_state_by_engine_and_datasource[
+                (engine, datasource)
+            ] = state
+            if (
+                state == CircuitBreakerState.OPEN
+                and previous_state != CircuitBreakerState.OPEN
+            ):
+                self.num_circuit_breaker_opens_by_engine[engine] += 1
+
+    def routed_statistic(
+        self,
+        engine: EngineName,
+        statistic_type: str,
+        datasource: str,
+        succeeded: bool,
+    ) -> None:
+        key = (engine, statistic_type, datasource)
+        with self._lock:
+            self.num_routed_statistics_by_routing_key[key] += 1
+            if succeeded:
+                self.num_routed_successes_by_routing_key[key] += 1
+
+    def routing_success_rate(
+        self, engine: EngineName, statistic_type: str, datasource: str
+    ) -> Optional[float]:
+        """Fraction of the statistics routed to the engine that succeeded, None if none routed."""
+        key = (engine, statistic_type, datasource)
+        with self._lock:
+            num_routed = self.num_routed_statistics_by_routing_key.get(key, 0)
+            if not num_routed:
+                return None
+            return self.num_routed_successes_by_routing_key.get(key, 0) / num_routed
+
+    def queue_depth(
+        self, engine: EngineName, depth: int, num_statistics: int = 0
+    ) -> None:
+        with self._lock:
+            self.queue_depth_by_engine[engine] = depth
+            self.max_queue_depth_by_engine[engine] = max(
+                self.max_queue_depth_by_engine[engine], depth
+            )
+            self.queued_statistics_by_engine[engine] = num_statistics
+            self.max_queued_statistics_by_engine[engine] = max(
+                self.max_queued_statistics_by_engine[engine], num_statistics
+            )
+
+    def queued_call(
+        self, engine: EngineName, wait_seconds: float, service_seconds: float
+    ) -> None:
+        with self._lock:
+            self.num_queued_calls_by_engine[engine] += 1
+            self.queue_wait_seconds_by_engine[engine] += wait_seconds
+            self.service_seconds_by_engine[engine] += service_seconds
+
+    def expired_call(self, engine: EngineName) -> None:
+        with self._lock:
+            self.num_expired_calls_by_engine[engine] += 1
+
+    def overloaded_call(self, engine: EngineName) -> None:
+        with self._lock:
+            self.num_overloaded_calls_by_engine[engine] += 1
+
+    def mean_queue_wait_seconds(self, engine: EngineName) -> Optional[float]:
+        """Mean time the served calls waited in the queue, None if none served."""
+        with self._lock:
+            num_calls = self.num_queued_calls_by_engine.get(engine, 0)
+            if not num_calls:
+                return None
+            return self.queue_wait_seconds_by_engine.get(engine, 0) / num_calls
+
+    def mean_service_seconds(self, engine: EngineName) -> Optional[float]:
+        """Mean time serving the queued calls, None if none served."""
+        with self._lock:
+            num_calls = self.num_queued_calls_by_engine.get(engine, 0)
+            if not num_calls:
+                return None
+            return self.service_seconds_by_engine.get(engine, 0) / num_calls
+
     def __repr__(self) -> str:
         return (
             f"ProfileCoreReport("
             f"num_issued_queries_by_engine={dict(self.num_issued_queries_by_engine)}, "
             f"num_successful_queries_by_engine={dict(self.num_successful_queries_by_engine)}, "
-            f"num_unsuccessful_queries_by_engine_and_status={dict({(k[0], k[1].value): v for k, v in self.num_unsuccessful_queries_by_engine_and_status.items()})})"
+            f"num_unsuccessful_queries_by_engine_and_status={dict({(k[0], k[1].value): v for k, v in self.num_unsuccessful_queries_by_engine_and_status.items()})}, "
+            f"num_connection_checkouts_by_engine={dict(self.num_connection_checkouts_by_engine)}, "
+            f"connection_checkout_seconds_by_engine={dict(self.connection_checkout_seconds_by_engine)}, "
+            f"num_cache_hits_by_engine={dict(self.num_cache_hits_by_engine)}, "
+            f"num_cache_misses_by_engine={dict(self.num_cache_misses_by_engine)}, "
+            f"concurrency_limit_by_engine_and_datasource={dict(self.concurrency_limit_by_engine_and_datasource)}, "
+            f"num_concurrency_increases_by_engine={dict(self.num_concurrency_increases_by_engine)}, "
+            f"num_concurrency_decreases_by_engine={dict(self.num_concurrency_decreases_by_engine)}, "
+            f"num_single_flight_joins_by_engine={dict(self.num_single_flight_joins_by_engine)}, "
+            f"num_hedges_by_engine={dict(self.num_hedges_by_engine)}, "
+            f"num_hedge_wins_by_engine={dict(self.num_hedge_wins_by_engine)}, "
+            f"circuit_breaker_state_by_engine_and_datasource={dict({k: v.value for k, v in self.circuit_breaker_state_by_engine_and_datasource.items()})}, "
+            f"num_circuit_breaker_opens_by_engine={dict(self.num_circuit_breaker_opens_by_engine)}, "
+            f"num_routed_statistics_by_routing_key={dict(self.num_routed_statistics_by_routing_key)}, "
+            f"num_routed_successes_by_routing_key={dict(self.num_routed_successes_by_routing_key)}, "
+            f"queue_depth_by_engine={dict(self.queue_depth_by_engine)}, "
+            f"max_queue_depth_by_engine={dict(self.max_queue_depth_by_engine)}, "
+            f"queued_statistics_by_engine={dict(self.queued_statistics_by_engine)}, "
+            f"max_queued_statistics_by_engine={dict(self.max_queued_statistics_by_engine)}, "
+            f"num_queued_calls_by_engine={dict(self.num_queued_calls_by_engine)}, "
+            f"queue_wait_seconds_by_engine={dict(self.queue_wait_seconds_by_engine)}, "
+            f"service_seconds_by_engine={dict(self.service_seconds_by_engine)}, "
+            f"num_expired_calls_by_engine={dict(self.num_expired_calls_by_engine)}, "
+            f"num_overloaded_calls_by_engine={dict(self.num_overloaded_calls_by_engine)})"
         )
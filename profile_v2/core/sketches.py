@@ -0,0 +1,325 @@
+import hashlib
+import json
+import math
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Tuple, Type
+
+
+class Sketch(ABC):
+    """
+    Compact, serializable and mergeable summary of a column, so results calculated on separate partitions, shards or
+    parallel batches can be combined without scanning the data again.
+
+    Sketches are merged with `merge`, which returns a new sketch and leaves both inputs untouched.
+    """
+
+    _TAG: str
+    _TYPES_BY_TAG: Dict[str, Type["Sketch"]] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        Sketch._TYPES_BY_TAG[cls._TAG] = cls
+
+    @abstractmethod
+    def add(self, value: Any) -> None:
+        pass
+
+    @abstractmethod
+    def merge(self, other: "Sketch") -> "Sketch":
+        pass
+
+    @abstractmethod
+    def estimate(self) -> Any:
+        """Point estimate of the statistic summarized by the sketch."""
+        pass
+
+    @abstractmethod
+    def _payload(self) -> bytes:
+        pass
+
+    @classmethod
+    @abstractmethod
+    def _from_payload(cls, payload: bytes) -> "Sketch":
+        pass
+
+    def to_bytes(self) -> bytes:
+        return self._TAG.encode() + b":" + self._payload()
+
+    @staticmethod
+    def from_bytes(data: bytes) -> "Sketch":
+        tag, payload = data.split(b":", 1)
+        return Sketch._TYPES_BY_TAG[tag.decode()]._from_payload(payload)
+
+    def _check_mergeable(self, other: "Sketch") -> None:
+        if type(other) is not type(self):
+            raise ValueError(
+                f"Cannot merge {type(self).__name__} with {type(other).__name__}"
+            )
+
+    def __eq__(self, other: object) -> bool:
+        return (
+            isinstance(other, Sketch)
+            and type(other) is type(self)
+            and self.to_bytes() == other.to_bytes()
+        )
+
+
+class HyperLogLogSketch(Sketch):
+    """
+    HyperLogLog sketch for distinct counts, with 2^precision one-byte registers and relative standard error of
+    1.04 / sqrt(2^precision) (1.6% with the default precision of 12, in 4KB).
+    """
+
+    _TAG = "hll"
+
+    def __init__(self, precision: int = 12):
+        if not 4 <= precision <= 18:
+            raise ValueError(f"Precision must be between 4 and 18: {precision}")
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    @staticmethod
+    def _hash(value: Any) -> int:
+        return int.from_bytes(
+            hashlib.blake2b(repr(value).encode(), digest_size=8).digest(), "big"
+        )
+
+    def add(self, value: Any) -> None:
+        if value is None:
+            return
+        hash_value = HyperLogLogSketch._hash(value)
+        index = hash_value >> (64 - self.precision)
+        remaining_bits = 64 - self.precision
+        rest = hash_value & ((1 << remaining_bits) - 1)
+        # position of the leftmost 1-bit in the remaining bits
+        rank = remaining_bits - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: Sketch) -> "HyperLogLogSketch":
+        self._check_mergeable(other)
+        assert isinstance(other, HyperLogLogSketch)
+        if other.precision != self.precision:
+            raise ValueError(
+                f"Cannot merge HyperLogLog sketches of precision {self.precision} and {other.precision}"
+            )
+        merged = HyperLogLogSketch(self.precision)
+        merged.registers = bytearray(
+            max(a, b) for a, b in zip(self.registers, other.registers)
+        )
+        return merged
+
+    def estimate(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw_estimate = (
+            alpha * m * m / sum(2.0**-register for register in self.registers)
+        )
+        zeros = self.registers.count(0)
+        if raw_estimate <= 2.5 * m and zeros > 0:
+            # linear counting, more accurate for small cardinalities
+            return round(m * math.log(m / zeros))
+        return round(raw_estimate)
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def _payload(self) -> bytes:
+        return bytes([self.precision]) + bytes(self.registers)
+
+    @classmethod
+    def _from_payload(cls, payload: bytes) -> "HyperLogLogSketch":
+        sketch = HyperLogLogSketch(payload[0])
+        sketch.registers = bytearray(payload[1:])
+        return sketch
+
+
+class KllQuantileSketch(Sketch):
+    """
+    KLL sketch for quantiles of numeric values: a hierarchy of compactors, where level h items weight 2^h.
+    Rank error is around 1.65 / k with the default k of 200.
+
+    Compaction keeps odd or even items alternately, instead of randomly, so results are reproducible.
+    """
+
+    _TAG = "kll"
+
+    def __init__(self, k: int = 200):
+        self.k = k
+        self.levels: List[List[float]] = [[]]
+        self.count = 0
+        self._keep_odd = False
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, math.ceil(self.k * (2 / 3) ** depth))
+
+    def add(self, value: Any) -> None:
+        if value is None:
+            return
+        self.levels[0].append(float(value))
+        self.count += 1
+        self._compress()
+
+    def _compress(self) -> None:
+        level = 0
+        while level < len(self.levels):
+            if len(self.levels[level]) >= self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append([])
+                items = sorted(self.levels[level])
+                leftover = [items.pop()] if len(items) % 2 else []
+                self.levels[level + 1].extend(items[int(self._keep_odd) :: 2])
+                self.levels[level] = leftover
+                self._keep_odd = not self._keep_odd
+            level += 1
+
+    def merge(self, other: Sketch) -> "KllQuantileSketch":
+        self._check_mergeable(other)
+        assert isinstance(other, KllQuantileSketch)
+        merged = KllQuantileSketch(min(self.k, other.k))
+        merged.levels = [
+            (self.levels[level] if level < len(self.levels) else [])
+            + (other.levels[level] if level < len(other.levels) else [])
+            for level in range(max(len(self.levels), len(other.levels)))
+        ]
+        merged.count = self.count + other.count
+        merged._compress()
+        return merged
+
+    def _weighted_items(self) -> List[Tuple[float, int]]:
+        return sorted(
+            (item, 1 << level)
+            for level, items in enumerate(self.levels)
+            for item in items
+        )
+
+    def quantile(self, q: float) -> float:
+        if not 0 <= q <= 1:
+            raise ValueError(f"Quantile must be between 0 and 1: {q}")
+        weighted_items = self._weighted_items()
+        if not weighted_items:
+            return math.nan
+        total_weight = sum(weight for _, weight in weighted_items)
+        cumulative_weight = 0
+        for item, weight in weighted_items:
+            cumulative_weight += weight
+            if cumulative_weight >= q * total_weight:
+                return item
+        return weighted_items[-1][0]
+
+    def rank(self, value: float) -> float:
+        """Estimated fraction of values lower or equal than the given one."""
+        weighted_items = self._weighted_items()
+        total_weight = sum(weight for _, weight in weighted_items)
+        if not total_weight:
+            return math.nan
+        return (
+            sum(weight for item, weight in weighted_items if item <= value)
+            / total_weight
+        )
+
+    def estimate(self) -> float:
+        return self.quantile(0.5)
+
+    def _payload(self) -> bytes:
+        return json.dumps(
+            {"k": self.k, "count": self.count, "levels": self.levels}
+        ).encode()
+
+    @classmethod
+    def _from_payload(cls, payload: bytes) -> "KllQuantileSketch":
+        data = json.loads(payload)
+        sketch = KllQuantileSketch(data["k"])
+        sketch.count = data["count"]
+        sketch.levels = data["levels"]
+        return sketch
+
+
+class SpaceSavingSketch(Sketch):
+    """
+    Space-Saving sketch for the heavy hitters (most frequent values) with `capacity` counters.
+
+    Counts are overestimated by at most the error of each counter, which is below count of values / capacity.
+    Values must be JSON-serializable.
+    """
+
+    _TAG = "spacesaving"
+
+    def __init__(self, capacity: int = 64):
+        self.capacity = capacity
+        self.counters: Dict[Any, int] = {}
+        self.errors: Dict[Any, int] = {}
+
+    def add(self, value: Any, weight: int = 1) -> None:
+        if value in self.counters:
+            self.counters[value] += weight
+        elif len(self.counters) < self.capacity:
+            self.counters[value] = weight
+            self.errors[value] = 0
+        else:
+            # the new value replaces the least frequent one, inheriting its count as error
+            min_value = min(self.counters, key=self.counters.__getitem__)
+            min_count = self.counters.pop(min_value)
+            self.errors.pop(min_value)
+            self.counters[value] = min_count + weight
+            self.errors[value] = min_count
+
+    def _min_count(self) -> int:
+        return min(self.counters.values()) if len(self.counters) >= self.capacity else 0
+
+    def merge(self, other: Sketch) -> "SpaceSavingSketch":
+        self._check_mergeable(other)
+        assert isinstance(other, SpaceSavingSketch)
+        # a value missing in a full sketch may have been counted up to its minimum count
+        self_min_count = self._min_count()
+        other_min_count = other._min_count()
+        counters: Dict[Any, Tuple[int, int]] = {}
+        for value in self.counters.keys() | other.counters.keys():
+            counters[value] = (
+                self.counters.get(value, self_min_count)
+                + other.counters.get(value, other_min_count),
+                self.errors.get(value, self_min_count)
+                + other.errors.get(value, other_min_count),
+            )
+
+        merged = SpaceSavingSketch(max(self.capacity, other.capacity))
+        for value, (count, error) in sorted(
+            counters.items(), key=lambda item: item[1][0], reverse=True
+        )[: merged.capacity]:
+            merged.counters[value] = count
+            merged.errors[value] = error
+        return merged
+
+    def top_k(self, k: int) -> List[Tuple[Any, int, int]]:
+        """(value, estimated count, max overestimation) of the k most frequent values."""
+        return [
+            (value, count, self.errors[value])
+            for value, count in sorted(
+                self.counters.items(), key=lambda item: item[1], reverse=True
+            )[:k]
+        ]
+
+    def estimate(self) -> List[Tuple[Any, int, int]]:
+        return self.top_k(self.capacity)
+
+    def _payload(self) -> bytes:
+        return json.dumps(
+            {
+                "capacity": self.capacity,
+                "counters": [
+                    [value, count, self.errors[value]]
+                    for value, count in self.counters.items()
+                ],
+            }
+        ).encode()
+
+    @classmethod
+    def _from_payload(cls, payload: bytes) -> "SpaceSavingSketch":
+        data = json.loads(payload)
+        sketch = SpaceSavingSketch(data["capacity"])
+        for value, count, error in data["counters"]:
+            sketch.counters[value] = count
+            sketch.errors[value] = error
+        return sketch
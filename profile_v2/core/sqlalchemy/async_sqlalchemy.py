@@ -0,0 +1,227 @@
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import make_url, text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from profile_v2.core.api import ProfileEngineValueError
+from profile_v2.core.model import (DataSource, DataSourceType,
+                                   ProfileNonFunctionalRequirements,
+                                   ProfileRequest, ProfileResponse,
+                                   SuccessStatisticResult,
+                                   UnsuccessfulStatisticResultType)
+from profile_v2.core.model_utils import (DataSourceKey, ModelCollections,
+                                         ModelKeys)
+from profile_v2.core.report import ProfileCoreReport
+from profile_v2.core.sqlalchemy.registry import _pool_engine_kwargs
+from profile_v2.core.sqlalchemy.sqlalchemy import SqlAlchemyProfileEngine
+
+logger = logging.getLogger(__name__)
+
+# asyncio drivers of the dialects having one; Snowflake and BigQuery dialects are synchronous only
+_ASYNC_DRIVER_BY_DIALECT: Dict[DataSourceType, str] = {
+    DataSourceType.POSTGRES: "postgresql+asyncpg",
+    DataSourceType.SQLITE: "sqlite+aiosqlite",
+}
+
+
+def async_connection_string(datasource: DataSource) -> Optional[str]:
+    """
+    Connection string of the datasource with its asyncio driver, None if the dialect has none.
+    Connection strings with an explicit driver (eg: postgresql+asyncpg://) are kept as they are.
+    """
+    url = make_url(datasource.connection_string)
+    if "+" in url.drivername:
+        return datasource.connection_string
+    async_driver = _ASYNC_DRIVER_BY_DIALECT.get(datasource.source)
+    if async_driver is None:
+        return None
+    return url.set(drivername=async_driver).render_as_string(hide_password=False)
+
+
+def create_async_datasource_engine(
+    datasource: DataSource, **engine_kwargs: Any
+) -> AsyncEngine:
+    connection_string = async_connection_string(datasource)
+    if connection_string is None:
+        raise ProfileEngineValueError(
+            f"No asyncio driver for datasource: {datasource.source.value}"
+        )
+    return create_async_engine(
+        connection_string, **_pool_engine_kwargs(connection_string, engine_kwargs)
+    )
+
+
+class AsyncSqlAlchemyProfileEngine:
+    """
+    Native asyncio counterpart of SqlAlchemyProfileEngine, on SQLAlchemy's asyncio extension: `profile` is a
+    coroutine, and the SELECT of every batch is awaited concurrently, so in-flight queries don't hold an OS thread
+    each, unlike AsyncProfileEngine wrapping a synchronous engine.
+
+    Statements are generated as in SqlAlchemyProfileEngine (fusion of the statistics of a batch in a single SELECT).
+    Queries in flight are bounded by `max_concurrency`, across all the calls to `profile`, and so is the connection
+    pool of every datasource, unless the dialect has no queue pool (eg: in-memory SQLite, with a single connection).
+    Statistics of a datasource whose engine can't be created are FAILURE results.
+
+    Only dialects with an asyncio driver are supported (Postgres with asyncpg, SQLite with aiosqlite); statistics
+    on other datasources are UNSUPPORTED. Packing, cost budgets and the approximate distinct policy are not
+    supported: use SqlAlchemyProfileEngine for those.
+    """
+
+    def __init__(
+        self,
+        report: ProfileCoreReport = ProfileCoreReport(),
+        max_concurrency: int = 100,
+    ):
+        self.report = report
+        self.max_concurrency = max_concurrency
+        self._statement_engine = SqlAlchemyProfileEngine(report=report)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._engines: Dict[DataSourceKey, AsyncEngine] = {}
+
+    async def profile(
+        self,
+        datasource: DataSource,
+        requests: List[ProfileRequest],
+        non_functional_requirements: ProfileNonFunctionalRequirements = ProfileNonFunctionalRequirements(),
+    ) -> ProfileResponse:
+        if not ModelCollections.validate_fq_statistic_name_uniqueness(requests):
+            raise ProfileEngineValueError(
+                "FQ statistic names must be unique across all requests"
+            )
+
+        response = ProfileResponse()
+        fused_requests = SqlAlchemyProfileEngine._fuse_requests_by_batch(requests)
+
+        try:
+            engine = self._get_engine(datasource)
+        except Exception as e:
+            logger.exception(e)
+            for request in fused_requests:
+                response.update(
+                    ModelCollections.failed_response_for_request(
+                        request,
+                        UnsuccessfulStatisticResultType.FAILURE,
+                        f"Unable to create engine: {e}",
+                        e,
+                    )
+                )
+            return response
+        if engine is None:
+            for request in fused_requests:
+                response.update(
+                    ModelCollections.failed_response_for_request(
+                        request,
+                        UnsuccessfulStatisticResultType.UNSUPPORTED,
+                        f"No asyncio driver for datasource: {datasource.source.value}",
+                    )
+                )
+            return response
+
+        # every coroutine sets the results of its own batch, so they can share the response
+        await asyncio.gather(
+            *[
+                self._process_request(
+                    request, datasource, engine, non_functional_requirements, response
+                )
+                for request in fused_requests
+            ]
+        )
+        return response
+
+    async def dispose(self) -> None:
+        """Closes the pooled connections of all the datasources."""
+        engines = list(self._engines.values())
+        self._engines.clear()
+        for engine in engines:
+            await engine.dispose()
+
+    def _get_engine(self, datasource: DataSource) -> Optional[AsyncEngine]:
+        key = ModelKeys.datasource_key(datasource)
+        if key not in self._engines:
+            if async_connection_string(datasource) is None:
+                return None
+            self._engines[key] = create_async_datasource_engine(
+                datasource, pool_size=self.max_concurrency, max_overflow=0
+            )
+        return self._engines[key]
+
+    async def _process_request(
+        self,
+        request: ProfileRequest,
+        datasource: DataSource,
+        engine: AsyncEngine,
+        non_functional_requirements: ProfileNonFunctionalRequirements,
+        response: ProfileResponse,
+    ) -> None:
+        try:
+            select_statement, fq_name_mappings, error_bounds = (
+                self._statement_engine._generate_select_query(
+                    request, datasource, response, non_functional_requirements
+                )
+            )
+            if select_statement is None:
+                return
+            dialect_select_statement = select_statement.sql(
+                dialect=datasource.source.value
+            )
+        except Exception as e:
+            self._fail_request(request, {}, e, response)
+            return
+        logger.info(f"Dialect-specific SQL statement: {dialect_select_statement}")
+
+        engine_name = self.__class__.__name__
+        async with self._semaphore:
+            self.report.issue_query(engine_name)
+            try:
+                start = time.perf_counter()
+                async with engine.connect() as connection:
+                    self.report.connection_checkout(
+                        engine_name, time.perf_counter() - start
+                    )
+                    result = await connection.execute(text(dialect_select_statement))
+                    row = result.first()
+            except Exception as e:
+                self._fail_request(request, fq_name_mappings, e, response)
+                return
+        self.report.successful_query(engine_name)
+
+        if row is None:
+            return
+        for column, value in zip(row._fields, row):
+            fq_name = fq_name_mappings[column.strip("`")]
+            response.data[fq_name] = SuccessStatisticResult(
+                value=value, error_bound=error_bounds.get(fq_name)
+            )
+
+    def _fail_request(
+        self,
+        request: ProfileRequest,
+        fq_name_mappings: Dict[str, str],
+        e: Exception,
+        response: ProfileResponse,
+    ) -> None:
+        self.report.unsuccessful_query(
+            self.__class__.__name__, UnsuccessfulStatisticResultType.FAILURE
+        )
+        logger.error(f"Error profiling request: {request}")
+        logger.exception(e)
+        # statistics resolved without query (eg: unsupported) keep their result
+        response.update(
+            ModelCollections.failed_response_for_request(
+                ProfileRequest(
+                    statistics=[
+                        statistic
+                        for statistic in request.statistics
+                        if statistic.fq_name not in response.data
+                        or statistic.fq_name in fq_name_mappings.values()
+                    ],
+                    batch=request.batch,
+                ),
+                unsuccessful_result_type=UnsuccessfulStatisticResultType.FAILURE,
+                message=str(e),
+                exception=e,
+            )
+        )
@@ -0,0 +1,352 @@
+import json
+import logging
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+
+from profile_v2.core.api import ProfileEngine
+from profile_v2.core.model import (BatchSpec, DataSource, DataSourceType,
+                                   ExpensivenessRequirements,
+                                   ProfileNonFunctionalRequirements,
+                                   ProfileRequest, ProfileStatisticType,
+                                   SuccessStatisticResult, TypedStatistic)
+from profile_v2.core.model_utils import DataSourceKey, ModelKeys
+from profile_v2.core.sqlalchemy.session import SqlAlchemyExecutionSession
+
+logger = logging.getLogger(__name__)
+
+# rough throughput of a warehouse scan, so seconds budgets are enforced with no configuration;
+# estimators should be given the measured throughput of the warehouse instead
+DEFAULT_ROWS_PER_SECOND = 10_000_000
+DEFAULT_BYTES_PER_SECOND = 500_000_000
+
+
+@dataclass
+class StatementCost:
+    """Estimated cost of a statement; None if the estimator can't tell."""
+
+    bytes: Optional[int] = None
+    rows: Optional[int] = None
+    seconds: Optional[float] = None
+
+    def exceeded_budgets(
+        self, non_functional_requirements: ProfileNonFunctionalRequirements
+    ) -> List[str]:
+        """Description of the budgets in the non-functional requirements exceeded by this cost, if any."""
+        return [
+            f"estimated {name} {estimated} > {budget}"
+            for name, estimated, budget in self._budgets(non_functional_requirements)
+            if budget is not None and estimated is not None and estimated > budget
+        ]
+
+    def unenforced_budgets(
+        self, non_functional_requirements: ProfileNonFunctionalRequirements
+    ) -> List[str]:
+        """Names of the budgets in the non-functional requirements this cost has no estimate for."""
+        return [
+            name
+            for name, estimated, budget in self._budgets(non_functional_requirements)
+            if budget is not None and estimated is None
+        ]
+
+    def _budgets(
+        self, non_functional_requirements: ProfileNonFunctionalRequirements
+    ) -> List[Tuple[str, Optional[float], Optional[float]]]:
+        return [
+            ("bytes", self.bytes, non_functional_requirements.max_estimated_bytes),
+            ("rows", self.rows, non_functional_requirements.max_estimated_rows),
+            (
+                "seconds",
+                self.seconds,
+                non_functional_requirements.max_estimated_seconds,
+            ),
+        ]
+
+
+class CostEstimator(ABC):
+    """Estimates the cost of a generated statement before it is executed."""
+
+    def prefetch(
+        self,
+        session: SqlAlchemyExecutionSession,
+        datasource: DataSource,
+        requests: List[ProfileRequest],
+    ) -> None:
+        """
+        Called once per profile call with cost budgets, before its statements are estimated, so estimators can
+        fetch what they need in bulk rather than once per statement.
+        """
+        pass
+
+    @abstractmethod
+    def estimate(
+        self,
+        session: SqlAlchemyExecutionSession,
+        datasource: DataSource,
+        request: ProfileRequest,
+        dialect_sql: str,
+    ) -> Optional[StatementCost]:
+        pass
+
+    @staticmethod
+    def _with_seconds(
+        cost: StatementCost,
+        rows_per_second: Optional[float],
+        bytes_per_second: Optional[float],
+    ) -> StatementCost:
+        if cost.bytes is not None and bytes_per_second:
+            cost.seconds = cost.bytes / bytes_per_second
+        elif cost.rows is not None and rows_per_second:
+            cost.seconds = cost.rows / rows_per_second
+        return cost
+
+
+class ExplainCostEstimator(CostEstimator):
+    """
+    Estimates the cost with the dialect EXPLAIN, without running the statement:
+    - Snowflake: EXPLAIN USING JSON, bytes assigned to the scan
+    - Postgres: EXPLAIN (FORMAT JSON), rows and bytes (rows * width) of the biggest plan node
+
+    Seconds are derived from the throughput (`bytes_per_second`, else `rows_per_second`).
+    Other dialects, and EXPLAIN errors, give no estimate.
+    """
+
+    def __init__(
+        self,
+        rows_per_second: Optional[float] = DEFAULT_ROWS_PER_SECOND,
+        bytes_per_second: Optional[float] = DEFAULT_BYTES_PER_SECOND,
+    ):
+        self.rows_per_second = rows_per_second
+        self.bytes_per_second = bytes_per_second
+
+    def estimate(
+        self,
+        session: SqlAlchemyExecutionSession,
+        datasource: DataSource,
+        request: ProfileRequest,
+        dialect_sql: str,
+    ) -> Optional[StatementCost]:
+        if datasource.source == DataSourceType.SNOWFLAKE:
+            parse = ExplainCostEstimator._parse_snowflake_explain
+            explain_sql = f"EXPLAIN USING JSON {dialect_sql}"
+        elif datasource.source == DataSourceType.POSTGRES:
+            parse = ExplainCostEstimator._parse_postgres_explain
+            explain_sql = f"EXPLAIN (FORMAT JSON) {dialect_sql}"
+        else:
+            return None
+
+        try:
+            rows = session.execute(explain_sql)
+            plan = rows[0][0]
+            cost = parse(json.loads(plan) if isinstance(plan, str) else plan)
+        except Exception as e:
+            logger.warning(f"Unable to estimate cost with EXPLAIN: {e}")
+            return None
+        return CostEstimator._with_seconds(
+            cost, self.rows_per_second, self.bytes_per_second
+        )
+
+    @staticmethod
+    def _parse_snowflake_explain(plan: Dict[str, Any]) -> StatementCost:
+        global_stats = plan.get("GlobalStats", {})
+        return StatementCost(bytes=global_stats.get("bytesAssigned"))
+
+    @staticmethod
+    def _parse_postgres_explain(plan: Any) -> StatementCost:
+        # biggest node of the plan tree, usually the scan; the aggregate on top of it returns a single row
+        max_rows = 0
+        max_bytes = 0
+        nodes = [plan[0]["Plan"]]
+        while nodes:
+            node = nodes.pop()
+            rows = int(node.get("Plan Rows", 0))
+            if rows > max_rows:
+                max_rows = rows
+                max_bytes = rows * int(node.get("Plan Width", 0))
+            nodes.extend(node.get("Plans", []))
+        return StatementCost(bytes=max_bytes, rows=max_rows)
+
+
+class BigQueryDryRunCostEstimator(CostEstimator):
+    """
+    Estimates the bytes scanned by a BigQuery statement with a dry run (totalBytesProcessed), which is free and
+    accounts for partition pruning and clustering. Seconds are derived from `bytes_per_second`.
+    Other dialects, and dry run errors, give no estimate.
+    """
+
+    def __init__(self, bytes_per_second: Optional[float] = DEFAULT_BYTES_PER_SECOND):
+        self.bytes_per_second = bytes_per_second
+
+    def estimate(
+        self,
+        session: SqlAlchemyExecutionSession,
+        datasource: DataSource,
+        request: ProfileRequest,
+        dialect_sql: str,
+    ) -> Optional[StatementCost]:
+        if datasource.source != DataSourceType.BIGQUERY:
+            return None
+
+        try:
+            # sqlalchemy-bigquery dependency, only needed for BigQuery datasources
+            from google.cloud import bigquery
+
+            client = session.connection.connection.dbapi_connection._client
+            query_job = client.query(
+                dialect_sql,
+                job_config=bigquery.QueryJobConfig(dry_run=True, use_query_cache=False),
+            )
+            cost = StatementCost(bytes=query_job.total_bytes_processed)
+        except Exception as e:
+            logger.warning(f"Unable to estimate cost with a dry run: {e}")
+            return None
+        return CostEstimator._with_seconds(cost, None, self.bytes_per_second)
+
+
+class RowCountCostEstimator(CostEstimator):
+    """
+    Estimates the rows scanned by a statement as the row count of its table, as per the given engine (eg: catalog
+    statistics, so no data is scanned). Bytes are derived from `bytes_per_row`, if any, and seconds from the
+    throughput (`bytes_per_second`, else `rows_per_second`).
+    Partitioned or sampled batches are estimated as the whole table, as an upper bound.
+
+    Row counts of all the tables of a profile call are fetched at once (see `prefetch`), and kept for
+    `ttl_seconds`, so statements on the same table don't fetch them again.
+    """
+
+    def __init__(
+        self,
+        row_count_engine: ProfileEngine,
+        bytes_per_row: Optional[int] = None,
+        rows_per_second: Optional[float] = DEFAULT_ROWS_PER_SECOND,
+        bytes_per_second: Optional[float] = DEFAULT_BYTES_PER_SECOND,
+        ttl_seconds: float = 60,
+    ):
+        self.row_count_engine = row_count_engine
+        self.bytes_per_row = bytes_per_row
+        self.rows_per_second = rows_per_second
+        self.bytes_per_second = bytes_per_second
+        self.ttl_seconds = ttl_seconds
+        # row count (None if unknown) and expiration, by datasource and table
+        self._row_counts: Dict[
+            Tuple[DataSourceKey, str], Tuple[Optional[int], float]
+        ] = {}
+        self._lock = Lock()
+
+    def prefetch(
+        self,
+        session: SqlAlchemyExecutionSession,
+        datasource: DataSource,
+        requests: List[ProfileRequest],
+    ) -> None:
+        self._row_counts_of(
+            datasource, [request.batch.fq_dataset_name for request in requests]
+        )
+
+    def estimate(
+        self,
+        session: SqlAlchemyExecutionSession,
+        datasource: DataSource,
+        request: ProfileRequest,
+        dialect_sql: str,
+    ) -> Optional[StatementCost]:
+        rows = self._row_counts_of(datasource, [request.batch.fq_dataset_name]).get(
+            request.batch.fq_dataset_name
+        )
+        if rows is None:
+            return None
+        return CostEstimator._with_seconds(
+            StatementCost(
+                bytes=rows * self.bytes_per_row if self.bytes_per_row else None,
+                rows=rows,
+            ),
+            self.rows_per_second,
+            self.bytes_per_second,
+        )
+
+    def _row_counts_of(
+        self, datasource: DataSource, fq_dataset_names: List[str]
+    ) -> Dict[str, Optional[int]]:
+        """
+        Row counts of the tables, fetching the ones not cached (or expired) with a single call to the row count engine.
+        """
+        datasource_key = ModelKeys.datasource_key(datasource)
+        now = time.monotonic()
+        row_counts: Dict[str, Optional[int]] = {}
+        missing: List[str] = []
+        with self._lock:
+            for fq_dataset_name in sorted(set(fq_dataset_names)):
+                entry = self._row_counts.get((datasource_key, fq_dataset_name))
+                if entry and entry[1] > now:
+                    row_counts[fq_dataset_name] = entry[0]
+                else:
+                    missing.append(fq_dataset_name)
+        if not missing:
+            return row_counts
+
+        response = self.row_count_engine._do_profile(
+            datasource,
+            [
+                ProfileRequest(
+                    statistics=[
+                        TypedStatistic(
+                            fq_name=str(index),
+                            type=ProfileStatisticType.TABLE_ROW_COUNT,
+                        )
+                    ],
+                    # whole table, as an upper bound of partitions and samples
+                    batch=BatchSpec(fq_dataset_name=fq_dataset_name),
+                )
+                for index, fq_dataset_name in enumerate(missing)
+            ],
+            ProfileNonFunctionalRequirements(
+                expensiveness=ExpensivenessRequirements.CHEAP
+            ),
+        )
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            for index, fq_dataset_name in enumerate(missing):
+                result = response.data.get(str(index))
+                row_count = (
+                    int(result.value)
+                    if isinstance(result, SuccessStatisticResult)
+                    and result.value is not None
+                    else None
+                )
+                row_counts[fq_dataset_name] = row_count
+                self._row_counts[(datasource_key, fq_dataset_name)] = (
+                    row_count,
+                    expires_at,
+                )
+        return row_counts
+
+
+class FallbackCostEstimator(CostEstimator):
+    """First estimate given by the estimators, in order; eg: EXPLAIN, then the row-count model."""
+
+    def __init__(self, estimators: List[CostEstimator]):
+        self.estimators = estimators
+
+    def prefetch(
+        self,
+        session: SqlAlchemyExecutionSession,
+        datasource: DataSource,
+        requests: List[ProfileRequest],
+    ) -> None:
+        for estimator in self.estimators:
+            estimator.prefetch(session, datasource, requests)
+
+    def estimate(
+        self,
+        session: SqlAlchemyExecutionSession,
+        datasource: DataSource,
+        request: ProfileRequest,
+        dialect_sql: str,
+    ) -> Optional[StatementCost]:
+        for estimator in self.estimators:
+            cost = estimator.estimate(session, datasource, request, dialect_sql)
+            if cost is not None:
+                return cost
+        return None
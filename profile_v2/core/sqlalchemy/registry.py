@@ -0,0 +1,188 @@
+import logging
+import time
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import Engine, create_engine, make_url
+from sqlalchemy.pool import QueuePool
+
+from profile_v2.core.model import DataSource, DataSourceType
+from profile_v2.core.model_utils import DataSourceKey, ModelKeys
+
+logger = logging.getLogger(__name__)
+
+EngineFactory = Callable[..., Engine]
+
+# sizing arguments of QueuePool; other pools (eg: SingletonThreadPool for in-memory SQLite) reject some of them
+_QUEUE_POOL_KWARGS = ["pool_size", "max_overflow", "pool_timeout"]
+
+
+def _pool_engine_kwargs(
+    connection_string: str, engine_kwargs: Dict[str, Any]
+) -> Dict[str, Any]:
+    pool_class = engine_kwargs.get("poolclass")
+    if pool_class is None:
+        url = make_url(connection_string)
+        pool_class = url.get_dialect().get_pool_class(url)
+    if issubclass(pool_class, QueuePool):
+        return engine_kwargs
+    return {
+        name: value
+        for name, value in engine_kwargs.items()
+        if name not in _QUEUE_POOL_KWARGS
+    }
+
+
+def create_datasource_engine(datasource: DataSource, **engine_kwargs: Any) -> Engine:
+    engine_kwargs = _pool_engine_kwargs(datasource.connection_string, engine_kwargs)
+    if datasource.source == DataSourceType.SNOWFLAKE:
+        return create_engine(datasource.connection_string, **engine_kwargs)
+    elif datasource.source == DataSourceType.BIGQUERY:
+        assert datasource.extra_config and datasource.extra_config.get(
+            "credentials_path"
+        ), "credentials_path is required for BigQuery"
+        return create_engine(
+            datasource.connection_string,
+            credentials_path=datasource.extra_config["credentials_path"],
+            **engine_kwargs,
+        )
+    elif datasource.source in [DataSourceType.POSTGRES, DataSourceType.SQLITE]:
+        return create_engine(datasource.connection_string, **engine_kwargs)
+    else:
+        assert False, f"Unsupported datasource: {datasource.source}"
+
+
+@dataclass
+class _RegistryEntry:
+    engine: Engine
+    pool_size: int
+    last_used: float
+
+
+class SqlAlchemyEngineRegistry:
+    """
+    Thread-safe registry of SQLAlchemy engines keyed by datasource (connection string + extra config).
+
+    Reusing the engine means reusing its connection pool, so successive or parallel profile calls on the same
+    datasource reuse authenticated sessions instead of paying connection setup (eg: Snowflake login) every time.
+
+    - pool size: engines are created with at least `pool_size` connections; callers may ask for a bigger pool
+      (eg: to match the number of parallel workers), in which case the engine is replaced with a bigger one.
+      Up to `max_overflow` extra connections are opened on demand, so callers needing more connections than the
+      pool size don't block; they are closed once returned. Pools without sizing (eg: in-memory SQLite) ignore both.
+    - pre-warming: `warm_up` opens connections in advance so that the first batches do not pay the setup.
+    - idle eviction: engines not used for more than `idle_timeout_seconds` are disposed on registry access.
+    - explicit dispose: `dispose` closes the pooled connections of one or all datasources.
+    """
+
+    def __init__(
+        self,
+        engine_factory: EngineFactory,
+        pool_size: int = 5,
+        max_overflow: int = 10,
+        idle_timeout_seconds: Optional[float] = 600,
+    ):
+        self.engine_factory = engine_factory
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.idle_timeout_seconds = idle_timeout_seconds
+        self._entries: Dict[DataSourceKey, _RegistryEntry] = {}
+        self._lock = Lock()
+
+    def get_engine(
+        self, datasource: DataSource, pool_size: Optional[int] = None
+    ) -> Engine:
+        key = ModelKeys.datasource_key(datasource)
+        requested_pool_size = max(pool_size or 0, self.pool_size)
+        disposable: List[Engine] = []
+        with self._lock:
+            now = time.monotonic()
+            disposable.extend(self._pop_idle_entries(now, keep=key))
+
+            entry = self._entries.get(key)
+            if entry is None or entry.pool_size < requested_pool_size:
+                if entry is not None:
+                    logger.info(
+                        f"Growing connection pool for {datasource.source.value} from {entry.pool_size} to {requested_pool_size}"
+                    )
+                    disposable.append(entry.engine)
+                entry = _RegistryEntry(
+                    engine=self.engine_factory(
+                        datasource,
+                        pool_size=requested_pool_size,
+                        max_overflow=self.max_overflow,
+                    ),
+                    pool_size=requested_pool_size,
+                    last_used=now,
+                )
+                self._entries[key] = entry
+            entry.last_used = now
+
+        # checked out connections from disposed engines keep working and are discarded once returned
+        for engine in disposable:
+            engine.dispose()
+
+        return entry.engine
+
+    def warm_up(
+        self, datasource: DataSource, num_connections: Optional[int] = None
+    ) -> Engine:
+        """
+        Opens `num_connections` (default: pool size) connections and returns them to the pool.
+        """
+        num_connections = num_connections or self.pool_size
+        engine = self.get_engine(datasource, pool_size=num_connections)
+        connections = []
+        try:
+            for _ in range(num_connections):
+                connections.append(engine.connect())
+        finally:
+            for connection in connections:
+                connection.close()
+        logger.info(
+            f"Warmed up {len(connections)} connections for {datasource.source.value}"
+        )
+        return engine
+
+    def evict_idle(self) -> int:
+        with self._lock:
+            disposable = self._pop_idle_entries(time.monotonic())
+        for engine in disposable:
+            engine.dispose()
+        return len(disposable)
+
+    def dispose(self, datasource: Optional[DataSource] = None) -> None:
+        with self._lock:
+            if datasource is None:
+                disposable = [entry.engine for entry in self._entries.values()]
+                self._entries.clear()
+            else:
+                entry = self._entries.pop(ModelKeys.datasource_key(datasource), None)
+                disposable = [entry.engine] if entry else []
+        for engine in disposable:
+            engine.dispose()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def _pop_idle_entries(
+        self, now: float, keep: Optional[DataSourceKey] = None
+    ) -> List[Engine]:
+        if self.idle_timeout_seconds is None:
+            return []
+        idle_keys = [
+            key
+            for key, entry in self._entries.items()
+            if key != keep and now - entry.last_used > self.idle_timeout_seconds
+        ]
+        for key in idle_keys:
+            logger.info(f"Evicting idle engine for {key[0]}")
+        return [self._entries.pop(key).engine for key in idle_keys]
+
+
+DEFAULT_ENGINE_REGISTRY = SqlAlchemyEngineRegistry(
+    engine_factory=create_datasource_engine
+)
+"""Process-wide engine registry used by default by the SQLAlchemy-based profile engines."""
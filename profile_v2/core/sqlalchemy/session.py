@@ -0,0 +1,212 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import (Any, Callable, Dict, Iterator, List, Optional, Sequence,
+                    Tuple, Union)
+
+from sqlalchemy import Connection, Engine, Row, TextClause, text
+
+from profile_v2.core.api import (ProfileEngineCancelledError,
+                                 current_cancellation_token,
+                                 raise_if_cancelled)
+from profile_v2.core.report import EngineName, ProfileCoreReport
+
+logger = logging.getLogger(__name__)
+
+
+class SqlAlchemyExecutionSession:
+    """
+    Runs all the statements of a profile call (or of a parallel worker) on a single connection.
+
+    The connection is checked out from the engine pool lazily, on the first statement, and returned on `close`.
+    Checkout time is reported separately from query time, so the saving of not checking out a connection per
+    statement is visible in the report.
+
+    Statements are cancelled with the profile call (see CancellationToken): a statement is not started once the
+    call is cancelled, and the one in flight is cancelled as per the dialect (see `_cancel_statement`), raising
+    ProfileEngineCancelledError.
+
+    Not thread-safe: every worker should open its own session.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        report: ProfileCoreReport,
+        engine_name: EngineName,
+    ):
+        self.engine = engine
+        self.report = report
+        self.engine_name = engine_name
+        self._connection: Optional[Connection] = None
+
+    def __enter__(self) -> "SqlAlchemyExecutionSession":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    @property
+    def connection(self) -> Connection:
+        if self._connection is None:
+            start = time.perf_counter()
+            self._connection = self.engine.connect()
+            self.report.connection_checkout(
+                self.engine_name, time.perf_counter() - start
+            )
+        return self._connection
+
+    def execute(
+        self,
+        statement: Union[str, TextClause],
+        parameters: Optional[Dict[str, Any]] = None,
+    ) -> Sequence[Row]:
+        """
+        Executes the statement and fetches all the rows.
+
+        On error, the connection is rolled back, so it can be used for the next statements.
+        """
+        connection = self.connection
+        try:
+            if isinstance(statement, str):
+                statement = text(statement)
+            with SqlAlchemyExecutionSession._cancellable(connection):
+                return connection.execute(statement, parameters).fetchall()
+        except Exception:
+            connection.rollback()
+            raise
+
+    def execute_stream(
+        self,
+        statement: Union[str, TextClause],
+        parameters: Optional[Dict[str, Any]] = None,
+        chunk_size: int = 10_000,
+    ) -> Iterator[Sequence[Row]]:
+        """
+        Executes the statement and yields the rows in chunks, with a server-side cursor where the driver supports
+        it, so big results are never held in memory at once.
+
+        On error, the connection is rolled back, so it can be used for the next statements.
+        """
+        connection = self.connection
+        try:
+            if isinstance(statement, str):
+                statement = text(statement)
+            with SqlAlchemyExecutionSession._cancellable(connection):
+                result = connection.execution_options(
+                    stream_results=True, yield_per=chunk_size
+                ).execute(statement, parameters)
+                yield from result.partitions(chunk_size)
+        except Exception:
+            connection.rollback()
+            raise
+
+    def execute_select(self, statement: str) -> List[Tuple[str, Any]]:
+        """
+        Executes a single-row SELECT and returns (column, value) pairs of the row.
+        """
+        rows = self.execute(statement)
+        # TODO: what if there are multiple rows? raise error?
+        row = rows[0] if rows else None
+        logger.info(row)
+        if not row:
+            return []
+        return [(column.strip("`"), value) for column, value in zip(row._fields, row)]
+
+    @staticmethod
+    @contextmanager
+    def _cancellable(connection: Connection) -> Iterator[None]:
+        """
+        Cancels the statement run in the block if the profile call is cancelled meanwhile, raising
+        ProfileEngineCancelledError instead of the driver error.
+        """
+        raise_if_cancelled()
+        token = current_cancellation_token.get()
+        if token is None:
+            yield
+            return
+        dialect_name = connection.dialect.name
+        dbapi_connection = connection.connection.dbapi_connection
+        remove_callback = token.add_callback(
+            lambda: SqlAlchemyExecutionSession._cancel_statement(
+                dialect_name, dbapi_connection
+            )
+        )
+        try:
+            yield
+        except Exception as e:
+            if token.cancelled:
+                raise ProfileEngineCancelledError("Profile call cancelled") from e
+            raise
+        finally:
+            remove_callback()
+        raise_if_cancelled()
+
+    @staticmethod
+    def _cancel_statement(dialect_name: str, dbapi_connection: Any) -> None:
+        """
+        Cancels the statement in flight with the DBAPI connection `interrupt` (sqlite3), the SYSTEM$CANCEL_ALL_QUERIES
+        of the session (Snowflake), a cancel of the running jobs (BigQuery), or the DBAPI connection `cancel` (eg:
+        psycopg2). Other drivers have no portable way, so their statement runs to completion.
+
+        Except for `interrupt`, the cancel is a round trip to the server, so it's run on its own thread: the token
+        may be cancelled on the event loop thread (see AsyncProfileEngine).
+        """
+        interrupt = getattr(dbapi_connection, "interrupt", None)
+        if callable(interrupt):
+            logger.info("Cancelling statement with interrupt")
+            try:
+                interrupt()
+            except Exception as e:
+                logger.warning(f"Unable to cancel statement: {e}")
+            return
+
+        cancel: Optional[Callable[[Any], None]] = None
+        if dialect_name == "snowflake":
+            cancel = SqlAlchemyExecutionSession._cancel_snowflake_statement
+        elif dialect_name == "bigquery":
+            cancel = SqlAlchemyExecutionSession._cancel_bigquery_statement
+        elif callable(getattr(dbapi_connection, "cancel", None)):
+            cancel = SqlAlchemyExecutionSession._cancel_dbapi_statement
+        if cancel is None:
+            logger.warning(
+                f"Unable to cancel statement: {type(dbapi_connection).__name__} can't cancel"
+            )
+            return
+
+        def run_cancel() -> None:
+            logger.info(f"Cancelling {dialect_name} statement")
+            try:
+                cancel(dbapi_connection)
+            except Exception as e:
+                logger.warning(f"Unable to cancel statement: {e}")
+
+        threading.Thread(
+            target=run_cancel, name="cancel-statement", daemon=True
+        ).start()
+
+    @staticmethod
+    def _cancel_snowflake_statement(dbapi_connection: Any) -> None:
+        # the query id is only known once the statement returns; a session runs a statement at a time
+        with dbapi_connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT SYSTEM$CANCEL_ALL_QUERIES(%s)", (dbapi_connection.session_id,)
+            )
+
+    @staticmethod
+    def _cancel_dbapi_statement(dbapi_connection: Any) -> None:
+        dbapi_connection.cancel()
+
+    @staticmethod
+    def _cancel_bigquery_statement(dbapi_connection: Any) -> None:
+        # the DBAPI cursors keep the job of their last statement
+        for cursor in list(getattr(dbapi_connection, "_cursors_created", ())):
+            query_job = getattr(cursor, "_query_job", None)
+            if query_job is not None and not query_job.done(reload=False):
+                query_job.cancel()
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
@@ -0,0 +1,236 @@
+import logging
+from typing import Dict, List, Optional
+
+from sqlglot.expressions import Select
+
+from profile_v2.core.api import ProfileEngine
+from profile_v2.core.catalog.catalog import CatalogStatisticsProfileEngine
+from profile_v2.core.model import (BatchSpec, DataSource,
+                                   ExpensivenessRequirements,
+                                   ProfileNonFunctionalRequirements,
+                                   ProfileRequest, ProfileResponse,
+                                   ProfileStatisticType, SketchStatisticResult,
+                                   StatisticSpec, SuccessStatisticResult,
+                                   TypedStatistic,
+                                   UnsuccessfulStatisticResultType)
+from profile_v2.core.model_utils import ModelCollections
+from profile_v2.core.report import ProfileCoreReport
+from profile_v2.core.sketches import HyperLogLogSketch
+from profile_v2.core.sqlalchemy.registry import (DEFAULT_ENGINE_REGISTRY,
+                                                 SqlAlchemyEngineRegistry)
+from profile_v2.core.sqlalchemy.session import SqlAlchemyExecutionSession
+from profile_v2.core.sqlalchemy.sqlalchemy import SqlAlchemyProfileEngine
+
+logger = logging.getLogger(__name__)
+
+
+class SqlAlchemySketchProfileEngine(ProfileEngine):
+    """
+    Profile engine returning mergeable sketches (SketchStatisticResult) instead of opaque scalars.
+
+    Supported statistics are approximate single-column COLUMN_DISTINCT_COUNT, as HyperLogLog sketches. The
+    columns of a batch are streamed in a single scan and sketched client-side, so this is more expensive than a
+    warehouse APPROX_COUNT_DISTINCT; it pays off when results are to be merged, eg: with IncrementalProfileEngine.
+
+    Since every row is transferred, only tables with at most `max_scanned_rows` rows are sketched, as per the
+    row counts of `row_count_engine` (catalog statistics by default, so no data is scanned). Partitioned or
+    sampled batches are bounded by the row count of the whole table, and tables with no known row count are not
+    sketched. Full scans of tables of any size must be opted in with `max_scanned_rows=None`.
+
+    Unsupported statistics, and statistics of tables over the ceiling, are UNSUPPORTED, so this engine is meant to
+    be the first one in a SequentialFallbackProfileEngine.
+    """
+
+    def __init__(
+        self,
+        report: ProfileCoreReport = ProfileCoreReport(),
+        engine_registry: Optional[SqlAlchemyEngineRegistry] = None,
+        precision: int = 12,
+        chunk_size: int = 10_000,
+        max_scanned_rows: Optional[int] = 1_000_000,
+        row_count_engine: Optional[ProfileEngine] = None,
+    ):
+        super().__init__(report)
+        self.engine_registry = engine_registry or DEFAULT_ENGINE_REGISTRY
+        self.precision = precision
+        self.chunk_size = chunk_size
+        self.max_scanned_rows = max_scanned_rows
+        self.row_count_engine = row_count_engine or CatalogStatisticsProfileEngine(
+            report=self.report, engine_registry=self.engine_registry
+        )
+
+    def _do_profile(
+        self,
+        datasource: DataSource,
+        requests: List[ProfileRequest],
+        non_functional_requirements: ProfileNonFunctionalRequirements = ProfileNonFunctionalRequirements(),
+    ) -> ProfileResponse:
+        response = ProfileResponse()
+
+        split = ModelCollections.group_request_by_statistics_predicate(
+            requests, SqlAlchemySketchProfileEngine._is_statistic_supported
+        )
+        for unsupported_request in split[False]:
+            response.update(
+                ModelCollections.failed_response_for_request(
+                    unsupported_request,
+                    UnsuccessfulStatisticResultType.UNSUPPORTED,
+                    "Unsupported by sketches",
+                )
+            )
+        supported_requests = split[True]
+        if self.max_scanned_rows is not None:
+            supported_requests = self._filter_by_row_count(
+                supported_requests, datasource, response
+            )
+        if not supported_requests:
+            return response
+
+        engine = self.engine_registry.get_engine(datasource)
+        with SqlAlchemyExecutionSession(
+            engine, report=self.report, engine_name=self.__class__.__name__
+        ) as session:
+            for request in supported_requests:
+                self._process_request(request, datasource, session, response)
+
+        return response
+
+    def _filter_by_row_count(
+        self,
+        requests: List[ProfileRequest],
+        datasource: DataSource,
+        response: ProfileResponse,
+    ) -> List[ProfileRequest]:
+        """
+        Requests on tables with at most `max_scanned_rows` rows; the others are set UNSUPPORTED in the response.
+        """
+        assert self.max_scanned_rows is not None
+        fq_dataset_names = sorted(
+            {request.batch.fq_dataset_name for request in requests}
+        )
+        row_count_response = self.row_count_engine._do_profile(
+            datasource,
+            [
+                ProfileRequest(
+                    statistics=[
+                        TypedStatistic(
+                            fq_name=str(index),
+                            type=ProfileStatisticType.TABLE_ROW_COUNT,
+                        )
+                    ],
+                    # whole table, as an upper bound of partitions and samples
+                    batch=BatchSpec(fq_dataset_name=fq_dataset_name),
+                )
+                for index, fq_dataset_name in enumerate(fq_dataset_names)
+            ],
+            ProfileNonFunctionalRequirements(
+                expensiveness=ExpensivenessRequirements.CHEAP
+            ),
+        )
+        row_counts: Dict[str, int] = {
+            fq_dataset_names[int(index)]: result.value
+            for index, result in row_count_response.data.items()
+            if isinstance(result, SuccessStatisticResult) and result.value is not None
+        }
+
+        small_requests: List[ProfileRequest] = []
+        for request in requests:
+            row_count = row_counts.get(request.batch.fq_dataset_name)
+            if row_count is not None and row_count <= self.max_scanned_rows:
+                small_requests.append(request)
+                continue
+            response.update(
+                ModelCollections.failed_response_for_request(
+                    request,
+                    UnsuccessfulStatisticResultType.UNSUPPORTED,
+                    (
+                        f"Unknown row count of {request.batch.fq_dataset_name}, not sketched"
+                        if row_count is None
+                        else f"{row_count} rows in {request.batch.fq_dataset_name} > {self.max_scanned_rows}, not sketched"
+                    ),
+                )
+            )
+        return small_requests
+
+    def _process_request(
+        self,
+        request: ProfileRequest,
+        datasource: DataSource,
+        session: SqlAlchemyExecutionSession,
+        response: ProfileResponse,
+    ) -> None:
+        columns = list(
+            dict.fromkeys(
+                statistic.columns[0]
+                for statistic in request.statistics
+                if isinstance(statistic, TypedStatistic)
+            )
+        )
+        sketches: Dict[str, HyperLogLogSketch] = {
+            column: HyperLogLogSketch(self.precision) for column in columns
+        }
+
+        try:
+            select_statement = self._generate_scan_query(request, columns)
+            dialect_select_statement = select_statement.sql(
+                dialect=datasource.source.value
+            )
+            logger.info(f"Dialect-specific SQL statement: {dialect_select_statement}")
+            self.report_issue_query()
+            for rows in session.execute_stream(
+                dialect_select_statement, chunk_size=self.chunk_size
+            ):
+                for row in rows:
+                    for sketch, value in zip(sketches.values(), row):
+                        sketch.add(value)
+        except Exception as e:
+            self.report_unsuccessful_query(UnsuccessfulStatisticResultType.FAILURE)
+            logger.error(f"Error sketching request: {request}")
+            logger.exception(e)
+            response.update(
+                ModelCollections.failed_response_for_request(
+                    request,
+                    unsuccessful_result_type=UnsuccessfulStatisticResultType.FAILURE,
+                    message=str(e),
+                    exception=e,
+                )
+            )
+            return
+        self.report_successful_query()
+
+        for statistic in request.statistics:
+            assert isinstance(statistic, TypedStatistic)
+            sketch = sketches[statistic.columns[0]]
+            response.data[statistic.fq_name] = SketchStatisticResult(
+                value=sketch.estimate(),
+                error_bound=sketch.relative_error,
+                sketch=sketch,
+            )
+
+    @staticmethod
+    def _generate_scan_query(request: ProfileRequest, columns: List[str]) -> Select:
+        table_name = SqlAlchemyProfileEngine._sqlglotfriendly_table_name(
+            request.batch.fq_dataset_name
+        )
+        select_statement = Select().select(*columns)
+        select_statement = (
+            select_statement.from_(
+                f"{table_name} TABLESAMPLE ({request.batch.sample.size})"
+            )
+            if request.batch.sample
+            else select_statement.from_(table_name)
+        )
+        if request.batch.partitions:
+            select_statement = select_statement.where(
+                SqlAlchemyProfileEngine._partitions_condition(request.batch.partitions)
+            )
+        return select_statement
+
+    @staticmethod
+    def _is_statistic_supported(statistic_spec: StatisticSpec) -> bool:
+        return (
+            isinstance(statistic_spec, TypedStatistic)
+            and statistic_spec.type == ProfileStatisticType.COLUMN_DISTINCT_COUNT
+            and statistic_spec.approximate
+            and len(statistic_spec.columns) == 1
+        )
@@ -1,49 +1,166 @@
+import dataclasses
 import logging
-from typing import Any, Dict, Iterator, List, Optional, Tuple
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
 
-from sqlalchemy import Engine, create_engine, text
+from sqlalchemy import Engine
+from sqlglot import exp
 from sqlglot.expressions import Select
 
-from profile_v2.core.api import ProfileEngine
+from profile_v2.core.api import (ProfileEngine, ProfileEngineCancelledError,
+                                 raise_if_cancelled)
+from profile_v2.core.catalog.catalog import CatalogStatisticsProfileEngine
 from profile_v2.core.model import (CustomStatistic, DataSource, DataSourceType,
-                                   ExpensivenessRequirements,
+                                   ExpensivenessRequirements, PartitionsSpec,
+                                   PartitionValue,
                                    ProfileNonFunctionalRequirements,
                                    ProfileRequest, ProfileResponse,
-                                   ProfileStatisticType,
+                                   ProfileStatisticType, StatisticSpec,
                                    SuccessStatisticResult, TypedStatistic,
                                    UnsuccessfulStatisticResult,
                                    UnsuccessfulStatisticResultType)
 from profile_v2.core.model_utils import ModelCollections
 from profile_v2.core.report import ProfileCoreReport
+from profile_v2.core.sqlalchemy.cost import (BigQueryDryRunCostEstimator,
+                                             CostEstimator,
+                                             ExplainCostEstimator,
+                                             FallbackCostEstimator,
+                                             RowCountCostEstimator)
+from profile_v2.core.sqlalchemy.registry import (DEFAULT_ENGINE_REGISTRY,
+                                                 SqlAlchemyEngineRegistry,
+                                                 create_datasource_engine)
+from profile_v2.core.sqlalchemy.session import SqlAlchemyExecutionSession
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class _PackMember:
+    """A batch SELECT to be combined with others in a UNION ALL statement."""
+
+    request: ProfileRequest
+    select_statement: Select
+    fq_name_mappings: Dict[str, str]
+    error_bounds: Dict[str, float]
+    dialect_sql: str
+
+    _NULL_SLOT_LENGTH = len(", NULL AS profile_pack_value_0000")
+
+    @property
+    def width(self) -> int:
+        return len(self.select_statement.expressions)
+
+    @property
+    def slot_fq_names(self) -> List[str]:
+        return [
+            self.fq_name_mappings[expression.alias]
+            for expression in self.select_statement.expressions
+        ]
+
+    @staticmethod
+    def estimated_pack_length(pack: List["_PackMember"]) -> int:
+        width = max(member.width for member in pack)
+        return sum(
+            len(member.dialect_sql)
+            + (width - member.width) * _PackMember._NULL_SLOT_LENGTH
+            + len(" UNION ALL ")
+            for member in pack
+        )
+
+
 class SqlAlchemyProfileEngine(ProfileEngine):
     """
     Generic profile engine using SQLAlchemy.
 
+    Engines are taken from a process-wide SqlAlchemyEngineRegistry, so connection pools are shared across calls and
+    across parallel batches. When running under a ParallelProfileEngine, set `pool_size` to its `max_workers`.
+    All the statements of a `_do_profile` call run on a single connection (see SqlAlchemyExecutionSession).
+
+    Packing (opt-in with `pack_size` > 1): the single-row aggregate SELECTs of many batches are combined in a single
+    UNION ALL statement, tagged with a batch discriminator column, saving one round trip per batch. Useful when
+    profiling many small tables. Packs are bounded by `pack_size` and by the max SQL length of the dialect
+    (or `max_sql_length`). If a packed statement fails, its batches are retried one by one.
+
+    Approximate distinct counts (TypedStatistic.approximate) are computed with the dialect approximate aggregate
+    (APPROX_COUNT_DISTINCT in Snowflake and BigQuery), and their results carry the error bound. With
+    `approximate_distinct_row_count_threshold` in the non-functional requirements, exact distinct counts are
+    downgraded to approximate ones on tables bigger than the threshold, as per `row_count_engine` (catalog by default).
+
+    Cost budgets: with max estimated bytes/rows/seconds in the non-functional requirements, every statement is
+    estimated with `cost_estimator` before running it (EXPLAIN, BigQuery dry run, else row count of the table by
+    default), and the statistics of statements over budget are SKIPPED. Statements with no estimate, or with no
+    estimate of the budgeted measure (eg: seconds), run with a warning.
+
+    Cancellation (see CancellationToken): once the call is cancelled, the statement in flight is cancelled through
+    the DBAPI connection, pending batches are not run, and ProfileEngineCancelledError is raised.
+
     TODO:
     - TABLE_ROW_COUNT statistic, support it depending on "expensiveness" considerations
     """
 
-    def __init__(self, report: ProfileCoreReport = ProfileCoreReport()):
+    def __init__(
+        self,
+        report: ProfileCoreReport = ProfileCoreReport(),
+        engine_registry: Optional[SqlAlchemyEngineRegistry] = None,
+        pool_size: Optional[int] = None,
+        pack_size: Optional[int] = None,
+        max_sql_length: Optional[int] = None,
+        row_count_engine: Optional[ProfileEngine] = None,
+        cost_estimator: Optional[CostEstimator] = None,
+    ):
         super().__init__(report)
+        self.engine_registry = engine_registry or DEFAULT_ENGINE_REGISTRY
+        self.pool_size = pool_size
+        self.pack_size = pack_size
+        self.max_sql_length = max_sql_length
+        self.row_count_engine = row_count_engine or CatalogStatisticsProfileEngine(
+            report=self.report, engine_registry=self.engine_registry
+        )
+        self.cost_estimator = cost_estimator or FallbackCostEstimator(
+            [
+                ExplainCostEstimator(),
+                BigQueryDryRunCostEstimator(),
+                RowCountCostEstimator(self.row_count_engine),
+            ]
+        )
+
+    _PACKABLE_STATISTIC_TYPES = {
+        ProfileStatisticType.TABLE_ROW_COUNT,
+        ProfileStatisticType.COLUMN_DISTINCT_COUNT,
+        ProfileStatisticType.COLUMN_NULL_COUNT,
+        ProfileStatisticType.COLUMN_NON_NULL_COUNT,
+    }
+
+    # generic SQL of the single-column aggregates, transpiled by sqlglot to each dialect
+    _COLUMN_AGGREGATE_SQL_BY_STATISTIC_TYPE: Dict[ProfileStatisticType, str] = {
+        ProfileStatisticType.COLUMN_MIN: "MIN({column})",
+        ProfileStatisticType.COLUMN_MAX: "MAX({column})",
+        ProfileStatisticType.COLUMN_MEAN: "AVG({column})",
+        ProfileStatisticType.COLUMN_STDDEV: "STDDEV({column})",
+        ProfileStatisticType.COLUMN_NULL_COUNT: "COUNT(*) - COUNT({column})",
+        ProfileStatisticType.COLUMN_NON_NULL_COUNT: "COUNT({column})",
+    }
+
+    _DEFAULT_MAX_SQL_LENGTH = 1_000_000
+    _MAX_SQL_LENGTH_BY_DIALECT: Dict[DataSourceType, int] = {
+        DataSourceType.SNOWFLAKE: 1_000_000,  # 1 MB max statement size
+        DataSourceType.BIGQUERY: 1_024_000,  # 1024K characters max unresolved query length
+        DataSourceType.POSTGRES: 1_000_000,  # no hard limit, keep statements reasonable
+        DataSourceType.SQLITE: 1_000_000,  # SQLITE_MAX_SQL_LENGTH default
+    }
+    _APPROXIMATE_DISTINCT_ERROR_BOUND_BY_DIALECT: Dict[DataSourceType, float] = {
+        # relative error of APPROX_COUNT_DISTINCT (HyperLogLog), as documented by each warehouse
+        DataSourceType.SNOWFLAKE: 0.0162338,
+        DataSourceType.BIGQUERY: 0.0057,  # HLL++ with precision 15: 1.04 / sqrt(2^15)
+    }
+    _MAX_PACK_SIZE_BY_DIALECT: Dict[DataSourceType, int] = {
+        DataSourceType.SQLITE: 500,  # SQLITE_MAX_COMPOUND_SELECT default
+    }
 
     @staticmethod
-    def create_engine(datasource: DataSource):
-        if datasource.source == DataSourceType.SNOWFLAKE:
-            return create_engine(datasource.connection_string)
-        elif datasource.source == DataSourceType.BIGQUERY:
-            assert datasource.extra_config and datasource.extra_config.get(
-                "credentials_path"
-            ), "credentials_path is required for BigQuery"
-            return create_engine(
-                datasource.connection_string,
-                credentials_path=datasource.extra_config["credentials_path"],
-            )
-        else:
-            assert False, f"Unsupported datasource: {datasource.source}"
+    def create_engine(datasource: DataSource, **engine_kwargs: Any) -> Engine:
+        return create_datasource_engine(datasource, **engine_kwargs)
 
     def _do_profile(
         self,
@@ -53,157 +170,470 @@ class SqlAlchemyProfileEngine(ProfileEngine):
     ) -> ProfileResponse:
         response = ProfileResponse()
 
-        split = ModelCollections.group_request_by_statistics_predicate(
-            requests,
-            lambda statistic_spec: statistic_spec.is_table_level(),
-        )
-        table_level_requests = split[True]
-        column_level_requests = split[False]
+        fused_requests = SqlAlchemyProfileEngine._fuse_requests_by_batch(requests)
+        if non_functional_requirements.approximate_distinct_row_count_threshold:
+            fused_requests = self._apply_approximate_distinct_policy(
+                fused_requests, datasource, non_functional_requirements
+            )
 
-        engine = SqlAlchemyProfileEngine.create_engine(datasource)
+        engine = self.engine_registry.get_engine(datasource, pool_size=self.pool_size)
 
-        self._process_table_level_requests(
-            table_level_requests,
-            datasource,
-            engine,
-            non_functional_requirements,
-            response,
+        packable_requests: List[ProfileRequest] = []
+        if self.pack_size and self.pack_size > 1:
+            packable_requests = [
+                request
+                for request in fused_requests
+                if self._is_packable_request(request)
+            ]
+            fused_requests = [
+                request
+                for request in fused_requests
+                if not self._is_packable_request(request)
+            ]
+
+        with self._open_session(engine) as session:
+            if non_functional_requirements.has_cost_budgets():
+                self.cost_estimator.prefetch(
+                    session, datasource, packable_requests + fused_requests
+                )
+            if packable_requests:
+                self._process_packed_requests(
+                    packable_requests,
+                    datasource,
+                    session,
+                    non_functional_requirements,
+                    response,
+                )
+            for request in fused_requests:
+                # pending batches are not run once the call is cancelled
+                raise_if_cancelled()
+                self._process_request(
+                    request, datasource, session, non_functional_requirements, response
+                )
+
+        return response
+
+    def _open_session(self, engine: Engine) -> SqlAlchemyExecutionSession:
+        return SqlAlchemyExecutionSession(
+            engine, report=self.report, engine_name=self.__class__.__name__
         )
-        self._process_column_level_requests(
-            column_level_requests, datasource, engine, response
+
+    @staticmethod
+    def _fuse_requests_by_batch(
+        requests: List[ProfileRequest],
+    ) -> List[ProfileRequest]:
+        """
+        Query fusion stage: merges all the statistics targeting the same batch, table and column-level ones,
+        so every batch is scanned by a single SELECT.
+        """
+        return ModelCollections.join_statistics_by_batch(
+            [
+                ProfileRequest(statistics=list(request.statistics), batch=request.batch)
+                for request in requests
+            ]
         )
 
-        return response
+    def _process_request(
+        self,
+        request: ProfileRequest,
+        datasource: DataSource,
+        session: SqlAlchemyExecutionSession,
+        non_functional_requirements: ProfileNonFunctionalRequirements,
+        response: ProfileResponse,
+    ):
+        try:
+            select_statement, fq_name_mappings, error_bounds = (
+                self._generate_select_query(
+                    request, datasource, response, non_functional_requirements
+                )
+            )
+        except Exception as e:
+            self._fail_request(request, {}, e, response)
+            return
+
+        if select_statement:
+            self._execute_select_statement(
+                request,
+                select_statement,
+                fq_name_mappings,
+                error_bounds,
+                datasource,
+                session,
+                non_functional_requirements,
+                response,
+            )
 
-    def _process_table_level_requests(
+    def _execute_select_statement(
         self,
-        table_level_requests: List[ProfileRequest],
+        request: ProfileRequest,
+        select_statement: Select,
+        fq_name_mappings: Dict[str, str],
+        error_bounds: Dict[str, float],
         datasource: DataSource,
-        engine: Engine,
+        session: SqlAlchemyExecutionSession,
         non_functional_requirements: ProfileNonFunctionalRequirements,
         response: ProfileResponse,
     ):
-        if (
-            non_functional_requirements.expensiveness
-            == ExpensivenessRequirements.UNLIMITED
-        ):
-            for request in table_level_requests:
-                for statistic in request.statistics:
-                    sqlglot_friendly_table_name = (
-                        SqlAlchemyProfileEngine._sqlglotfriendly_table_name(
-                            request.batch.fq_dataset_name
-                        )
-                    )
-                    select_statement = (
-                        Select()
-                        .select("COUNT(*) AS row_count")
-                        .from_(sqlglot_friendly_table_name)
-                    )
-                    logger.info(f"Generic SQL statement: {select_statement}")
-                    dialect_select_statement = select_statement.sql(
-                        dialect=datasource.source.value
-                    )
-                    logger.info(
-                        f"Dialect-specific SQL statement: {dialect_select_statement}"
-                    )
-                    self.report_issue_query()
-                    try:
-                        column, value = next(
-                            self._execute_select(engine, dialect_select_statement)
-                        )
-                        response.data[statistic.fq_name] = SuccessStatisticResult(
-                            value=value
-                        )
-                    except Exception as e:
-                        self.report_unsuccessful_query(
-                            UnsuccessfulStatisticResultType.FAILURE
-                        )
-                        logger.error(f"Error profiling request: {request}")
-                        logger.exception(e)
-                        failed_response_for_request = ModelCollections.failed_response_for_request(
-                            request,
-                            unsuccessful_result_type=UnsuccessfulStatisticResultType.FAILURE,
-                            message=str(e),
-                            exception=e,
-                        )
-                        response.update(failed_response_for_request)
-                    else:
-                        self.report_successful_query()
-        else:
-            for request in table_level_requests:
-                not_matching_expensiveness_response = (
-                    ModelCollections.failed_response_for_request(
-                        request,
-                        UnsuccessfulStatisticResultType.SKIPPED,
-                        "Skipped because of expensiveness",
-                    )
+        try:
+            logger.info(f"Generic SQL statement: {select_statement}")
+            dialect_select_statement = select_statement.sql(
+                dialect=datasource.source.value
+            )
+            logger.info(f"Dialect-specific SQL statement: {dialect_select_statement}")
+            if self._skip_if_over_budget(
+                request,
+                fq_name_mappings,
+                dialect_select_statement,
+                datasource,
+                session,
+                non_functional_requirements,
+                response,
+            ):
+                return
+            self.report_issue_query()
+            for column, value in session.execute_select(dialect_select_statement):
+                fq_name = fq_name_mappings[column]
+                response.data[fq_name] = SuccessStatisticResult(
+                    value=value, error_bound=error_bounds.get(fq_name)
                 )
-                response.update(not_matching_expensiveness_response)
+        except ProfileEngineCancelledError:
+            self.report_unsuccessful_query(UnsuccessfulStatisticResultType.FAILURE)
+            raise
+        except Exception as e:
+            self._fail_request(request, fq_name_mappings, e, response)
+        else:
+            self.report_successful_query()
 
-    def _process_column_level_requests(
+    def _skip_if_over_budget(
         self,
-        column_level_requests: List[ProfileRequest],
+        request: ProfileRequest,
+        fq_name_mappings: Dict[str, str],
+        dialect_sql: str,
         datasource: DataSource,
-        engine: Engine,
+        session: SqlAlchemyExecutionSession,
+        non_functional_requirements: ProfileNonFunctionalRequirements,
+        response: ProfileResponse,
+    ) -> bool:
+        """
+        Estimates the cost of the statement if there are cost budgets, and marks its statistics as SKIPPED if
+        over budget. Returns whether the statement is to be skipped.
+        """
+        if not non_functional_requirements.has_cost_budgets():
+            return False
+        cost = self.cost_estimator.estimate(session, datasource, request, dialect_sql)
+        logger.info(f"Estimated cost: {cost}")
+        if cost is None:
+            logger.warning(
+                f"No cost estimate, budgets not enforced: {request.batch.fq_dataset_name}"
+            )
+            return False
+        unenforced_budgets = cost.unenforced_budgets(non_functional_requirements)
+        if unenforced_budgets:
+            logger.warning(
+                f"No estimated {', '.join(unenforced_budgets)}, budgets not enforced: {request.batch.fq_dataset_name}"
+            )
+        exceeded_budgets = cost.exceeded_budgets(non_functional_requirements)
+        if not exceeded_budgets:
+            return False
+
+        self.report_unsuccessful_query(UnsuccessfulStatisticResultType.SKIPPED)
+        message = f"Skipped because of cost: {', '.join(exceeded_budgets)}"
+        logger.warning(f"{message}: {request}")
+        for fq_name in fq_name_mappings.values():
+            response.data[fq_name] = UnsuccessfulStatisticResult(
+                type=UnsuccessfulStatisticResultType.SKIPPED,
+                message=message,
+            )
+        return True
+
+    def _fail_request(
+        self,
+        request: ProfileRequest,
+        fq_name_mappings: Dict[str, str],
+        e: Exception,
         response: ProfileResponse,
     ):
-        for request in column_level_requests:
+        self.report_unsuccessful_query(UnsuccessfulStatisticResultType.FAILURE)
+        logger.error(f"Error profiling request: {request}")
+        logger.exception(e)
+        # statistics resolved without query (eg: unsupported) keep their result
+        failed_response_for_request = ModelCollections.failed_response_for_request(
+            ProfileRequest(
+                statistics=[
+                    statistic
+                    for statistic in request.statistics
+                    if statistic.fq_name not in response.data
+                    or statistic.fq_name in fq_name_mappings.values()
+                ],
+                batch=request.batch,
+            ),
+            unsuccessful_result_type=UnsuccessfulStatisticResultType.FAILURE,
+            message=str(e),
+            exception=e,
+        )
+        response.update(failed_response_for_request)
+
+    @staticmethod
+    def _is_packable_request(request: ProfileRequest) -> bool:
+        """
+        Only requests whose statistics are all integer-valued can be packed, so UNION ALL never needs to coerce
+        different types in the same column position.
+        """
+        return all(
+            isinstance(statistic, TypedStatistic)
+            and statistic.type in SqlAlchemyProfileEngine._PACKABLE_STATISTIC_TYPES
+            for statistic in request.statistics
+        )
+
+    def _process_packed_requests(
+        self,
+        requests: List[ProfileRequest],
+        datasource: DataSource,
+        session: SqlAlchemyExecutionSession,
+        non_functional_requirements: ProfileNonFunctionalRequirements,
+        response: ProfileResponse,
+    ):
+        members: List[_PackMember] = []
+        for request in requests:
             try:
-                select_statement, fq_name_mappings = self._generate_select_query(
-                    request, response
-                )
-                if select_statement:
-                    logger.info(f"Generic SQL statement: {select_statement}")
-                    dialect_select_statement = select_statement.sql(
-                        dialect=datasource.source.value
-                    )
-                    logger.info(
-                        f"Dialect-specific SQL statement: {dialect_select_statement}"
+                select_statement, fq_name_mappings, error_bounds = (
+                    self._generate_select_query(
+                        request, datasource, response, non_functional_requirements
                     )
-                    self.report_issue_query()
-                    for column, value in self._execute_select(
-                        engine, dialect_select_statement
-                    ):
-                        fq_name = fq_name_mappings[column]
-                        response.data[fq_name] = SuccessStatisticResult(value=value)
+                )
             except Exception as e:
-                self.report_unsuccessful_query(UnsuccessfulStatisticResultType.FAILURE)
-                logger.error(f"Error profiling request: {request}")
-                logger.exception(e)
-                failed_response_for_request = ModelCollections.failed_response_for_request(
-                    request,
-                    unsuccessful_result_type=UnsuccessfulStatisticResultType.FAILURE,
-                    message=str(e),
-                    exception=e,
+                self._fail_request(request, {}, e, response)
+                continue
+            if select_statement:
+                members.append(
+                    _PackMember(
+                        request=request,
+                        select_statement=select_statement,
+                        fq_name_mappings=fq_name_mappings,
+                        error_bounds=error_bounds,
+                        dialect_sql=SqlAlchemyProfileEngine._pack_member_sql(
+                            select_statement, 0, datasource
+                        ),
+                    )
+                )
+
+        if non_functional_requirements.has_cost_budgets():
+            # estimated one by one, so a pack never hides an expensive member
+            members = [
+                member
+                for member in members
+                if not self._skip_if_over_budget(
+                    member.request,
+                    member.fq_name_mappings,
+                    member.select_statement.sql(dialect=datasource.source.value),
+                    datasource,
+                    session,
+                    non_functional_requirements,
+                    response,
+                )
+            ]
+            # already estimated
+            non_functional_requirements = dataclasses.replace(
+                non_functional_requirements,
+                max_estimated_bytes=None,
+                max_estimated_rows=None,
+                max_estimated_seconds=None,
+            )
+
+        for pack in self._pack_members(members, datasource):
+            raise_if_cancelled()
+            if len(pack) == 1:
+                self._execute_select_statement(
+                    pack[0].request,
+                    pack[0].select_statement,
+                    pack[0].fq_name_mappings,
+                    pack[0].error_bounds,
+                    datasource,
+                    session,
+                    non_functional_requirements,
+                    response,
                 )
-                response.update(failed_response_for_request)
             else:
-                self.report_successful_query()
+                self._execute_pack(
+                    pack, datasource, session, non_functional_requirements, response
+                )
+
+    def _pack_members(
+        self, members: List[_PackMember], datasource: DataSource
+    ) -> List[List[_PackMember]]:
+        """
+        Greedily packs members up to the pack size and the max SQL length of the dialect.
+        Members are sorted by width, so members in the same pack need little NULL padding.
+        """
+        pack_size = min(
+            self.pack_size or 1,
+            SqlAlchemyProfileEngine._MAX_PACK_SIZE_BY_DIALECT.get(
+                datasource.source, self.pack_size or 1
+            ),
+        )
+        max_sql_length = (
+            self.max_sql_length
+            or SqlAlchemyProfileEngine._MAX_SQL_LENGTH_BY_DIALECT.get(
+                datasource.source, SqlAlchemyProfileEngine._DEFAULT_MAX_SQL_LENGTH
+            )
+        )
+
+        packs: List[List[_PackMember]] = []
+        pack: List[_PackMember] = []
+        for member in sorted(members, key=lambda m: m.width):
+            if pack and (
+                len(pack) >= pack_size
+                or _PackMember.estimated_pack_length(pack + [member]) > max_sql_length
+            ):
+                packs.append(pack)
+                pack = []
+            pack.append(member)
+        if pack:
+            packs.append(pack)
+        return packs
+
+    def _execute_pack(
+        self,
+        pack: List[_PackMember],
+        datasource: DataSource,
+        session: SqlAlchemyExecutionSession,
+        non_functional_requirements: ProfileNonFunctionalRequirements,
+        response: ProfileResponse,
+    ):
+        width = max(member.width for member in pack)
+        packed_statement = " UNION ALL ".join(
+            SqlAlchemyProfileEngine._pack_member_sql(
+                member.select_statement, index, datasource, width
+            )
+            for index, member in enumerate(pack)
+        )
+        logger.info(f"Packed SQL statement for {len(pack)} batches: {packed_statement}")
+        self.report_issue_query()
+        try:
+            rows = session.execute(packed_statement)
+            values_by_member = {row[0]: row[1:] for row in rows}
+            assert len(values_by_member) == len(
+                pack
+            ), f"Expected {len(pack)} rows in packed result, got {len(values_by_member)}"
+        except ProfileEngineCancelledError:
+            self.report_unsuccessful_query(UnsuccessfulStatisticResultType.FAILURE)
+            raise
+        except Exception as e:
+            self.report_unsuccessful_query(UnsuccessfulStatisticResultType.FAILURE)
+            logger.warning(
+                f"Packed statement failed ({e}), falling back to one statement per batch"
+            )
+            for member in pack:
+                self._execute_select_statement(
+                    member.request,
+                    member.select_statement,
+                    member.fq_name_mappings,
+                    member.error_bounds,
+                    datasource,
+                    session,
+                    non_functional_requirements,
+                    response,
+                )
+        else:
+            self.report_successful_query()
+            for index, member in enumerate(pack):
+                for fq_name, value in zip(
+                    member.slot_fq_names, values_by_member[index]
+                ):
+                    response.data[fq_name] = SuccessStatisticResult(
+                        value=value, error_bound=member.error_bounds.get(fq_name)
+                    )
+
+    @staticmethod
+    def _pack_member_sql(
+        select_statement: Select,
+        index: int,
+        datasource: DataSource,
+        width: Optional[int] = None,
+    ) -> str:
+        """
+        Rewrites the SELECT of a pack member with positional slots: the batch discriminator followed by the values,
+        padded with NULLs up to the width of the pack.
+        """
+        expressions = [
+            exp.alias_(exp.Literal.number(index), "profile_pack_batch"),
+        ] + [
+            exp.alias_(expression.this.copy(), f"profile_pack_value_{slot}")
+            for slot, expression in enumerate(select_statement.expressions)
+        ]
+        for slot in range(len(select_statement.expressions), width or 0):
+            expressions.append(exp.alias_(exp.Null(), f"profile_pack_value_{slot}"))
+        member_statement = select_statement.copy()
+        member_statement.set("expressions", expressions)
+        return member_statement.sql(dialect=datasource.source.value)
 
     def _generate_select_query(
-        self, request: ProfileRequest, response: ProfileResponse
-    ) -> Tuple[Optional[Select], Dict[str, str]]:
+        self,
+        request: ProfileRequest,
+        datasource: DataSource,
+        response: ProfileResponse,
+        non_functional_requirements: ProfileNonFunctionalRequirements = ProfileNonFunctionalRequirements(),
+    ) -> Tuple[Optional[Select], Dict[str, str], Dict[str, float]]:
         """
         Generate a SELECT query based on the profile request.
 
-        If the request contains multiple statistics, the query will be a single SELECT statement.
+        If the request contains multiple statistics, the query will be a single SELECT statement, table-level
+        statistics (eg: COUNT(*)) being just other projected expressions. So all the statistics of a batch, for all
+        its columns, are calculated in a single scan.
         If some statistic is not supported, the corresponding UnsuccessfulStatisticResult will be added to the response.
+        Same for table-level statistics when not matching the expensiveness requirements.
+        Batches with partitions are restricted to them with a WHERE clause.
+
+        Besides the SELECT, returns the mapping from projected column to fq_name, and the error bound of the
+        statistics computed approximately.
 
         If no SELECT query is needed (e.g. all unsupported), None is returned.
         """
         fq_name_mappings: Dict[str, str] = {}
+        error_bounds: Dict[str, float] = {}
         select_statement = Select()
         for statistic in request.statistics:
             fq_name = statistic.fq_name
             sqlfriendly_fq_name = SqlAlchemyProfileEngine._sqlfriendly_column_name(
                 fq_name
             )
-            fq_name_mappings[sqlfriendly_fq_name] = fq_name
 
+            column: Optional[str] = None
             if isinstance(statistic, TypedStatistic):
                 if statistic.type == ProfileStatisticType.COLUMN_DISTINCT_COUNT:
-                    column = f"COUNT(DISTINCT {','.join([col for col in statistic.columns])}) AS {sqlfriendly_fq_name}"
-                    select_statement = select_statement.select(column, append=True)
+                    error_bound = (
+                        SqlAlchemyProfileEngine._approximate_distinct_error_bound(
+                            statistic, datasource
+                        )
+                    )
+                    if error_bound is not None:
+                        # generic APPROX_DISTINCT, transpiled eg to APPROX_COUNT_DISTINCT
+                        column = f"APPROX_DISTINCT({statistic.columns[0]}) AS {sqlfriendly_fq_name}"
+                        error_bounds[fq_name] = error_bound
+                    else:
+                        column = f"COUNT(DISTINCT {','.join([col for col in statistic.columns])}) AS {sqlfriendly_fq_name}"
+                elif (
+                    statistic.type
+                    in SqlAlchemyProfileEngine._COLUMN_AGGREGATE_SQL_BY_STATISTIC_TYPE
+                    and len(statistic.columns) == 1
+                ):
+                    aggregate_sql = (
+                        SqlAlchemyProfileEngine._COLUMN_AGGREGATE_SQL_BY_STATISTIC_TYPE[
+                            statistic.type
+                        ].format(column=statistic.columns[0])
+                    )
+                    column = f"{aggregate_sql} AS {sqlfriendly_fq_name}"
+                elif statistic.type == ProfileStatisticType.TABLE_ROW_COUNT:
+                    if (
+                        non_functional_requirements.expensiveness
+                        == ExpensivenessRequirements.UNLIMITED
+                    ):
+                        column = f"COUNT(*) AS {sqlfriendly_fq_name}"
+                    else:
+                        response.data[fq_name] = UnsuccessfulStatisticResult(
+                            type=UnsuccessfulStatisticResultType.SKIPPED,
+                            message="Skipped because of expensiveness",
+                        )
                 else:
                     logger.warning(f"Unsupported statistic type: {statistic.type}")
                     response.data[fq_name] = UnsuccessfulStatisticResult(
@@ -212,7 +642,6 @@ class SqlAlchemyProfileEngine(ProfileEngine):
                     )
             elif isinstance(statistic, CustomStatistic):
                 column = f"{statistic.sql} AS {sqlfriendly_fq_name}"
-                select_statement = select_statement.select(column, append=True)
             else:
                 logger.warning(f"Unsupported statistic spec: {statistic}")
                 response.data[fq_name] = UnsuccessfulStatisticResult(
@@ -220,6 +649,10 @@ class SqlAlchemyProfileEngine(ProfileEngine):
                     message=f"Unsupported statistic spec: {statistic}",
                 )
 
+            if column:
+                fq_name_mappings[sqlfriendly_fq_name] = fq_name
+                select_statement = select_statement.select(column, append=True)
+
         if len(select_statement.expressions) > 0:
             sqlglot_friendly_table_name = (
                 SqlAlchemyProfileEngine._sqlglotfriendly_table_name(
@@ -233,21 +666,153 @@ class SqlAlchemyProfileEngine(ProfileEngine):
                 if request.batch.sample
                 else select_statement.from_(sqlglot_friendly_table_name)
             )
+            if request.batch.partitions:
+                select_statement = select_statement.where(
+                    SqlAlchemyProfileEngine._partitions_condition(
+                        request.batch.partitions
+                    )
+                )
 
-            return select_statement, fq_name_mappings
+            return select_statement, fq_name_mappings, error_bounds
+
+        return None, fq_name_mappings, error_bounds
+
+    @staticmethod
+    def _approximate_distinct_error_bound(
+        statistic: TypedStatistic, datasource: DataSource
+    ) -> Optional[float]:
+        """
+        Error bound if the distinct count is to be computed approximately, None if computed exactly:
+        not requested, multiple columns or dialect with no approximate aggregate.
+        """
+        if not statistic.approximate or len(statistic.columns) != 1:
+            return None
+        return SqlAlchemyProfileEngine._APPROXIMATE_DISTINCT_ERROR_BOUND_BY_DIALECT.get(
+            datasource.source
+        )
 
-        return None, fq_name_mappings
+    def _apply_approximate_distinct_policy(
+        self,
+        requests: List[ProfileRequest],
+        datasource: DataSource,
+        non_functional_requirements: ProfileNonFunctionalRequirements,
+    ) -> List[ProfileRequest]:
+        """
+        Downgrades exact distinct counts to approximate ones on batches with more rows than the threshold in the
+        non-functional requirements. Row counts are taken from the catalog, so no data is scanned; batches with no
+        row count in the catalog are left as they are.
+        """
+        threshold = non_functional_requirements.approximate_distinct_row_count_threshold
+        candidate_requests = [
+            request
+            for request in requests
+            if any(
+                SqlAlchemyProfileEngine._is_exact_distinct(statistic)
+                for statistic in request.statistics
+            )
+        ]
+        if not threshold or not candidate_requests:
+            return requests
 
-    def _execute_select(self, engine, select_query) -> Iterator[Tuple[str, Any]]:
-        with engine.connect() as conn:
-            result = conn.execute(text(select_query))
-            # TODO: what if there are multiple rows? raise error?
-            row = result.fetchone()
-            logger.info(row)
-            if row:
-                for column, value in zip(row._fields, row._data):
-                    column = column.strip("`")
-                    yield column, value
+        row_count_requests = [
+            ProfileRequest(
+                statistics=[
+                    TypedStatistic(
+                        fq_name=str(index), type=ProfileStatisticType.TABLE_ROW_COUNT
+                    )
+                ],
+                batch=request.batch,
+            )
+            for index, request in enumerate(candidate_requests)
+        ]
+        row_count_response = self.row_count_engine._do_profile(
+            datasource,
+            row_count_requests,
+            ProfileNonFunctionalRequirements(
+                expensiveness=ExpensivenessRequirements.CHEAP
+            ),
+        )
+        large_batches = [
+            candidate_requests[int(index)].batch
+            for index, result in row_count_response.data.items()
+            if isinstance(result, SuccessStatisticResult)
+            and result.value is not None
+            and result.value > threshold
+        ]
+        logger.info(
+            f"Approximate distinct counts on {len(large_batches)} batches above {threshold} rows"
+        )
+
+        return [
+            (
+                ProfileRequest(
+                    statistics=[
+                        (
+                            dataclasses.replace(statistic, approximate=True)
+                            if SqlAlchemyProfileEngine._is_exact_distinct(statistic)
+                            else statistic
+                        )
+                        for statistic in request.statistics
+                    ],
+                    batch=request.batch,
+                )
+                if request.batch in large_batches
+                else request
+            )
+            for request in requests
+        ]
+
+    @staticmethod
+    def _is_exact_distinct(statistic: StatisticSpec) -> bool:
+        return (
+            isinstance(statistic, TypedStatistic)
+            and statistic.type == ProfileStatisticType.COLUMN_DISTINCT_COUNT
+            and not statistic.approximate
+        )
+
+    @staticmethod
+    def _partitions_condition(partitions: PartitionsSpec) -> exp.Condition:
+        """
+        Condition restricting the scan to the given partitions: values of a column are OR-ed (IN), and columns are
+        AND-ed. Values are literals, so they are quoted by sqlglot rather than interpolated.
+        """
+        return exp.and_(
+            *[
+                exp.column(partition.column).isin(
+                    *[
+                        SqlAlchemyProfileEngine._partition_value_literal(value)
+                        for value in partition.values
+                    ]
+                )
+                for partition in partitions.columns
+            ]
+        )
+
+    @staticmethod
+    def _partition_value_literal(value: PartitionValue) -> exp.Expression:
+        """
+        Literal of the type of the value, so it compares with partition columns of that type (eg: BigQuery doesn't
+        coerce strings to INT64 or DATE). Naive datetimes are DATETIME, aware ones TIMESTAMP WITH TIME ZONE.
+        """
+        # bool before int, and datetime before date, as they are subclasses
+        if isinstance(value, bool):
+            return exp.Boolean(this=value)
+        if isinstance(value, (int, float)):
+            return exp.Literal.number(value)
+        if isinstance(value, datetime):
+            return exp.cast(
+                exp.Literal.string(value.isoformat()),
+                (
+                    exp.DataType.Type.DATETIME
+                    if value.tzinfo is None
+                    else exp.DataType.Type.TIMESTAMPTZ
+                ),
+            )
+        if isinstance(value, date):
+            return exp.cast(
+                exp.Literal.string(value.isoformat()), exp.DataType.Type.DATE
+            )
+        return exp.Literal.string(str(value))
 
     @staticmethod
     def _sqlglotfriendly_table_name(table_name: str) -> str:
@@ -0,0 +1,85 @@
+"""
+Micro-benchmark of the bookkeeping of SequentialFallbackProfileEngine: profiles N statistics with a chain of three
+engines, where every engine fails a fraction of the statistics it receives, and prints the time per statistic,
+which should stay flat as N grows.
+
+Run with: python -m tests.core.benchmark_fallback [max number of statistics]
+"""
+
+import sys
+import time
+from typing import List
+
+from profile_v2.core.api import ProfileEngine
+from profile_v2.core.api_utils import SequentialFallbackProfileEngine
+from profile_v2.core.model import (BatchSpec, CustomStatistic, DataSource,
+                                   DataSourceType,
+                                   ProfileNonFunctionalRequirements,
+                                   ProfileRequest, ProfileResponse,
+                                   SuccessStatisticResult,
+                                   UnsuccessfulStatisticResult,
+                                   UnsuccessfulStatisticResultType)
+
+
+class FailingEveryNthEngine(ProfileEngine):
+    """Fails one in `n` of the statistics it receives, succeeds the others."""
+
+    def __init__(self, n: int):
+        self.n = n
+
+    def _do_profile(
+        self,
+        datasource: DataSource,
+        requests: List[ProfileRequest],
+        non_functional_requirements: ProfileNonFunctionalRequirements = ProfileNonFunctionalRequirements(),
+    ) -> ProfileResponse:
+        response = ProfileResponse()
+        position = 0
+        for request in requests:
+            for statistic in request.statistics:
+                response.data[statistic.fq_name] = (
+                    UnsuccessfulStatisticResult(
+                        type=UnsuccessfulStatisticResultType.UNSUPPORTED
+                    )
+                    if position % self.n == 0
+                    else SuccessStatisticResult(value=position)
+                )
+                position += 1
+        return response
+
+
+def run(num_statistics: int, statistics_per_request: int = 10) -> float:
+    requests = [
+        ProfileRequest(
+            statistics=[
+                CustomStatistic(fq_name=f"stat_{i}_{j}", sql="COUNT(*)")
+                for j in range(statistics_per_request)
+            ],
+            batch=BatchSpec(fq_dataset_name=f"db.schema.table_{i}"),
+        )
+        for i in range(num_statistics // statistics_per_request)
+    ]
+    engine = SequentialFallbackProfileEngine(
+        [FailingEveryNthEngine(10), FailingEveryNthEngine(2), FailingEveryNthEngine(1)]
+    )
+    datasource = DataSource(
+        source=DataSourceType.SNOWFLAKE, connection_string="connection_string"
+    )
+
+    start = time.perf_counter()
+    response = engine._do_profile(datasource, requests)
+    elapsed_seconds = time.perf_counter() - start
+    assert len(response.data) == num_statistics
+    return elapsed_seconds
+
+
+if __name__ == "__main__":
+    max_statistics = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    num_statistics = 10_000
+    while num_statistics <= max_statistics:
+        elapsed_seconds = run(num_statistics)
+        print(
+            f"{num_statistics:>10} statistics: {elapsed_seconds:8.3f}s, "
+            f"{elapsed_seconds / num_statistics * 1e6:6.2f}us per statistic"
+        )
+        num_statistics *= 10
@@ -1,10 +1,15 @@
+import os
+import tempfile
+import time
 import unittest
+from unittest.mock import patch
 
 from profile_v2.core.bigquery.bigquery import (
     BigQueryInformationSchemaProfileEngine, BigQueryProfileEngine,
-    BigQueryUtils)
+    BigQueryTablesMetadataCache, BigQueryUtils)
 from profile_v2.core.model import (BatchSpec, CustomStatistic, DataSource,
-                                   DataSourceType, ProfileRequest,
+                                   DataSourceType, PartitionSpec,
+                                   PartitionsSpec, ProfileRequest,
                                    ProfileResponse, ProfileStatisticType,
                                    SuccessStatisticResult, TypedStatistic,
                                    UnsuccessfulStatisticResult,
@@ -14,7 +19,7 @@ from tests.core.common import (BIGQUERY_CONNECTION_STRING,
                                BIGQUERY_CREDENTIALS_PATH,
                                BIGQUERY_DATASET_CUSTOMER_DEMO,
                                BIGQUERY_DATASET_DEPLOY_TEST_1K,
-                               BIGQUERY_PROJECT)
+                               BIGQUERY_PROJECT, create_sqlite_datasource)
 
 
 class TestBigQueryUtils(unittest.TestCase):
@@ -328,6 +333,120 @@ class TestBigQueryInformationSchemaProfileEngine(unittest.TestCase):
         )
 
 
+class TestBigQueryInformationSchemaProfileEngineWithSqlite(unittest.TestCase):
+    """Uses a SQLite table named __TABLES__ as stand-in for the BigQuery metadata table."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.datasource = create_sqlite_datasource(
+            os.path.join(self.tmpdir.name, "db.sqlite"),
+            {
+                "__TABLES__": (
+                    ["table_id", "row_count"],
+                    [("table1", 10), ("table2", 20), ("table3", 30)],
+                )
+            },
+        )
+        self.report = ProfileCoreReport()
+        self.cache = BigQueryTablesMetadataCache(ttl_seconds=60)
+        self.engine = BigQueryInformationSchemaProfileEngine(
+            report=self.report, tables_metadata_cache=self.cache
+        )
+
+    def tearDown(self):
+        self.engine.engine_registry.dispose(self.datasource)
+        self.tmpdir.cleanup()
+
+    def _row_count_requests(self, *tables):
+        return [
+            ProfileRequest(
+                statistics=[
+                    TypedStatistic(
+                        fq_name=f"project.main.{table}.row_count",
+                        type=ProfileStatisticType.TABLE_ROW_COUNT,
+                    ),
+                ],
+                batch=BatchSpec(fq_dataset_name=f"project.main.{table}"),
+            )
+            for table in tables
+        ]
+
+    def test_only_requested_tables_are_fetched_and_cached(self):
+        with patch.object(
+            self.engine, "_fetch_row_counts", wraps=self.engine._fetch_row_counts
+        ) as fetch_row_counts:
+            response = self.engine.profile(
+                self.datasource, self._row_count_requests("table1", "table2")
+            )
+            assert response == ProfileResponse(
+                data={
+                    "project.main.table1.row_count": SuccessStatisticResult(value=10),
+                    "project.main.table2.row_count": SuccessStatisticResult(value=20),
+                }
+            )
+            assert fetch_row_counts.call_args.args[2] == ["table1", "table2"]
+
+            # table1 is cached, only table3 is fetched
+            response = self.engine.profile(
+                self.datasource, self._row_count_requests("table1", "table3")
+            )
+            assert response == ProfileResponse(
+                data={
+                    "project.main.table1.row_count": SuccessStatisticResult(value=10),
+                    "project.main.table3.row_count": SuccessStatisticResult(value=30),
+                }
+            )
+            assert fetch_row_counts.call_args.args[2] == ["table3"]
+
+            # everything cached, no query at all
+            self.engine.profile(
+                self.datasource, self._row_count_requests("table2", "table3")
+            )
+            assert fetch_row_counts.call_count == 2
+
+        assert (
+            self.report.num_issued_queries_by_engine[
+                "BigQueryInformationSchemaProfileEngine"
+            ]
+            == 2
+        )
+
+    def test_non_existing_table_fails_only_its_statistics(self):
+        response = self.engine.profile(
+            self.datasource, self._row_count_requests("table1", "non_existing")
+        )
+        assert response.data["project.main.table1.row_count"] == SuccessStatisticResult(
+            value=10
+        )
+        assert (
+            response.data["project.main.non_existing.row_count"].type
+            == UnsuccessfulStatisticResultType.FAILURE
+        )
+
+    def test_partitioned_batch_unsupported(self):
+        requests = self._row_count_requests("table1")
+        requests[0].batch.partitions = PartitionsSpec(
+            columns=[PartitionSpec(column="day", values=["2024-01-01"])]
+        )
+
+        response = self.engine.profile(self.datasource, requests)
+
+        assert (
+            response.data["project.main.table1.row_count"].type
+            == UnsuccessfulStatisticResultType.UNSUPPORTED
+        )
+
+    def test_cache_entries_expire(self):
+        cache = BigQueryTablesMetadataCache(ttl_seconds=0.05)
+        cache.put(("k",), "dataset", {"table1": 1})
+        assert cache.get(("k",), "dataset", ["table1", "table2"]) == (
+            {"table1": 1},
+            ["table2"],
+        )
+        time.sleep(0.1)
+        assert cache.get(("k",), "dataset", ["table1"]) == ({}, ["table1"])
+
+
 class TestBigQueryProfileEngine(unittest.TestCase):
 
     _datasource = DataSource(
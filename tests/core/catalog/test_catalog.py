@@ -0,0 +1,281 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import Mock
+
+from profile_v2.core.api import ProfileEngineValueError
+from profile_v2.core.api_utils import SequentialFallbackProfileEngine
+from profile_v2.core.catalog.catalog import (CatalogSchema,
+                                             CatalogStatisticsProfileEngine)
+from profile_v2.core.model import (BatchSpec, CustomStatistic,
+                                   ExpensivenessRequirements,
+                                   ProfileNonFunctionalRequirements,
+                                   ProfileRequest, ProfileResponse,
+                                   ProfileStatisticType, SampleSpec,
+                                   SuccessStatisticResult, TypedStatistic,
+                                   UnsuccessfulStatisticResultType)
+from profile_v2.core.report import ProfileCoreReport
+from profile_v2.core.sqlalchemy.session import SqlAlchemyExecutionSession
+from profile_v2.core.sqlalchemy.sqlalchemy import SqlAlchemyProfileEngine
+from tests.core.common import create_sqlite_datasource
+
+
+class TestCatalogSchema(unittest.TestCase):
+
+    def test_from_batch_spec(self):
+        assert CatalogSchema.from_batch_spec(
+            BatchSpec(fq_dataset_name="db.schema.table")
+        ) == CatalogSchema(database="db", schema="schema")
+        assert CatalogSchema.from_batch_spec(
+            BatchSpec(fq_dataset_name="schema.table")
+        ) == CatalogSchema(database=None, schema="schema")
+
+
+class TestCatalogStatisticsProfileEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmpdir.name, "db.sqlite")
+        self.datasource = create_sqlite_datasource(
+            path,
+            {
+                "t1": (["a", "b"], [(i % 7, i) for i in range(70)]),
+                "t2": (["c"], [(1,), (2,)]),
+                "not_analyzed": (["d"], [(1,)]),
+            },
+        )
+        with sqlite3.connect(path) as conn:
+            conn.execute("CREATE INDEX t1_a ON t1 (a)")
+            conn.execute("ANALYZE t1")
+            conn.execute("ANALYZE t2")
+        conn.close()
+        self.report = ProfileCoreReport()
+        self.engine = CatalogStatisticsProfileEngine(report=self.report)
+
+    def tearDown(self):
+        self.engine.engine_registry.dispose(self.datasource)
+        self.tmpdir.cleanup()
+
+    def test_sqlite_catalog_statistics(self):
+        requests = [
+            ProfileRequest(
+                statistics=[
+                    TypedStatistic(
+                        fq_name="t1.row_count",
+                        type=ProfileStatisticType.TABLE_ROW_COUNT,
+                    ),
+                    TypedStatistic(
+                        fq_name="t1.a.distinct_count",
+                        type=ProfileStatisticType.COLUMN_DISTINCT_COUNT,
+                        columns=["a"],
+                        approximate=True,
+                    ),
+                    TypedStatistic(
+                        fq_name="t1.a.exact_distinct_count",
+                        type=ProfileStatisticType.COLUMN_DISTINCT_COUNT,
+                        columns=["a"],
+                    ),
+                    TypedStatistic(
+                        fq_name="t1.b.distinct_count",
+                        type=ProfileStatisticType.COLUMN_DISTINCT_COUNT,
+                        columns=["b"],
+                        approximate=True,
+                    ),
+                ],
+                batch=BatchSpec(fq_dataset_name="main.t1"),
+            ),
+            ProfileRequest(
+                statistics=[
+                    TypedStatistic(
+                        fq_name="t2.row_count",
+                        type=ProfileStatisticType.TABLE_ROW_COUNT,
+                    ),
+                    CustomStatistic(fq_name="t2.custom", sql="MAX(c)"),
+                ],
+                batch=BatchSpec(fq_dataset_name="main.t2"),
+            ),
+            ProfileRequest(
+                statistics=[
+                    TypedStatistic(
+                        fq_name="not_analyzed.row_count",
+                        type=ProfileStatisticType.TABLE_ROW_COUNT,
+                    ),
+                ],
+                batch=BatchSpec(fq_dataset_name="main.not_analyzed"),
+            ),
+            ProfileRequest(
+                statistics=[
+                    TypedStatistic(
+                        fq_name="t2.sample.row_count",
+                        type=ProfileStatisticType.TABLE_ROW_COUNT,
+                    ),
+                ],
+                batch=BatchSpec(fq_dataset_name="main.t2", sample=SampleSpec(size=1)),
+            ),
+        ]
+
+        response = self.engine.profile(
+            self.datasource,
+            requests,
+            ProfileNonFunctionalRequirements(
+                expensiveness=ExpensivenessRequirements.CHEAP
+            ),
+        )
+
+        # row counts as of the last ANALYZE
+        assert response.data["t1.row_count"] == SuccessStatisticResult(
+            value=70, error_bound=0.1
+        )
+        assert response.data["t1.a.distinct_count"] == SuccessStatisticResult(
+            value=7, error_bound=0.1
+        )
+        assert response.data["t2.row_count"] == SuccessStatisticResult(
+            value=2, error_bound=0.1
+        )
+        for fq_name in [
+            "t1.a.exact_distinct_count",  # catalog distinct counts are estimates
+            "t1.b.distinct_count",  # no index on b
+            "t2.custom",
+            "not_analyzed.row_count",
+            "t2.sample.row_count",
+        ]:
+            assert (
+                response.data[fq_name].type
+                == UnsuccessfulStatisticResultType.UNSUPPORTED
+            ), fq_name
+        # one bulk query for the whole schema
+        assert (
+            self.report.num_issued_queries_by_engine["CatalogStatisticsProfileEngine"]
+            == 1
+        )
+
+    def test_first_engine_in_fallback_chain(self):
+        requests = [
+            ProfileRequest(
+                statistics=[
+                    TypedStatistic(
+                        fq_name="t2.row_count",
+                        type=ProfileStatisticType.TABLE_ROW_COUNT,
+                    ),
+                    CustomStatistic(fq_name="t2.c.max", sql="MAX(c)"),
+                ],
+                batch=BatchSpec(fq_dataset_name="main.t2"),
+            ),
+            ProfileRequest(
+                statistics=[
+                    TypedStatistic(
+                        fq_name="not_analyzed.row_count",
+                        type=ProfileStatisticType.TABLE_ROW_COUNT,
+                    ),
+                ],
+                batch=BatchSpec(fq_dataset_name="main.not_analyzed"),
+            ),
+        ]
+        fallback_engine = SequentialFallbackProfileEngine(
+            [self.engine, SqlAlchemyProfileEngine(report=self.report)]
+        )
+
+        response = fallback_engine.profile(
+            self.datasource,
+            requests,
+            ProfileNonFunctionalRequirements(
+                expensiveness=ExpensivenessRequirements.CHEAP
+            ),
+        )
+
+        assert response.data["t2.row_count"] == SuccessStatisticResult(
+            value=2, error_bound=0.1
+        )
+        assert response.data["t2.c.max"] == SuccessStatisticResult(value=2)
+        assert (
+            response.data["not_analyzed.row_count"].type
+            == UnsuccessfulStatisticResultType.SKIPPED
+        )
+
+    def test_estimated_row_counts_only_if_approximate_or_cheap(self):
+        requests = [
+            ProfileRequest(
+                statistics=[
+                    TypedStatistic(
+                        fq_name="t1.row_count",
+                        type=ProfileStatisticType.TABLE_ROW_COUNT,
+                    ),
+                    TypedStatistic(
+                        fq_name="t1.approximate_row_count",
+                        type=ProfileStatisticType.TABLE_ROW_COUNT,
+                        approximate=True,
+                    ),
+                ],
+                batch=BatchSpec(fq_dataset_name="main.t1"),
+            )
+        ]
+
+        response = self.engine.profile(self.datasource, requests)
+
+        assert (
+            response.data["t1.row_count"].type
+            == UnsuccessfulStatisticResultType.UNSUPPORTED
+        )
+        assert response.data["t1.approximate_row_count"] == SuccessStatisticResult(
+            value=70, error_bound=0.1
+        )
+
+    def test_invalid_sqlite_schema(self):
+        session = Mock(spec=SqlAlchemyExecutionSession)
+
+        with self.assertRaises(ProfileEngineValueError):
+            self.engine._fetch_sqlite_statistics(
+                session, CatalogSchema(database=None, schema="main'; --"), ["t1"]
+            )
+        session.execute.assert_not_called()
+
+    def test_postgres_distinct_count(self):
+        assert CatalogStatisticsProfileEngine._postgres_distinct_count(42, 1000) == 42
+        assert (
+            CatalogStatisticsProfileEngine._postgres_distinct_count(-0.5, 1000) == 500
+        )
+        assert CatalogStatisticsProfileEngine._postgres_distinct_count(-1, 1000) == 1000
+
+    def test_postgres_statistics(self):
+        session = Mock(spec=SqlAlchemyExecutionSession)
+        session.execute.return_value = [
+            ("t1", 1000.0, "a", 42.0),
+            ("t1", 1000.0, "b", -0.5),
+            ("t1", 1000.0, "c", None),
+            ("t2", 10.0, None, None),
+            ("not_analyzed", -1.0, None, None),
+        ]
+
+        catalog_statistics = self.engine._fetch_postgres_statistics(
+            session,
+            CatalogSchema(database=None, schema="public"),
+            ["not_analyzed", "t1", "t2"],
+        )
+
+        assert catalog_statistics.row_counts == {"t1": 1000, "t2": 10}
+        assert catalog_statistics.distinct_counts == {
+            ("t1", "a"): 42,
+            ("t1", "b"): 500,
+        }
+        parameters = session.execute.call_args[0][1]
+        assert parameters == {
+            "schema": "public",
+            "tables": ["not_analyzed", "t1", "t2"],
+        }
+
+    def test_snowflake_statistics_case_insensitive(self):
+        session = Mock(spec=SqlAlchemyExecutionSession)
+        # unquoted identifiers are stored uppercase
+        session.execute.return_value = [("T1", 70), ("Quoted", 2), ("T3", None)]
+
+        catalog_statistics = self.engine._fetch_snowflake_statistics(
+            session,
+            CatalogSchema(database="db", schema="schema"),
+            ["t1", "Quoted", "t3"],
+        )
+
+        assert catalog_statistics.row_counts == {"t1": 70, "Quoted": 2}
+        query, parameters = session.execute.call_args[0]
+        assert "db.INFORMATION_SCHEMA.TABLES" in str(query)
+        assert parameters == {"schema": "SCHEMA", "tables": ["T1", "QUOTED", "T3"]}
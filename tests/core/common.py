@@ -1,13 +1,16 @@
 import logging
 import os
+import sqlite3
 import threading
 import time
 import urllib.parse
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Engine, event
 
 from profile_v2.core.api import ProfileEngine
-from profile_v2.core.model import (DataSource,
+from profile_v2.core.model import (DataSource, DataSourceType,
                                    ProfileNonFunctionalRequirements,
                                    ProfileRequest, ProfileResponse,
                                    SuccessStatisticResult)
@@ -31,9 +34,45 @@ BIGQUERY_DATASET_DEPLOY_TEST_1K = "deploy_test_1k"
 BIGQUERY_CONNECTION_STRING = f"bigquery://{BIGQUERY_PROJECT}"
 
 
+def create_sqlite_datasource(
+    path: str,
+    tables: Dict[str, Tuple[Sequence[str], Sequence[Tuple[Any, ...]]]],
+) -> DataSource:
+    """
+    Creates a SQLite database file with the given tables ({name: (columns, rows)}) and returns its datasource.
+    Tables are in the "main" schema, so their fq_dataset_name is "main.<name>".
+    """
+    with sqlite3.connect(path) as conn:
+        for table, (columns, rows) in tables.items():
+            conn.execute(f"CREATE TABLE {table} ({', '.join(columns)})")
+            conn.executemany(
+                f"INSERT INTO {table} VALUES ({', '.join('?' for _ in columns)})",
+                rows,
+            )
+    conn.close()
+    return DataSource(
+        source=DataSourceType.SQLITE, connection_string=f"sqlite:///{path}"
+    )
+
+
+def add_slow_sqlite_function(engine: Engine, delay_seconds: float) -> None:
+    """
+    Registers SLOW(x) in the SQLite connections of the engine, returning x after sleeping the given delay: a
+    stand-in of a slow warehouse query, which can be interrupted between rows.
+    Must be called before the engine opens its first connection.
+    """
+
+    @event.listens_for(engine, "connect")
+    def connect(dbapi_connection, connection_record):
+        dbapi_connection.create_function(
+            "SLOW", 1, lambda x: time.sleep(delay_seconds) or x
+        )
+
+
 class FixedResponseEngine(ProfileEngine):
     def __init__(self, response: ProfileResponse):
         self.response = response
+        self.received_requests: Optional[List[ProfileRequest]] = None
 
     def _do_profile(
         self,
@@ -41,6 +80,7 @@ class FixedResponseEngine(ProfileEngine):
         requests: List[ProfileRequest],
         non_functional_requirements: ProfileNonFunctionalRequirements = ProfileNonFunctionalRequirements(),
     ) -> ProfileResponse:
+        self.received_requests = requests
         return self.response
 
 
@@ -50,6 +90,7 @@ class SuccessResponseEngine(ProfileEngine):
     ):
         self.success_value = success_value
         self.elapsed_time_millis = elapsed_time_millis
+        self.received_requests: List[List[ProfileRequest]] = []
 
     def _do_profile(
         self,
@@ -57,6 +98,7 @@ class SuccessResponseEngine(ProfileEngine):
         requests: List[ProfileRequest],
         non_functional_requirements: ProfileNonFunctionalRequirements = ProfileNonFunctionalRequirements(),
     ) -> ProfileResponse:
+        self.received_requests.append(requests)
         response = ProfileResponse()
         if self.elapsed_time_millis:
             logger.info(
@@ -0,0 +1,284 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from typing import Dict, Optional
+
+from profile_v2.core.model import (BatchSpec, DataSource, DataSourceType,
+                                   PartitionSpec, PartitionsSpec,
+                                   ProfileNonFunctionalRequirements,
+                                   ProfileRequest, ProfileResponse,
+                                   ProfileStatisticType,
+                                   SuccessStatisticResult, TypedStatistic,
+                                   UnsuccessfulStatisticResultType)
+from profile_v2.core.report import ProfileCoreReport
+from profile_v2.core.sqlalchemy.cost import (DEFAULT_ROWS_PER_SECOND,
+                                             BigQueryDryRunCostEstimator,
+                                             CostEstimator,
+                                             ExplainCostEstimator,
+                                             FallbackCostEstimator,
+                                             RowCountCostEstimator,
+                                             StatementCost)
+from profile_v2.core.sqlalchemy.session import SqlAlchemyExecutionSession
+from profile_v2.core.sqlalchemy.sqlalchemy import SqlAlchemyProfileEngine
+from tests.core.common import (FixedResponseEngine, SuccessResponseEngine,
+                               create_sqlite_datasource)
+
+
+class TableRowsCostEstimator(CostEstimator):
+    def __init__(self, rows_by_table: Dict[str, int]):
+        self.rows_by_table = rows_by_table
+        self.estimated_sqls = []
+
+    def estimate(
+        self,
+        session: SqlAlchemyExecutionSession,
+        datasource: DataSource,
+        request: ProfileRequest,
+        dialect_sql: str,
+    ) -> Optional[StatementCost]:
+        self.estimated_sqls.append(dialect_sql)
+        rows = self.rows_by_table.get(request.batch.fq_dataset_name)
+        return StatementCost(rows=rows) if rows is not None else None
+
+
+class TestCostEstimators(unittest.TestCase):
+
+    def test_exceeded_budgets(self):
+        cost = StatementCost(bytes=1000, rows=10, seconds=None)
+
+        assert cost.exceeded_budgets(ProfileNonFunctionalRequirements()) == []
+        assert cost.exceeded_budgets(
+            ProfileNonFunctionalRequirements(
+                max_estimated_bytes=100, max_estimated_rows=10, max_estimated_seconds=1
+            )
+        ) == ["estimated bytes 1000 > 100"]
+
+    def test_parse_postgres_explain(self):
+        plan = [
+            {
+                "Plan": {
+                    "Node Type": "Aggregate",
+                    "Plan Rows": 1,
+                    "Plan Width": 8,
+                    "Plans": [
+                        {"Node Type": "Seq Scan", "Plan Rows": 5000, "Plan Width": 12}
+                    ],
+                }
+            }
+        ]
+
+        assert ExplainCostEstimator._parse_postgres_explain(plan) == StatementCost(
+            bytes=60000, rows=5000
+        )
+
+    def test_parse_snowflake_explain(self):
+        plan = {
+            "GlobalStats": {
+                "partitionsTotal": 10,
+                "partitionsAssigned": 2,
+                "bytesAssigned": 123456,
+            },
+            "Operations": [],
+        }
+
+        assert ExplainCostEstimator._parse_snowflake_explain(plan) == StatementCost(
+            bytes=123456
+        )
+
+    def test_row_count_estimator_with_fallback(self):
+        row_count_engine = FixedResponseEngine(
+            ProfileResponse(data={"0": SuccessStatisticResult(value=1000)})
+        )
+        estimator = FallbackCostEstimator(
+            [
+                ExplainCostEstimator(),  # no EXPLAIN estimate for sqlite
+                RowCountCostEstimator(
+                    row_count_engine, bytes_per_row=10, bytes_per_second=5000
+                ),
+            ]
+        )
+        request = ProfileRequest(
+            statistics=[], batch=BatchSpec(fq_dataset_name="main.t1")
+        )
+
+        cost = estimator.estimate(
+            None,  # type: ignore[arg-type]
+            DataSource(source=DataSourceType.SQLITE, connection_string=""),
+            request,
+            "SELECT 1",
+        )
+
+        assert cost == StatementCost(bytes=10000, rows=1000, seconds=2)
+        assert row_count_engine.received_requests[0].batch == request.batch
+
+    def test_row_counts_fetched_once_per_table(self):
+        row_count_engine = SuccessResponseEngine(success_value=1000)
+        estimator = RowCountCostEstimator(row_count_engine)
+        datasource = DataSource(source=DataSourceType.SQLITE, connection_string="")
+        requests = [
+            ProfileRequest(
+                statistics=[],
+                batch=BatchSpec(fq_dataset_name=table, partitions=partitions),
+            )
+            for table in ["main.t1", "main.t2"]
+            for partitions in [
+                None,
+                PartitionsSpec(columns=[PartitionSpec(column="a", values=[1])]),
+            ]
+        ]
+
+        estimator.prefetch(None, datasource, requests)  # type: ignore[arg-type]
+        costs = [
+            estimator.estimate(
+                None, datasource, request, "SELECT 1"  # type: ignore[arg-type]
+            )
+            for request in requests
+        ]
+
+        assert costs == [
+            StatementCost(rows=1000, seconds=1000 / DEFAULT_ROWS_PER_SECOND)
+        ] * len(requests)
+        # a single bulk fetch of the whole tables
+        assert row_count_engine.received_requests == [
+            [
+                ProfileRequest(
+                    statistics=[
+                        TypedStatistic(
+                            fq_name=str(index),
+                            type=ProfileStatisticType.TABLE_ROW_COUNT,
+                        )
+                    ],
+                    batch=BatchSpec(fq_dataset_name=table),
+                )
+                for index, table in enumerate(["main.t1", "main.t2"])
+            ]
+        ]
+
+    def test_bigquery_dry_run_only_for_bigquery(self):
+        estimator = BigQueryDryRunCostEstimator()
+        request = ProfileRequest(
+            statistics=[], batch=BatchSpec(fq_dataset_name="project.dataset.t1")
+        )
+
+        assert (
+            estimator.estimate(
+                None,  # type: ignore[arg-type]
+                DataSource(source=DataSourceType.SQLITE, connection_string=""),
+                request,
+                "SELECT 1",
+            )
+            is None
+        )
+        # dry run errors give no estimate
+        assert (
+            estimator.estimate(
+                None,  # type: ignore[arg-type]
+                DataSource(source=DataSourceType.BIGQUERY, connection_string=""),
+                request,
+                "SELECT 1",
+            )
+            is None
+        )
+
+
+class TestSqlAlchemyProfileEngineCostBudgets(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "db.sqlite")
+        self.datasource = create_sqlite_datasource(
+            self.path,
+            {
+                "t1": (["a"], [(1,), (2,), (3,), (4,)]),
+                "t2": (["a"], [(1,), (1,)]),
+                "t3": (["a"], [(1,)]),
+            },
+        )
+        self.report = ProfileCoreReport()
+        self.cost_estimator = TableRowsCostEstimator({"main.t1": 4, "main.t2": 2})
+        self.requests = [
+            ProfileRequest(
+                statistics=[
+                    TypedStatistic(
+                        fq_name=f"{table}.row_count",
+                        type=ProfileStatisticType.TABLE_ROW_COUNT,
+                    ),
+                ],
+                batch=BatchSpec(fq_dataset_name=f"main.{table}"),
+            )
+            for table in ["t1", "t2", "t3"]
+        ]
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _profile(self, pack_size: Optional[int] = None) -> ProfileResponse:
+        engine = SqlAlchemyProfileEngine(
+            report=self.report,
+            cost_estimator=self.cost_estimator,
+            pack_size=pack_size,
+        )
+        try:
+            return engine.profile(
+                self.datasource,
+                self.requests,
+                ProfileNonFunctionalRequirements(max_estimated_rows=3),
+            )
+        finally:
+            engine.engine_registry.dispose(self.datasource)
+
+    def _assert_over_budget_skipped(self, response: ProfileResponse):
+        assert (
+            response.data["t1.row_count"].type
+            == UnsuccessfulStatisticResultType.SKIPPED
+        )
+        assert "estimated rows 4 > 3" in response.data["t1.row_count"].message
+        assert response.data["t2.row_count"] == SuccessStatisticResult(value=2)
+        # no estimate, so it runs
+        assert response.data["t3.row_count"] == SuccessStatisticResult(value=1)
+        assert len(self.cost_estimator.estimated_sqls) == 3
+        assert (
+            self.report.num_unsuccessful_queries_by_engine_and_status[
+                ("SqlAlchemyProfileEngine", UnsuccessfulStatisticResultType.SKIPPED)
+            ]
+            == 1
+        )
+
+    def test_statements_over_budget_skipped(self):
+        self._assert_over_budget_skipped(self._profile())
+        assert self.report.num_issued_queries_by_engine["SqlAlchemyProfileEngine"] == 2
+
+    def test_packed_statements_over_budget_skipped(self):
+        self._assert_over_budget_skipped(self._profile(pack_size=10))
+        assert self.report.num_issued_queries_by_engine["SqlAlchemyProfileEngine"] == 1
+
+    def test_seconds_budget_enforced_with_default_estimator(self):
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("ANALYZE t1")
+        conn.close()
+        engine = SqlAlchemyProfileEngine(report=self.report)
+        try:
+            response = engine.profile(
+                self.datasource,
+                self.requests[:1],
+                ProfileNonFunctionalRequirements(max_estimated_seconds=1e-9),
+            )
+        finally:
+            engine.engine_registry.dispose(self.datasource)
+
+        assert (
+            response.data["t1.row_count"].type
+            == UnsuccessfulStatisticResultType.SKIPPED
+        )
+        assert "estimated seconds" in response.data["t1.row_count"].message
+
+    def test_no_estimates_without_budgets(self):
+        engine = SqlAlchemyProfileEngine(
+            report=self.report, cost_estimator=self.cost_estimator
+        )
+        response = engine.profile(self.datasource, self.requests)
+        engine.engine_registry.dispose(self.datasource)
+
+        assert response.data["t1.row_count"] == SuccessStatisticResult(value=4)
+        assert self.cost_estimator.estimated_sqls == []
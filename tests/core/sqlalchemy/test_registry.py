@@ -0,0 +1,130 @@
+import os
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock
+
+from profile_v2.core.model import DataSource, DataSourceType
+from profile_v2.core.sqlalchemy.registry import SqlAlchemyEngineRegistry
+from profile_v2.core.sqlalchemy.sqlalchemy import SqlAlchemyProfileEngine
+
+
+class TestSqlAlchemyEngineRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.datasource = DataSource(
+            source=DataSourceType.SQLITE,
+            connection_string=f"sqlite:///{os.path.join(self.tmpdir.name, 'db1.sqlite')}",
+        )
+        self.other_datasource = DataSource(
+            source=DataSourceType.SQLITE,
+            connection_string=f"sqlite:///{os.path.join(self.tmpdir.name, 'db2.sqlite')}",
+        )
+        self.engine_factory = Mock(wraps=SqlAlchemyProfileEngine.create_engine)
+        self.registry = SqlAlchemyEngineRegistry(
+            engine_factory=self.engine_factory, pool_size=2
+        )
+
+    def tearDown(self):
+        self.registry.dispose()
+        self.tmpdir.cleanup()
+
+    def test_engine_is_reused_for_same_datasource(self):
+        engine1 = self.registry.get_engine(self.datasource)
+        engine2 = self.registry.get_engine(
+            DataSource(
+                source=DataSourceType.SQLITE,
+                connection_string=self.datasource.connection_string,
+            )
+        )
+        engine3 = self.registry.get_engine(self.other_datasource)
+
+        assert engine1 is engine2
+        assert engine1 is not engine3
+        assert self.engine_factory.call_count == 2
+        assert len(self.registry) == 2
+
+    def test_extra_config_is_part_of_the_key(self):
+        engine1 = self.registry.get_engine(
+            DataSource(
+                source=DataSourceType.SQLITE,
+                connection_string=self.datasource.connection_string,
+                extra_config={"a": 1},
+            )
+        )
+        engine2 = self.registry.get_engine(
+            DataSource(
+                source=DataSourceType.SQLITE,
+                connection_string=self.datasource.connection_string,
+                extra_config={"a": 2},
+            )
+        )
+        assert engine1 is not engine2
+
+    def test_concurrent_access_creates_a_single_engine(self):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            engines = list(
+                executor.map(
+                    lambda _: self.registry.get_engine(self.datasource), range(64)
+                )
+            )
+        assert all(engine is engines[0] for engine in engines)
+        assert self.engine_factory.call_count == 1
+
+    def test_pool_size_grows_on_demand(self):
+        engine1 = self.registry.get_engine(self.datasource)
+        assert engine1.pool.size() == 2
+
+        engine2 = self.registry.get_engine(self.datasource, pool_size=4)
+        assert engine2 is not engine1
+        assert engine2.pool.size() == 4
+
+        # smaller requests reuse the bigger pool
+        assert self.registry.get_engine(self.datasource, pool_size=1) is engine2
+
+    def test_connections_overflow_pool_size(self):
+        engine = self.registry.get_engine(self.datasource)
+        connections = [engine.connect() for _ in range(4)]
+        try:
+            assert engine.pool.checkedout() == 4
+        finally:
+            for connection in connections:
+                connection.close()
+        assert engine.pool.checkedin() == 2
+
+    def test_in_memory_sqlite(self):
+        engine = self.registry.get_engine(
+            DataSource(source=DataSourceType.SQLITE, connection_string="sqlite://")
+        )
+        with engine.connect() as connection:
+            assert connection.exec_driver_sql("SELECT 1").scalar() == 1
+
+    def test_warm_up(self):
+        engine = self.registry.warm_up(self.datasource, num_connections=2)
+        assert engine.pool.checkedin() == 2
+
+    def test_idle_eviction(self):
+        registry = SqlAlchemyEngineRegistry(
+            engine_factory=self.engine_factory, idle_timeout_seconds=0.05
+        )
+        engine1 = registry.get_engine(self.datasource)
+        time.sleep(0.1)
+        assert registry.evict_idle() == 1
+        assert len(registry) == 0
+
+        engine2 = registry.get_engine(self.datasource)
+        assert engine2 is not engine1
+        registry.dispose()
+
+    def test_dispose(self):
+        engine1 = self.registry.get_engine(self.datasource)
+        self.registry.get_engine(self.other_datasource)
+
+        self.registry.dispose(self.datasource)
+        assert len(self.registry) == 1
+        assert self.registry.get_engine(self.datasource) is not engine1
+
+        self.registry.dispose()
+        assert len(self.registry) == 0
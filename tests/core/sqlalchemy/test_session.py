@@ -0,0 +1,134 @@
+import contextvars
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, Mock
+
+import pytest
+
+from profile_v2.core.api import (CancellationToken,
+                                 ProfileEngineCancelledError,
+                                 current_cancellation_token)
+from profile_v2.core.report import ProfileCoreReport
+from profile_v2.core.sqlalchemy.session import SqlAlchemyExecutionSession
+from profile_v2.core.sqlalchemy.sqlalchemy import SqlAlchemyProfileEngine
+from tests.core.common import (add_slow_sqlite_function,
+                               create_sqlite_datasource)
+
+
+class TestSqlAlchemyExecutionSession(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        datasource = create_sqlite_datasource(
+            os.path.join(self.tmpdir.name, "db.sqlite"),
+            {"t": (["a", "b"], [(1, "x"), (2, "y"), (3, "y")])},
+        )
+        self.engine = SqlAlchemyProfileEngine.create_engine(datasource)
+        self.report = ProfileCoreReport()
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def test_single_checkout_for_multiple_statements(self):
+        with SqlAlchemyExecutionSession(self.engine, self.report, "engine1") as session:
+            assert session.execute_select("SELECT COUNT(*) AS c FROM t") == [("c", 3)]
+            assert session.execute_select(
+                "SELECT COUNT(DISTINCT b) AS d, MAX(a) AS m FROM t"
+            ) == [("d", 2), ("m", 3)]
+            assert len(session.execute("SELECT a FROM t")) == 3
+
+        assert self.report.num_connection_checkouts_by_engine["engine1"] == 1
+        assert self.report.connection_checkout_seconds_by_engine["engine1"] > 0
+        assert self.engine.pool.checkedout() == 0
+
+    def test_no_checkout_if_no_statements(self):
+        with SqlAlchemyExecutionSession(self.engine, self.report, "engine1"):
+            pass
+        assert self.report.num_connection_checkouts_by_engine["engine1"] == 0
+
+    def test_session_is_usable_after_failure(self):
+        with SqlAlchemyExecutionSession(self.engine, self.report, "engine1") as session:
+            with pytest.raises(Exception):
+                session.execute_select("SELECT COUNT(*) FROM non_existing_table")
+            assert session.execute_select("SELECT COUNT(*) AS c FROM t") == [("c", 3)]
+
+        assert self.report.num_connection_checkouts_by_engine["engine1"] == 1
+
+    def test_statement_cancelled(self):
+        add_slow_sqlite_function(self.engine, delay_seconds=0.01)
+        # about 10 seconds if not cancelled
+        slow_statement = (
+            "SELECT SUM(SLOW(x)) AS s FROM (WITH RECURSIVE c(x) AS "
+            "(SELECT 1 UNION ALL SELECT x + 1 FROM c LIMIT 1000) SELECT x FROM c)"
+        )
+        token = CancellationToken()
+
+        def run_statements():
+            current_cancellation_token.set(token)
+            with SqlAlchemyExecutionSession(
+                self.engine, self.report, "engine1"
+            ) as session:
+                start = time.perf_counter()
+                with pytest.raises(ProfileEngineCancelledError):
+                    session.execute_select(slow_statement)
+                assert time.perf_counter() - start < 2
+                # no statement started once cancelled
+                with pytest.raises(ProfileEngineCancelledError):
+                    session.execute_select("SELECT COUNT(*) AS c FROM t")
+
+        timer = threading.Timer(0.2, token.cancel)
+        timer.start()
+        try:
+            contextvars.copy_context().run(run_statements)
+        finally:
+            timer.cancel()
+
+        # connection is usable without the cancelled token
+        with SqlAlchemyExecutionSession(self.engine, self.report, "engine1") as session:
+            assert session.execute_select("SELECT COUNT(*) AS c FROM t") == [("c", 3)]
+
+    def test_statement_cancelled_off_the_calling_thread(self):
+        cancelled_on = []
+        cancelled = threading.Event()
+
+        def cancel(*args):
+            cancelled_on.append(threading.current_thread())
+            cancelled.set()
+
+        # psycopg2
+        dbapi_connection = Mock(spec=["cancel"], cancel=Mock(side_effect=cancel))
+        SqlAlchemyExecutionSession._cancel_statement("postgresql", dbapi_connection)
+        assert cancelled.wait(1)
+        assert cancelled_on[-1] is not threading.current_thread()
+
+        # Snowflake, cancelling the queries of the session
+        cancelled.clear()
+        dbapi_connection = MagicMock(spec=["cursor", "session_id"], session_id=123)
+        cursor = dbapi_connection.cursor.return_value.__enter__.return_value
+        cursor.execute.side_effect = cancel
+        SqlAlchemyExecutionSession._cancel_statement("snowflake", dbapi_connection)
+        assert cancelled.wait(1)
+        assert cancelled_on[-1] is not threading.current_thread()
+        cursor.execute.assert_called_once_with(
+            "SELECT SYSTEM$CANCEL_ALL_QUERIES(%s)", (123,)
+        )
+
+        # BigQuery, cancelling the running jobs
+        cancelled.clear()
+        running_job = Mock(
+            done=Mock(return_value=False), cancel=Mock(side_effect=cancel)
+        )
+        done_job = Mock(done=Mock(return_value=True))
+        dbapi_connection = Mock(
+            spec=["_cursors_created"],
+            _cursors_created=[Mock(_query_job=done_job), Mock(_query_job=running_job)],
+        )
+        SqlAlchemyExecutionSession._cancel_statement("bigquery", dbapi_connection)
+        assert cancelled.wait(1)
+        assert cancelled_on[-1] is not threading.current_thread()
+        running_job.cancel.assert_called_once_with()
+        done_job.cancel.assert_not_called()
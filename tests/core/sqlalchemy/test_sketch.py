@@ -0,0 +1,134 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from pytest import approx
+
+from profile_v2.core.incremental import IncrementalProfileEngine
+from profile_v2.core.model import (BatchSpec, PartitionSpec, PartitionsSpec,
+                                   ProfileRequest, ProfileStatisticType,
+                                   SketchStatisticResult, TypedStatistic,
+                                   UnsuccessfulStatisticResultType)
+from profile_v2.core.report import ProfileCoreReport
+from profile_v2.core.sqlalchemy.sketch import SqlAlchemySketchProfileEngine
+from tests.core.common import create_sqlite_datasource
+
+
+class TestSqlAlchemySketchProfileEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmpdir.name, "db.sqlite")
+        self.datasource = create_sqlite_datasource(
+            path,
+            {
+                "events": (
+                    ["day", "user", "country"],
+                    [("d1", f"u{i}", f"c{i % 3}") for i in range(100)]
+                    + [("d2", f"u{i}", None) for i in range(50, 200)],
+                ),
+                "not_analyzed": (["day", "user", "country"], [("d1", "u1", "c1")]),
+            },
+        )
+        # row counts in the catalog, so tables are known to be below the ceiling
+        with sqlite3.connect(path) as conn:
+            conn.execute("ANALYZE events")
+        conn.close()
+        self.report = ProfileCoreReport()
+        self.engine = SqlAlchemySketchProfileEngine(report=self.report, chunk_size=7)
+
+    def tearDown(self):
+        self.engine.engine_registry.dispose(self.datasource)
+        self.tmpdir.cleanup()
+
+    @staticmethod
+    def _requests(partitions=None, fq_dataset_name="main.events"):
+        return [
+            ProfileRequest(
+                statistics=[
+                    TypedStatistic(
+                        fq_name=f"events.{column}.distinct_count",
+                        type=ProfileStatisticType.COLUMN_DISTINCT_COUNT,
+                        columns=[column],
+                        approximate=approximate,
+                    )
+                    for column, approximate in [
+                        ("user", True),
+                        ("country", True),
+                        ("day", False),
+                    ]
+                ],
+                batch=BatchSpec(fq_dataset_name=fq_dataset_name, partitions=partitions),
+            )
+        ]
+
+    def test_sketches_in_single_scan(self):
+        response = self.engine.profile(self.datasource, self._requests())
+
+        user_result = response.data["events.user.distinct_count"]
+        assert isinstance(user_result, SketchStatisticResult)
+        assert user_result.value == approx(200, rel=3 * user_result.error_bound)
+        assert user_result.sketch is not None
+        assert user_result.error_bound == user_result.sketch.relative_error
+        assert response.data["events.country.distinct_count"].value == 3
+        assert (
+            response.data["events.day.distinct_count"].type
+            == UnsuccessfulStatisticResultType.UNSUPPORTED
+        )
+        assert (
+            self.report.num_issued_queries_by_engine["SqlAlchemySketchProfileEngine"]
+            == 1
+        )
+
+    def test_partition_sketches_merged_incrementally(self):
+        incremental_engine = IncrementalProfileEngine(
+            self.engine, report=self.report, merge_sketches=True
+        )
+        partitions = PartitionsSpec(
+            columns=[PartitionSpec(column="day", values=["d1", "d2"])]
+        )
+        requests = self._requests(partitions)
+        requests[0].statistics = requests[0].statistics[:1]
+
+        response = incremental_engine.profile(self.datasource, requests)
+
+        # users overlap across partitions: 100 + 150 - 50
+        result = response.data["events.user.distinct_count"]
+        assert result.value == approx(200, rel=3 * result.error_bound)
+        assert (
+            self.report.num_issued_queries_by_engine["SqlAlchemySketchProfileEngine"]
+            == 2
+        )
+
+    def test_tables_over_row_count_ceiling_not_sketched(self):
+        engine = SqlAlchemySketchProfileEngine(report=self.report, max_scanned_rows=200)
+        requests = self._requests() + self._requests(
+            fq_dataset_name="main.not_analyzed"
+        )
+        for request in requests[1:]:
+            for statistic in request.statistics:
+                statistic.fq_name = f"not_analyzed.{statistic.fq_name}"
+
+        response = engine.profile(self.datasource, requests)
+
+        # 250 rows in events, unknown row count of not_analyzed
+        for fq_name, result in response.data.items():
+            assert result.type == UnsuccessfulStatisticResultType.UNSUPPORTED, fq_name
+        assert (
+            self.report.num_issued_queries_by_engine.get(
+                "SqlAlchemySketchProfileEngine", 0
+            )
+            == 0
+        )
+
+        # opt in to full scans
+        engine = SqlAlchemySketchProfileEngine(
+            report=self.report, max_scanned_rows=None
+        )
+        response = engine.profile(self.datasource, requests)
+
+        assert isinstance(
+            response.data["not_analyzed.events.user.distinct_count"],
+            SketchStatisticResult,
+        )
@@ -1,20 +1,26 @@
+import os
+import tempfile
 import unittest
+from datetime import date, datetime
 from unittest.mock import Mock
 
 from profile_v2.core.model import (BatchSpec, CustomStatistic, DataSource,
                                    DataSourceType, ExpensivenessRequirements,
+                                   PartitionSpec, PartitionsSpec,
                                    ProfileNonFunctionalRequirements,
                                    ProfileRequest, ProfileResponse,
                                    ProfileStatisticType, SampleSpec,
                                    SuccessStatisticResult, TypedStatistic,
                                    UnsuccessfulStatisticResult,
                                    UnsuccessfulStatisticResultType)
+from profile_v2.core.report import ProfileCoreReport
 from profile_v2.core.sqlalchemy.sqlalchemy import SqlAlchemyProfileEngine
 from tests.core.common import (BIGQUERY_CONNECTION_STRING,
                                BIGQUERY_CREDENTIALS_PATH,
                                BIGQUERY_DATASET_CUSTOMER_DEMO,
                                BIGQUERY_PROJECT, SNOWFLAKE_CONNECTION_STRING,
-                               SNOWFLAKE_DATABASE, SNOWFLAKE_SCHEMA)
+                               SNOWFLAKE_DATABASE, SNOWFLAKE_SCHEMA,
+                               FixedResponseEngine, create_sqlite_datasource)
 
 
 class TestSqlAlchemyProfileEngine(unittest.TestCase):
@@ -375,3 +381,503 @@ class TestSqlAlchemyProfileEngine(unittest.TestCase):
             response.data["fq_name_1"].type == UnsuccessfulStatisticResultType.SKIPPED
         )
         assert response.data["fq_name_1"].message == "Skipped because of expensiveness"
+
+
+class TestSqlAlchemyProfileEngineWithSqlite(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.datasource = create_sqlite_datasource(
+            os.path.join(self.tmpdir.name, "db.sqlite"),
+            {
+                "t1": (["a", "b"], [(1, "x"), (2, "y"), (3, "y"), (None, "z")]),
+                "t2": (["c"], [(1,), (1,)]),
+            },
+        )
+        self.report = ProfileCoreReport()
+        self.engine = SqlAlchemyProfileEngine(report=self.report)
+
+    def tearDown(self):
+        self.engine.engine_registry.dispose(self.datasource)
+        self.tmpdir.cleanup()
+
+    def test_table_and_column_level_requests(self):
+        requests = [
+            ProfileRequest(
+                statistics=[
+                    TypedStatistic(
+                        fq_name="t1.row_count",
+                        type=ProfileStatisticType.TABLE_ROW_COUNT,
+                    ),
+                    TypedStatistic(
+                        fq_name="t1.b.distinct_count",
+                        type=ProfileStatisticType.COLUMN_DISTINCT_COUNT,
+                        columns=["b"],
+                    ),
+                    CustomStatistic(fq_name="t1.a.max", sql="MAX(a)"),
+                ],
+                batch=BatchSpec(fq_dataset_name="main.t1"),
+            ),
+            ProfileRequest(
+                statistics=[
+                    TypedStatistic(
+                        fq_name="t2.c.distinct_count",
+                        type=ProfileStatisticType.COLUMN_DISTINCT_COUNT,
+                        columns=["c"],
+                    ),
+                ],
+                batch=BatchSpec(fq_dataset_name="main.t2"),
+            ),
+        ]
+
+        response = self.engine.profile(self.datasource, requests)
+
+        assert response == ProfileResponse(
+            data={
+                "t1.row_count": SuccessStatisticResult(value=4),
+                "t1.b.distinct_count": SuccessStatisticResult(value=3),
+                "t1.a.max": SuccessStatisticResult(value=3),
+                "t2.c.distinct_count": SuccessStatisticResult(value=1),
+            }
+        )
+        # all the statements of the call run on a single connection
+        assert (
+            self.report.num_connection_checkouts_by_engine["SqlAlchemyProfileEngine"]
+            == 1
+        )
+        # row count fused with the column-level statistics: a single scan per table
+        assert self.report.num_issued_queries_by_engine["SqlAlchemyProfileEngine"] == 2
+
+    def test_row_count_fused_across_requests_for_same_batch(self):
+        requests = [
+            ProfileRequest(
+                statistics=[
+                    TypedStatistic(
+                        fq_name="t1.row_count",
+                        type=ProfileStatisticType.TABLE_ROW_COUNT,
+                    ),
+                ],
+                batch=BatchSpec(fq_dataset_name="main.t1"),
+            ),
+            ProfileRequest(
+                statistics=[
+                    TypedStatistic(
+                        fq_name="t1.a.distinct_count",
+                        type=ProfileStatisticType.COLUMN_DISTINCT_COUNT,
+                        columns=["a"],
+                    ),
+                ],
+                batch=BatchSpec(fq_dataset_name="main.t1"),
+            ),
+        ]
+
+        response = self.engine.profile(self.datasource, requests)
+
+        assert response == ProfileResponse(
+            data={
+                "t1.row_count": SuccessStatisticResult(value=4),
+                "t1.a.distinct_count": SuccessStatisticResult(value=3),
+            }
+        )
+        assert self.report.num_issued_queries_by_engine["SqlAlchemyProfileEngine"] == 1
+        # input requests are not mutated by the fusion
+        assert len(requests[0].statistics) == 1
+
+    def test_row_count_skipped_if_cheap(self):
+        requests = [
+            ProfileRequest(
+                statistics=[
+                    TypedStatistic(
+                        fq_name="t1.row_count",
+                        type=ProfileStatisticType.TABLE_ROW_COUNT,
+                    ),
+                    TypedStatistic(
+                        fq_name="t1.a.distinct_count",
+                        type=ProfileStatisticType.COLUMN_DISTINCT_COUNT,
+                        columns=["a"],
+                    ),
+                ],
+                batch=BatchSpec(fq_dataset_name="main.t1"),
+            ),
+        ]
+
+        response = self.engine.profile(
+            self.datasource,
+            requests,
+            ProfileNonFunctionalRequirements(
+                expensiveness=ExpensivenessRequirements.CHEAP
+            ),
+        )
+
+        assert response.data["t1.row_count"] == UnsuccessfulStatisticResult(
+            type=UnsuccessfulStatisticResultType.SKIPPED,
+            message="Skipped because of expensiveness",
+        )
+        assert response.data["t1.a.distinct_count"] == SuccessStatisticResult(value=3)
+
+    def test_failure_does_not_break_the_session(self):
+        requests = [
+            ProfileRequest(
+                statistics=[CustomStatistic(fq_name="fq_name_1", sql="MAX(x)")],
+                batch=BatchSpec(fq_dataset_name="main.t1"),
+            ),
+            ProfileRequest(
+                statistics=[CustomStatistic(fq_name="fq_name_2", sql="COUNT(*)")],
+                batch=BatchSpec(fq_dataset_name="main.t2"),
+            ),
+        ]
+
+        response = self.engine.profile(self.datasource, requests)
+
+        assert (
+            response.data["fq_name_1"].type == UnsuccessfulStatisticResultType.FAILURE
+        )
+        assert response.data["fq_name_2"] == SuccessStatisticResult(value=2)
+
+    def test_packing_small_tables_with_union_all(self):
+        datasource = create_sqlite_datasource(
+            os.path.join(self.tmpdir.name, "many.sqlite"),
+            {f"small{i}": (["a"], [(j,) for j in range(i + 1)]) for i in range(5)},
+        )
+        engine = SqlAlchemyProfileEngine(report=self.report, pack_size=3)
+        requests = [
+            ProfileRequest(
+                statistics=[
+                    TypedStatistic(
+                        fq_name=f"small{i}.row_count",
+                        type=ProfileStatisticType.TABLE_ROW_COUNT,
+                    ),
+                ]
+                + (
+                    [
+                        TypedStatistic(
+                            fq_name=f"small{i}.a.distinct_count",
+                            type=ProfileStatisticType.COLUMN_DISTINCT_COUNT,
+                            columns=["a"],
+                        )
+                    ]
+                    if i % 2
+                    else []
+                ),
+                batch=BatchSpec(fq_dataset_name=f"main.small{i}"),
+            )
+            for i in range(5)
+        ] + [
+            # not packable, runs on its own (and fails, no t1 in this database)
+            ProfileRequest(
+                statistics=[CustomStatistic(fq_name="t1.a.max", sql="MAX(a)")],
+                batch=BatchSpec(fq_dataset_name="main.t1"),
+            )
+        ]
+
+        response = engine.profile(datasource, requests)
+        engine.engine_registry.dispose(datasource)
+
+        assert response == ProfileResponse(
+            data={
+                "small0.row_count": SuccessStatisticResult(value=1),
+                "small1.row_count": SuccessStatisticResult(value=2),
+                "small1.a.distinct_count": SuccessStatisticResult(value=2),
+                "small2.row_count": SuccessStatisticResult(value=3),
+                "small3.row_count": SuccessStatisticResult(value=4),
+                "small3.a.distinct_count": SuccessStatisticResult(value=4),
+                "small4.row_count": SuccessStatisticResult(value=5),
+                "t1.a.max": UnsuccessfulStatisticResult(
+                    type=UnsuccessfulStatisticResultType.FAILURE,
+                    message=response.data["t1.a.max"].message,
+                    exception=response.data["t1.a.max"].exception,
+                ),
+            }
+        )
+        # 5 batches in 2 packs of up to 3 + 1 for the custom statistic
+        assert self.report.num_issued_queries_by_engine["SqlAlchemyProfileEngine"] == 3
+
+    def test_packing_is_bounded_by_max_sql_length(self):
+        engine = SqlAlchemyProfileEngine(
+            report=self.report, pack_size=10, max_sql_length=100
+        )
+        requests = [
+            ProfileRequest(
+                statistics=[
+                    TypedStatistic(
+                        fq_name=f"{table}.row_count",
+                        type=ProfileStatisticType.TABLE_ROW_COUNT,
+                    ),
+                ],
+                batch=BatchSpec(fq_dataset_name=f"main.{table}"),
+            )
+            for table in ["t1", "t2"]
+        ]
+
+        response = engine.profile(self.datasource, requests)
+
+        assert response == ProfileResponse(
+            data={
+                "t1.row_count": SuccessStatisticResult(value=4),
+                "t2.row_count": SuccessStatisticResult(value=2),
+            }
+        )
+        assert self.report.num_issued_queries_by_engine["SqlAlchemyProfileEngine"] == 2
+
+    def test_failed_pack_falls_back_to_one_statement_per_batch(self):
+        engine = SqlAlchemyProfileEngine(report=self.report, pack_size=10)
+        requests = [
+            ProfileRequest(
+                statistics=[
+                    TypedStatistic(
+                        fq_name=f"{table}.row_count",
+                        type=ProfileStatisticType.TABLE_ROW_COUNT,
+                    ),
+                ],
+                batch=BatchSpec(fq_dataset_name=f"main.{table}"),
+            )
+            for table in ["t1", "t2", "non_existing"]
+        ]
+
+        response = engine.profile(self.datasource, requests)
+
+        assert response.data["t1.row_count"] == SuccessStatisticResult(value=4)
+        assert response.data["t2.row_count"] == SuccessStatisticResult(value=2)
+        assert (
+            response.data["non_existing.row_count"].type
+            == UnsuccessfulStatisticResultType.FAILURE
+        )
+
+    def test_approximate_distinct_count_is_exact_if_unsupported_by_dialect(self):
+        requests = [
+            ProfileRequest(
+                statistics=[
+                    TypedStatistic(
+                        fq_name="t1.a.distinct_count",
+                        type=ProfileStatisticType.COLUMN_DISTINCT_COUNT,
+                        columns=["a"],
+                        approximate=True,
+                    ),
+                ],
+                batch=BatchSpec(fq_dataset_name="main.t1"),
+            )
+        ]
+
+        response = self.engine.profile(self.datasource, requests)
+
+        assert response == ProfileResponse(
+            data={"t1.a.distinct_count": SuccessStatisticResult(value=3)}
+        )
+
+    def test_approximate_distinct_count_transpiled_with_error_bound(self):
+        request = ProfileRequest(
+            statistics=[
+                TypedStatistic(
+                    fq_name="t1.a.distinct_count",
+                    type=ProfileStatisticType.COLUMN_DISTINCT_COUNT,
+                    columns=["a"],
+                    approximate=True,
+                ),
+                TypedStatistic(
+                    fq_name="t1.a_b.distinct_count",
+                    type=ProfileStatisticType.COLUMN_DISTINCT_COUNT,
+                    columns=["a", "b"],
+                    approximate=True,
+                ),
+            ],
+            batch=BatchSpec(fq_dataset_name="db.schema.t1"),
+        )
+        for source, error_bound in [
+            (DataSourceType.SNOWFLAKE, 0.0162338),
+            (DataSourceType.BIGQUERY, 0.0057),
+        ]:
+            select_statement, fq_name_mappings, error_bounds = (
+                self.engine._generate_select_query(
+                    request,
+                    DataSource(source=source, connection_string=""),
+                    ProfileResponse(),
+                )
+            )
+
+            assert select_statement is not None
+            sql = select_statement.sql(dialect=source.value)
+            assert "APPROX_COUNT_DISTINCT(a)" in sql
+            assert "COUNT(DISTINCT a, b)" in sql
+            assert error_bounds == {"t1.a.distinct_count": error_bound}
+
+    def test_distinct_count_downgraded_above_row_count_threshold(self):
+        row_count_engine = FixedResponseEngine(
+            ProfileResponse(
+                data={
+                    "0": SuccessStatisticResult(value=4),
+                    "1": SuccessStatisticResult(value=2),
+                }
+            )
+        )
+        engine = SqlAlchemyProfileEngine(
+            report=self.report, row_count_engine=row_count_engine
+        )
+        requests = [
+            ProfileRequest(
+                statistics=[
+                    TypedStatistic(
+                        fq_name=f"{table}.{column}.distinct_count",
+                        type=ProfileStatisticType.COLUMN_DISTINCT_COUNT,
+                        columns=[column],
+                    ),
+                ],
+                batch=BatchSpec(fq_dataset_name=f"main.{table}"),
+            )
+            for table, column in [("t1", "a"), ("t2", "c")]
+        ]
+
+        downgraded_requests = engine._apply_approximate_distinct_policy(
+            requests,
+            self.datasource,
+            ProfileNonFunctionalRequirements(
+                approximate_distinct_row_count_threshold=3
+            ),
+        )
+
+        assert [
+            statistic.approximate
+            for request in downgraded_requests
+            for statistic in request.statistics
+        ] == [True, False]
+        assert [request.batch for request in row_count_engine.received_requests] == [
+            request.batch for request in requests
+        ]
+        # requests are not mutated
+        assert not requests[0].statistics[0].approximate
+
+    def test_column_statistics_fused_in_single_scan(self):
+        statistic_types = [
+            ProfileStatisticType.COLUMN_MIN,
+            ProfileStatisticType.COLUMN_MAX,
+            ProfileStatisticType.COLUMN_MEAN,
+            ProfileStatisticType.COLUMN_NULL_COUNT,
+            ProfileStatisticType.COLUMN_NON_NULL_COUNT,
+        ]
+        requests = [
+            ProfileRequest(
+                statistics=[
+                    TypedStatistic(
+                        fq_name=f"t1.{column}.{statistic_type.value}",
+                        type=statistic_type,
+                        columns=[column],
+                    )
+                    for statistic_type in statistic_types
+                ],
+                batch=BatchSpec(fq_dataset_name="main.t1"),
+            )
+            for column in ["a", "b"]
+        ]
+
+        response = self.engine.profile(self.datasource, requests)
+
+        assert response == ProfileResponse(
+            data={
+                "t1.a.column_min": SuccessStatisticResult(value=1),
+                "t1.a.column_max": SuccessStatisticResult(value=3),
+                "t1.a.column_mean": SuccessStatisticResult(value=2.0),
+                "t1.a.column_null_count": SuccessStatisticResult(value=1),
+                "t1.a.column_non_null_count": SuccessStatisticResult(value=3),
+                "t1.b.column_min": SuccessStatisticResult(value="x"),
+                "t1.b.column_max": SuccessStatisticResult(value="z"),
+                "t1.b.column_mean": SuccessStatisticResult(value=0.0),
+                "t1.b.column_null_count": SuccessStatisticResult(value=0),
+                "t1.b.column_non_null_count": SuccessStatisticResult(value=4),
+            }
+        )
+        assert self.report.num_issued_queries_by_engine["SqlAlchemyProfileEngine"] == 1
+
+    def test_column_statistics_transpiled(self):
+        request = ProfileRequest(
+            statistics=[
+                TypedStatistic(
+                    fq_name="t1.a.stddev",
+                    type=ProfileStatisticType.COLUMN_STDDEV,
+                    columns=["a"],
+                ),
+                TypedStatistic(
+                    fq_name="t1.a.null_count",
+                    type=ProfileStatisticType.COLUMN_NULL_COUNT,
+                    columns=["a"],
+                ),
+                TypedStatistic(
+                    fq_name="t1.a_b.min",
+                    type=ProfileStatisticType.COLUMN_MIN,
+                    columns=["a", "b"],
+                ),
+            ],
+            batch=BatchSpec(fq_dataset_name="schema.t1"),
+        )
+        response = ProfileResponse()
+
+        select_statement, _, _ = self.engine._generate_select_query(
+            request,
+            DataSource(source=DataSourceType.SNOWFLAKE, connection_string=""),
+            response,
+        )
+
+        assert select_statement is not None
+        assert select_statement.sql(dialect="snowflake") == (
+            "SELECT STDDEV(a) AS t1_a_stddev, COUNT(*) - COUNT(a) AS t1_a_null_count "
+            "FROM schema.t1"
+        )
+        assert (
+            response.data["t1.a_b.min"].type
+            == UnsuccessfulStatisticResultType.UNSUPPORTED
+        )
+
+    def test_partitions_restrict_scan(self):
+        requests = [
+            ProfileRequest(
+                statistics=[
+                    TypedStatistic(
+                        fq_name="t1.row_count",
+                        type=ProfileStatisticType.TABLE_ROW_COUNT,
+                    ),
+                ],
+                batch=BatchSpec(
+                    fq_dataset_name="main.t1",
+                    partitions=PartitionsSpec(
+                        columns=[
+                            PartitionSpec(column="b", values=["y", "z", "o'clock"]),
+                            PartitionSpec(column="b", values=["y"]),
+                        ]
+                    ),
+                ),
+            )
+        ]
+
+        select_statement, _, _ = self.engine._generate_select_query(
+            requests[0], self.datasource, ProfileResponse()
+        )
+        assert select_statement is not None
+        assert select_statement.sql(dialect="sqlite") == (
+            "SELECT COUNT(*) AS t1_row_count FROM main.t1 "
+            "WHERE b IN ('y', 'z', 'o''clock') AND b IN ('y')"
+        )
+
+        response = self.engine.profile(self.datasource, requests)
+
+        assert response == ProfileResponse(
+            data={"t1.row_count": SuccessStatisticResult(value=2)}
+        )
+
+    def test_partition_values_keep_their_type(self):
+        condition = SqlAlchemyProfileEngine._partitions_condition(
+            PartitionsSpec(
+                columns=[
+                    PartitionSpec(column="id", values=[1, 2]),
+                    PartitionSpec(column="ratio", values=[0.5]),
+                    PartitionSpec(column="flag", values=[True]),
+                    PartitionSpec(column="day", values=[date(2024, 1, 31)]),
+                    PartitionSpec(column="ts", values=[datetime(2024, 1, 31, 10, 30)]),
+                    PartitionSpec(column="name", values=["2024"]),
+                ]
+            )
+        )
+
+        assert condition.sql(dialect="bigquery") == (
+            "id IN (1, 2) AND ratio IN (0.5) AND flag IN (TRUE) "
+            "AND day IN (CAST('2024-01-31' AS DATE)) "
+            "AND ts IN (CAST('2024-01-31T10:30:00' AS DATETIME)) "
+            "AND name IN ('2024')"
+        )
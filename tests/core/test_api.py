@@ -1,8 +1,12 @@
+import contextvars
 import unittest
 
 import pytest
 
-from profile_v2.core.api import ProfileEngineValueError
+from profile_v2.core.api import (CancellationToken,
+                                 ProfileEngineCancelledError,
+                                 ProfileEngineValueError,
+                                 current_cancellation_token)
 from profile_v2.core.model import (BatchSpec, DataSource, DataSourceType,
                                    ProfileRequest, ProfileResponse,
                                    StatisticSpec, SuccessStatisticResult)
@@ -48,3 +52,40 @@ class TestApi(unittest.TestCase):
             match="FQ statistic names must be unique across all requests",
         ):
             profile_engine.profile(self._datasource, requests)
+
+    def test_cancellation_token_callbacks(self):
+        token = CancellationToken()
+        calls = []
+        token.add_callback(lambda: calls.append("a"))
+        remove = token.add_callback(lambda: calls.append("b"))
+        remove()
+
+        token.cancel()
+        token.cancel()
+        assert token.cancelled
+        assert calls == ["a"]
+
+        # registered once cancelled, called right away
+        token.add_callback(lambda: calls.append("c"))
+        assert calls == ["a", "c"]
+
+    def test_profile_cancelled(self):
+        profile_engine = FixedResponseEngine(ProfileResponse())
+        requests = [
+            ProfileRequest(
+                statistics=[StatisticSpec(fq_name="fq_name_1")],
+                batch=BatchSpec(fq_dataset_name="dataset_1"),
+            )
+        ]
+        token = CancellationToken()
+
+        def profile():
+            current_cancellation_token.set(token)
+            return profile_engine.profile(self._datasource, requests)
+
+        assert contextvars.copy_context().run(profile) == ProfileResponse()
+        token.cancel()
+        with pytest.raises(ProfileEngineCancelledError):
+            contextvars.copy_context().run(profile)
+        # not cancelled out of the context of the token
+        assert profile_engine.profile(self._datasource, requests) == ProfileResponse()
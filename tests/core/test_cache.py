@@ -0,0 +1,91 @@
+import os
+import tempfile
+import unittest
+
+from profile_v2.core.cache import (CachedStatisticResult,
+                                   InMemoryStatisticResultCache,
+                                   SqliteStatisticResultCache,
+                                   TieredStatisticResultCache)
+from profile_v2.core.model import SketchStatisticResult, SuccessStatisticResult
+from profile_v2.core.sketches import HyperLogLogSketch
+
+
+class TestInMemoryStatisticResultCache(unittest.TestCase):
+
+    def test_least_recently_used_evicted(self):
+        cache = InMemoryStatisticResultCache(max_entries=2)
+        cache.put_many(
+            {
+                "key1": CachedStatisticResult(SuccessStatisticResult(1), 0),
+                "key2": CachedStatisticResult(SuccessStatisticResult(2), 0),
+            }
+        )
+        cache.get_many(["key1"])
+        cache.put_many({"key3": CachedStatisticResult(SuccessStatisticResult(3), 0)})
+
+        assert set(cache.get_many(["key1", "key2", "key3"]).keys()) == {
+            "key1",
+            "key3",
+        }
+        assert len(cache) == 2
+
+
+class TestSqliteStatisticResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "cache.sqlite")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_put_and_get(self):
+        cache = SqliteStatisticResultCache(self.path)
+        cache.put_many(
+            {
+                "key1": CachedStatisticResult(
+                    SuccessStatisticResult(value=10, error_bound=0.01), 100
+                ),
+                "key2": CachedStatisticResult(SuccessStatisticResult(value="x"), 200),
+                "key3": CachedStatisticResult(
+                    SuccessStatisticResult(value=object()), 300
+                ),
+            }
+        )
+
+        # another instance on the same file, eg: from another process
+        found = SqliteStatisticResultCache(self.path).get_many(
+            ["key1", "key2", "key3", "key4"]
+        )
+
+        assert found == {
+            "key1": CachedStatisticResult(
+                SuccessStatisticResult(value=10, error_bound=0.01), 100
+            ),
+            "key2": CachedStatisticResult(SuccessStatisticResult(value="x"), 200),
+        }
+
+        cache.invalidate(["key1"])
+        assert list(cache.get_many(["key1", "key2"]).keys()) == ["key2"]
+
+    def test_sketches_persisted(self):
+        sketch = HyperLogLogSketch()
+        sketch.add("a")
+        entry = CachedStatisticResult(
+            SketchStatisticResult(value=1, error_bound=0.01, sketch=sketch), 100
+        )
+        cache = SqliteStatisticResultCache(self.path)
+        cache.put_many({"key1": entry})
+
+        assert cache.get_many(["key1"]) == {"key1": entry}
+
+    def test_tiered_promotes_to_memory(self):
+        persistent = SqliteStatisticResultCache(self.path)
+        persistent.put_many(
+            {"key1": CachedStatisticResult(SuccessStatisticResult(1), 0)}
+        )
+        memory = InMemoryStatisticResultCache()
+        cache = TieredStatisticResultCache(memory=memory, persistent=persistent)
+
+        assert list(cache.get_many(["key1", "key2"]).keys()) == ["key1"]
+        assert list(memory.get_many(["key1"]).keys()) == ["key1"]
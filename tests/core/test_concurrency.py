@@ -0,0 +1,305 @@
+import contextvars
+import threading
+import time
+import unittest
+from collections import defaultdict
+from typing import Dict, List
+
+from profile_v2.core.concurrency import (AdaptiveConcurrencyLimiter,
+                                         CircuitBreaker, CircuitBreakerState,
+                                         SharedExecutor)
+
+
+class TestAdaptiveConcurrencyLimiter(unittest.TestCase):
+
+    def test_additive_increase(self):
+        limiter = AdaptiveConcurrencyLimiter(min_limit=1, max_limit=3, initial_limit=2)
+
+        # one round of `limit` successes increases the limit by one
+        for _ in range(2):
+            limiter.acquire()
+            limiter.release(0.1)
+        assert limiter.limit == 3
+
+        # capped at max
+        for _ in range(10):
+            limiter.acquire()
+            limiter.release(0.1)
+        assert limiter.limit == 3
+
+    def test_multiplicative_decrease_on_failure(self):
+        changes = []
+        limiter = AdaptiveConcurrencyLimiter(
+            min_limit=2,
+            max_limit=16,
+            initial_limit=16,
+            on_change=lambda previous, limit: changes.append((previous, limit)),
+        )
+
+        for _ in range(3):
+            limiter.acquire()
+            limiter.release(0.1, failed=True)
+
+        # halved, floored at min
+        assert limiter.limit == 2
+        assert changes == [(16, 8), (8, 4), (4, 2)]
+
+    def test_decrease_on_degraded_latency(self):
+        limiter = AdaptiveConcurrencyLimiter(
+            min_limit=1, max_limit=8, initial_limit=8, latency_tolerance=2.0
+        )
+
+        limiter.acquire()
+        limiter.release(0.1)
+        limiter.acquire()
+        limiter.release(0.15)
+        assert limiter.limit == 8
+
+        limiter.acquire()
+        limiter.release(0.5)
+        assert limiter.limit == 4
+
+    def test_latency_compared_per_unit_of_work(self):
+        limiter = AdaptiveConcurrencyLimiter(
+            min_limit=1, max_limit=8, initial_limit=8, latency_tolerance=2.0
+        )
+
+        limiter.acquire()
+        limiter.release(0.1, size=1)
+        # a batch 10 times bigger is not degraded
+        limiter.acquire()
+        limiter.release(1.0, size=10)
+        assert limiter.limit == 8
+
+        limiter.acquire()
+        limiter.release(5.0, size=10)
+        assert limiter.limit == 4
+
+    def test_cancel_keeps_limit(self):
+        limiter = AdaptiveConcurrencyLimiter(min_limit=1, max_limit=8, initial_limit=2)
+
+        for _ in range(2):
+            limiter.acquire()
+            limiter.cancel()
+
+        assert limiter.in_flight == 0
+        assert limiter.limit == 2
+
+    def test_acquire_blocks_at_limit(self):
+        limiter = AdaptiveConcurrencyLimiter(min_limit=1, max_limit=1)
+        limiter.acquire()
+
+        acquired = threading.Event()
+
+        def acquire():
+            limiter.acquire()
+            acquired.set()
+
+        thread = threading.Thread(target=acquire)
+        thread.start()
+        time.sleep(0.1)
+        assert not acquired.is_set()
+
+        limiter.release(0.1)
+        thread.join(timeout=1)
+        assert acquired.is_set()
+        assert limiter.in_flight == 1
+
+    def test_invalid_limits(self):
+        with self.assertRaises(ValueError):
+            AdaptiveConcurrencyLimiter(min_limit=4, max_limit=2)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.0
+        self.changes = []
+        self.circuit_breaker = CircuitBreaker(
+            failure_threshold=2,
+            reset_timeout_seconds=10,
+            on_change=lambda previous, state: self.changes.append((previous, state)),
+            clock=lambda: self.now,
+        )
+
+    def test_opens_after_consecutive_failures(self):
+        assert self.circuit_breaker.allow_request()
+        self.circuit_breaker.record_failure()
+        assert self.circuit_breaker.allow_request()
+        self.circuit_breaker.record_success()
+        # not consecutive
+        assert self.circuit_breaker.allow_request()
+        self.circuit_breaker.record_failure()
+        assert self.circuit_breaker.state == CircuitBreakerState.CLOSED
+
+        assert self.circuit_breaker.allow_request()
+        self.circuit_breaker.record_failure()
+
+        assert self.circuit_breaker.state == CircuitBreakerState.OPEN
+        assert not self.circuit_breaker.allow_request()
+        assert self.changes == [(CircuitBreakerState.CLOSED, CircuitBreakerState.OPEN)]
+
+    def test_half_open_probe_closes_on_success(self):
+        for _ in range(2):
+            self.circuit_breaker.allow_request()
+            self.circuit_breaker.record_failure()
+
+        self.now = 10
+        assert self.circuit_breaker.allow_request()
+        assert self.circuit_breaker.state == CircuitBreakerState.HALF_OPEN
+        # a single probe at a time
+        assert not self.circuit_breaker.allow_request()
+
+        self.circuit_breaker.record_success()
+        assert self.circuit_breaker.state == CircuitBreakerState.CLOSED
+        assert self.circuit_breaker.allow_request()
+
+    def test_half_open_probe_cancelled(self):
+        for _ in range(2):
+            self.circuit_breaker.allow_request()
+            self.circuit_breaker.record_failure()
+
+        self.now = 10
+        assert self.circuit_breaker.allow_request()
+        self.circuit_breaker.record_cancellation()
+
+        # still half-open, and a new probe can go through
+        assert self.circuit_breaker.state == CircuitBreakerState.HALF_OPEN
+        assert self.circuit_breaker.allow_request()
+
+    def test_half_open_probe_opens_again_on_failure(self):
+        for _ in range(2):
+            self.circuit_breaker.allow_request()
+            self.circuit_breaker.record_failure()
+
+        self.now = 10
+        assert self.circuit_breaker.allow_request()
+        self.circuit_breaker.record_failure()
+
+        assert self.circuit_breaker.state == CircuitBreakerState.OPEN
+        self.now = 15
+        assert not self.circuit_breaker.allow_request()
+        assert self.changes == [
+            (CircuitBreakerState.CLOSED, CircuitBreakerState.OPEN),
+            (CircuitBreakerState.OPEN, CircuitBreakerState.HALF_OPEN),
+            (CircuitBreakerState.HALF_OPEN, CircuitBreakerState.OPEN),
+        ]
+
+
+class TestSharedExecutor(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = SharedExecutor(max_workers=4, max_concurrency_per_key=1)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def _wait_all(self, futures):
+        pending = set(futures)
+        while pending:
+            pending -= self.executor.wait_any(pending)
+        return [future.result() for future in futures]
+
+    def test_tasks_submitted_at_once_run_in_parallel(self):
+        # one idle thread, left by a previous task
+        self._wait_all([self.executor.submit("a", lambda: None)])
+        barrier = threading.Barrier(2, timeout=1)
+
+        # both tasks must run at once to pass the barrier
+        assert sorted(
+            self._wait_all(
+                [self.executor.submit(key, barrier.wait) for key in ["a", "b"]]
+            )
+        ) == [0, 1]
+
+    def test_wait_any_timeout(self):
+        release = threading.Event()
+        future = self.executor.submit("a", release.wait)
+
+        assert self.executor.wait_any({future}, timeout_seconds=0.05) == set()
+        release.set()
+        assert self.executor.wait_any({future}, timeout_seconds=1) == {future}
+
+    def test_wait_until_lends_slot_of_waiting_task(self):
+        completed: List[int] = []
+
+        def task():
+            # same key, so it only runs while the waiting task lends its slot
+            self.executor.submit("a", lambda: completed.append(1))
+            self.executor.wait_until(lambda: bool(completed))
+            return completed
+
+        assert self._wait_all([self.executor.submit("a", task)]) == [[1]]
+
+    def test_limit_per_key(self):
+        lock = threading.Lock()
+        in_flight: Dict[str, int] = defaultdict(int)
+        max_in_flight: Dict[str, int] = defaultdict(int)
+
+        def task(key: str) -> str:
+            with lock:
+                in_flight[key] += 1
+                max_in_flight[key] = max(max_in_flight[key], in_flight[key])
+            time.sleep(0.05)
+            with lock:
+                in_flight[key] -= 1
+            return key
+
+        start = time.perf_counter()
+        results = self._wait_all(
+            [self.executor.submit(key, task, key) for key in ["a", "a", "a", "b", "b"]]
+        )
+        elapsed = time.perf_counter() - start
+
+        assert results == ["a", "a", "a", "b", "b"]
+        assert max_in_flight == {"a": 1, "b": 1}
+        # keys run in parallel
+        assert elapsed < 0.25
+        # threads are kept for the next tasks
+        num_threads = self.executor.num_threads
+        self._wait_all([self.executor.submit("a", task, "a")])
+        assert self.executor.num_threads == num_threads
+
+    def test_nested_tasks_run_by_waiting_thread(self):
+        executor = SharedExecutor(max_workers=1, max_concurrency_per_key=1)
+
+        def inner(value: int) -> int:
+            return value * 2
+
+        def outer() -> int:
+            futures = {executor.submit("a", inner, value) for value in range(3)}
+            total = 0
+            while futures:
+                done = executor.wait_any(futures)
+                futures -= done
+                total += sum(future.result() for future in done)
+            return total
+
+        try:
+            future = executor.submit("a", outer)
+            # the single worker is busy with the outer task, so the caller runs tasks too
+            assert executor.wait_any({future}) == {future}
+            assert future.result() == 6
+            assert executor.num_threads == 1
+        finally:
+            executor.shutdown()
+
+    def test_tasks_run_in_submitter_context(self):
+        variable: contextvars.ContextVar[str] = contextvars.ContextVar(
+            "variable", default="default"
+        )
+
+        def submit() -> str:
+            variable.set("submitter")
+            return self._wait_all([self.executor.submit("a", variable.get)])[0]
+
+        assert contextvars.copy_context().run(submit) == "submitter"
+        assert self._wait_all([self.executor.submit("a", variable.get)]) == ["default"]
+
+    def test_exceptions_set_in_futures(self):
+        def fail() -> None:
+            raise ValueError("boom")
+
+        future = self.executor.submit("a", fail)
+        self.executor.wait_any({future})
+        assert isinstance(future.exception(), ValueError)
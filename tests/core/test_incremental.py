@@ -0,0 +1,182 @@
+import os
+import sqlite3
+import statistics
+import tempfile
+import unittest
+
+from pytest import approx
+
+from profile_v2.core.incremental import IncrementalProfileEngine
+from profile_v2.core.model import (BatchSpec, CustomStatistic, PartitionSpec,
+                                   PartitionsSpec, ProfileRequest,
+                                   ProfileStatisticType,
+                                   SuccessStatisticResult, TypedStatistic,
+                                   UnsuccessfulStatisticResultType)
+from profile_v2.core.report import ProfileCoreReport
+from profile_v2.core.sqlalchemy.sqlalchemy import SqlAlchemyProfileEngine
+from tests.core.common import create_sqlite_datasource
+
+
+class TestIncrementalProfileEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "db.sqlite")
+        self.rows = [
+            ("d1", 1.0),
+            ("d1", 3.0),
+            ("d1", None),
+            ("d2", 10.0),
+            ("d2", 4.0),
+            ("d2", 7.0),
+        ]
+        self.datasource = create_sqlite_datasource(
+            self.path, {"events": (["day", "amount"], self.rows)}
+        )
+        self.report = ProfileCoreReport()
+        self.sqlalchemy_engine = SqlAlchemyProfileEngine(report=self.report)
+        self.versions = {}
+        self.engine = IncrementalProfileEngine(
+            self.sqlalchemy_engine,
+            report=self.report,
+            partition_versions=lambda datasource, batch: self.versions,
+        )
+
+    def tearDown(self):
+        self.sqlalchemy_engine.engine_registry.dispose(self.datasource)
+        self.tmpdir.cleanup()
+
+    @staticmethod
+    def _requests(days):
+        return [
+            ProfileRequest(
+                statistics=[
+                    TypedStatistic(
+                        fq_name="events.row_count",
+                        type=ProfileStatisticType.TABLE_ROW_COUNT,
+                    ),
+                    *[
+                        TypedStatistic(
+                            fq_name=f"events.amount.{statistic_type.value}",
+                            type=statistic_type,
+                            columns=["amount"],
+                        )
+                        for statistic_type in [
+                            ProfileStatisticType.COLUMN_NULL_COUNT,
+                            ProfileStatisticType.COLUMN_MIN,
+                            ProfileStatisticType.COLUMN_MAX,
+                            ProfileStatisticType.COLUMN_MEAN,
+                        ]
+                    ],
+                ],
+                batch=BatchSpec(
+                    fq_dataset_name="main.events",
+                    partitions=PartitionsSpec(
+                        columns=[PartitionSpec(column="day", values=days)]
+                    ),
+                ),
+            )
+        ]
+
+    def _insert(self, rows):
+        with sqlite3.connect(self.path) as connection:
+            connection.executemany("INSERT INTO events VALUES (?, ?)", rows)
+        self.rows.extend(rows)
+
+    def _num_queries(self) -> int:
+        return self.report.num_issued_queries_by_engine["SqlAlchemyProfileEngine"]
+
+    def _assert_combined(self, response, days):
+        amounts = [amount for day, amount in self.rows if day in days]
+        non_null_amounts = [amount for amount in amounts if amount is not None]
+        assert response.data["events.row_count"] == SuccessStatisticResult(
+            value=len(amounts)
+        )
+        assert response.data["events.amount.column_null_count"] == (
+            SuccessStatisticResult(value=len(amounts) - len(non_null_amounts))
+        )
+        assert response.data["events.amount.column_min"] == SuccessStatisticResult(
+            value=min(non_null_amounts)
+        )
+        assert response.data["events.amount.column_max"] == SuccessStatisticResult(
+            value=max(non_null_amounts)
+        )
+        assert response.data["events.amount.column_mean"].value == approx(
+            statistics.mean(non_null_amounts)
+        )
+
+    def test_only_new_partitions_profiled(self):
+        response = self.engine.profile(self.datasource, self._requests(["d1", "d2"]))
+        self._assert_combined(response, ["d1", "d2"])
+        assert self._num_queries() == 2  # one scan per partition
+
+        self._insert([("d3", 2.0), ("d3", 5.0)])
+        response = self.engine.profile(
+            self.datasource, self._requests(["d1", "d2", "d3"])
+        )
+        self._assert_combined(response, ["d1", "d2", "d3"])
+        assert self._num_queries() == 3
+        assert self.report.num_cache_hits_by_engine["IncrementalProfileEngine"] == 12
+
+    def test_changed_partitions_profiled(self):
+        self.engine.profile(self.datasource, self._requests(["d1", "d2"]))
+
+        self._insert([("d2", 100.0)])
+        self.versions = {"d2": "v2"}
+        response = self.engine.profile(self.datasource, self._requests(["d1", "d2"]))
+
+        self._assert_combined(response, ["d1", "d2"])
+        assert self._num_queries() == 3
+
+    def test_stddev_combined(self):
+        partitions = [[1.0, 3.0], [10.0, 4.0, 7.0], [5.0]]
+        partial_values = [
+            {
+                ProfileStatisticType.COLUMN_STDDEV: (
+                    statistics.stdev(partition) if len(partition) > 1 else None
+                ),
+                ProfileStatisticType.COLUMN_MEAN: statistics.mean(partition),
+                ProfileStatisticType.COLUMN_NON_NULL_COUNT: len(partition),
+            }
+            for partition in partitions
+        ]
+
+        assert IncrementalProfileEngine._combine_partial_values(
+            ProfileStatisticType.COLUMN_STDDEV, partial_values
+        ) == approx(statistics.stdev([1.0, 3.0, 10.0, 4.0, 7.0, 5.0]))
+
+    def test_non_combinable_statistics_profiled_as_is(self):
+        batch = self._requests(["d1", "d2"])[0].batch
+        response = self.engine.profile(
+            self.datasource,
+            [
+                ProfileRequest(
+                    statistics=[
+                        TypedStatistic(
+                            fq_name="events.amount.distinct_count",
+                            type=ProfileStatisticType.COLUMN_DISTINCT_COUNT,
+                            columns=["amount"],
+                        ),
+                        CustomStatistic(fq_name="events.amount.sum", sql="SUM(amount)"),
+                    ],
+                    batch=batch,
+                )
+            ],
+        )
+
+        assert response.data["events.amount.distinct_count"] == (
+            SuccessStatisticResult(value=5)
+        )
+        assert response.data["events.amount.sum"] == SuccessStatisticResult(value=25.0)
+        assert self._num_queries() == 1
+
+    def test_failed_partition_fails_statistic(self):
+        requests = self._requests(["d1"])
+        requests[0].batch.fq_dataset_name = "main.non_existing"
+
+        response = self.engine.profile(self.datasource, requests)
+
+        assert (
+            response.data["events.row_count"].type
+            == UnsuccessfulStatisticResultType.FAILURE
+        )
@@ -1,6 +1,7 @@
 import unittest
 from threading import Thread
 
+from profile_v2.core.concurrency import CircuitBreakerState
 from profile_v2.core.model import UnsuccessfulStatisticResultType
 from profile_v2.core.report import ProfileCoreReport
 
@@ -89,5 +90,134 @@ class TestProfileCoreReport(unittest.TestCase):
             repr(report)
             == "ProfileCoreReport(num_issued_queries_by_engine={'engine1': 2, 'engine2': 1}, "
             "num_successful_queries_by_engine={'engine1': 2}, "
-            "num_unsuccessful_queries_by_engine_and_status={('engine2', 'failure'): 1})"
+            "num_unsuccessful_queries_by_engine_and_status={('engine2', 'failure'): 1}, "
+            "num_connection_checkouts_by_engine={}, "
+            "connection_checkout_seconds_by_engine={}, "
+            "num_cache_hits_by_engine={}, "
+            "num_cache_misses_by_engine={}, "
+            "concurrency_limit_by_engine_and_datasource={}, "
+            "num_concurrency_increases_by_engine={}, "
+            "num_concurrency_decreases_by_engine={}, "
+            "num_single_flight_joins_by_engine={}, "
+            "num_hedges_by_engine={}, "
+            "num_hedge_wins_by_engine={}, "
+            "circuit_breaker_state_by_engine_and_datasource={}, "
+            "num_circuit_breaker_opens_by_engine={}, "
+            "num_routed_statistics_by_routing_key={}, "
+            "num_routed_successes_by_routing_key={}, "
+            "queue_depth_by_engine={}, "
+            "max_queue_depth_by_engine={}, "
+            "queued_statistics_by_engine={}, "
+            "max_queued_statistics_by_engine={}, "
+            "num_queued_calls_by_engine={}, "
+            "queue_wait_seconds_by_engine={}, "
+            "service_seconds_by_engine={}, "
+            "num_expired_calls_by_engine={}, "
+            "num_overloaded_calls_by_engine={})"
         )
+
+    def test_connection_checkout_accumulates_time(self):
+        report = ProfileCoreReport()
+        report.connection_checkout("engine1", 0.5)
+        report.connection_checkout("engine1", 0.25)
+
+        assert report.num_connection_checkouts_by_engine["engine1"] == 2
+        assert report.connection_checkout_seconds_by_engine["engine1"] == 0.75
+        assert report.num_connection_checkouts_by_engine["engine2"] == 0
+
+    def test_cache_lookup_accumulates_hits_and_misses(self):
+        report = ProfileCoreReport()
+        report.cache_lookup("engine1", hits=3, misses=1)
+        report.cache_lookup("engine1", hits=0, misses=2)
+
+        assert report.num_cache_hits_by_engine["engine1"] == 3
+        assert report.num_cache_misses_by_engine["engine1"] == 3
+        assert report.num_cache_hits_by_engine["engine2"] == 0
+
+    def test_concurrency_limit_adjustments(self):
+        report = ProfileCoreReport()
+        report.concurrency_limit("engine1", "datasource1", 4)
+        report.concurrency_limit("engine1", "datasource1", 5, previous_limit=4)
+        report.concurrency_limit("engine1", "datasource2", 4)
+        report.concurrency_limit("engine1", "datasource1", 2, previous_limit=5)
+
+        assert report.concurrency_limit_by_engine_and_datasource == {
+            ("engine1", "datasource1"): 2,
+            ("engine1", "datasource2"): 4,
+        }
+        assert report.num_concurrency_increases_by_engine["engine1"] == 1
+        assert report.num_concurrency_decreases_by_engine["engine1"] == 1
+
+    def test_single_flight_join_accumulates_statistics(self):
+        report = ProfileCoreReport()
+        report.single_flight_join("engine1", 2)
+        report.single_flight_join("engine1", 3)
+
+        assert report.num_single_flight_joins_by_engine["engine1"] == 5
+        assert report.num_single_flight_joins_by_engine["engine2"] == 0
+
+    def test_hedge_win_rate(self):
+        report = ProfileCoreReport()
+        assert report.hedge_win_rate("engine1") is None
+
+        for _ in range(4):
+            report.hedge("engine1")
+        report.hedge_win("engine1")
+
+        assert report.num_hedges_by_engine["engine1"] == 4
+        assert report.num_hedge_wins_by_engine["engine1"] == 1
+        assert report.hedge_win_rate("engine1") == 0.25
+
+    def test_circuit_breaker_state(self):
+        report = ProfileCoreReport()
+        report.circuit_breaker_state(
+            "engine1", "sqlite:1234", CircuitBreakerState.CLOSED
+        )
+        report.circuit_breaker_state(
+            "engine1",
+            "sqlite:1234",
+            CircuitBreakerState.OPEN,
+            previous_state=CircuitBreakerState.CLOSED,
+        )
+
+        assert report.circuit_breaker_state_by_engine_and_datasource == {
+            ("engine1", "sqlite:1234"): CircuitBreakerState.OPEN
+        }
+        assert report.num_circuit_breaker_opens_by_engine["engine1"] == 1
+        assert (
+            "circuit_breaker_state_by_engine_and_datasource={('engine1', 'sqlite:1234'): 'open'}"
+            in repr(report)
+        )
+
+    def test_routed_statistics(self):
+        report = ProfileCoreReport()
+        assert report.routing_success_rate("engine1", "custom", "sqlite:1234") is None
+
+        report.routed_statistic("engine1", "custom", "sqlite:1234", True)
+        report.routed_statistic("engine1", "custom", "sqlite:1234", True)
+        report.routed_statistic("engine1", "custom", "sqlite:1234", False)
+
+        assert report.routing_success_rate("engine1", "custom", "sqlite:1234") == 2 / 3
+        assert report.routing_success_rate("engine1", "custom", "sqlite:5678") is None
+
+    def test_queue_metrics(self):
+        report = ProfileCoreReport()
+        assert report.mean_queue_wait_seconds("engine1") is None
+        assert report.mean_service_seconds("engine1") is None
+
+        report.queue_depth("engine1", 2, 10)
+        report.queue_depth("engine1", 1, 4)
+        report.queued_call("engine1", 0.5, 1.0)
+        report.queued_call("engine1", 1.5, 2.0)
+        report.expired_call("engine1")
+        report.overloaded_call("engine1")
+
+        assert report.queue_depth_by_engine["engine1"] == 1
+        assert report.max_queue_depth_by_engine["engine1"] == 2
+        assert report.queued_statistics_by_engine["engine1"] == 4
+        assert report.max_queued_statistics_by_engine["engine1"] == 10
+        assert report.num_queued_calls_by_engine["engine1"] == 2
+        assert report.num_expired_calls_by_engine["engine1"] == 1
+        assert report.num_overloaded_calls_by_engine["engine1"] == 1
+        assert report.mean_queue_wait_seconds("engine1") == 1.0
+        assert report.mean_service_seconds("engine1") == 1.5
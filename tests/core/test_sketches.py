@@ -0,0 +1,95 @@
+import random
+import unittest
+
+from pytest import approx, raises
+
+from profile_v2.core.sketches import (HyperLogLogSketch, KllQuantileSketch,
+                                      Sketch, SpaceSavingSketch)
+
+
+class TestHyperLogLogSketch(unittest.TestCase):
+
+    def test_estimate_within_error(self):
+        sketch = HyperLogLogSketch()
+        for i in range(100_000):
+            sketch.add(i)
+
+        assert sketch.estimate() == approx(100_000, rel=3 * sketch.relative_error)
+
+    def test_small_cardinalities_and_nulls(self):
+        sketch = HyperLogLogSketch()
+        for value in ["a", "b", "a", None, "c"]:
+            sketch.add(value)
+
+        assert sketch.estimate() == 3
+
+    def test_merge_overlapping(self):
+        sketch1 = HyperLogLogSketch()
+        sketch2 = HyperLogLogSketch()
+        for i in range(50_000):
+            sketch1.add(i)
+            sketch2.add(i + 25_000)
+
+        merged = sketch1.merge(sketch2)
+
+        assert merged.estimate() == approx(75_000, rel=3 * merged.relative_error)
+        with raises(ValueError):
+            sketch1.merge(HyperLogLogSketch(precision=10))
+
+    def test_serialization(self):
+        sketch = HyperLogLogSketch(precision=8)
+        for i in range(1000):
+            sketch.add(f"value{i}")
+
+        data = sketch.to_bytes()
+
+        assert len(data) < 300
+        assert Sketch.from_bytes(data) == sketch
+
+
+class TestKllQuantileSketch(unittest.TestCase):
+
+    def test_quantiles_and_merge(self):
+        values = list(range(100_000))
+        random.Random(42).shuffle(values)
+        sketch1 = KllQuantileSketch()
+        sketch2 = KllQuantileSketch()
+        for value in values[:50_000]:
+            sketch1.add(value)
+        for value in values[50_000:]:
+            sketch2.add(value)
+
+        merged = sketch1.merge(sketch2)
+
+        assert merged.count == 100_000
+        assert sum(len(level) for level in merged.levels) < 1000
+        for q in [0.1, 0.5, 0.9]:
+            assert merged.quantile(q) == approx(q * 100_000, abs=2_000)
+        assert merged.rank(25_000) == approx(0.25, abs=0.02)
+        assert Sketch.from_bytes(merged.to_bytes()) == merged
+
+
+class TestSpaceSavingSketch(unittest.TestCase):
+
+    def test_heavy_hitters_and_merge(self):
+        rng = random.Random(42)
+        population = ["a"] * 50 + ["b"] * 30 + [str(i) for i in range(100)]
+        sketch1 = SpaceSavingSketch(capacity=10)
+        sketch2 = SpaceSavingSketch(capacity=10)
+        for _ in range(5_000):
+            sketch1.add(rng.choice(population))
+            sketch2.add(rng.choice(population))
+
+        merged = sketch1.merge(sketch2)
+        top = merged.top_k(2)
+
+        assert [value for value, _, _ in top] == ["a", "b"]
+        for value, count, error in top:
+            true_count = 10_000 * population.count(value) / len(population)
+            assert count - error <= true_count * 1.1
+            assert count >= true_count * 0.9
+        assert Sketch.from_bytes(merged.to_bytes()).top_k(2) == top
+
+    def test_cannot_merge_different_sketches(self):
+        with raises(ValueError):
+            SpaceSavingSketch().merge(HyperLogLogSketch())
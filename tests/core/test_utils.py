@@ -1,22 +1,47 @@
 import asyncio
+import concurrent.futures
+import contextvars
 import logging
+import os
+import tempfile
+import threading
 import time
 import unittest
-from typing import List
+from datetime import date, datetime
+from typing import List, Set, Tuple
 
 from pytest import approx
 
-from profile_v2.core.api_utils import (AsyncProfileEngine, ModelCollections,
+from profile_v2.core.api import (CancellationToken, ProfileEngine,
+                                 ProfileEngineCancelledError,
+                                 ProfileEngineOverloadedError,
+                                 ProfileEngineTimeoutError,
+                                 ProfileEngineValueError,
+                                 current_cancellation_token)
+from profile_v2.core.api_utils import (AsyncProfileEngine,
+                                       CachingProfileEngine, ModelCollections,
                                        ParallelProfileEngine,
-                                       SequentialFallbackProfileEngine)
+                                       QueueOverloadPolicy,
+                                       RoutingProfileEngine,
+                                       SequentialFallbackProfileEngine,
+                                       SingleFlightProfileEngine)
+from profile_v2.core.concurrency import CircuitBreakerState, SharedExecutor
 from profile_v2.core.model import (BatchSpec, CustomStatistic, DataSource,
-                                   DataSourceType,
+                                   DataSourceType, PartitionSpec,
+                                   PartitionsSpec,
                                    ProfileNonFunctionalRequirements,
                                    ProfileRequest, ProfileResponse,
+                                   ProfileStatisticType, SketchStatisticResult,
                                    StatisticSpec, SuccessStatisticResult,
-                                   UnsuccessfulStatisticResult,
+                                   TypedStatistic, UnsuccessfulStatisticResult,
                                    UnsuccessfulStatisticResultType)
-from tests.core.common import FixedResponseEngine, SuccessResponseEngine
+from profile_v2.core.model_utils import ModelKeys
+from profile_v2.core.report import ProfileCoreReport
+from profile_v2.core.sketches import HyperLogLogSketch
+from profile_v2.core.sqlalchemy.sqlalchemy import SqlAlchemyProfileEngine
+from tests.core.common import (FixedResponseEngine, SuccessResponseEngine,
+                               add_slow_sqlite_function,
+                               create_sqlite_datasource)
 
 logger = logging.getLogger(__name__)
 
@@ -195,6 +220,33 @@ class TestModelCollections(unittest.TestCase):
             ),
         ]
 
+    def test_join_statistics_by_batch_interleaved(self):
+        requests = [
+            ProfileRequest(
+                statistics=[StatisticSpec(fq_name=f"fq_name_stat{i}")],
+                batch=BatchSpec(fq_dataset_name=f"batch{i % 2}"),
+            )
+            for i in range(4)
+        ]
+        grouped = ModelCollections.join_statistics_by_batch(requests)
+        # in order of first appearance of every batch
+        assert grouped == [
+            ProfileRequest(
+                statistics=[
+                    StatisticSpec(fq_name="fq_name_stat0"),
+                    StatisticSpec(fq_name="fq_name_stat2"),
+                ],
+                batch=BatchSpec(fq_dataset_name="batch0"),
+            ),
+            ProfileRequest(
+                statistics=[
+                    StatisticSpec(fq_name="fq_name_stat1"),
+                    StatisticSpec(fq_name="fq_name_stat3"),
+                ],
+                batch=BatchSpec(fq_dataset_name="batch1"),
+            ),
+        ]
+
     def test_group_requests_by_batch(self):
         requests = [
             ProfileRequest(
@@ -276,6 +328,87 @@ class TestModelCollections(unittest.TestCase):
             ),
         }
 
+    def test_split_response_by_type_with_sketch_results(self):
+        response = ProfileResponse(
+            data={
+                "fq_stat1": SketchStatisticResult(value=1, sketch=HyperLogLogSketch()),
+                "fq_stat2": SuccessStatisticResult(value=2),
+            }
+        )
+
+        responses_by_type = ModelCollections.split_response_by_type(response)
+
+        assert responses_by_type == {SuccessStatisticResult: response}
+
+    def test_merge_sketch_results(self):
+        sketches = [HyperLogLogSketch(), HyperLogLogSketch()]
+        for i in range(10):
+            sketches[0].add(i)
+            sketches[1].add(i + 5)
+        results = [
+            SketchStatisticResult(value=sketch.estimate(), sketch=sketch)
+            for sketch in sketches
+        ]
+
+        merged = ModelCollections.merge_sketch_results(results)
+        assert isinstance(merged, SketchStatisticResult)
+        assert merged.value == 15
+        assert merged.error_bound == sketches[0].relative_error
+
+        failure = UnsuccessfulStatisticResult(
+            type=UnsuccessfulStatisticResultType.FAILURE
+        )
+        assert ModelCollections.merge_sketch_results([results[0], failure]) == failure
+        assert (
+            ModelCollections.merge_sketch_results(
+                [results[0], SuccessStatisticResult(value=1)]
+            ).type
+            == UnsuccessfulStatisticResultType.FAILURE
+        )
+
+    def test_merge_sketch_responses(self):
+        sketch = HyperLogLogSketch()
+        sketch.add("a")
+        responses = [
+            ProfileResponse(
+                data={"fq_stat1": SketchStatisticResult(value=1, sketch=sketch)}
+            ),
+            ProfileResponse(
+                data={"fq_stat1": SketchStatisticResult(value=1, sketch=sketch)}
+            ),
+        ]
+
+        merged = ModelCollections.merge_sketch_responses(responses)
+
+        assert merged.data["fq_stat1"].value == 1
+
+
+class TestModelKeys(unittest.TestCase):
+
+    def test_batch_key_distinguishes_value_types(self):
+        def batch(value) -> BatchSpec:
+            return BatchSpec(
+                fq_dataset_name="batch1",
+                partitions=PartitionsSpec(
+                    columns=[PartitionSpec(column="day", values=[value])]
+                ),
+            )
+
+        keys = {
+            ModelKeys.batch_key(batch(value))
+            for value in [
+                date(2024, 1, 1),
+                "2024-01-01",
+                datetime(2024, 1, 1),
+                "2024-01-01 00:00:00",
+            ]
+        }
+
+        assert len(keys) == 4
+        assert ModelKeys.batch_key(batch(date(2024, 1, 1))) == ModelKeys.batch_key(
+            batch(date(2024, 1, 1))
+        )
+
 
 class TestSequentialFallbackProfileEngine(unittest.TestCase):
 
@@ -379,6 +512,33 @@ class TestSequentialFallbackProfileEngine(unittest.TestCase):
 
         response = fallback_engine.profile(self._datasource, requests)
         print(response)
+        # next engines only get the statistics that failed in the previous one
+        assert engine2.received_requests == [
+            ProfileRequest(
+                statistics=[
+                    StatisticSpec(fq_name="fq_stat_2b"),
+                    StatisticSpec(fq_name="fq_stat_2c"),
+                ],
+                batch=BatchSpec(fq_dataset_name="batch2"),
+            ),
+            ProfileRequest(
+                statistics=[
+                    StatisticSpec(fq_name="fq_stat_3b"),
+                    StatisticSpec(fq_name="fq_stat_3c"),
+                ],
+                batch=BatchSpec(fq_dataset_name="batch3"),
+            ),
+        ]
+        assert engine3.received_requests == [
+            ProfileRequest(
+                statistics=[StatisticSpec(fq_name="fq_stat_2c")],
+                batch=BatchSpec(fq_dataset_name="batch2"),
+            ),
+            ProfileRequest(
+                statistics=[StatisticSpec(fq_name="fq_stat_3b")],
+                batch=BatchSpec(fq_dataset_name="batch3"),
+            ),
+        ]
         assert response == ProfileResponse(
             data={
                 "fq_stat_1a": SuccessStatisticResult(value=1),
@@ -459,125 +619,1425 @@ class TestSequentialFallbackProfileEngine(unittest.TestCase):
             }
         )
 
+    def test_pending_requests_share_statistics_in_requested_order(self):
+        statistics = [StatisticSpec(fq_name=f"fq_stat_{i}") for i in range(4)]
+        requests = [
+            ProfileRequest(
+                statistics=statistics[:2], batch=BatchSpec(fq_dataset_name="batch1")
+            ),
+            ProfileRequest(
+                statistics=statistics[2:], batch=BatchSpec(fq_dataset_name="batch2")
+            ),
+        ]
+        unsupported = UnsuccessfulStatisticResult(
+            type=UnsuccessfulStatisticResultType.UNSUPPORTED
+        )
+        engine1 = FixedResponseEngine(
+            ProfileResponse(
+                data={
+                    "fq_stat_3": unsupported,
+                    "fq_stat_0": SuccessStatisticResult(value=1),
+                    "fq_stat_2": unsupported,
+                    "fq_stat_1": SuccessStatisticResult(value=1),
+                }
+            )
+        )
+        engine2 = FixedResponseEngine(
+            ProfileResponse(
+                data={
+                    "fq_stat_2": SuccessStatisticResult(value=2),
+                    "fq_stat_3": SuccessStatisticResult(value=2),
+                }
+            )
+        )
+
+        SequentialFallbackProfileEngine([engine1, engine2]).profile(
+            self._datasource, requests
+        )
 
-class TestParallelProfileEngine(unittest.TestCase):
+        assert engine1.received_requests is requests
+        assert engine2.received_requests == [
+            ProfileRequest(
+                statistics=statistics[2:], batch=BatchSpec(fq_dataset_name="batch2")
+            )
+        ]
+        assert engine2.received_requests[0].batch is requests[1].batch
+        assert all(
+            pending is requested
+            for pending, requested in zip(
+                engine2.received_requests[0].statistics, statistics[2:]
+            )
+        )
+
+
+class TestHedgedSequentialFallbackProfileEngine(unittest.TestCase):
+    _datasource = DataSource(
+        source=DataSourceType.SNOWFLAKE, connection_string="connection_string1"
+    )
     _requests = [
         ProfileRequest(
             statistics=[
-                CustomStatistic(fq_name="fq_stat1_1", sql="1"),
-                CustomStatistic(fq_name="fq_stat2_1", sql="1"),
+                StatisticSpec(fq_name="fq_stat_a"),
+                StatisticSpec(fq_name="fq_stat_b"),
             ],
             batch=BatchSpec(fq_dataset_name="batch1"),
-        ),
-        ProfileRequest(
-            statistics=[
-                CustomStatistic(fq_name="fq_stat1_2", sql="1"),
-                CustomStatistic(fq_name="fq_stat2_2", sql="1"),
+        )
+    ]
+
+    def test_hedge_slow_engine(self):
+        report = ProfileCoreReport()
+        hedge_engine = SuccessResponseEngine(success_value=2, elapsed_time_millis=10)
+        engine = SequentialFallbackProfileEngine(
+            [
+                SuccessResponseEngine(success_value=1, elapsed_time_millis=1000),
+                hedge_engine,
             ],
-            batch=BatchSpec(fq_dataset_name="batch2"),
-        ),
-        ProfileRequest(
-            statistics=[
-                CustomStatistic(fq_name="fq_stat1_3", sql="1"),
-                CustomStatistic(fq_name="fq_stat2_3", sql="1"),
+            report=report,
+            hedge_percentile=95,
+            hedge_initial_delay_seconds=0.1,
+        )
+
+        start_time = time.time()
+        response = engine.profile(self._datasource, self._requests)
+        elapsed_time = time.time() - start_time
+
+        assert response == ProfileResponse(
+            data={
+                "fq_stat_a": SuccessStatisticResult(value=2),
+                "fq_stat_b": SuccessStatisticResult(value=2),
+            }
+        )
+        # not waiting for the slow engine
+        assert elapsed_time == approx(0.11, abs=0.1)
+        assert hedge_engine.received_requests == [self._requests]
+        assert report.num_hedges_by_engine["SuccessResponseEngine"] == 1
+        assert report.hedge_win_rate("SuccessResponseEngine") == 1
+
+    def test_slower_engine_call_cancelled(self):
+        class CancellableSlowEngine(SuccessResponseEngine):
+            def __init__(self):
+                super().__init__(success_value=1)
+                self.cancelled = threading.Event()
+
+            def _do_profile(self, datasource, requests, non_functional_requirements):
+                # stand-in of a warehouse statement, cancelled through the token of the call
+                token = current_cancellation_token.get()
+                assert token is not None
+                token.add_callback(self.cancelled.set)
+                if self.cancelled.wait(5):
+                    raise ProfileEngineCancelledError("Profile call cancelled")
+                return super()._do_profile(
+                    datasource, requests, non_functional_requirements
+                )
+
+        slow_engine = CancellableSlowEngine()
+        engine = SequentialFallbackProfileEngine(
+            [slow_engine, SuccessResponseEngine(success_value=2)],
+            report=ProfileCoreReport(),
+            hedge_percentile=95,
+            hedge_initial_delay_seconds=0.05,
+        )
+
+        response = engine.profile(self._datasource, self._requests)
+
+        assert response.data["fq_stat_a"] == SuccessStatisticResult(value=2)
+        assert slow_engine.cancelled.wait(1)
+        # the cancelled call is sampled at its elapsed time, so the hedge delay doesn't drift downward
+        deadline = time.monotonic() + 1
+        while not engine._latencies_seconds[0] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert engine._latencies_seconds[0][0] >= 0.05 / 2
+        # the caller has no token, and its context is left as it was
+        assert current_cancellation_token.get() is None
+
+    def test_no_hedge_for_fast_engine(self):
+        report = ProfileCoreReport()
+        hedge_engine = SuccessResponseEngine(success_value=2)
+        engine = SequentialFallbackProfileEngine(
+            [
+                SuccessResponseEngine(success_value=1, elapsed_time_millis=10),
+                hedge_engine,
             ],
-            batch=BatchSpec(fq_dataset_name="batch3"),
-        ),
-    ]
+            report=report,
+            hedge_percentile=95,
+            hedge_initial_delay_seconds=0.5,
+        )
+
+        response = engine.profile(self._datasource, self._requests)
+
+        assert response.data["fq_stat_a"] == SuccessStatisticResult(value=1)
+        assert hedge_engine.received_requests == []
+        assert report.num_hedges_by_engine == {}
+
+    def test_hedge_delay_from_latency_percentile(self):
+        engine = SequentialFallbackProfileEngine(
+            [
+                SuccessResponseEngine(success_value=1, elapsed_time_millis=20),
+                SuccessResponseEngine(success_value=2),
+            ],
+            report=ProfileCoreReport(),
+            hedge_percentile=50,
+            hedge_min_samples=3,
+        )
+
+        # no hedging until the latencies are known
+        assert engine._hedge_delay_seconds(0, self._requests) is None
+        for _ in range(3):
+            engine.profile(self._datasource, self._requests)
+
+        assert engine._hedge_delay_seconds(0, self._requests) == approx(0.02, abs=0.015)
+        # latencies are per statistic, so the delay scales with the size of the call
+        assert engine._hedge_delay_seconds(0, self._requests * 10) == approx(
+            10 * engine._hedge_delay_seconds(0, self._requests)
+        )
+
+    def test_statistics_unsuccessful_in_both_continue_with_next_engine(self):
+        class SlowFixedResponseEngine(FixedResponseEngine):
+            def _do_profile(self, datasource, requests, non_functional_requirements):
+                time.sleep(0.3)
+                return super()._do_profile(
+                    datasource, requests, non_functional_requirements
+                )
+
+        unsupported = UnsuccessfulStatisticResult(
+            type=UnsuccessfulStatisticResultType.UNSUPPORTED
+        )
+        last_engine = SuccessResponseEngine(success_value=3)
+        report = ProfileCoreReport()
+        engine = SequentialFallbackProfileEngine(
+            [
+                SlowFixedResponseEngine(
+                    ProfileResponse(
+                        data={
+                            "fq_stat_a": SuccessStatisticResult(value=1),
+                            "fq_stat_b": unsupported,
+                        }
+                    )
+                ),
+                FixedResponseEngine(
+                    ProfileResponse(
+                        data={"fq_stat_a": unsupported, "fq_stat_b": unsupported}
+                    )
+                ),
+                last_engine,
+            ],
+            report=report,
+            hedge_percentile=95,
+            hedge_initial_delay_seconds=0.05,
+        )
+
+        response = engine.profile(self._datasource, self._requests)
+
+        assert response == ProfileResponse(
+            data={
+                "fq_stat_a": SuccessStatisticResult(value=1),
+                "fq_stat_b": SuccessStatisticResult(value=3),
+            }
+        )
+        assert last_engine.received_requests == [
+            [
+                ProfileRequest(
+                    statistics=[StatisticSpec(fq_name="fq_stat_b")],
+                    batch=BatchSpec(fq_dataset_name="batch1"),
+                )
+            ]
+        ]
+        assert report.num_hedges_by_engine["FixedResponseEngine"] == 1
+        assert report.num_hedge_wins_by_engine["FixedResponseEngine"] == 0
+
+
+class TestPipelinedSequentialFallbackProfileEngine(unittest.TestCase):
     _datasource = DataSource(
         source=DataSourceType.SNOWFLAKE, connection_string="connection_string1"
     )
+    _requests = [
+        ProfileRequest(
+            statistics=[
+                StatisticSpec(fq_name=f"fq_stat_{i}_a"),
+                StatisticSpec(fq_name=f"fq_stat_{i}_b"),
+            ],
+            batch=BatchSpec(fq_dataset_name=f"batch{i}"),
+        )
+        for i in range(3)
+    ]
+
+    class PerRequestDelayEngine(SuccessResponseEngine):
+        """Takes `elapsed_time_millis` per request, and fails the statistics in `unsupported_fq_names`."""
+
+        def __init__(self, success_value, elapsed_time_millis, unsupported_fq_names=()):
+            super().__init__(success_value=success_value)
+            self.request_elapsed_time_millis = elapsed_time_millis
+            self.unsupported_fq_names = set(unsupported_fq_names)
+
+        def _do_profile(self, datasource, requests, non_functional_requirements):
+            time.sleep(self.request_elapsed_time_millis * len(requests) / 1000)
+            response = super()._do_profile(
+                datasource, requests, non_functional_requirements
+            )
+            for fq_name in self.unsupported_fq_names & response.data.keys():
+                response.data[fq_name] = UnsuccessfulStatisticResult(
+                    type=UnsuccessfulStatisticResultType.UNSUPPORTED
+                )
+            return response
+
+    def _engines(self) -> List[ProfileEngine]:
+        return [
+            self.PerRequestDelayEngine(
+                1,
+                elapsed_time_millis=200,
+                unsupported_fq_names=[f"fq_stat_{i}_b" for i in range(3)],
+            ),
+            self.PerRequestDelayEngine(2, elapsed_time_millis=200),
+        ]
 
     _expected_response = ProfileResponse(
         data={
-            "fq_stat1_1": SuccessStatisticResult(value=1),
-            "fq_stat2_1": SuccessStatisticResult(value=1),
-            "fq_stat1_2": SuccessStatisticResult(value=1),
-            "fq_stat2_2": SuccessStatisticResult(value=1),
-            "fq_stat1_3": SuccessStatisticResult(value=1),
-            "fq_stat2_3": SuccessStatisticResult(value=1),
+            **{f"fq_stat_{i}_a": SuccessStatisticResult(value=1) for i in range(3)},
+            **{f"fq_stat_{i}_b": SuccessStatisticResult(value=2) for i in range(3)},
         }
     )
 
-    def _batch_requests_individually(
-        self, requests: List[ProfileRequest]
-    ) -> List[List[ProfileRequest]]:
-        return [[request] for request in requests]
+    def test_sequential(self):
+        engine = SequentialFallbackProfileEngine(self._engines())
 
-    def _batch_statistics_individually(
-        self, requests: List[ProfileRequest]
-    ) -> List[List[ProfileRequest]]:
-        result: List[List[ProfileRequest]] = []
-        for request in requests:
-            for statistic in request.statistics:
-                result.append(
-                    [ProfileRequest(statistics=[statistic], batch=request.batch)]
-                )
-        return result
+        start_time = time.time()
+        response = engine.profile(self._datasource, self._requests)
+        elapsed_time = time.time() - start_time
 
-    def test_profile_all_in_parallel(self):
-        parallel_engine = ParallelProfileEngine(
-            engine=SuccessResponseEngine(success_value=1, elapsed_time_millis=1000),
-            max_workers=3,
-            batch_requests_predicate=self._batch_requests_individually,
+        assert response == self._expected_response
+        # 3 requests in the first engine, then 3 requests in the second one
+        assert elapsed_time == approx(1.2, abs=0.1)
+
+    def test_pipelined(self):
+        engines = self._engines()
+        engine = SequentialFallbackProfileEngine(
+            engines, pipelined=True, pipeline_chunk_size=1
         )
 
         start_time = time.time()
-        response = parallel_engine.profile(self._datasource, self._requests)
-        end_time = time.time()
-        elapsed_time = end_time - start_time
+        response = engine.profile(self._datasource, self._requests)
+        elapsed_time = time.time() - start_time
 
         assert response == self._expected_response
-        # all requests in parallel, so elapsed time should be around 1 second = time of the slowest request
-        assert elapsed_time == approx(1, abs=0.1)
+        # second engine working on the failures of every request while the first one works on the next one
+        assert elapsed_time == approx(0.8, abs=0.1)
+        assert engines[1].received_requests == [
+            [
+                ProfileRequest(
+                    statistics=[StatisticSpec(fq_name=f"fq_stat_{i}_b")],
+                    batch=BatchSpec(fq_dataset_name=f"batch{i}"),
+                )
+            ]
+            for i in range(3)
+        ]
 
-    def test_profile_each_statistic_individually(self):
-        parallel_engine = ParallelProfileEngine(
-            engine=SuccessResponseEngine(success_value=1, elapsed_time_millis=1000),
-            max_workers=2,
-            batch_requests_predicate=self._batch_statistics_individually,
-        )
+    def test_pipelined_in_batch_sized_chunks_by_default(self):
+        engines = self._engines()
+        engine = SequentialFallbackProfileEngine(engines, pipelined=True)
 
-        start_time = time.time()
-        response = parallel_engine.profile(self._datasource, self._requests)
-        end_time = time.time()
-        elapsed_time = end_time - start_time
+        response = engine.profile(self._datasource, self._requests)
 
         assert response == self._expected_response
-        # all 6 statistics in individual batches, so elapsed time should be statistics=6/workers=2 = 3 seconds
-        assert elapsed_time == approx(3, abs=0.1)
+        # a single call to every engine, as the requests fit in a chunk
+        assert engines[0].received_requests == [self._requests]
+        assert engines[1].received_requests == [
+            [
+                ProfileRequest(
+                    statistics=[StatisticSpec(fq_name=f"fq_stat_{i}_b")],
+                    batch=BatchSpec(fq_dataset_name=f"batch{i}"),
+                )
+                for i in range(3)
+            ]
+        ]
 
+    def test_pipelined_engine_exception(self):
+        class FailingEngine(SuccessResponseEngine):
+            def _do_profile(self, datasource, requests, non_functional_requirements):
+                raise RuntimeError("boom")
 
-class TestAsyncProfileEngine(unittest.TestCase):
+        engine = SequentialFallbackProfileEngine(
+            [FailingEngine(), SuccessResponseEngine()], pipelined=True
+        )
 
-    def setUp(self):
-        self.loop = asyncio.new_event_loop()
+        with self.assertRaises(RuntimeError):
+            engine.profile(self._datasource, self._requests)
 
-        self.requests = [
-            ProfileRequest(
-                statistics=[
-                    CustomStatistic(fq_name="fq_stat1_1", sql="1"),
-                    CustomStatistic(fq_name="fq_stat1_2", sql="2"),
-                ],
-                batch=BatchSpec(fq_dataset_name="batch1"),
-            )
+    def test_pipelined_call_cancelled(self):
+        token = CancellationToken()
+
+        class CancellingEngine(self.PerRequestDelayEngine):
+            def _do_profile(self, datasource, requests, non_functional_requirements):
+                token.cancel()
+                return super()._do_profile(
+                    datasource, requests, non_functional_requirements
+                )
+
+        engines = [
+            CancellingEngine(
+                1,
+                elapsed_time_millis=50,
+                unsupported_fq_names=[f"fq_stat_{i}_b" for i in range(3)],
+            ),
+            self.PerRequestDelayEngine(2, elapsed_time_millis=50),
         ]
-        self.response = ProfileResponse(
-            data={
-                "fq_stat1_1": SuccessStatisticResult(value=1),
-                "fq_stat1_2": SuccessStatisticResult(value=2),
-            }
+        engine = SequentialFallbackProfileEngine(
+            engines, pipelined=True, pipeline_chunk_size=1
         )
-        self.engine = FixedResponseEngine(self.response)
-        self.async_engine = AsyncProfileEngine(self.engine, self.loop)
+
+        def profile_cancellable() -> ProfileResponse:
+            current_cancellation_token.set(token)
+            return engine.profile(self._datasource, self._requests)
+
+        with self.assertRaises(ProfileEngineCancelledError):
+            contextvars.copy_context().run(profile_cancellable)
+        # no chunk is profiled once the call is cancelled
+        assert len(engines[0].received_requests) == 1
+        assert engines[1].received_requests == []
+
+    def test_pipelined_engines_run_in_executor(self):
+        thread_names: Set[str] = set()
+
+        class ThreadRecordingEngine(self.PerRequestDelayEngine):
+            def _do_profile(self, datasource, requests, non_functional_requirements):
+                thread_names.add(threading.current_thread().name)
+                return super()._do_profile(
+                    datasource, requests, non_functional_requirements
+                )
+
+        executor = SharedExecutor(max_workers=2, thread_name_prefix="test-executor")
+        engine = SequentialFallbackProfileEngine(
+            [
+                ThreadRecordingEngine(
+                    1,
+                    elapsed_time_millis=20,
+                    unsupported_fq_names=[f"fq_stat_{i}_b" for i in range(3)],
+                ),
+                ThreadRecordingEngine(2, elapsed_time_millis=20),
+            ],
+            pipelined=True,
+            pipeline_chunk_size=1,
+            executor=executor,
+        )
+
+        try:
+            response = engine.profile(self._datasource, self._requests)
+        finally:
+            executor.shutdown()
+
+        assert response == self._expected_response
+        # no thread of its own
+        assert thread_names <= {f"test-executor-{i}" for i in range(2)}
+
+    def test_pipelining_and_hedging_are_exclusive(self):
+        with self.assertRaises(ProfileEngineValueError):
+            SequentialFallbackProfileEngine(
+                self._engines(), pipelined=True, hedge_percentile=95
+            )
+
+
+class TestCircuitBreakerSequentialFallbackProfileEngine(unittest.TestCase):
+    _datasource = DataSource(
+        source=DataSourceType.SNOWFLAKE, connection_string="connection_string1"
+    )
+    _requests = [
+        ProfileRequest(
+            statistics=[StatisticSpec(fq_name="fq_stat_a")],
+            batch=BatchSpec(fq_dataset_name="batch1"),
+        )
+    ]
+
+    class DownEngine(SuccessResponseEngine):
+        def __init__(self):
+            super().__init__()
+            self.down = True
+
+        def _do_profile(self, datasource, requests, non_functional_requirements):
+            self.received_requests.append(requests)
+            if self.down:
+                raise RuntimeError("warehouse suspended")
+            return SuccessResponseEngine(success_value=1)._do_profile(
+                datasource, requests, non_functional_requirements
+            )
+
+    def test_open_breaker_skips_engine(self):
+        report = ProfileCoreReport()
+        down_engine = self.DownEngine()
+        engine = SequentialFallbackProfileEngine(
+            [down_engine, SuccessResponseEngine(success_value=2)],
+            report=report,
+            circuit_breaker_failure_threshold=2,
+            circuit_breaker_reset_timeout_seconds=0.2,
+        )
+
+        for _ in range(4):
+            response = engine.profile(self._datasource, self._requests)
+            assert response == ProfileResponse(
+                data={"fq_stat_a": SuccessStatisticResult(value=2)}
+            )
+
+        # open after 2 failures, so the last calls skip the engine
+        assert len(down_engine.received_requests) == 2
+        assert report.num_circuit_breaker_opens_by_engine["DownEngine"] == 1
+        datasource_label = ModelKeys.datasource_label(self._datasource)
+        assert report.circuit_breaker_state_by_engine_and_datasource == {
+            ("DownEngine", datasource_label): CircuitBreakerState.OPEN,
+            ("SuccessResponseEngine", datasource_label): CircuitBreakerState.CLOSED,
+        }
+
+        # probe after the reset timeout, closing the breaker
+        down_engine.down = False
+        time.sleep(0.2)
+        response = engine.profile(self._datasource, self._requests)
+        assert response == ProfileResponse(
+            data={"fq_stat_a": SuccessStatisticResult(value=1)}
+        )
+        assert (
+            report.circuit_breaker_state_by_engine_and_datasource[
+                ("DownEngine", datasource_label)
+            ]
+            == CircuitBreakerState.CLOSED
+        )
+
+    def test_breaker_per_datasource(self):
+        down_engine = self.DownEngine()
+        engine = SequentialFallbackProfileEngine(
+            [down_engine, SuccessResponseEngine(success_value=2)],
+            report=ProfileCoreReport(),
+            circuit_breaker_failure_threshold=1,
+        )
+        other_datasource = DataSource(
+            source=DataSourceType.SNOWFLAKE, connection_string="connection_string2"
+        )
+
+        engine.profile(self._datasource, self._requests)
+        engine.profile(self._datasource, self._requests)
+        engine.profile(other_datasource, self._requests)
+
+        assert len(down_engine.received_requests) == 2
+
+    def test_last_engine_open_breaker_fails_statistics(self):
+        engine = SequentialFallbackProfileEngine(
+            [self.DownEngine()],
+            report=ProfileCoreReport(),
+            circuit_breaker_failure_threshold=1,
+        )
+
+        engine.profile(self._datasource, self._requests)
+        response = engine.profile(self._datasource, self._requests)
+
+        result = response.data["fq_stat_a"]
+        assert isinstance(result, UnsuccessfulStatisticResult)
+        assert result.type == UnsuccessfulStatisticResultType.FAILURE
+        assert result.message == "Circuit breaker open for DownEngine"
+
+
+class TestRoutingProfileEngine(unittest.TestCase):
+    _datasource = DataSource(
+        source=DataSourceType.SNOWFLAKE, connection_string="connection_string1"
+    )
+
+    class UnsupportingEngine(FixedResponseEngine):
+        def __init__(self):
+            super().__init__(ProfileResponse())
+            self.num_calls = 0
+
+        def _do_profile(self, datasource, requests, non_functional_requirements):
+            self.num_calls += 1
+            return ModelCollections.failed_response_for_request(
+                requests[0], UnsuccessfulStatisticResultType.UNSUPPORTED
+            )
+
+    class SlowEngine(SuccessResponseEngine):
+        pass
+
+    class FastEngine(SuccessResponseEngine):
+        pass
+
+    @staticmethod
+    def _requests(i: int) -> List[ProfileRequest]:
+        return [
+            ProfileRequest(
+                statistics=[CustomStatistic(fq_name=f"fq_stat_{i}", sql="1")],
+                batch=BatchSpec(fq_dataset_name="batch1"),
+            )
+        ]
+
+    def test_route_away_from_unsupporting_engine(self):
+        report = ProfileCoreReport()
+        unsupporting_engine = self.UnsupportingEngine()
+        success_engine = SuccessResponseEngine(success_value=1)
+        engine = RoutingProfileEngine(
+            [unsupporting_engine, success_engine],
+            report=report,
+            exploration_rate=0,
+            min_samples=3,
+        )
+
+        for i in range(10):
+            response = engine.profile(self._datasource, self._requests(i))
+            assert response == ProfileResponse(
+                data={f"fq_stat_{i}": SuccessStatisticResult(value=1)}
+            )
+
+        # tried first until its success rate is known
+        assert unsupporting_engine.num_calls == 3
+        assert len(success_engine.received_requests) == 10
+        datasource_label = ModelKeys.datasource_label(self._datasource)
+        assert (
+            report.routing_success_rate(
+                "UnsupportingEngine", "CustomStatistic", datasource_label
+            )
+            == 0
+        )
+        assert (
+            report.routing_success_rate(
+                "SuccessResponseEngine", "CustomStatistic", datasource_label
+            )
+            == 1
+        )
+
+    def test_engines_of_same_class_have_own_outcomes(self):
+        class SupportingEngine(SuccessResponseEngine):
+            def __init__(self, supported: bool):
+                super().__init__(success_value=1)
+                self.supported = supported
+
+            def _do_profile(self, datasource, requests, non_functional_requirements):
+                if self.supported:
+                    return super()._do_profile(
+                        datasource, requests, non_functional_requirements
+                    )
+                self.received_requests.append(requests)
+                return ModelCollections.failed_response_for_request(
+                    requests[0], UnsuccessfulStatisticResultType.UNSUPPORTED
+                )
+
+        report = ProfileCoreReport()
+        unsupporting_engine = SupportingEngine(supported=False)
+        success_engine = SupportingEngine(supported=True)
+        engine = RoutingProfileEngine(
+            [unsupporting_engine, success_engine],
+            report=report,
+            exploration_rate=0,
+            min_samples=2,
+        )
+
+        for i in range(20):
+            engine.profile(self._datasource, self._requests(i))
+
+        assert len(unsupporting_engine.received_requests) == 2
+        assert len(success_engine.received_requests) == 20
+        datasource_label = ModelKeys.datasource_label(self._datasource)
+        assert (
+            report.routing_success_rate(
+                "SupportingEngine[0]", "CustomStatistic", datasource_label
+            )
+            == 0
+        )
+        assert (
+            report.routing_success_rate(
+                "SupportingEngine[1]", "CustomStatistic", datasource_label
+            )
+            == 1
+        )
+
+    def test_routers_sharing_report_have_own_outcomes(self):
+        report = ProfileCoreReport()
+        unsupporting_engines = [self.UnsupportingEngine() for _ in range(2)]
+        routers = [
+            RoutingProfileEngine(
+                [unsupporting_engine, SuccessResponseEngine(success_value=1)],
+                report=report,
+                exploration_rate=0,
+                min_samples=3,
+            )
+            for unsupporting_engine in unsupporting_engines
+        ]
+
+        for router in routers:
+            for i in range(10):
+                router.profile(self._datasource, self._requests(i))
+
+        # each router learns on its own engines
+        assert [engine.num_calls for engine in unsupporting_engines] == [3, 3]
+        assert (
+            report.num_routed_statistics_by_routing_key[
+                (
+                    "UnsupportingEngine",
+                    "CustomStatistic",
+                    ModelKeys.datasource_label(self._datasource),
+                )
+            ]
+            == 6
+        )
+
+    def test_latency_sampled_once_per_call(self):
+        engine = RoutingProfileEngine(
+            [self.SlowEngine(success_value=1, elapsed_time_millis=100)],
+            report=ProfileCoreReport(),
+        )
+        requests = [
+            ProfileRequest(
+                statistics=[
+                    CustomStatistic(fq_name=f"fq_stat_{i}", sql="1") for i in range(10)
+                ],
+                batch=BatchSpec(fq_dataset_name="batch1"),
+            )
+        ]
+
+        engine.profile(self._datasource, requests)
+
+        latencies_seconds = engine._latencies_seconds[
+            (0, "CustomStatistic", ModelKeys.datasource_label(self._datasource))
+        ]
+        assert len(latencies_seconds) == 1
+        # per statistic
+        assert 0.01 <= latencies_seconds[0] < 0.05
+
+    def test_route_to_fastest_engine(self):
+        slow_engine = self.SlowEngine(success_value=1, elapsed_time_millis=200)
+        fast_engine = self.FastEngine(success_value=2)
+        engine = RoutingProfileEngine(
+            [slow_engine, fast_engine],
+            report=ProfileCoreReport(),
+            exploration_rate=0,
+            min_samples=2,
+        )
+
+        for i in range(10):
+            engine.profile(self._datasource, self._requests(i))
+
+        # until its latency is known, the fast engine is tried as it has no cost
+        assert len(slow_engine.received_requests) == 2
+        assert len(fast_engine.received_requests) == 8
+
+    def test_exploration(self):
+        unsupporting_engine = self.UnsupportingEngine()
+        engine = RoutingProfileEngine(
+            [unsupporting_engine, SuccessResponseEngine(success_value=1)],
+            report=ProfileCoreReport(),
+            exploration_rate=0.5,
+            min_samples=1,
+            seed=42,
+        )
+
+        for i in range(100):
+            response = engine.profile(self._datasource, self._requests(i))
+            assert response.data[f"fq_stat_{i}"] == SuccessStatisticResult(value=1)
+
+        # a random engine for about half of the statistics, and so the unsupporting one for about a quarter
+        assert 10 < unsupporting_engine.num_calls < 40
+
+
+class TestParallelProfileEngine(unittest.TestCase):
+    _requests = [
+        ProfileRequest(
+            statistics=[
+                CustomStatistic(fq_name="fq_stat1_1", sql="1"),
+                CustomStatistic(fq_name="fq_stat2_1", sql="1"),
+            ],
+            batch=BatchSpec(fq_dataset_name="batch1"),
+        ),
+        ProfileRequest(
+            statistics=[
+                CustomStatistic(fq_name="fq_stat1_2", sql="1"),
+                CustomStatistic(fq_name="fq_stat2_2", sql="1"),
+            ],
+            batch=BatchSpec(fq_dataset_name="batch2"),
+        ),
+        ProfileRequest(
+            statistics=[
+                CustomStatistic(fq_name="fq_stat1_3", sql="1"),
+                CustomStatistic(fq_name="fq_stat2_3", sql="1"),
+            ],
+            batch=BatchSpec(fq_dataset_name="batch3"),
+        ),
+    ]
+    _datasource = DataSource(
+        source=DataSourceType.SNOWFLAKE, connection_string="connection_string1"
+    )
+
+    _expected_response = ProfileResponse(
+        data={
+            "fq_stat1_1": SuccessStatisticResult(value=1),
+            "fq_stat2_1": SuccessStatisticResult(value=1),
+            "fq_stat1_2": SuccessStatisticResult(value=1),
+            "fq_stat2_2": SuccessStatisticResult(value=1),
+            "fq_stat1_3": SuccessStatisticResult(value=1),
+            "fq_stat2_3": SuccessStatisticResult(value=1),
+        }
+    )
+
+    def _batch_requests_individually(
+        self, requests: List[ProfileRequest]
+    ) -> List[List[ProfileRequest]]:
+        return [[request] for request in requests]
+
+    def _batch_statistics_individually(
+        self, requests: List[ProfileRequest]
+    ) -> List[List[ProfileRequest]]:
+        result: List[List[ProfileRequest]] = []
+        for request in requests:
+            for statistic in request.statistics:
+                result.append(
+                    [ProfileRequest(statistics=[statistic], batch=request.batch)]
+                )
+        return result
+
+    def test_profile_all_in_parallel(self):
+        parallel_engine = ParallelProfileEngine(
+            engine=SuccessResponseEngine(success_value=1, elapsed_time_millis=1000),
+            max_workers=3,
+            batch_requests_predicate=self._batch_requests_individually,
+        )
+
+        start_time = time.time()
+        response = parallel_engine.profile(self._datasource, self._requests)
+        end_time = time.time()
+        elapsed_time = end_time - start_time
+
+        assert response == self._expected_response
+        # all requests in parallel, so elapsed time should be around 1 second = time of the slowest request
+        assert elapsed_time == approx(1, abs=0.1)
+
+    def test_profile_each_statistic_individually(self):
+        parallel_engine = ParallelProfileEngine(
+            engine=SuccessResponseEngine(success_value=1, elapsed_time_millis=1000),
+            max_workers=2,
+            batch_requests_predicate=self._batch_statistics_individually,
+        )
+
+        start_time = time.time()
+        response = parallel_engine.profile(self._datasource, self._requests)
+        end_time = time.time()
+        elapsed_time = end_time - start_time
+
+        assert response == self._expected_response
+        # all 6 statistics in individual batches, so elapsed time should be statistics=6/workers=2 = 3 seconds
+        assert elapsed_time == approx(3, abs=0.1)
+
+    def test_failed_batch_cancels_other_batches(self):
+        cancelled = threading.Event()
+
+        class FailingBatchEngine(SuccessResponseEngine):
+            def _do_profile(self, datasource, requests, non_functional_requirements):
+                self.received_requests.append(requests)
+                if requests[0].batch.fq_dataset_name == "batch1":
+                    # once the second batch is running
+                    time.sleep(0.1)
+                    raise RuntimeError("boom")
+                # running until cancelled
+                while not current_cancellation_token.get().cancelled:
+                    time.sleep(0.01)
+                cancelled.set()
+                raise ProfileEngineCancelledError("Profile call cancelled")
+
+        engine = FailingBatchEngine()
+        parallel_engine = ParallelProfileEngine(
+            engine=engine,
+            max_workers=2,
+            batch_requests_predicate=self._batch_requests_individually,
+        )
+
+        with self.assertRaisesRegex(RuntimeError, "boom"):
+            parallel_engine.profile(self._datasource, self._requests)
+
+        # the running batch is cancelled and waited for, the queued one is not run
+        assert cancelled.is_set()
+        assert sorted(
+            requests[0].batch.fq_dataset_name for requests in engine.received_requests
+        ) == ["batch1", "batch2"]
+
+    def test_adaptive_concurrency_backs_off_when_throttled(self):
+        report = ProfileCoreReport()
+        engine = ThrottlingEngine(max_concurrency=2, elapsed_time_millis=100)
+        parallel_engine = ParallelProfileEngine(
+            engine=engine,
+            max_workers=8,
+            batch_requests_predicate=self._batch_statistics_individually,
+            adaptive_concurrency=True,
+            report=report,
+        )
+
+        # first call starts at 4 in flight, which is throttled
+        parallel_engine.profile(self._datasource, self._requests)
+        assert engine.max_observed_concurrency == 4
+        assert report.num_concurrency_decreases_by_engine["ParallelProfileEngine"] > 0
+
+        # the learned limit carries over, so later calls only probe one above the throttling threshold
+        engine.max_observed_concurrency = 0
+        parallel_engine.profile(self._datasource, self._requests)
+        assert engine.max_observed_concurrency <= 3
+        assert (
+            report.concurrency_limit_by_engine_and_datasource[
+                ("ParallelProfileEngine", ModelKeys.datasource_label(self._datasource))
+            ]
+            <= 3
+        )
+
+    def test_adaptive_concurrency_grows_up_to_max_workers(self):
+        report = ProfileCoreReport()
+        parallel_engine = ParallelProfileEngine(
+            engine=SuccessResponseEngine(success_value=1, elapsed_time_millis=50),
+            max_workers=6,
+            batch_requests_predicate=self._batch_statistics_individually,
+            adaptive_concurrency=True,
+            report=report,
+        )
+
+        for _ in range(5):
+            response = parallel_engine.profile(self._datasource, self._requests)
+            assert response == self._expected_response
+
+        assert (
+            report.concurrency_limit_by_engine_and_datasource[
+                ("ParallelProfileEngine", ModelKeys.datasource_label(self._datasource))
+            ]
+            == 6
+        )
+        assert report.num_concurrency_increases_by_engine["ParallelProfileEngine"] == 2
+        assert report.num_concurrency_decreases_by_engine["ParallelProfileEngine"] == 0
+
+    def test_nested_engines_share_executor(self):
+        executor = SharedExecutor(max_workers=2, max_concurrency_per_key=2)
+        engine = ThreadCountingEngine(elapsed_time_millis=50)
+        parallel_engine = ParallelProfileEngine(
+            engine=ParallelProfileEngine(
+                engine=engine,
+                max_workers=4,
+                batch_requests_predicate=self._batch_statistics_individually,
+                executor=executor,
+            ),
+            max_workers=4,
+            batch_requests_predicate=self._batch_requests_individually,
+            executor=executor,
+        )
+
+        try:
+            response = parallel_engine.profile(self._datasource, self._requests)
+        finally:
+            executor.shutdown()
+
+        assert response == self._expected_response
+        assert len(engine.received_requests) == 6
+        # outer batches waiting for their inner ones run them, instead of blocking the two workers
+        assert executor.num_threads == 2
+        assert engine.max_in_flight <= 2
+
+    def test_nested_engine_waiting_for_limiter_lends_its_slot(self):
+        executor = SharedExecutor(max_workers=4, max_concurrency_per_key=1)
+        parallel_engine = ParallelProfileEngine(
+            engine=ParallelProfileEngine(
+                engine=SuccessResponseEngine(success_value=1, elapsed_time_millis=50),
+                max_workers=1,
+                adaptive_concurrency=True,
+                executor=executor,
+            ),
+            max_workers=2,
+            batch_requests_predicate=self._batch_requests_individually,
+            executor=executor,
+        )
+        responses: List[ProfileResponse] = []
+
+        # the second outer batch waits for the limiter slot of the first one, whose inner batch needs the key slot
+        thread = threading.Thread(
+            target=lambda: responses.append(
+                parallel_engine.profile(self._datasource, self._requests)
+            ),
+            daemon=True,
+        )
+        thread.start()
+        thread.join(5)
+
+        assert not thread.is_alive()
+        executor.shutdown()
+        assert responses == [self._expected_response]
+
+    def test_thread_count_bounded_under_async_engine(self):
+        loop = asyncio.new_event_loop()
+        # threads of the consumers
+        loop.set_default_executor(concurrent.futures.ThreadPoolExecutor(max_workers=4))
+        executor = SharedExecutor(max_workers=4)
+        engine = ThreadCountingEngine(elapsed_time_millis=20)
+        async_engine = AsyncProfileEngine(
+            ParallelProfileEngine(
+                engine=engine,
+                max_workers=4,
+                batch_requests_predicate=self._batch_statistics_individually,
+                executor=executor,
+            ),
+            loop,
+            num_consumers=4,
+        )
+        datasources = [
+            DataSource(
+                source=DataSourceType.SNOWFLAKE,
+                connection_string=f"connection_string{i}",
+            )
+            for i in range(20)
+        ]
+
+        async def test_coroutine():
+            return await asyncio.gather(
+                *[
+                    async_engine.profile(datasource, self._requests)
+                    for datasource in datasources
+                ]
+            )
+
+        num_threads_before = threading.active_count()
+        try:
+            responses = loop.run_until_complete(test_coroutine())
+        finally:
+            loop.run_until_complete(async_engine.shutdown(cancel=True))
+            loop.close()
+            executor.shutdown()
+
+        assert all(response == self._expected_response for response in responses)
+        # consumer threads and executor workers, rather than a pool per call
+        assert engine.max_active_threads - num_threads_before <= 4 + 4
+
+
+class ThreadCountingEngine(SuccessResponseEngine):
+    """Records the max number of calls in flight, and of threads alive during the calls."""
+
+    def __init__(self, elapsed_time_millis: int):
+        super().__init__(success_value=1, elapsed_time_millis=elapsed_time_millis)
+        self.max_in_flight = 0
+        self.max_active_threads = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def _do_profile(
+        self,
+        datasource: DataSource,
+        requests: List[ProfileRequest],
+        non_functional_requirements: ProfileNonFunctionalRequirements = ProfileNonFunctionalRequirements(),
+    ) -> ProfileResponse:
+        with self._lock:
+            self._in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self._in_flight)
+            self.max_active_threads = max(
+                self.max_active_threads, threading.active_count()
+            )
+        try:
+            return super()._do_profile(
+                datasource, requests, non_functional_requirements
+            )
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+
+class ThrottlingEngine(SuccessResponseEngine):
+    """Fails the statistics of any call beyond `max_concurrency` calls in flight, like a throttled warehouse."""
+
+    def __init__(self, max_concurrency: int, elapsed_time_millis: int):
+        super().__init__(success_value=1, elapsed_time_millis=elapsed_time_millis)
+        self.max_concurrency = max_concurrency
+        self.max_observed_concurrency = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def _do_profile(
+        self,
+        datasource: DataSource,
+        requests: List[ProfileRequest],
+        non_functional_requirements: ProfileNonFunctionalRequirements = ProfileNonFunctionalRequirements(),
+    ) -> ProfileResponse:
+        with self._lock:
+            self._in_flight += 1
+            throttled = self._in_flight > self.max_concurrency
+            self.max_observed_concurrency = max(
+                self.max_observed_concurrency, self._in_flight
+            )
+        try:
+            response = super()._do_profile(
+                datasource, requests, non_functional_requirements
+            )
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+        if throttled:
+            for fq_name in response.data:
+                response.data[fq_name] = UnsuccessfulStatisticResult(
+                    type=UnsuccessfulStatisticResultType.FAILURE, message="Throttled"
+                )
+        return response
+
+
+class TestCachingProfileEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.datasource = DataSource(
+            source=DataSourceType.SNOWFLAKE, connection_string="connection_string1"
+        )
+        self.report = ProfileCoreReport()
+        self.engine = SuccessResponseEngine(success_value=1)
+        self.caching_engine = CachingProfileEngine(self.engine, report=self.report)
+
+    @staticmethod
+    def _requests(prefix: str, sqls: List[str]) -> List[ProfileRequest]:
+        return [
+            ProfileRequest(
+                statistics=[
+                    CustomStatistic(fq_name=f"{prefix}_{sql}", sql=sql) for sql in sqls
+                ],
+                batch=BatchSpec(fq_dataset_name="batch1"),
+            )
+        ]
+
+    def test_cached_by_statistic_definition_not_fq_name(self):
+        response1 = self.caching_engine.profile(
+            self.datasource, self._requests("first", ["1", "2"])
+        )
+        response2 = self.caching_engine.profile(
+            self.datasource, self._requests("second", ["1", "2", "3"])
+        )
+
+        assert response1 == ProfileResponse(
+            data={
+                "first_1": SuccessStatisticResult(value=1),
+                "first_2": SuccessStatisticResult(value=1),
+            }
+        )
+        assert response2 == ProfileResponse(
+            data={
+                "second_1": SuccessStatisticResult(value=1),
+                "second_2": SuccessStatisticResult(value=1),
+                "second_3": SuccessStatisticResult(value=1),
+            }
+        )
+        assert self.engine.received_requests[1] == self._requests("second", ["3"])
+        assert self.report.num_cache_hits_by_engine["CachingProfileEngine"] == 2
+        assert self.report.num_cache_misses_by_engine["CachingProfileEngine"] == 3
+
+    def test_different_datasource_is_a_miss(self):
+        self.caching_engine.profile(self.datasource, self._requests("first", ["1"]))
+        self.caching_engine.profile(
+            DataSource(
+                source=DataSourceType.SNOWFLAKE,
+                connection_string="connection_string2",
+            ),
+            self._requests("first", ["1"]),
+        )
+
+        assert len(self.engine.received_requests) == 2
+
+    def test_unsuccessful_results_not_cached(self):
+        engine = FixedResponseEngine(
+            ProfileResponse(
+                data={
+                    "first_1": UnsuccessfulStatisticResult(
+                        type=UnsuccessfulStatisticResultType.FAILURE
+                    )
+                }
+            )
+        )
+        caching_engine = CachingProfileEngine(engine, report=self.report)
+
+        caching_engine.profile(self.datasource, self._requests("first", ["1"]))
+        engine.received_requests = None
+        caching_engine.profile(self.datasource, self._requests("first", ["1"]))
+
+        assert engine.received_requests == self._requests("first", ["1"])
+
+    def test_approximate_results_of_exact_statistics_not_cached(self):
+        def requests(approximate: bool) -> List[ProfileRequest]:
+            return [
+                ProfileRequest(
+                    statistics=[
+                        TypedStatistic(
+                            fq_name="distinct_count",
+                            type=ProfileStatisticType.COLUMN_DISTINCT_COUNT,
+                            columns=["a"],
+                            approximate=approximate,
+                        )
+                    ],
+                    batch=BatchSpec(fq_dataset_name="batch1"),
+                )
+            ]
+
+        # eg: exact distinct count downgraded on a large table
+        engine = FixedResponseEngine(
+            ProfileResponse(
+                data={
+                    "distinct_count": SuccessStatisticResult(
+                        value=999, error_bound=0.016
+                    )
+                }
+            )
+        )
+        caching_engine = CachingProfileEngine(engine, report=self.report)
+
+        caching_engine.profile(self.datasource, requests(approximate=False))
+        engine.received_requests = None
+        caching_engine.profile(self.datasource, requests(approximate=False))
+        assert engine.received_requests == requests(approximate=False)
+
+        caching_engine.profile(self.datasource, requests(approximate=True))
+        engine.received_requests = None
+        caching_engine.profile(self.datasource, requests(approximate=True))
+        assert engine.received_requests is None
+
+    def test_max_staleness(self):
+        self.caching_engine.profile(self.datasource, self._requests("first", ["1"]))
+
+        self.caching_engine.profile(
+            self.datasource,
+            self._requests("first", ["1"]),
+            ProfileNonFunctionalRequirements(max_staleness_seconds=3600),
+        )
+        assert len(self.engine.received_requests) == 1
+
+        self.caching_engine.profile(
+            self.datasource,
+            self._requests("first", ["1"]),
+            ProfileNonFunctionalRequirements(max_staleness_seconds=0),
+        )
+        assert len(self.engine.received_requests) == 2
+
+    def test_ttl(self):
+        caching_engine = CachingProfileEngine(
+            self.engine, report=self.report, ttl_seconds=0.05
+        )
+        caching_engine.profile(self.datasource, self._requests("first", ["1"]))
+        time.sleep(0.1)
+        caching_engine.profile(self.datasource, self._requests("first", ["1"]))
+
+        assert len(self.engine.received_requests) == 2
+
+    def test_persistent_cache_shared_across_engines(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "cache.sqlite")
+            CachingProfileEngine(
+                self.engine, report=self.report, persistent_cache_path=path
+            ).profile(self.datasource, self._requests("first", ["1"]))
+
+            response = CachingProfileEngine(
+                SuccessResponseEngine(success_value=2),
+                report=self.report,
+                persistent_cache_path=path,
+            ).profile(self.datasource, self._requests("second", ["1", "2"]))
+
+        assert response == ProfileResponse(
+            data={
+                "second_1": SuccessStatisticResult(value=1),
+                "second_2": SuccessStatisticResult(value=2),
+            }
+        )
+
+
+class TestSingleFlightProfileEngine(unittest.TestCase):
+    _datasource = DataSource(
+        source=DataSourceType.SNOWFLAKE, connection_string="connection_string1"
+    )
+
+    @staticmethod
+    def _requests(*fq_names: str) -> List[ProfileRequest]:
+        return [
+            ProfileRequest(
+                statistics=[
+                    CustomStatistic(fq_name=fq_name, sql="COUNT(*)")
+                    for fq_name in fq_names
+                ],
+                batch=BatchSpec(fq_dataset_name="db.schema.table1"),
+            )
+        ]
+
+    def _profile_concurrently(
+        self,
+        engine: SingleFlightProfileEngine,
+        calls: List[Tuple[List[ProfileRequest], ProfileNonFunctionalRequirements]],
+    ) -> List[object]:
+        results: List[object] = [None] * len(calls)
+
+        def profile(index: int) -> None:
+            requests, non_functional_requirements = calls[index]
+            try:
+                results[index] = engine.profile(
+                    self._datasource, requests, non_functional_requirements
+                )
+            except Exception as e:
+                results[index] = e
+
+        threads = []
+        for index in range(len(calls)):
+            threads.append(threading.Thread(target=profile, args=(index,)))
+            threads[-1].start()
+            # so the first call is the leader
+            time.sleep(0.05)
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_join_statistic_in_flight(self):
+        report = ProfileCoreReport()
+        inner_engine = SuccessResponseEngine(success_value=7, elapsed_time_millis=300)
+        engine = SingleFlightProfileEngine(inner_engine, report=report)
+
+        responses = self._profile_concurrently(
+            engine,
+            [
+                (self._requests("a"), ProfileNonFunctionalRequirements()),
+                (self._requests("b", "c"), ProfileNonFunctionalRequirements()),
+            ],
+        )
+
+        assert responses == [
+            ProfileResponse(data={"a": SuccessStatisticResult(value=7)}),
+            ProfileResponse(
+                data={
+                    "b": SuccessStatisticResult(value=7),
+                    "c": SuccessStatisticResult(value=7),
+                }
+            ),
+        ]
+        # a single computation, led by the first call
+        assert inner_engine.received_requests == [self._requests("a")]
+        assert (
+            report.num_single_flight_joins_by_engine["SingleFlightProfileEngine"] == 2
+        )
+
+    def test_different_non_functional_requirements_not_joined(self):
+        inner_engine = SuccessResponseEngine(success_value=7, elapsed_time_millis=300)
+        engine = SingleFlightProfileEngine(inner_engine, report=ProfileCoreReport())
+
+        self._profile_concurrently(
+            engine,
+            [
+                (self._requests("a"), ProfileNonFunctionalRequirements()),
+                (
+                    self._requests("b"),
+                    ProfileNonFunctionalRequirements(max_staleness_seconds=0),
+                ),
+            ],
+        )
+
+        assert inner_engine.received_requests == [
+            self._requests("a"),
+            self._requests("b"),
+        ]
+
+    def test_failure_of_leader_fails_joined_statistics(self):
+        class FailingEngine(SuccessResponseEngine):
+            def _do_profile(self, datasource, requests, non_functional_requirements):
+                super()._do_profile(datasource, requests, non_functional_requirements)
+                raise RuntimeError("boom")
+
+        engine = SingleFlightProfileEngine(
+            FailingEngine(elapsed_time_millis=300), report=ProfileCoreReport()
+        )
+
+        results = self._profile_concurrently(
+            engine,
+            [
+                (self._requests("a"), ProfileNonFunctionalRequirements()),
+                (self._requests("b"), ProfileNonFunctionalRequirements()),
+            ],
+        )
+
+        assert isinstance(results[0], RuntimeError)
+        assert isinstance(results[1], ProfileResponse)
+        result = results[1].data["b"]
+        assert isinstance(result, UnsuccessfulStatisticResult)
+        assert result.type == UnsuccessfulStatisticResultType.FAILURE
+        assert result.message == "boom"
+
+        # nothing left in flight
+        inner_engine = SuccessResponseEngine(success_value=1)
+        engine.engine = inner_engine
+        assert engine.profile(self._datasource, self._requests("c")) == ProfileResponse(
+            data={"c": SuccessStatisticResult(value=1)}
+        )
+
+    def test_cancellation_of_leader_not_passed_to_joined_calls(self):
+        class CancelledOnceEngine(SuccessResponseEngine):
+            def _do_profile(self, datasource, requests, non_functional_requirements):
+                response = super()._do_profile(
+                    datasource, requests, non_functional_requirements
+                )
+                if len(self.received_requests) == 1:
+                    # stand-in of the first caller cancelling its call
+                    raise ProfileEngineCancelledError("Profile call cancelled")
+                return response
+
+        inner_engine = CancelledOnceEngine(success_value=1, elapsed_time_millis=300)
+        engine = SingleFlightProfileEngine(inner_engine, report=ProfileCoreReport())
+
+        results = self._profile_concurrently(
+            engine,
+            [
+                (self._requests("a"), ProfileNonFunctionalRequirements()),
+                (self._requests("b"), ProfileNonFunctionalRequirements()),
+            ],
+        )
+
+        assert isinstance(results[0], ProfileEngineCancelledError)
+        # the joined call profiles the statistic again
+        assert results[1] == ProfileResponse(
+            data={"b": SuccessStatisticResult(value=1)}
+        )
+        assert len(inner_engine.received_requests) == 2
+
+
+class BlockingEngine(SuccessResponseEngine):
+    """Engine blocking every call until released."""
+
+    def __init__(self):
+        super().__init__(success_value=1)
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def _do_profile(
+        self,
+        datasource: DataSource,
+        requests: List[ProfileRequest],
+        non_functional_requirements: ProfileNonFunctionalRequirements = ProfileNonFunctionalRequirements(),
+    ) -> ProfileResponse:
+        self.started.set()
+        self.release.wait()
+        return super()._do_profile(datasource, requests, non_functional_requirements)
+
+
+class TestAsyncProfileEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.async_engines: List[AsyncProfileEngine] = []
+
+        self.requests = [
+            ProfileRequest(
+                statistics=[
+                    CustomStatistic(fq_name="fq_stat1_1", sql="1"),
+                    CustomStatistic(fq_name="fq_stat1_2", sql="2"),
+                ],
+                batch=BatchSpec(fq_dataset_name="batch1"),
+            )
+        ]
+        self.response = ProfileResponse(
+            data={
+                "fq_stat1_1": SuccessStatisticResult(value=1),
+                "fq_stat1_2": SuccessStatisticResult(value=2),
+            }
+        )
+        self.engine = FixedResponseEngine(self.response)
+        self.async_engine = self._async_engine(self.engine)
         self.datasource = DataSource(
             source=DataSourceType.SNOWFLAKE, connection_string="connection_string1"
         )
         self.non_functional_requirements = ProfileNonFunctionalRequirements()
 
     def tearDown(self):
+        for async_engine in self.async_engines:
+            self.loop.run_until_complete(async_engine.shutdown(cancel=True))
         self.loop.close()
 
+    def _async_engine(self, engine: ProfileEngine, **kwargs) -> AsyncProfileEngine:
+        async_engine = AsyncProfileEngine(engine, self.loop, **kwargs)
+        self.async_engines.append(async_engine)
+        return async_engine
+
     def test_profile(self):
         async def test_coroutine():
             future = self.async_engine.profile(
@@ -590,3 +2050,459 @@ class TestAsyncProfileEngine(unittest.TestCase):
             assert future.result() == self.response
 
         self.loop.run_until_complete(test_coroutine())
+
+    def test_coalesce_concurrent_calls(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        datasource = create_sqlite_datasource(
+            os.path.join(tmpdir.name, "db.sqlite"),
+            {"t1": (["a"], [(1,), (2,), (3,)]), "t2": (["a"], [(10,), (20,)])},
+        )
+        report = ProfileCoreReport()
+        sqlalchemy_engine = SqlAlchemyProfileEngine(report=report)
+        async_engine = self._async_engine(
+            sqlalchemy_engine, coalescing_window_seconds=0.05
+        )
+
+        def request(table: str, *statistics: StatisticSpec) -> ProfileRequest:
+            return ProfileRequest(
+                statistics=list(statistics),
+                batch=BatchSpec(fq_dataset_name=f"main.{table}"),
+            )
+
+        async def test_coroutine():
+            return await asyncio.gather(
+                # same fq_name as the next caller, different statistic
+                async_engine.profile(
+                    datasource,
+                    [request("t1", CustomStatistic(fq_name="x", sql="SUM(a)"))],
+                ),
+                async_engine.profile(
+                    datasource,
+                    [
+                        request("t1", CustomStatistic(fq_name="x", sql="MAX(a)")),
+                        request("t2", CustomStatistic(fq_name="y", sql="SUM(a)")),
+                    ],
+                ),
+                # same statistic as the first caller, different fq_name
+                async_engine.profile(
+                    datasource,
+                    [request("t1", CustomStatistic(fq_name="z", sql="SUM(a)"))],
+                ),
+                # invalid call, not affecting the others
+                async_engine.profile(
+                    datasource,
+                    [
+                        request("t1", CustomStatistic(fq_name="w", sql="MIN(a)")),
+                        request("t2", CustomStatistic(fq_name="w", sql="MIN(a)")),
+                    ],
+                ),
+                return_exceptions=True,
+            )
+
+        try:
+            responses = self.loop.run_until_complete(test_coroutine())
+        finally:
+            sqlalchemy_engine.engine_registry.dispose(datasource)
+            tmpdir.cleanup()
+
+        assert responses[0] == ProfileResponse(
+            data={"x": SuccessStatisticResult(value=6)}
+        )
+        assert responses[1] == ProfileResponse(
+            data={
+                "x": SuccessStatisticResult(value=3),
+                "y": SuccessStatisticResult(value=30),
+            }
+        )
+        assert responses[2] == ProfileResponse(
+            data={"z": SuccessStatisticResult(value=6)}
+        )
+        assert isinstance(responses[3], ProfileEngineValueError)
+        # a single query per table for the three valid calls
+        assert report.num_issued_queries_by_engine["SqlAlchemyProfileEngine"] == 2
+
+    def test_calls_on_different_datasources_not_coalesced(self):
+        engine = SuccessResponseEngine(success_value=1)
+        async_engine = self._async_engine(engine)
+        other_datasource = DataSource(
+            source=DataSourceType.SNOWFLAKE, connection_string="connection_string2"
+        )
+
+        async def test_coroutine():
+            return await asyncio.gather(
+                async_engine.profile(self.datasource, self.requests),
+                async_engine.profile(other_datasource, self.requests),
+            )
+
+        responses = self.loop.run_until_complete(test_coroutine())
+
+        for response in responses:
+            assert response == ProfileResponse(
+                data={
+                    "fq_stat1_1": SuccessStatisticResult(value=1),
+                    "fq_stat1_2": SuccessStatisticResult(value=1),
+                }
+            )
+        assert engine.received_requests == [self.requests, self.requests]
+
+    def test_priority_overtakes_queued_calls(self):
+        engine = BlockingEngine()
+        report = ProfileCoreReport()
+        async_engine = self._async_engine(engine, report=report)
+
+        def requests(fq_name: str) -> List[ProfileRequest]:
+            return [
+                ProfileRequest(
+                    statistics=[CustomStatistic(fq_name=fq_name, sql=fq_name)],
+                    batch=BatchSpec(fq_dataset_name="batch1"),
+                )
+            ]
+
+        async def test_coroutine():
+            running = async_engine.profile(self.datasource, requests("running"))
+            await asyncio.to_thread(engine.started.wait)
+            # queued while the consumer is busy
+            queued = [
+                async_engine.profile(self.datasource, requests("bulk1"), priority=1),
+                async_engine.profile(self.datasource, requests("bulk2"), priority=1),
+                async_engine.profile(self.datasource, requests("interactive")),
+            ]
+            await asyncio.sleep(0.05)
+            engine.release.set()
+            return await asyncio.gather(running, *queued)
+
+        responses = self.loop.run_until_complete(test_coroutine())
+
+        assert responses[3] == ProfileResponse(
+            data={"interactive": SuccessStatisticResult(value=1)}
+        )
+        assert responses[1] == ProfileResponse(
+            data={"bulk1": SuccessStatisticResult(value=1)}
+        )
+        # interactive call first, then the bulk calls coalesced
+        assert len(engine.received_requests) == 3
+        assert engine.received_requests[1] == requests("interactive")
+        assert len(engine.received_requests[2][0].statistics) == 2
+        assert report.max_queue_depth_by_engine["AsyncProfileEngine"] == 3
+        assert report.queue_depth_by_engine["AsyncProfileEngine"] == 0
+        assert report.num_queued_calls_by_engine["AsyncProfileEngine"] == 4
+        assert report.mean_queue_wait_seconds("AsyncProfileEngine") > 0
+
+    def test_coalesce_calls_interleaved_with_other_datasources(self):
+        engine = BlockingEngine()
+        async_engine = self._async_engine(engine)
+        other_datasource = DataSource(
+            source=DataSourceType.SNOWFLAKE, connection_string="connection_string2"
+        )
+
+        async def test_coroutine():
+            running = async_engine.profile(other_datasource, self.requests)
+            await asyncio.to_thread(engine.started.wait)
+            # queued while the consumer is busy
+            queued = [
+                async_engine.profile(datasource, self.requests)
+                for _ in range(50)
+                for datasource in (self.datasource, other_datasource)
+            ]
+            await asyncio.sleep(0.05)
+            engine.release.set()
+            return await asyncio.gather(running, *queued)
+
+        responses = self.loop.run_until_complete(test_coroutine())
+
+        assert len(responses) == 101
+        # the running call, then the queued calls coalesced per datasource
+        assert len(engine.received_requests) == 3
+        assert len(engine.received_requests[1][0].statistics) == 2
+        assert len(engine.received_requests[2][0].statistics) == 2
+        assert all(
+            response
+            == ProfileResponse(
+                data={
+                    "fq_stat1_1": SuccessStatisticResult(value=1),
+                    "fq_stat1_2": SuccessStatisticResult(value=1),
+                }
+            )
+            for response in responses
+        )
+
+    def test_deadline_exceeded_while_queued(self):
+        engine = BlockingEngine()
+        report = ProfileCoreReport()
+        async_engine = self._async_engine(engine, report=report)
+
+        async def test_coroutine():
+            running = async_engine.profile(self.datasource, self.requests)
+            await asyncio.to_thread(engine.started.wait)
+            expiring = async_engine.profile(
+                self.datasource, self.requests, deadline_seconds=0.01
+            )
+            await asyncio.sleep(0.05)
+            engine.release.set()
+            return await asyncio.gather(running, expiring, return_exceptions=True)
+
+        responses = self.loop.run_until_complete(test_coroutine())
+
+        assert isinstance(responses[0], ProfileResponse)
+        assert isinstance(responses[1], ProfileEngineTimeoutError)
+        assert len(engine.received_requests) == 1
+        assert report.num_expired_calls_by_engine["AsyncProfileEngine"] == 1
+
+    def test_multiple_consumers(self):
+        engine = SuccessResponseEngine(success_value=1, elapsed_time_millis=200)
+        report = ProfileCoreReport()
+        async_engine = self._async_engine(engine, num_consumers=4, report=report)
+        datasources = [
+            DataSource(
+                source=DataSourceType.SNOWFLAKE,
+                connection_string=f"connection_string{i}",
+            )
+            for i in range(4)
+        ]
+
+        async def test_coroutine():
+            return await asyncio.gather(
+                *[
+                    async_engine.profile(datasource, self.requests)
+                    for datasource in datasources
+                ]
+            )
+
+        start = time.perf_counter()
+        responses = self.loop.run_until_complete(test_coroutine())
+        elapsed = time.perf_counter() - start
+
+        assert len(responses) == 4
+        assert len(engine.received_requests) == 4
+        # calls on different datasources are not coalesced, but run in parallel
+        assert elapsed < 0.6
+        assert report.num_queued_calls_by_engine["AsyncProfileEngine"] == 4
+        assert report.mean_service_seconds("AsyncProfileEngine") == approx(0.2, abs=0.1)
+
+    def test_overloaded_queue_rejects_calls(self):
+        engine = BlockingEngine()
+        report = ProfileCoreReport()
+        async_engine = self._async_engine(engine, report=report, max_queued_calls=1)
+
+        async def test_coroutine():
+            running = async_engine.profile(self.datasource, self.requests)
+            await asyncio.to_thread(engine.started.wait)
+            queued = async_engine.profile(self.datasource, self.requests)
+            rejected = async_engine.profile(self.datasource, self.requests)
+            engine.release.set()
+            return await asyncio.gather(
+                running, queued, rejected, return_exceptions=True
+            )
+
+        responses = self.loop.run_until_complete(test_coroutine())
+
+        assert isinstance(responses[0], ProfileResponse)
+        assert isinstance(responses[1], ProfileResponse)
+        assert isinstance(responses[2], ProfileEngineOverloadedError)
+        assert len(engine.received_requests) == 2
+        assert report.num_overloaded_calls_by_engine["AsyncProfileEngine"] == 1
+        assert report.max_queue_depth_by_engine["AsyncProfileEngine"] == 1
+        assert report.max_queued_statistics_by_engine["AsyncProfileEngine"] == 2
+        assert report.queued_statistics_by_engine["AsyncProfileEngine"] == 0
+
+    def test_overloaded_queue_skips_calls(self):
+        engine = BlockingEngine()
+        async_engine = self._async_engine(
+            engine,
+            max_queued_statistics=3,
+            overload_policy=QueueOverloadPolicy.SKIP,
+        )
+
+        async def test_coroutine():
+            running = async_engine.profile(self.datasource, self.requests)
+            await asyncio.to_thread(engine.started.wait)
+            queued = async_engine.profile(self.datasource, self.requests)
+            skipped = async_engine.profile(self.datasource, self.requests)
+            engine.release.set()
+            return await asyncio.gather(running, queued, skipped)
+
+        responses = self.loop.run_until_complete(test_coroutine())
+
+        assert responses[1] == ProfileResponse(
+            data={
+                "fq_stat1_1": SuccessStatisticResult(value=1),
+                "fq_stat1_2": SuccessStatisticResult(value=1),
+            }
+        )
+        assert responses[2] == ProfileResponse(
+            data={
+                "fq_stat1_1": UnsuccessfulStatisticResult(
+                    type=UnsuccessfulStatisticResultType.SKIPPED,
+                    message="Profile queue overloaded",
+                ),
+                "fq_stat1_2": UnsuccessfulStatisticResult(
+                    type=UnsuccessfulStatisticResultType.SKIPPED,
+                    message="Profile queue overloaded",
+                ),
+            }
+        )
+        assert len(engine.received_requests) == 2
+
+    def test_overloaded_queue_blocks_callers(self):
+        engine = BlockingEngine()
+        async_engine = self._async_engine(
+            engine,
+            max_queued_calls=1,
+            overload_policy=QueueOverloadPolicy.BLOCK,
+        )
+
+        async def test_coroutine():
+            running = async_engine.profile(self.datasource, self.requests)
+            await asyncio.to_thread(engine.started.wait)
+            queued = async_engine.profile(self.datasource, self.requests)
+            # submitted from another thread, blocked until the queued call is dequeued
+            blocked_submission = asyncio.ensure_future(
+                asyncio.to_thread(async_engine.profile, self.datasource, self.requests)
+            )
+            await asyncio.sleep(0.05)
+            assert not blocked_submission.done()
+            # the event loop can't block
+            with self.assertRaises(ProfileEngineValueError):
+                async_engine.profile(self.datasource, self.requests)
+
+            engine.release.set()
+            blocked = await blocked_submission
+            return await asyncio.gather(running, queued, blocked)
+
+        responses = self.loop.run_until_complete(test_coroutine())
+
+        assert all(isinstance(response, ProfileResponse) for response in responses)
+        assert len(engine.received_requests) == 3
+
+    def test_cancel_running_call(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        rows = [(i,) for i in range(1000)]
+        datasource = create_sqlite_datasource(
+            os.path.join(tmpdir.name, "db.sqlite"),
+            {"t1": (["a"], rows), "t2": (["a"], rows)},
+        )
+        report = ProfileCoreReport()
+        sqlalchemy_engine = SqlAlchemyProfileEngine(report=report)
+        # about 10 seconds per table if not cancelled
+        add_slow_sqlite_function(
+            sqlalchemy_engine.engine_registry.get_engine(datasource), 0.01
+        )
+        async_engine = self._async_engine(
+            ParallelProfileEngine(
+                SequentialFallbackProfileEngine([sqlalchemy_engine], report=report),
+                max_workers=1,
+                batch_requests_predicate=lambda requests: [
+                    [request] for request in requests
+                ],
+                report=report,
+            )
+        )
+
+        async def test_coroutine():
+            future = async_engine.profile(
+                datasource,
+                [
+                    ProfileRequest(
+                        statistics=[
+                            CustomStatistic(fq_name=f"{table}_s", sql="SUM(SLOW(a))")
+                        ],
+                        batch=BatchSpec(fq_dataset_name=f"main.{table}"),
+                    )
+                    for table in ["t1", "t2"]
+                ],
+            )
+            await asyncio.sleep(0.3)
+            future.cancel()
+            # waits for the running call to stop
+            await async_engine.shutdown()
+            return future
+
+        start = time.perf_counter()
+        try:
+            future = self.loop.run_until_complete(test_coroutine())
+        finally:
+            sqlalchemy_engine.engine_registry.dispose(datasource)
+            tmpdir.cleanup()
+
+        assert future.cancelled()
+        assert time.perf_counter() - start < 2
+        # the statement of the first batch cancelled, the second batch never run
+        assert report.num_issued_queries_by_engine["SqlAlchemyProfileEngine"] == 1
+        assert (
+            report.num_unsuccessful_queries_by_engine_and_status[
+                ("SqlAlchemyProfileEngine", UnsuccessfulStatisticResultType.FAILURE)
+            ]
+            == 1
+        )
+
+    def test_shutdown_drains_queued_calls(self):
+        engine = BlockingEngine()
+        async_engine = self._async_engine(engine)
+
+        async def test_coroutine():
+            running = async_engine.profile(self.datasource, self.requests)
+            await asyncio.to_thread(engine.started.wait)
+            queued = async_engine.profile(self.datasource, self.requests, priority=1)
+            self.loop.call_later(0.05, engine.release.set)
+            await async_engine.shutdown()
+            assert running.done() and queued.done()
+            rejected = async_engine.profile(self.datasource, self.requests)
+            return await asyncio.gather(
+                running, queued, rejected, return_exceptions=True
+            )
+
+        responses = self.loop.run_until_complete(test_coroutine())
+
+        assert isinstance(responses[0], ProfileResponse)
+        assert isinstance(responses[1], ProfileResponse)
+        assert isinstance(responses[2], ProfileEngineCancelledError)
+        assert len(engine.received_requests) == 2
+
+    def test_shutdown_drains_call_not_enqueued_yet(self):
+        async def test_coroutine():
+            # enqueued on the event loop after the shutdown started
+            future = self.async_engine.profile(self.datasource, self.requests)
+            await self.async_engine.shutdown()
+            return await asyncio.wait_for(future, 2)
+
+        assert self.loop.run_until_complete(test_coroutine()) == self.response
+
+    def test_shutdown_cancels_outstanding_calls_after_timeout(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        datasource = create_sqlite_datasource(
+            os.path.join(tmpdir.name, "db.sqlite"),
+            {"t1": (["a"], [(i,) for i in range(1000)])},
+        )
+        sqlalchemy_engine = SqlAlchemyProfileEngine(report=ProfileCoreReport())
+        add_slow_sqlite_function(
+            sqlalchemy_engine.engine_registry.get_engine(datasource), 0.01
+        )
+        async_engine = self._async_engine(sqlalchemy_engine)
+        requests = [
+            ProfileRequest(
+                statistics=[CustomStatistic(fq_name="s", sql="SUM(SLOW(a))")],
+                batch=BatchSpec(fq_dataset_name="main.t1"),
+            )
+        ]
+
+        async def test_coroutine():
+            running = async_engine.profile(datasource, requests)
+            await asyncio.sleep(0.1)
+            queued = async_engine.profile(datasource, requests, priority=1)
+            await async_engine.shutdown(timeout_seconds=0.2)
+            return running, queued
+
+        start = time.perf_counter()
+        try:
+            running, queued = self.loop.run_until_complete(test_coroutine())
+        finally:
+            sqlalchemy_engine.engine_registry.dispose(datasource)
+            tmpdir.cleanup()
+
+        assert time.perf_counter() - start < 2
+        assert isinstance(running.exception(), ProfileEngineCancelledError)
+        assert queued.cancelled()
+
+    def test_invalid_number_of_consumers(self):
+        with self.assertRaises(ProfileEngineValueError):
+            AsyncProfileEngine(self.engine, self.loop, num_consumers=0)